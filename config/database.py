@@ -0,0 +1,82 @@
+"""
+Configuración de la base de datos.
+
+Por defecto se usa SQLite (`db.sqlite3`) en modo producción: WAL para que las
+lecturas no bloqueen a las escrituras, `busy_timeout` para que un worker espere
+al bloqueo en vez de fallar con "database is locked", y transacciones
+`IMMEDIATE` para que dos escritores no choquen al promover su bloqueo de
+lectura a escritura. Los PRAGMA se aplican al abrir cada conexión y, con
+`CONN_MAX_AGE`, la conexión se reutiliza entre peticiones.
+
+Si está definida la variable de entorno DATABASE_URL se usa esa base de datos
+(p. ej. postgres://...) vía dj-database-url; si la URL es sqlite:// también
+recibe los PRAGMA.
+
+Variables de entorno:
+    DATABASE_URL          URL de la base de datos (opcional).
+    DATABASE_REPLICA_URLS URLs de réplicas de solo lectura separadas por comas (opcional);
+                          se registran como `replica1`, `replica2`... (ver config/routers.py).
+    DB_CONN_MAX_AGE       segundos que se reutiliza una conexión (60; 0 = cerrar en cada petición).
+    SQLITE_BUSY_TIMEOUT   milisegundos de espera ante un bloqueo (20000).
+    SQLITE_MMAP_MB        tamaño del mapeo en memoria del fichero (128).
+    SQLITE_CACHE_MB       caché de páginas por conexión (32).
+"""
+import os
+
+import dj_database_url
+
+
+def _entero_env(nombre, defecto):
+    try:
+        return int(os.environ.get(nombre, defecto))
+    except ValueError:
+        return defecto
+
+
+def pragmas_sqlite():
+    """PRAGMA aplicados a cada conexión nueva, en orden."""
+    return {
+        'journal_mode': 'WAL',
+        'synchronous': 'NORMAL',
+        'busy_timeout': _entero_env('SQLITE_BUSY_TIMEOUT', 20000),
+        'mmap_size': _entero_env('SQLITE_MMAP_MB', 128) * 1024 * 1024,
+        # Negativo = tamaño en KiB en lugar de número de páginas
+        'cache_size': -_entero_env('SQLITE_CACHE_MB', 32) * 1024,
+        'temp_store': 'MEMORY',
+    }
+
+
+def opciones_sqlite():
+    pragmas = pragmas_sqlite()
+    return {
+        'init_command': ';'.join(f'PRAGMA {clave}={valor}' for clave, valor in pragmas.items()),
+        # Timeout del módulo sqlite3 (segundos); igual al busy_timeout
+        'timeout': pragmas['busy_timeout'] / 1000,
+        'transaction_mode': 'IMMEDIATE',
+    }
+
+
+def configurar_bases(base_dir):
+    """Devuelve el diccionario DATABASES según el entorno."""
+    conn_max_age = _entero_env('DB_CONN_MAX_AGE', 60)
+    url = os.environ.get('DATABASE_URL')
+    if url:
+        default = dj_database_url.parse(url, conn_max_age=conn_max_age, conn_health_checks=conn_max_age > 0)
+    else:
+        default = {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': base_dir / 'db.sqlite3',
+            'CONN_MAX_AGE': conn_max_age,
+            'CONN_HEALTH_CHECKS': conn_max_age > 0,
+        }
+    bases = {'default': default}
+    urls_replicas = [u.strip() for u in os.environ.get('DATABASE_REPLICA_URLS', '').split(',') if u.strip()]
+    for i, url_replica in enumerate(urls_replicas, 1):
+        replica = dj_database_url.parse(url_replica, conn_max_age=conn_max_age, conn_health_checks=conn_max_age > 0)
+        # En los tests las réplicas apuntan a la base de pruebas de `default`
+        replica['TEST'] = {'MIRROR': 'default'}
+        bases[f'replica{i}'] = replica
+    for base in bases.values():
+        if base['ENGINE'] == 'django.db.backends.sqlite3':
+            base['OPTIONS'] = {**opciones_sqlite(), **base.get('OPTIONS', {})}
+    return bases
@@ -0,0 +1,92 @@
+"""
+Enrutado de lecturas a réplicas.
+
+`EnrutadoLecturasMiddleware` marca cada petición: si es un GET/HEAD de una de
+las vistas públicas de `settings.REPLICAS_VISTAS` y la sesión no escribió hace
+poco, las lecturas de los modelos de `settings.REPLICAS_APPS` van a una réplica
+(alias `replica*` de DATABASES, ver config/database.py). Todo lo demás usa
+`default`, sin cambiar el código de las vistas.
+
+Lectura tras escritura: en cuanto la petición escribe, el resto de sus
+lecturas vuelven a la primaria, y la respuesta deja la cookie
+`REPLICAS_COOKIE` durante `REPLICAS_RETRASO_MAX` segundos (el retraso de
+réplica que se tolera) para que el navegador vea sus propios cambios.
+"""
+import random
+import time
+from contextvars import ContextVar
+
+from django.conf import settings
+
+# Estado de la petición en curso: {'replica': bool, 'escrito': bool}
+_peticion = ContextVar('enrutado_lecturas', default=None)
+
+
+def alias_replicas():
+    return [alias for alias in settings.DATABASES if alias.startswith('replica')]
+
+
+class LecturasRouter:
+
+    def __init__(self):
+        self.replicas = alias_replicas()
+
+    def db_for_read(self, model, **hints):
+        estado = _peticion.get()
+        if not self.replicas or not estado or not estado['replica']:
+            return None
+        if model._meta.app_label not in settings.REPLICAS_APPS:
+            return None
+        return random.choice(self.replicas)
+
+    def db_for_write(self, model, **hints):
+        estado = _peticion.get()
+        if estado is not None:
+            estado['escrito'] = True
+            estado['replica'] = False
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Las réplicas son copias de `default`: los objetos pueden relacionarse
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == 'default'
+
+
+class EnrutadoLecturasMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not alias_replicas():
+            return self.get_response(request)
+        estado = {'replica': False, 'escrito': False}
+        token = _peticion.set(estado)
+        try:
+            response = self.get_response(request)
+        finally:
+            _peticion.reset(token)
+        if estado['escrito'] or request.method not in ('GET', 'HEAD', 'OPTIONS'):
+            retraso = settings.REPLICAS_RETRASO_MAX
+            response.set_cookie(
+                settings.REPLICAS_COOKIE, str(int(time.time() + retraso)),
+                max_age=retraso, httponly=True, samesite='Lax',
+            )
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        estado = _peticion.get()
+        if estado is None or estado['escrito'] or request.method not in ('GET', 'HEAD'):
+            return None
+        nombre = request.resolver_match.url_name if request.resolver_match else None
+        if nombre in settings.REPLICAS_VISTAS and not self._fijada_a_primaria(request):
+            estado['replica'] = True
+        return None
+
+    @staticmethod
+    def _fijada_a_primaria(request):
+        try:
+            return float(request.COOKIES.get(settings.REPLICAS_COOKIE, 0)) > time.time()
+        except ValueError:
+            return False
@@ -46,10 +46,13 @@ INSTALLED_APPS = [
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',
+    'jugadores.middleware.ArchivoTorneosMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'config.routers.EnrutadoLecturasMiddleware',
+    'jugadores.limites.LimiteEscriturasMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
     
@@ -82,12 +85,22 @@ WSGI_APPLICATION = 'config.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
-    }
+# SQLite con WAL y PRAGMA de producción, o DATABASE_URL si está definida (ver config/database.py)
+from .database import configurar_bases
+
+DATABASES = configurar_bases(BASE_DIR)
+
+# Lecturas de vistas públicas a las réplicas, si las hay (ver config/routers.py).
+# Para probar en local con SQLite:
+#   DATABASE_REPLICA_URLS=sqlite:///db_replica.sqlite3 y `manage.py sincronizar_replicas`
+DATABASE_ROUTERS = ['config.routers.LecturasRouter']
+REPLICAS_APPS = {'jugadores'}
+REPLICAS_VISTAS = {
+    'inicio', 'resultados_partidos', 'tabla_clasificacion', 'perfil_jugador',
+    'estadisticas_equipo', 'estadisticas_por_partido', 'estadisticas_por_torneo',
 }
+REPLICAS_RETRASO_MAX = 10        # segundos que una sesión lee de la primaria tras escribir
+REPLICAS_COOKIE = 'primaria_hasta'
 
 
 # Password validation
@@ -147,8 +160,127 @@ MEDIA_URL = '/media/'
 # Ruta del sistema de archivos donde se almacenarán los archivos multimedia
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# Comprobantes de pago: se sirven con permisos desde /pago/<id>/comprobante/ (ver jugadores/comprobantes.py).
+# '' los transmite Django; 'x-accel' (nginx) o 'x-sendfile' (Apache) delegan el envío en el servidor web.
+COMPROBANTES_SERVIDOR = os.environ.get('COMPROBANTES_SERVIDOR', '')
+COMPROBANTES_ACCEL_PREFIJO = '/media-protegida/'  # location internal de nginx con alias a MEDIA_ROOT
+COMPROBANTES_CACHE_SEGUNDOS = 3600
+COMPROBANTES_DISTANCIA_DUPLICADO = 4  # bits de diferencia de la huella visual para sospechar reutilización (ver jugadores/huellas.py)
+COMPROBANTES_MAX_BYTES = 8 * 1024 * 1024  # tamaño máximo de la subida (ver jugadores/subidas.py)
+COMPROBANTES_MAX_PIXELES = 40_000_000     # ancho x alto máximo: por encima se trata como bomba de descompresión
+# Subida del comprobante por trozos reanudables (ver jugadores/subidas.py); fuera de MEDIA_ROOT
+SUBIDAS_PARCIALES_ROOT = os.path.join(BASE_DIR, 'subidas_parciales')
+SUBIDAS_TAMANO_TROZO = 256 * 1024   # cada petición lleva como mucho esto y libera el worker enseguida
+SUBIDAS_PARCIALES_HORAS = 24        # las subidas sin tocar en este tiempo se descartan
+SUBIDAS_PARCIALES_POR_USUARIO = 3   # abrir una más descarta la más antigua del usuario (acota el disco por cuenta)
+# El comprobante se valida mientras se recibe y va directo a disco solo en las vistas de
+# pagos (decorador jugadores.subidas.recibe_comprobante); FILE_UPLOAD_HANDLERS queda por defecto
+
+# Proxy y caché de imágenes externas de jugadores y equipos (ver jugadores/imagenes.py)
+IMAGENES_CACHE_ROOT = os.path.join(BASE_DIR, 'cache_imagenes')
+IMAGENES_CACHE_MAX_BYTES = 200 * 1024 * 1024  # tope en disco; se borran las menos usadas
+IMAGENES_MAX_BYTES = 10 * 1024 * 1024         # tamaño máximo del original descargado
+IMAGENES_MAX_PIXELES = 40_000_000
+IMAGENES_TIMEOUT_SEGUNDOS = 10
+IMAGENES_DESCARGADOR = 'jugadores.imagenes.descargar_http'  # función (url, max_bytes) -> bytes
+
+# Cachés: 'default' es local de cada proceso (resultados de encuestas...);
+# 'compartida' la ven todos los workers de la máquina y guarda lo que tiene que
+# ser coherente entre ellos: las sesiones, la marca de perfil aprovisionado de
+# jugadores/perfiles.py, los sellos de versión de jugadores/referencia.py y
+# jugadores/elegibilidad.py y los cubos de jugadores/limites.py. Con varias
+# máquinas habría que cambiarla por un backend común a todas (Redis, memcached).
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'compartida': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.path.join(BASE_DIR, 'cache_compartida'),
+        'OPTIONS': {'MAX_ENTRIES': 10000},
+    },
+}
+
 LOGIN_URL = '/iniciar_sesion/'
 
+# Sesiones en caché con respaldo en la base de datos: leer la sesión no consulta
+# la tabla salvo que la caché no la tenga (reinicio, entrada descartada). La caché
+# tiene que ser la compartida: con la de cada proceso, cerrar sesión en un worker
+# dejaría la cookie válida en los demás.
+SESSION_ENGINE = 'django.contrib.sessions.backends.cached_db'
+SESSION_CACHE_ALIAS = 'compartida'
+
+# Segundos que se recuerda que un usuario ya tiene Jugador y grupo (ver jugadores/perfiles.py)
+PERFIL_APROVISIONADO_CACHE_SEGUNDOS = 7 * 24 * 3600
+
+# Importación masiva de jugadores (ver jugadores/importacion.py)
+IMPORTACION_PROCESOS = None        # procesos para cifrar contraseñas (None = núcleos de la CPU)
+IMPORTACION_MIN_PARALELO = 20      # por debajo de esta cantidad se cifra en el propio hilo
+IMPORTACION_ITERACIONES_PBKDF2 = 100_000  # coste inicial; se sube al del hasher en el primer login
+
+# Conciliación de extractos bancarios (ver jugadores/conciliacion.py)
+CONCILIACION_VENTANA_DIAS = 3      # diferencia máxima entre la fecha del extracto y la del pago
+
+# Multas por tarjeta (ver jugadores/multas.py)
+MULTAS_TARJETA = {'amarilla': '2.00', 'roja': '5.00'}
+MULTAS_MONEDA = 'USD'              # solo los pagos en esta moneda descuentan deuda
+ARBITRAJE_MONTO_EQUIPO = '20.00'   # arbitraje por equipo y partido, repartido entre su plantilla (ver jugadores/arbitraje.py)
+
+# Elegibilidad por inscripción (ver jugadores/elegibilidad.py)
+INSCRIPCION_DIAS_ANTES = 60        # una inscripción sin torneo vale desde estos días antes del inicio
+ELEGIBILIDAD_CACHE_SEGUNDOS = 3600
+
+# Archivo estático de torneos finalizados (ver jugadores/archivo.py).
+# Se genera con `manage.py exportar_archivo_torneos` o al cerrar un torneo.
+ARCHIVO_TORNEOS_ROOT = os.path.join(BASE_DIR, 'archivo')
+ARCHIVO_TORNEOS_URL = '/archivo/'
+
+# Marcador en vivo por Server-Sent Events (ver jugadores/en_vivo.py).
+# Para conexiones SSE persistentes servir `config.asgi:application` con un servidor ASGI;
+# bajo WSGI los clientes degradan a sondeo cada EN_VIVO_REINTENTO_WSGI_MS.
+EN_VIVO_HISTORIAL = 200          # eventos recientes guardados por tema para reconexiones
+EN_VIVO_REINTENTO_MS = 3000      # `retry` enviado a EventSource bajo ASGI
+EN_VIVO_REINTENTO_WSGI_MS = 5000 # `retry` bajo WSGI (cada reconexión es un sondeo)
+EN_VIVO_LATIDO = 15              # segundos entre comentarios keep-alive
+EN_VIVO_SSE_DURACION = 300       # segundos antes de cerrar y dejar que el cliente reconecte
+EN_VIVO_ESPERA_MAX = 25          # espera máxima del sondeo largo (solo ASGI)
+
+# Segundos que se cachean los resultados de una encuesta (se invalidan al votar)
+ENCUESTAS_CACHE_SEGUNDOS = 30
+
+# Límite de escrituras por token bucket (ver jugadores/limites.py), por nombre de URL.
+# `capacidad` es la ráfaga permitida y `por_minuto` el ritmo de recarga; cada
+# petición POST consume una ficha del cubo del usuario y otra del de su IP.
+# El cubo de la IP lleva sus propios `ip_capacidad`/`ip_por_minuto`, mucho más
+# altos: detrás de la NAT del estadio o de una CGNAT móvil votan cientos de
+# aficionados con la misma IP. El staff queda exento salvo que se indique
+# 'excluir_staff': False.
+LIMITES_ESCRITURA = {
+    'detalle_partido': {'capacidad': 5, 'por_minuto': 6, 'ip_capacidad': 300, 'ip_por_minuto': 600},
+    'encuestas': {'capacidad': 5, 'por_minuto': 6, 'ip_capacidad': 300, 'ip_por_minuto': 600},
+}
+# Proxies de confianza delante de la aplicación: la IP del cliente es la entrada de
+# X-Forwarded-For que añade el más externo, contando desde la derecha. En Render
+# (variable RENDER) hay uno; 0 usa REMOTE_ADDR.
+LIMITES_PROXIES_DE_CONFIANZA = int(os.environ.get('LIMITES_PROXIES_DE_CONFIANZA', '1' if os.environ.get('RENDER') else '0'))
+
+# Cola de escrituras (ver jugadores/cola_escrituras.py): votos y papeletas se
+# vuelcan en lotes desde un hilo escritor por proceso. Desactivada se escribe al momento.
+COLA_ESCRITURAS_ACTIVA = False
+COLA_ESCRITURAS_LOTE = 200        # elementos máximos por transacción
+COLA_ESCRITURAS_INTERVALO = 0.5   # segundos máximos que espera un elemento encolado
+COLA_ESCRITURAS_INTENTOS = 5      # intentos de un lote con la base de datos bloqueada antes de descartarlo
+
+# Cola de tareas en segundo plano en la base de datos (ver jugadores/tareas.py); la
+# ejecuta `manage.py run_worker`. Desactivada, cada tarea corre al confirmar la transacción.
+TAREAS_ACTIVAS = os.environ.get('TAREAS_ACTIVAS', '') == '1'
+TAREAS_PLAZO_SEGUNDOS = 600        # sin renovar en este tiempo, la tarea se da por abandonada
+TAREAS_CONSERVAR_DIAS = 7          # las tareas hechas se borran pasado este tiempo
+TAREAS_PROGRAMADAS = {             # tarea: hora local a partir de la que se encola cada día
+    'sincronizar_multas': '03:00',
+    'reconstruir_acumulados': '03:30',
+}
+
 # Clave API para remove.bg (no la incluyas en el repositorio)
 # Se lee desde la variable de entorno REMOVE_BG_API_KEY.
 # En desarrollo, puedes exportarla en PowerShell:
@@ -0,0 +1,206 @@
+"""Acumulados diarios y semanales de pagos, goles y tarjetas.
+
+Las series de tendencia ("goles por jornada", "pagos por semana") se leen de
+`Acumulado`: una fila por métrica, ámbito (liga, torneo, equipo o jugador),
+periodo (día, o semana que empieza el lunes) y fecha de inicio. Una serie
+cuesta tantas filas como periodos muestra, no tantas como eventos.
+
+Las señales de `Pago`, `Tarjeta`, `Estadistica` y `Partido` anotan los días
+afectados con `programar`; tras el commit, `actualizar` recalcula solo esos días
+desde los datos originales y rehace sus semanas sumando las filas diarias. Una
+transacción que toca muchos eventos del mismo día lo recalcula una vez, y al
+recalcular (en vez de sumar deltas) borrar, anular o mover un evento no deja
+los totales descuadrados. Las acciones masivas que usan update() no emiten
+señales y llaman ellas mismas a `programar_pagos`/`programar_partidos`. El
+comando `reconstruir_acumulados` lo rehace todo.
+
+Los pagos cuentan en el día local en que se registraron y los goles y
+tarjetas en la fecha del partido. El ámbito de equipo usa el equipo actual del
+jugador: tras un traspaso, los días anteriores se corrigen al reconstruir.
+"""
+import threading
+from collections import defaultdict
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+
+from django.db import transaction
+from django.utils import timezone
+
+from .models import Acumulado, Estadistica, Pago, Partido, Tarjeta
+
+METRICAS = tuple(valor for valor, _nombre in Acumulado.METRICA_CHOICES)
+METRICAS_PARTIDO = ('goles', 'amarillas', 'rojas')
+PERIODOS = tuple(valor for valor, _nombre in Acumulado.PERIODO_CHOICES)
+AMBITOS = tuple(valor for valor, _nombre in Acumulado.AMBITO_CHOICES)
+CERO = Decimal('0.00')
+TAMANO_LOTE = 1000
+
+
+def inicio_semana(dia):
+    return dia - timedelta(days=dia.weekday())
+
+
+def dia_local(fecha):
+    return timezone.localtime(fecha).date()
+
+
+def _inicio_dia(fecha):
+    return timezone.make_aware(datetime.combine(fecha, time.min))
+
+
+# Cada fuente devuelve eventos (dia, jugador_id, equipo_id, torneo_id, cantidad, total)
+# de los días indicados, o de todo el histórico si `dias` es None.
+
+def _eventos_pagos(dias):
+    pagos = Pago.objects.filter(estado='aprobado')
+    if dias is not None:
+        pagos = pagos.filter(fecha__gte=_inicio_dia(min(dias)), fecha__lt=_inicio_dia(max(dias) + timedelta(days=1)))
+    filas = pagos.values_list('fecha', 'jugador_id', 'jugador__equipo_id', 'torneo_id', 'monto_usd')
+    for fecha, jugador_id, equipo_id, torneo_id, monto_usd in filas.iterator(chunk_size=2000):
+        dia = dia_local(fecha)
+        if dias is None or dia in dias:
+            yield dia, jugador_id, equipo_id, torneo_id, 1, monto_usd or CERO
+
+
+def _eventos_tarjetas(tipo):
+    def eventos(dias):
+        tarjetas = Tarjeta.objects.filter(tipo=tipo, anulada=False)
+        if dias is not None:
+            tarjetas = tarjetas.filter(partido__fecha__in=dias)
+        filas = tarjetas.values_list('partido__fecha', 'jugador_id', 'jugador__equipo_id', 'partido__torneo_id')
+        for fila in filas.iterator(chunk_size=2000):
+            yield (*fila, 1, CERO)
+    return eventos
+
+
+def _eventos_goles(dias):
+    anotadores = Estadistica.anotadores.through.objects.all()
+    if dias is not None:
+        anotadores = anotadores.filter(estadistica__partido__fecha__in=dias)
+    filas = anotadores.values_list(
+        'estadistica__partido__fecha', 'jugador_id', 'jugador__equipo_id', 'estadistica__partido__torneo_id', 'estadistica__goles',
+    )
+    sumas = defaultdict(lambda: [0, 0])
+    for *clave, goles in filas.iterator(chunk_size=2000):
+        suma = sumas[tuple(clave)]
+        suma[0] += goles or 0
+        suma[1] += 1
+    # Misma regla que las estadísticas: se suma el campo goles y, si está a
+    # cero, cada aparición como anotador cuenta como un gol
+    for clave, (goles, apariciones) in sumas.items():
+        yield (*clave, goles or apariciones, CERO)
+
+
+EVENTOS = {
+    'pagos': _eventos_pagos,
+    'goles': _eventos_goles,
+    'amarillas': _eventos_tarjetas('amarilla'),
+    'rojas': _eventos_tarjetas('roja'),
+}
+
+
+def _por_ambito(eventos):
+    """{(ambito, objeto_id, dia): [cantidad, total]}: cada evento suma a la liga, su torneo, su equipo y su jugador."""
+    cubos = defaultdict(lambda: [0, CERO])
+    for dia, jugador_id, equipo_id, torneo_id, cantidad, total in eventos:
+        for ambito, objeto_id in (('liga', 0), ('torneo', torneo_id), ('equipo', equipo_id), ('jugador', jugador_id)):
+            if objeto_id is not None:
+                cubo = cubos[ambito, objeto_id, dia]
+                cubo[0] += cantidad
+                cubo[1] += total
+    return cubos
+
+
+def _guardar(metrica, periodo, inicios, cubos):
+    viejos = Acumulado.objects.filter(metrica=metrica, periodo=periodo)
+    if inicios is not None:
+        viejos = viejos.filter(inicio__in=inicios)
+    viejos.delete()
+    Acumulado.objects.bulk_create(
+        [
+            Acumulado(metrica=metrica, periodo=periodo, ambito=ambito, objeto_id=objeto_id, inicio=inicio, cantidad=cantidad, total=total)
+            for (ambito, objeto_id, inicio), (cantidad, total) in cubos.items()
+        ],
+        batch_size=TAMANO_LOTE,
+    )
+
+
+def _semanas_desde_dias(metrica, semanas):
+    dias = Acumulado.objects.filter(metrica=metrica, periodo='dia')
+    if semanas is not None:
+        dias = dias.filter(inicio__gte=min(semanas), inicio__lt=max(semanas) + timedelta(days=7))
+    cubos = defaultdict(lambda: [0, CERO])
+    for ambito, objeto_id, inicio, cantidad, total in dias.values_list('ambito', 'objeto_id', 'inicio', 'cantidad', 'total').iterator(chunk_size=2000):
+        semana = inicio_semana(inicio)
+        if semanas is None or semana in semanas:
+            cubo = cubos[ambito, objeto_id, semana]
+            cubo[0] += cantidad
+            cubo[1] += total
+    return cubos
+
+
+def actualizar(dias, metricas=METRICAS):
+    """Recalcula los acumulados de `dias` (todo el histórico si es None) y de sus semanas."""
+    if dias is not None:
+        dias = {dia for dia in dias if dia is not None}
+        if not dias:
+            return
+    semanas = None if dias is None else {inicio_semana(dia) for dia in dias}
+    with transaction.atomic():
+        for metrica in metricas:
+            _guardar(metrica, 'dia', dias, _por_ambito(EVENTOS[metrica](dias)))
+            _guardar(metrica, 'semana', semanas, _semanas_desde_dias(metrica, semanas))
+
+
+def reconstruir(metricas=METRICAS):
+    """Rehace desde cero los acumulados de las métricas indicadas. Devuelve cuántas filas quedaron."""
+    actualizar(None, metricas)
+    return Acumulado.objects.filter(metrica__in=metricas).count()
+
+
+_pendientes = threading.local()
+
+
+def programar(dias, metricas=METRICAS):
+    """
+    Anota días para recalcular al confirmar la transacción en curso (en el
+    acto si no hay ninguna). Los días se juntan por hilo: el primer callback
+    que se ejecuta recalcula todo lo anotado y los demás no hacen nada.
+    """
+    pendientes = getattr(_pendientes, 'dias', None)
+    if pendientes is None:
+        pendientes = _pendientes.dias = defaultdict(set)
+    for metrica in metricas:
+        pendientes[metrica].update(dia for dia in dias if dia is not None)
+    # robust: un fallo aquí se registra pero no convierte en error un commit ya hecho
+    transaction.on_commit(_aplicar_pendientes, robust=True)
+
+
+def _aplicar_pendientes():
+    pendientes = getattr(_pendientes, 'dias', None)
+    _pendientes.dias = None
+    for metrica, dias in (pendientes or {}).items():
+        actualizar(dias, [metrica])
+
+
+def programar_pagos(pagos):
+    """Programa los días de un queryset de pagos (para cambios hechos con update())."""
+    programar({dia_local(fecha) for fecha in pagos.values_list('fecha', flat=True)}, ['pagos'])
+
+
+def programar_partidos(partido_ids, metricas=METRICAS_PARTIDO):
+    """Programa las fechas de los partidos indicados (ids o queryset)."""
+    programar(set(Partido.objects.filter(pk__in=partido_ids).values_list('fecha', flat=True)), metricas)
+
+
+def serie(metrica, periodo='semana', ambito='liga', objeto_id=0, desde=None, hasta=None):
+    """
+    [(inicio, cantidad, total)] de una métrica en orden cronológico, leída de los
+    acumulados. Los periodos sin eventos no aparecen.
+    """
+    filas = Acumulado.objects.filter(metrica=metrica, periodo=periodo, ambito=ambito, objeto_id=objeto_id)
+    if desde:
+        filas = filas.filter(inicio__gte=inicio_semana(desde) if periodo == 'semana' else desde)
+    if hasta:
+        filas = filas.filter(inicio__lte=hasta)
+    return list(filas.order_by('inicio').values_list('inicio', 'cantidad', 'total'))
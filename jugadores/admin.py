@@ -4,6 +4,9 @@ from django.utils.translation import gettext_lazy as _
 from .models import Equipo, Jugador, Partido, Estadistica, Torneo, VotacionJugadorPartido
 from .models import Pago
 from .models import Tarjeta
+from .models import Encuesta, OpcionEncuesta
+from .models import Acumulado, ArchivoMedia, Cargo, SaldoJugador, Tarea, TasaCambio
+from . import acumulados, elegibilidad
 
 
 class EquipoAdmin(admin.ModelAdmin):
@@ -21,6 +24,20 @@ class JugadorAdmin(admin.ModelAdmin):
 class PartidoAdmin(admin.ModelAdmin):
     list_display = ('torneo', 'equipo_local', 'equipo_visitante', 'fecha')
     list_filter = ('torneo',)
+    actions = ['crear_encuesta_jugador_partido', 'generar_cargos_arbitraje']
+
+    def crear_encuesta_jugador_partido(self, request, queryset):
+        from .encuestas import crear_encuesta_jugador_partido
+        for partido in queryset.select_related('equipo_local', 'equipo_visitante'):
+            crear_encuesta_jugador_partido(partido)
+        self.message_user(request, f'{queryset.count()} encuestas de Jugador del Partido creadas.')
+    crear_encuesta_jugador_partido.short_description = 'Crear encuesta Jugador del Partido'
+
+    def generar_cargos_arbitraje(self, request, queryset):
+        from .arbitraje import generar_cargos
+        resumen = generar_cargos(queryset)
+        self.message_user(request, f"{resumen['cargos']} cargos de arbitraje creados en {resumen['partidos']} partidos ({len(resumen['omitidos'])} ya los tenían).")
+    generar_cargos_arbitraje.short_description = 'Generar cargos de arbitraje (monto por defecto)'
 
 
 admin.site.register(Equipo, EquipoAdmin)
@@ -31,18 +48,28 @@ admin.site.register(Torneo)
 admin.site.register(VotacionJugadorPartido)
 admin.site.register(Pago)
 class PagoAdmin(admin.ModelAdmin):
-    list_display = ('id', 'jugador', 'tipo', 'monto', 'estado', 'fecha')
-    list_filter = ('tipo', 'estado', 'fecha')
+    list_display = ('id', 'jugador', 'tipo', 'monto', 'estado', 'torneo', 'fecha')
+    list_filter = ('tipo', 'estado', 'torneo', 'fecha')
     search_fields = ('jugador__nombre', 'jugador__apellido', 'referencia')
     actions = ['marcar_aprobado', 'marcar_rechazado']
 
     def marcar_aprobado(self, request, queryset):
+        from .multas import actualizar_saldos
+        jugador_ids = set(queryset.values_list('jugador_id', flat=True))
         updated = queryset.update(estado='aprobado')
+        actualizar_saldos(jugador_ids)
+        elegibilidad.invalidar()
+        acumulados.programar_pagos(queryset)
         self.message_user(request, f'{updated} pagos marcados como aprobados.')
     marcar_aprobado.short_description = 'Marcar seleccionados como Aprobado'
 
     def marcar_rechazado(self, request, queryset):
+        from .multas import actualizar_saldos
+        jugador_ids = set(queryset.values_list('jugador_id', flat=True))
         updated = queryset.update(estado='rechazado')
+        actualizar_saldos(jugador_ids)
+        elegibilidad.invalidar()
+        acumulados.programar_pagos(queryset)
         self.message_user(request, f'{updated} pagos marcados como rechazados.')
     marcar_rechazado.short_description = 'Marcar seleccionados como Rechazado'
 
@@ -64,12 +91,18 @@ class TarjetaAdmin(admin.ModelAdmin):
     eliminar_tarjetas_seleccionadas.short_description = 'Eliminar tarjetas seleccionadas'
 
     def anular_tarjetas(self, request, queryset):
+        from .multas import sincronizar_tarjetas
         updated = queryset.update(anulada=True, motivo_anulacion='Anulada desde admin')
+        sincronizar_tarjetas(queryset)
+        acumulados.programar_partidos(queryset.values('partido_id'), ['amarillas', 'rojas'])
         self.message_user(request, f'{updated} tarjetas marcadas como anuladas.')
     anular_tarjetas.short_description = 'Marcar como anuladas'
 
     def revertir_anulacion(self, request, queryset):
+        from .multas import sincronizar_tarjetas
         updated = queryset.update(anulada=False, motivo_anulacion=None)
+        sincronizar_tarjetas(queryset)
+        acumulados.programar_partidos(queryset.values('partido_id'), ['amarillas', 'rojas'])
         self.message_user(request, f'{updated} anulaciones revertidas.')
     revertir_anulacion.short_description = 'Revertir anulación'
 
@@ -77,3 +110,82 @@ class TarjetaAdmin(admin.ModelAdmin):
 
 admin.site.register(Tarjeta, TarjetaAdmin)
 
+
+
+class OpcionEncuestaInline(admin.TabularInline):
+    model = OpcionEncuesta
+    fields = ('texto', 'jugador', 'votos')
+    readonly_fields = ('votos',)
+    raw_id_fields = ('jugador',)
+    extra = 2
+
+
+class EncuestaAdmin(admin.ModelAdmin):
+    list_display = ('pregunta', 'tipo', 'partido', 'activa', 'fecha', 'cierre')
+    list_filter = ('tipo', 'activa')
+    inlines = [OpcionEncuestaInline]
+    actions = ['recontar_votos']
+
+    def recontar_votos(self, request, queryset):
+        from .encuestas import recontar
+        for encuesta in queryset:
+            recontar(encuesta)
+        self.message_user(request, f'{queryset.count()} encuestas recontadas.')
+    recontar_votos.short_description = 'Recontar votos desde las papeletas'
+
+admin.site.register(Encuesta, EncuestaAdmin)
+
+
+class CargoAdmin(admin.ModelAdmin):
+    list_display = ('jugador', 'tipo', 'monto', 'moneda', 'partido', 'anulado', 'fecha')
+    list_filter = ('tipo', 'anulado')
+    search_fields = ('jugador__nombre', 'jugador__apellido')
+    raw_id_fields = ('jugador', 'partido', 'tarjeta')
+
+
+class SaldoJugadorAdmin(admin.ModelAdmin):
+    list_display = ('jugador', 'cargos', 'pagos', 'deuda', 'actualizado')
+    search_fields = ('jugador__nombre', 'jugador__apellido')
+    ordering = ('-deuda',)
+
+
+admin.site.register(Cargo, CargoAdmin)
+admin.site.register(SaldoJugador, SaldoJugadorAdmin)
+
+
+class TasaCambioAdmin(admin.ModelAdmin):
+    list_display = ('fecha', 'bs_por_usd', 'fuente')
+    date_hierarchy = 'fecha'
+
+
+admin.site.register(TasaCambio, TasaCambioAdmin)
+
+
+class AcumuladoAdmin(admin.ModelAdmin):
+    list_display = ('metrica', 'periodo', 'inicio', 'ambito', 'objeto_id', 'cantidad', 'total')
+    list_filter = ('metrica', 'periodo', 'ambito')
+    date_hierarchy = 'inicio'
+    # Los mantiene acumulados.py; se corrigen con el comando reconstruir_acumulados
+    readonly_fields = ('metrica', 'periodo', 'inicio', 'ambito', 'objeto_id', 'cantidad', 'total')
+
+
+admin.site.register(Acumulado, AcumuladoAdmin)
+
+
+class ArchivoMediaAdmin(admin.ModelAdmin):
+    list_display = ('nombre', 'tamano', 'referencias', 'creado')
+    search_fields = ('nombre', 'sha256')
+    readonly_fields = ('nombre', 'sha256', 'tamano', 'referencias', 'creado')
+
+
+admin.site.register(ArchivoMedia, ArchivoMediaAdmin)
+
+
+class TareaAdmin(admin.ModelAdmin):
+    list_display = ('nombre', 'estado', 'ejecutar_en', 'intentos', 'max_intentos', 'trabajador', 'terminada')
+    list_filter = ('estado', 'nombre')
+    search_fields = ('nombre', 'clave')
+    readonly_fields = ('creada', 'terminada', 'bloqueada_hasta', 'trabajador', 'ultimo_error')
+
+
+admin.site.register(Tarea, TareaAdmin)
@@ -0,0 +1,134 @@
+"""Almacenamiento de subidas direccionado por contenido.
+
+`AlmacenamientoDeduplicado` guarda cada fichero como
+`cas/<2 primeros>/<sha256><extensión>` bajo MEDIA_ROOT. El hash se calcula en
+la misma pasada en que se copian los trozos a un temporal del mismo disco, que
+se renombra a ese nombre; si el contenido ya existía lo reemplaza por otro
+idéntico, así que dos subidas iguales ocupan un solo fichero. Al no cambiar nunca el contenido de un nombre, su URL
+se puede cachear como inmutable.
+
+`ArchivoMedia` lleva la cuenta de referencias: cada `save` suma una y cada
+`delete` resta una. Un fichero que llega a cero no se borra aquí: entre el
+recuento y el borrado otra subida del mismo contenido podría reutilizarlo, así
+que lo retira `limpiar_media`, que vuelve a comprobar referencias y fecha justo
+antes de borrar y no toca ficheros recientes. Los nombres que no están en
+`cas/` (subidas anteriores) se tratan como en FileSystemStorage.
+
+El comando `deduplicar_media` pasa los ficheros ya subidos a este esquema y
+recuenta las referencias.
+"""
+import hashlib
+import os
+import shutil
+import tempfile
+
+from django.core.files.storage import FileSystemStorage
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils.deconstruct import deconstructible
+
+PREFIJO = 'cas/'
+TAMANO_TROZO = 64 * 1024
+
+
+def es_direccionado(nombre):
+    return bool(nombre) and nombre.startswith(PREFIJO)
+
+
+def nombre_para(huella, nombre_original):
+    extension = os.path.splitext(nombre_original)[1].lower()
+    return f'{PREFIJO}{huella[:2]}/{huella}{extension}'
+
+
+def huella_de(nombre):
+    """SHA-256 de un nombre direccionado por contenido (o None si no lo es)."""
+    if not es_direccionado(nombre):
+        return None
+    return os.path.splitext(os.path.basename(nombre))[0]
+
+
+def huella_fichero(ruta):
+    sha = hashlib.sha256()
+    with open(ruta, 'rb') as fichero:
+        for trozo in iter(lambda: fichero.read(TAMANO_TROZO), b''):
+            sha.update(trozo)
+    return sha.hexdigest()
+
+
+def sumar_referencias(nombre, huella, tamano, cantidad=1):
+    from .models import ArchivoMedia
+    if ArchivoMedia.objects.filter(nombre=nombre).update(referencias=F('referencias') + cantidad):
+        return
+    try:
+        with transaction.atomic():
+            ArchivoMedia.objects.create(nombre=nombre, sha256=huella, tamano=tamano, referencias=cantidad)
+    except IntegrityError:
+        # Otra subida del mismo contenido creó la fila entre medias
+        ArchivoMedia.objects.filter(nombre=nombre).update(referencias=F('referencias') + cantidad)
+
+
+@deconstructible(path='jugadores.almacenamiento.AlmacenamientoDeduplicado')
+class AlmacenamientoDeduplicado(FileSystemStorage):
+
+    def get_available_name(self, name, max_length=None):
+        # El nombre definitivo sale del contenido: no hace falta buscar uno libre
+        return name
+
+    def _save(self, name, content):
+        directorio = self.path(f'{PREFIJO}tmp')
+        os.makedirs(directorio, exist_ok=True)
+        sha = hashlib.sha256()
+        tamano = 0
+        descriptor, temporal = tempfile.mkstemp(dir=directorio)
+        try:
+            with os.fdopen(descriptor, 'wb') as destino:
+                if hasattr(content, 'seek'):
+                    content.seek(0)
+                for trozo in content.chunks():
+                    sha.update(trozo)
+                    destino.write(trozo)
+                    tamano += len(trozo)
+            huella = sha.hexdigest()
+            final = nombre_para(huella, name)
+            ruta = self.path(final)
+            os.makedirs(os.path.dirname(ruta), exist_ok=True)
+            # mkstemp crea el temporal con 0600; el servidor web tiene que poder leerlo
+            os.chmod(temporal, self.file_permissions_mode if self.file_permissions_mode is not None else 0o644)
+            # Aunque ya exista se reemplaza (mismo contenido): así queda con fecha nueva y
+            # limpiar_media no borra un fichero de cas/ que esta subida acaba de reutilizar
+            os.replace(temporal, ruta)
+        except BaseException:
+            if os.path.exists(temporal):
+                os.remove(temporal)
+            raise
+        sumar_referencias(final, huella, tamano)
+        return final
+
+    def delete(self, name):
+        if not es_direccionado(name):
+            return super().delete(name)
+        from .models import ArchivoMedia
+        # El fichero sin referencias queda para limpiar_media (ver el docstring del módulo)
+        ArchivoMedia.objects.filter(nombre=name, referencias__gt=0).update(referencias=F('referencias') - 1)
+
+    def importar(self, ruta):
+        """
+        Incorpora un fichero que ya está en disco y devuelve (nombre, huella,
+        tamaño). No suma referencias y deja el original intacto.
+        """
+        huella = huella_fichero(ruta)
+        final = nombre_para(huella, ruta)
+        destino = self.path(final)
+        if not os.path.exists(destino):
+            os.makedirs(os.path.dirname(destino), exist_ok=True)
+            try:
+                os.link(ruta, destino)
+            except OSError:
+                # Otro sistema de archivos o sin enlaces duros: copia a un temporal y renombrado atómico
+                directorio = self.path(f'{PREFIJO}tmp')
+                os.makedirs(directorio, exist_ok=True)
+                descriptor, temporal = tempfile.mkstemp(dir=directorio)
+                os.close(descriptor)
+                shutil.copyfile(ruta, temporal)
+                os.replace(temporal, destino)
+        return final, huella, os.path.getsize(destino)
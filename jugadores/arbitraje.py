@@ -0,0 +1,105 @@
+"""Cargos de arbitraje por partido y por jornada.
+
+Cada equipo paga `monto` por partido y ese importe se reparte entre los
+jugadores de su plantilla (los céntimos sobrantes van a los primeros por id,
+de modo que la suma cuadra exactamente). Todos los cargos de una jornada se
+crean con un bulk_create dentro de una transacción y el saldo de los jugadores
+afectados se refresca una sola vez (`multas.actualizar_saldos`).
+
+Un partido que ya tiene cargos de arbitraje vigentes se omite; para corregir un
+importe se anulan sus cargos y se vuelve a generar.
+"""
+from collections import defaultdict
+from decimal import ROUND_DOWN, Decimal
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Sum
+
+from . import multas
+from .models import Cargo, Jugador, Pago, Partido
+
+CENTIMO = Decimal('0.01')
+
+
+def monto_por_defecto():
+    return Decimal(str(settings.ARBITRAJE_MONTO_EQUIPO))
+
+
+def repartir(monto, jugador_ids):
+    """Divide `monto` entre los jugadores; devuelve [(jugador_id, parte)] que suma exactamente `monto`."""
+    jugador_ids = sorted(jugador_ids)
+    if not jugador_ids:
+        return []
+    base = (monto / len(jugador_ids)).quantize(CENTIMO, rounding=ROUND_DOWN)
+    sobrantes = int((monto - base * len(jugador_ids)) / CENTIMO)
+    return [(jugador_id, base + CENTIMO if i < sobrantes else base) for i, jugador_id in enumerate(jugador_ids)]
+
+
+def partidos_jornada(torneo_id, fecha):
+    """Partidos de un torneo jugados en una fecha (una jornada)."""
+    return Partido.objects.filter(torneo_id=torneo_id, fecha=fecha)
+
+
+def generar_cargos(partidos, monto=None):
+    """
+    Crea los cargos de arbitraje de los partidos indicados (queryset o lista).
+    Devuelve un dict con 'cargos' (creados), 'partidos' (generados), 'omitidos'
+    (ya tenían cargos) y 'sin_plantilla' (equipos sin jugadores).
+    """
+    monto = monto_por_defecto() if monto is None else Decimal(monto)
+    moneda = settings.MULTAS_MONEDA
+    partidos = list(partidos)
+    resumen = {'cargos': 0, 'partidos': 0, 'omitidos': [], 'sin_plantilla': set()}
+    if not partidos:
+        return resumen
+    with transaction.atomic():
+        ya_generados = set(
+            Cargo.objects.filter(partido__in=partidos, tipo='arbitraje', anulado=False)
+            .values_list('partido_id', flat=True).distinct()
+        )
+        equipos = {p.equipo_local_id for p in partidos} | {p.equipo_visitante_id for p in partidos}
+        plantillas = defaultdict(list)
+        for jugador_id, equipo_id in Jugador.objects.filter(equipo_id__in=equipos).values_list('id', 'equipo_id'):
+            plantillas[equipo_id].append(jugador_id)
+
+        nuevos = []
+        for partido in partidos:
+            if partido.pk in ya_generados:
+                resumen['omitidos'].append(partido)
+                continue
+            for equipo_id in (partido.equipo_local_id, partido.equipo_visitante_id):
+                if not plantillas[equipo_id]:
+                    resumen['sin_plantilla'].add(equipo_id)
+                    continue
+                nuevos.extend(
+                    Cargo(jugador_id=jugador_id, partido_id=partido.pk, tipo='arbitraje', monto=parte, moneda=moneda)
+                    for jugador_id, parte in repartir(monto, plantillas[equipo_id])
+                )
+            resumen['partidos'] += 1
+        Cargo.objects.bulk_create(nuevos, batch_size=500)
+        multas.actualizar_saldos({cargo.jugador_id for cargo in nuevos})
+    resumen['cargos'] = len(nuevos)
+    return resumen
+
+
+def pendiente_por_partido(jugador_id):
+    """
+    Arbitraje de un jugador por partido: [(partido, cargado, pendiente)].
+    Los pagos de arbitraje aprobados no indican el partido, así que se aplican
+    a los cargos más antiguos primero.
+    """
+    cargos = list(
+        Cargo.objects.filter(jugador_id=jugador_id, tipo='arbitraje', anulado=False, moneda=settings.MULTAS_MONEDA)
+        .select_related('partido__equipo_local', 'partido__equipo_visitante')
+        .order_by('partido__fecha', 'pk')
+    )
+    disponible = Pago.objects.filter(
+        jugador_id=jugador_id, tipo='arbitraje', estado='aprobado', moneda=settings.MULTAS_MONEDA,
+    ).aggregate(total=Sum('monto'))['total'] or Decimal('0.00')
+    filas = []
+    for cargo in cargos:
+        aplicado = min(disponible, cargo.monto)
+        disponible -= aplicado
+        filas.append((cargo.partido, cargo.monto, cargo.monto - aplicado))
+    return filas
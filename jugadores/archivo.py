@@ -0,0 +1,194 @@
+"""Archivo estático de torneos finalizados.
+
+Un torneo con `fecha_fin` pasada ya no cambia, así que su clasificación,
+resultados y estadísticas se renderizan una sola vez a HTML/JSON dentro de
+`ARCHIVO_TORNEOS_ROOT`. Cada exportación se guarda en un directorio versionado
+por el hash de su contenido (`torneo/<id>/<version>/`), lo que permite servir
+los ficheros con caché de larga duración (ver `ArchivoTorneosMiddleware`).
+El manifiesto `manifiestos/torneo_<id>.json` indica la versión vigente y es lo
+único que consultan las vistas para decidir si redirigir.
+
+Las páginas se renderizan sin petición y como las vería un visitante anónimo:
+son las mismas para todos, y el staff sigue entrando a las vistas en vivo.
+"""
+import hashlib
+import json
+import logging
+import os
+import shutil
+import tempfile
+
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.core.serializers.json import DjangoJSONEncoder
+from django.template.loader import render_to_string
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+logger = logging.getLogger(__name__)
+
+
+def torneo_finalizado(torneo):
+    """True si el torneo tiene `fecha_fin` y esta ya pasó."""
+    fecha_fin = torneo.fecha_fin
+    if isinstance(fecha_fin, str):
+        # Instancias recién asignadas desde código pueden traer la fecha como texto
+        fecha_fin = parse_date(fecha_fin)
+    return bool(fecha_fin) and fecha_fin < timezone.localdate()
+
+
+def _raiz_publica():
+    return os.path.join(settings.ARCHIVO_TORNEOS_ROOT, 'publico')
+
+
+def _ruta_manifiesto(torneo_id):
+    return os.path.join(settings.ARCHIVO_TORNEOS_ROOT, 'manifiestos', f'torneo_{torneo_id}.json')
+
+
+def _dir_torneo(torneo_id):
+    return os.path.join(_raiz_publica(), 'torneo', str(torneo_id))
+
+
+def leer_manifiesto(torneo_id):
+    """Devuelve el manifiesto vigente del torneo o None si no tiene instantánea."""
+    try:
+        with open(_ruta_manifiesto(torneo_id), encoding='utf-8') as fh:
+            return json.load(fh)
+    except (OSError, ValueError):
+        return None
+
+
+def url_archivo(torneo_id, pagina='index.html'):
+    """URL pública de `pagina` dentro de la instantánea del torneo, o None si no existe."""
+    manifiesto = leer_manifiesto(torneo_id)
+    if not manifiesto or pagina not in manifiesto.get('paginas', []):
+        return None
+    return f"{settings.ARCHIVO_TORNEOS_URL}torneo/{torneo_id}/{manifiesto['version']}/{pagina}"
+
+
+def _render(plantilla, contexto):
+    # Sin `request` la cabecera saldría igual, pero así queda explícito que es la vista anónima
+    return render_to_string(plantilla, {'user': AnonymousUser(), **contexto})
+
+
+def _paginas_torneo(torneo):
+    """Renderiza todas las páginas del archivo. Devuelve {nombre_fichero: contenido}."""
+    # Import diferido: las vistas importan este módulo para redirigir
+    from .views_clasificacion import calcular_clasificacion
+    from .views_estadisticas import datos_estadisticas_partido, datos_estadisticas_torneo
+
+    partidos = list(torneo.partidos.select_related('equipo_local', 'equipo_visitante').order_by('fecha', 'id'))
+    clasificacion = calcular_clasificacion(torneo)
+    estadisticas = datos_estadisticas_torneo(torneo)
+    paginas = {
+        'index.html': _render('jugadores/torneo_detalle.html', {
+            'torneo': torneo,
+            'equipos': torneo.equipos.all(),
+            'en_archivo': True,
+        }),
+        'clasificacion.html': _render('jugadores/tabla_clasificacion.html', {
+            'equipos': clasificacion,
+            'torneo_seleccionado': torneo,
+            'en_archivo': True,
+        }),
+        'estadisticas.html': _render('jugadores/estadisticas_por_torneo.html', {
+            'torneo': torneo,
+            'datos': estadisticas,
+        }),
+    }
+    datos_partidos = []
+    for partido in partidos:
+        datos = datos_estadisticas_partido(partido)
+        paginas[f'partido_{partido.id}.html'] = _render('jugadores/estadisticas_por_partido.html', {
+            'partido': partido,
+            'datos': datos,
+        })
+        datos_partidos.append({
+            'id': partido.id,
+            'fecha': partido.fecha,
+            'estado': partido.estado,
+            'equipo_local': partido.equipo_local.nombre,
+            'equipo_visitante': partido.equipo_visitante.nombre,
+            'marcador_local': partido.marcador_local,
+            'marcador_visitante': partido.marcador_visitante,
+            'jugadores': [_fila_jugador(d) for d in datos],
+        })
+    paginas['torneo.json'] = json.dumps({
+        'id': torneo.id,
+        'nombre': torneo.nombre,
+        'fecha_inicio': torneo.fecha_inicio,
+        'fecha_fin': torneo.fecha_fin,
+        'clasificacion': clasificacion,
+        'partidos': datos_partidos,
+        'jugadores': sorted((_fila_jugador(d) for d in estadisticas), key=lambda x: (-x['goles'], -x['asistencias'])),
+    }, cls=DjangoJSONEncoder, ensure_ascii=False, indent=1)
+    return paginas
+
+
+def _fila_jugador(dato):
+    jugador = dato['jugador']
+    return {
+        'id': jugador.id,
+        'nombre': f'{jugador.nombre} {jugador.apellido}',
+        'goles': dato['goles'],
+        'asistencias': dato['asistencias'],
+        'amarillas': dato['amarillas'],
+        'rojas': dato['rojas'],
+    }
+
+
+def _escribir_atomico(ruta, contenido):
+    os.makedirs(os.path.dirname(ruta), exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(ruta), suffix='.tmp')
+    with os.fdopen(fd, 'w', encoding='utf-8') as fh:
+        fh.write(contenido)
+    os.replace(tmp, ruta)
+
+
+def exportar_torneo(torneo):
+    """
+    Genera (o regenera) la instantánea del torneo y actualiza su manifiesto.
+    Si el contenido no cambió se reutiliza la versión existente.
+    Devuelve el manifiesto escrito.
+    """
+    paginas = _paginas_torneo(torneo)
+    sha = hashlib.sha256()
+    for nombre in sorted(paginas):
+        sha.update(nombre.encode('utf-8'))
+        sha.update(paginas[nombre].encode('utf-8'))
+    version = sha.hexdigest()[:12]
+
+    base = _dir_torneo(torneo.id)
+    destino = os.path.join(base, version)
+    if not os.path.isdir(destino):
+        # Escribir en un directorio temporal y renombrar: nunca se sirve una exportación a medias
+        os.makedirs(base, exist_ok=True)
+        tmp = tempfile.mkdtemp(dir=base, prefix='.tmp-')
+        os.chmod(tmp, 0o755)
+        for nombre, contenido in paginas.items():
+            with open(os.path.join(tmp, nombre), 'w', encoding='utf-8') as fh:
+                fh.write(contenido)
+        os.replace(tmp, destino)
+
+    manifiesto = {
+        'torneo': torneo.id,
+        'version': version,
+        'generado': timezone.now().isoformat(),
+        'paginas': sorted(paginas),
+    }
+    _escribir_atomico(_ruta_manifiesto(torneo.id), json.dumps(manifiesto))
+    # Borrar versiones antiguas; la vigente queda referenciada por el manifiesto
+    for entrada in os.scandir(base):
+        if entrada.is_dir() and entrada.name != version:
+            shutil.rmtree(entrada.path, ignore_errors=True)
+    logger.info('Archivo del torneo %s exportado (versión %s)', torneo.id, version)
+    return manifiesto
+
+
+def eliminar_archivo(torneo_id):
+    """Elimina la instantánea del torneo; las vistas vuelven a calcular en vivo."""
+    try:
+        os.remove(_ruta_manifiesto(torneo_id))
+    except FileNotFoundError:
+        pass
+    shutil.rmtree(_dir_torneo(torneo_id), ignore_errors=True)
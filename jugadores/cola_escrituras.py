@@ -0,0 +1,210 @@
+"""Cola de escrituras con un hilo escritor por proceso.
+
+Las escrituras numerosas y tolerantes a latencia (votos de Jugador del
+Partido, papeletas de encuestas) se encolan y un hilo escritor las vuelca en
+lotes, cada lote en una sola transacción. Así cada worker de gunicorn toma el
+bloqueo de escritura de SQLite una vez por lote en vez de una vez por voto.
+No es un escritor único para todo el sitio: con N workers hay N hilos
+escritores, que siguen turnándose el bloqueo de SQLite entre ellos.
+
+Se activa con `settings.COLA_ESCRITURAS_ACTIVA`; desactivada, `encolar` escribe
+en el momento y deja pasar el IntegrityError, para que la vista pueda avisar al
+usuario (es lo que usan los tests y el desarrollo local).
+
+Un lote que falla por bloqueo (OperationalError: database is locked/busy) se
+reintenta hasta `COLA_ESCRITURAS_INTENTOS` veces. Con cualquier otro error el
+lote se reescribe elemento a elemento y solo se descartan los que fallan (p. ej.
+un voto duplicado), para que una escritura imposible no bloquee las siguientes.
+Como quien encoló ya recibió respuesta, no hay a quién avisar: los descartes se
+registran como error y quedan en las métricas (`descartados` y los últimos en
+`ultimos_descartados`, ver /cola_escrituras/estado/). Un error inesperado en el
+hilo escritor se registra y el hilo sigue. Las vistas solo dicen que el voto se recibió,
+no que ya cuenta. Al terminar el proceso, `atexit` detiene el hilo y vacía lo
+pendiente. Lo que siga en memoria si el proceso muere con SIGKILL se pierde.
+
+Elementos admitidos: instancias de modelo sin guardar (se insertan con
+bulk_create, sin señales post_save) o funciones sin argumentos que se ejecutan
+dentro de la transacción del lote.
+"""
+import atexit
+import logging
+import threading
+import time
+from collections import deque
+from itertools import groupby
+
+from django.conf import settings
+from django.db import OperationalError, close_old_connections, connection, transaction
+from django.db.models import Model
+
+logger = logging.getLogger(__name__)
+
+DESCARTADOS_RECORDADOS = 20
+
+
+class ColaEscrituras:
+
+    def __init__(self):
+        self._pendientes = deque()
+        self._cond = threading.Condition()
+        self._hilo = None
+        self._detener = False
+        # Serializa los volcados: el hilo escritor y `vaciar` nunca escriben a la vez
+        self._escribiendo = threading.Lock()
+        self._metricas = {
+            'encolados': 0,
+            'escritos': 0,
+            'descartados': 0,
+            'lotes': 0,
+            'ultimo_lote': 0,
+            'lote_max': 0,
+            'reintentos': 0,
+        }
+        self._descartados = deque(maxlen=DESCARTADOS_RECORDADOS)
+
+    def encolar(self, elemento):
+        """
+        Devuelve True si `elemento` ya está escrito (cola desactivada; un
+        IntegrityError llega a quien llama) o False si quedó en la cola.
+        """
+        if not settings.COLA_ESCRITURAS_ACTIVA:
+            with self._escribiendo:
+                with transaction.atomic():
+                    self._aplicar([elemento])
+            with self._cond:
+                self._metricas['escritos'] += 1
+            return True
+        with self._cond:
+            self._pendientes.append(elemento)
+            self._metricas['encolados'] += 1
+            if self._hilo is None or not self._hilo.is_alive():
+                self._detener = False
+                self._hilo = threading.Thread(target=self._bucle, name='cola-escrituras', daemon=True)
+                self._hilo.start()
+            if len(self._pendientes) >= settings.COLA_ESCRITURAS_LOTE:
+                self._cond.notify()
+        return False
+
+    def metricas(self):
+        with self._cond:
+            return dict(
+                self._metricas,
+                profundidad=len(self._pendientes),
+                activa=settings.COLA_ESCRITURAS_ACTIVA,
+                ultimos_descartados=list(self._descartados),
+                hilo_vivo=bool(self._hilo and self._hilo.is_alive()),
+            )
+
+    def vaciar(self):
+        """Escribe en el hilo actual todo lo pendiente. Devuelve cuántos elementos se procesaron."""
+        total = 0
+        while True:
+            lote = self._tomar_lote()
+            if not lote:
+                return total
+            self._volcar(lote)
+            total += len(lote)
+
+    def detener(self, timeout=10):
+        """Para el hilo escritor y vacía la cola (se registra con atexit)."""
+        with self._cond:
+            self._detener = True
+            self._cond.notify()
+            hilo = self._hilo
+        if hilo is not None and hilo is not threading.current_thread():
+            hilo.join(timeout)
+        try:
+            self.vaciar()
+        except Exception:
+            logger.exception('Quedaron escrituras sin volcar al cerrar: %s', len(self._pendientes))
+
+    def _tomar_lote(self):
+        with self._cond:
+            n = min(len(self._pendientes), settings.COLA_ESCRITURAS_LOTE)
+            return [self._pendientes.popleft() for _ in range(n)]
+
+    def _bucle(self):
+        try:
+            while True:
+                # Esperar a que se llene un lote o pase el intervalo
+                with self._cond:
+                    if len(self._pendientes) < settings.COLA_ESCRITURAS_LOTE and not self._detener:
+                        self._cond.wait(settings.COLA_ESCRITURAS_INTERVALO)
+                    if self._detener and not self._pendientes:
+                        return
+                lote = self._tomar_lote()
+                if lote:
+                    try:
+                        close_old_connections()
+                        self._volcar(lote)
+                    except Exception:
+                        logger.exception('Error inesperado del hilo escritor; se pierde un lote de %s escrituras', len(lote))
+                        self._contar_descartes(lote, 'error inesperado')
+        finally:
+            connection.close()
+
+    def _volcar(self, lote):
+        """Escribe `lote`; con la base de datos bloqueada lo reintenta unas pocas veces y luego lo descarta."""
+        intentos = max(1, settings.COLA_ESCRITURAS_INTENTOS)
+        for intento in range(1, intentos + 1):
+            try:
+                self._escribir(lote)
+                return
+            except OperationalError as e:
+                logger.warning('Base de datos ocupada al volcar %s escrituras (intento %s de %s): %s', len(lote), intento, intentos, e)
+                error = e
+            if intento < intentos:
+                with self._cond:
+                    self._metricas['reintentos'] += 1
+                time.sleep(settings.COLA_ESCRITURAS_INTERVALO)
+        logger.error('Lote de %s escrituras descartado tras %s intentos', len(lote), intentos)
+        self._contar_descartes(lote, error)
+
+    def _contar_descartes(self, elementos, motivo):
+        with self._cond:
+            self._metricas['descartados'] += len(elementos)
+            for elemento in elementos:
+                self._descartados.append(f'{elemento!r}: {motivo}')
+
+    def _escribir(self, lote):
+        with self._escribiendo:
+            try:
+                with transaction.atomic():
+                    self._aplicar(lote)
+                escritos = len(lote)
+            except OperationalError:
+                raise
+            except Exception:
+                # Algún elemento no se puede escribir: reintentar uno a uno y descartar solo ese
+                escritos = 0
+                with transaction.atomic():
+                    for elemento in lote:
+                        try:
+                            with transaction.atomic():
+                                self._aplicar([elemento])
+                            escritos += 1
+                        except OperationalError:
+                            raise
+                        except Exception as e:
+                            logger.error('Escritura encolada descartada: %r (%s)', elemento, e)
+                            self._contar_descartes([elemento], e)
+            with self._cond:
+                m = self._metricas
+                m['escritos'] += escritos
+                m['lotes'] += 1
+                m['ultimo_lote'] = len(lote)
+                m['lote_max'] = max(m['lote_max'], len(lote))
+
+    @staticmethod
+    def _aplicar(lote):
+        # Instancias consecutivas del mismo modelo van en un único bulk_create
+        for clave, grupo in groupby(lote, key=lambda e: type(e) if isinstance(e, Model) else None):
+            if clave is None:
+                for funcion in grupo:
+                    funcion()
+            else:
+                clave.objects.bulk_create(list(grupo))
+
+
+cola_escrituras = ColaEscrituras()
+atexit.register(cola_escrituras.detener)
@@ -0,0 +1,127 @@
+"""Entrega protegida de los comprobantes de pago.
+
+`/media/` solo se enruta con DEBUG, así que en producción los comprobantes se
+sirven desde `views.comprobante_pago`, que aplica la misma regla que
+`pago_detalle` (staff o dueño del pago) y después entrega el fichero con
+`servir`:
+
+- Con `COMPROBANTES_SERVIDOR = 'x-accel'` (nginx) o `'x-sendfile'` (Apache,
+  lighttpd) la respuesta va vacía con la cabecera correspondiente y el
+  servidor web envía el fichero, rangos incluidos. El directorio de media no
+  debe publicarse directamente: en nginx, una `location internal` con alias a
+  MEDIA_ROOT en `COMPROBANTES_ACCEL_PREFIJO`.
+- Sin servidor delante se transmite por trozos desde disco (nunca entero en
+  memoria) y se atiende un rango `bytes=` simple con 206.
+
+La ETag es fuerte: el SHA-256 del contenido en los ficheros direccionados por
+contenido (ver almacenamiento.py) y, en los antiguos, un hash del nombre, el
+tamaño y la fecha de modificación (no se reescriben en sitio). Con
+`If-None-Match` o `If-Modified-Since` vigentes se responde 304 sin abrir el
+fichero. La caché es `private`: el navegador puede reutilizarlo, los proxies
+compartidos no.
+"""
+import hashlib
+import mimetypes
+import os
+import re
+from urllib.parse import quote
+
+from django.conf import settings
+from django.http import FileResponse, HttpResponse, StreamingHttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+
+from .almacenamiento import huella_de
+
+TAMANO_TROZO = 64 * 1024
+RANGO = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+def etag(nombre, tamano, modificado_ns):
+    clave = f'{nombre}:{tamano}:{modificado_ns}'.encode()
+    return quote_etag(hashlib.sha256(clave).hexdigest()[:32])
+
+
+def _cabeceras(respuesta, etiqueta, modificado, nombre):
+    respuesta['ETag'] = etiqueta
+    respuesta['Last-Modified'] = http_date(modificado)
+    respuesta['Cache-Control'] = f'private, max-age={settings.COMPROBANTES_CACHE_SEGUNDOS}'
+    respuesta['Vary'] = 'Cookie'
+    respuesta['Accept-Ranges'] = 'bytes'
+    respuesta['Content-Disposition'] = f"inline; filename*=UTF-8''{quote(os.path.basename(nombre))}"
+    return respuesta
+
+
+def rango(cabecera, tamano):
+    """
+    (inicio, fin) inclusivos de una cabecera Range de un solo tramo; None si no
+    hay que atender el rango (ausente o con varios tramos: se sirve entero) y
+    False si no es satisfacible.
+    """
+    coincidencia = RANGO.match((cabecera or '').replace(' ', ''))
+    if not coincidencia:
+        return None
+    desde, hasta = coincidencia.groups()
+    if not desde:
+        if not hasta or int(hasta) == 0:
+            return False
+        return max(tamano - int(hasta), 0), tamano - 1
+    inicio = int(desde)
+    fin = min(int(hasta), tamano - 1) if hasta else tamano - 1
+    if inicio >= tamano or fin < inicio:
+        return False
+    return inicio, fin
+
+
+def _trozos(fichero, longitud):
+    try:
+        while longitud > 0:
+            datos = fichero.read(min(TAMANO_TROZO, longitud))
+            if not datos:
+                break
+            longitud -= len(datos)
+            yield datos
+    finally:
+        fichero.close()
+
+
+def servir(request, campo):
+    """Respuesta para el FieldFile `campo` (ya comprobados los permisos)."""
+    ruta = campo.path
+    estado = os.stat(ruta)
+    huella = huella_de(campo.name)
+    etiqueta = quote_etag(huella) if huella else etag(campo.name, estado.st_size, estado.st_mtime_ns)
+    modificado = int(estado.st_mtime)
+    condicional = get_conditional_response(request, etag=etiqueta, last_modified=modificado)
+    if condicional is not None:
+        return _cabeceras(condicional, etiqueta, modificado, campo.name)
+
+    tipo = mimetypes.guess_type(campo.name)[0] or 'application/octet-stream'
+    servidor = settings.COMPROBANTES_SERVIDOR
+    if servidor == 'x-accel':
+        respuesta = HttpResponse(content_type=tipo)
+        respuesta['X-Accel-Redirect'] = settings.COMPROBANTES_ACCEL_PREFIJO + quote(campo.name)
+        return _cabeceras(respuesta, etiqueta, modificado, campo.name)
+    if servidor == 'x-sendfile':
+        respuesta = HttpResponse(content_type=tipo)
+        respuesta['X-Sendfile'] = ruta
+        return _cabeceras(respuesta, etiqueta, modificado, campo.name)
+
+    tramo = None
+    # If-Range: solo se atiende el rango si el cliente tiene esta misma versión
+    if 'HTTP_RANGE' in request.META and request.META.get('HTTP_IF_RANGE', etiqueta) == etiqueta:
+        tramo = rango(request.META['HTTP_RANGE'], estado.st_size)
+    if tramo is False:
+        respuesta = HttpResponse(status=416)
+        respuesta['Content-Range'] = f'bytes */{estado.st_size}'
+        return respuesta
+    if tramo is None:
+        respuesta = FileResponse(open(ruta, 'rb'), content_type=tipo)
+        return _cabeceras(respuesta, etiqueta, modificado, campo.name)
+    inicio, fin = tramo
+    fichero = open(ruta, 'rb')
+    fichero.seek(inicio)
+    respuesta = StreamingHttpResponse(_trozos(fichero, fin - inicio + 1), status=206, content_type=tipo)
+    respuesta['Content-Length'] = str(fin - inicio + 1)
+    respuesta['Content-Range'] = f'bytes {inicio}-{fin}/{estado.st_size}'
+    return _cabeceras(respuesta, etiqueta, modificado, campo.name)
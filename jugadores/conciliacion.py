@@ -0,0 +1,213 @@
+"""Conciliación de pagos con extractos bancarios.
+
+El staff sube el CSV exportado del banco o de pago móvil. Cada línea se
+normaliza igual que `PagoForm.clean` normaliza la referencia del jugador
+(`normalizar_referencia`) y se cruza con los pagos pendientes mediante un
+diccionario por (método, referencia): unas pocas consultas `referencia IN (...)`
+sobre el índice de referencia traen los candidatos, sin comparar todas las
+líneas contra todos los pagos.
+
+Resultado por línea del extracto:
+- coincidencia: un único pago pendiente con la misma clave, monto y moneda
+  dentro de la ventana de fechas; se puede aprobar en bloque con un solo UPDATE.
+- duplicado: la referencia ya la usa un pago aprobado, o la clave encaja con
+  varios pagos o varias líneas; requiere revisión manual.
+- diferencia: la referencia existe pero con otro monto, otra moneda o fuera de
+  la ventana.
+
+Los extractos son en bolívares salvo que traigan una columna de moneda.
+- sin_pago: ningún pago pendiente declara esa referencia.
+"""
+import csv
+import io
+import unicodedata
+from collections import defaultdict
+from datetime import datetime, timedelta
+from decimal import Decimal, InvalidOperation
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.utils import timezone
+
+from . import elegibilidad
+from .models import Pago
+
+# Dígitos que se guardan de la referencia según el método (ver PagoForm.clean)
+DIGITOS_REFERENCIA = {'pago_movil': 4, 'transferencia': 6}
+METODOS_CONCILIABLES = ('pago_movil', 'transferencia')
+ALIAS = {
+    'fecha': 'fecha', 'fecha valor': 'fecha', 'fecha operacion': 'fecha',
+    'referencia': 'referencia', 'ref': 'referencia', 'numero de referencia': 'referencia', 'nro referencia': 'referencia',
+    'monto': 'monto', 'importe': 'monto', 'abono': 'monto', 'credito': 'monto',
+    'metodo': 'metodo', 'tipo': 'metodo',
+    'moneda': 'moneda', 'divisa': 'moneda',
+}
+MONEDA_EXTRACTO = 'VES'
+MONEDAS = {'ves': 'VES', 'bs': 'VES', 'bs.': 'VES', 'bolivares': 'VES', 'usd': 'USD', '$': 'USD', 'dolares': 'USD'}
+TAMANO_LOTE_IN = 500
+
+
+def digitos_requeridos(metodo):
+    return DIGITOS_REFERENCIA.get(metodo, 4)
+
+
+def normalizar_referencia(metodo, texto):
+    """
+    Reduce una referencia a los dígitos que se guardan en `Pago.referencia`:
+    los 4 últimos para pago móvil (y otros métodos) y, para transferencias, los
+    6 anteriores al dígito verificador final cuando lo hay. Devuelve None si no
+    hay dígitos suficientes.
+    """
+    digitos = ''.join(ch for ch in str(texto or '') if ch.isdigit())
+    requeridos = digitos_requeridos(metodo)
+    if len(digitos) < requeridos:
+        return None
+    if metodo == 'transferencia' and len(digitos) >= requeridos + 1:
+        return digitos[-(requeridos + 1):-1]
+    return digitos[-requeridos:]
+
+
+def _clave_columna(encabezado):
+    texto = unicodedata.normalize('NFKD', str(encabezado or '')).encode('ascii', 'ignore').decode('ascii')
+    return ALIAS.get(texto.strip().lower().replace('_', ' ').replace('.', ''))
+
+
+def _monto(texto):
+    texto = str(texto or '').strip().replace('Bs', '').replace(' ', '')
+    if ',' in texto and '.' in texto:
+        # 1.234,56 -> 1234.56 ; 1,234.56 -> 1234.56
+        if texto.rfind(',') > texto.rfind('.'):
+            texto = texto.replace('.', '').replace(',', '.')
+        else:
+            texto = texto.replace(',', '')
+    elif ',' in texto:
+        texto = texto.replace(',', '.')
+    return Decimal(texto).quantize(Decimal('0.01'))
+
+
+def _fecha(texto):
+    texto = str(texto or '').strip()[:10]
+    for formato in ('%d/%m/%Y', '%Y-%m-%d', '%d-%m-%Y'):
+        try:
+            return datetime.strptime(texto, formato).date()
+        except ValueError:
+            continue
+    raise ValueError(texto)
+
+
+def leer_extracto(archivo, metodo_por_defecto):
+    """
+    Lee el CSV del extracto. Devuelve (lineas, errores): cada línea es un dict
+    con n (fila), fecha, metodo, referencia (ya normalizada), original, monto y
+    moneda.
+    """
+    try:
+        texto = archivo.read().decode('utf-8-sig')
+    except UnicodeDecodeError:
+        raise ValidationError('El extracto debe estar en UTF-8.')
+    try:
+        dialecto = csv.Sniffer().sniff(texto[:4096], delimiters=',;\t')
+    except csv.Error:
+        dialecto = csv.excel
+    lector = csv.reader(io.StringIO(texto), dialecto)
+    columnas = [_clave_columna(c) for c in next(lector, [])]
+    faltan = {'fecha', 'referencia', 'monto'} - set(columnas)
+    if faltan:
+        raise ValidationError(f"El extracto no tiene las columnas: {', '.join(sorted(faltan))}.")
+
+    lineas, errores = [], []
+    for n, fila in enumerate(lector, start=2):
+        datos = {c: v for c, v in zip(columnas, fila) if c}
+        if not any(str(v).strip() for v in datos.values()):
+            continue
+        metodo = (datos.get('metodo') or '').strip().lower().replace(' ', '_') or metodo_por_defecto
+        if metodo not in METODOS_CONCILIABLES:
+            metodo = metodo_por_defecto
+        try:
+            fecha = _fecha(datos['fecha'])
+            monto = _monto(datos['monto'])
+        except (ValueError, InvalidOperation):
+            errores.append((n, 'fecha o monto no válidos'))
+            continue
+        texto_moneda = unicodedata.normalize('NFKD', str(datos.get('moneda') or '')).encode('ascii', 'ignore').decode('ascii').strip().lower()
+        moneda = MONEDAS.get(texto_moneda) if texto_moneda else MONEDA_EXTRACTO
+        if moneda is None:
+            errores.append((n, f"moneda no válida: {datos['moneda']}"))
+            continue
+        referencia = normalizar_referencia(metodo, datos['referencia'])
+        if referencia is None:
+            errores.append((n, f"referencia con menos de {digitos_requeridos(metodo)} dígitos: {datos['referencia']}"))
+            continue
+        lineas.append({
+            'n': n, 'fecha': fecha, 'metodo': metodo, 'referencia': referencia,
+            'original': datos['referencia'].strip(), 'monto': monto, 'moneda': moneda,
+        })
+    return lineas, errores
+
+
+def _en_lotes(valores, tamano=TAMANO_LOTE_IN):
+    valores = list(valores)
+    for i in range(0, len(valores), tamano):
+        yield valores[i:i + tamano]
+
+
+def conciliar(lineas):
+    """
+    Cruza las líneas del extracto con los pagos. Devuelve un dict con las listas
+    'coincidencias', 'duplicados', 'diferencias' y 'sin_pago'; cada elemento es
+    {'linea': ..., 'pagos': [...], 'motivo': ...}.
+    """
+    ventana = timedelta(days=settings.CONCILIACION_VENTANA_DIAS)
+    referencias = {l['referencia'] for l in lineas}
+    pendientes = defaultdict(list)   # (metodo, referencia) -> pagos pendientes
+    aprobados = set()                # (metodo, referencia) ya usados
+    for lote in _en_lotes(referencias):
+        consulta = Pago.objects.filter(
+            referencia__in=lote, metodo__in=METODOS_CONCILIABLES, estado__in=('pendiente', 'aprobado'),
+        ).select_related('jugador').only(
+            'id', 'metodo', 'referencia', 'monto', 'fecha', 'estado', 'moneda',
+            'jugador__id', 'jugador__nombre', 'jugador__apellido',
+        )
+        for pago in consulta:
+            clave = (pago.metodo, pago.referencia)
+            if pago.estado == 'aprobado':
+                aprobados.add(clave)
+            else:
+                pendientes[clave].append(pago)
+
+    repeticiones = defaultdict(int)
+    for l in lineas:
+        repeticiones[(l['metodo'], l['referencia'], l['monto'])] += 1
+
+    resultado = {'coincidencias': [], 'duplicados': [], 'diferencias': [], 'sin_pago': []}
+    for l in lineas:
+        clave = (l['metodo'], l['referencia'])
+        candidatos = pendientes.get(clave, [])
+        if not candidatos:
+            categoria, motivo = ('duplicados', 'referencia ya usada en un pago aprobado') if clave in aprobados else ('sin_pago', '')
+            resultado[categoria].append({'linea': l, 'pagos': [], 'motivo': motivo})
+            continue
+        mismo_monto = [p for p in candidatos if p.monto == l['monto'] and p.moneda == l.get('moneda', MONEDA_EXTRACTO)]
+        en_ventana = [p for p in mismo_monto if abs(timezone.localtime(p.fecha).date() - l['fecha']) <= ventana]
+        if clave in aprobados:
+            resultado['duplicados'].append({'linea': l, 'pagos': candidatos, 'motivo': 'referencia ya usada en un pago aprobado'})
+        elif len(candidatos) > 1:
+            resultado['duplicados'].append({'linea': l, 'pagos': candidatos, 'motivo': 'varios pagos declaran la misma referencia'})
+        elif repeticiones[(l['metodo'], l['referencia'], l['monto'])] > 1:
+            resultado['duplicados'].append({'linea': l, 'pagos': candidatos, 'motivo': 'la referencia se repite en el extracto'})
+        elif not mismo_monto:
+            resultado['diferencias'].append({'linea': l, 'pagos': candidatos, 'motivo': 'el monto o la moneda no coincide'})
+        elif not en_ventana:
+            resultado['diferencias'].append({'linea': l, 'pagos': candidatos, 'motivo': 'fecha fuera de la ventana'})
+        else:
+            resultado['coincidencias'].append({'linea': l, 'pagos': en_ventana, 'motivo': ''})
+    return resultado
+
+
+def aprobar_en_bloque(pago_ids):
+    """Aprueba con un único UPDATE los pagos indicados que sigan pendientes. Devuelve cuántos."""
+    aprobados = Pago.objects.filter(pk__in=list(pago_ids), estado='pendiente').update(estado='aprobado', motivo_rechazo=None)
+    if aprobados:
+        # update() no emite señales: puede haber inscripciones entre los aprobados
+        elegibilidad.invalidar()
+    return aprobados
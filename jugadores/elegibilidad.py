@@ -0,0 +1,93 @@
+"""Elegibilidad por inscripción: jugadores de un torneo sin inscripción aprobada.
+
+Un jugador está inscrito en un torneo si tiene un pago de tipo 'inscripcion'
+aprobado para ese torneo. Los pagos antiguos no indican torneo; se aceptan si
+su fecha cae en la temporada (desde `INSCRIPCION_DIAS_ANTES` días antes del
+inicio hasta el fin del torneo).
+
+`sin_inscripcion` es un anti-join (NOT EXISTS sobre el índice de
+jugador/tipo/estado de `Pago`), así que el coste no crece con el histórico de
+pagos de otras temporadas. `informe` guarda el resultado del torneo completo en
+la caché 'compartida', común a todos los workers, para que una aprobación en
+uno no deje a los demás con el informe viejo; lo invalidan las señales de
+`Pago`, `Jugador` y de los equipos del torneo, y las aprobaciones masivas (que
+usan update()) llaman a `invalidar`.
+"""
+from datetime import datetime, time, timedelta
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.db.models import Exists, OuterRef, Q
+from django.utils import timezone
+
+from .models import Jugador, Pago
+
+
+CLAVE_VERSION = 'elegibilidad:version'
+
+
+def _clave(torneo_id):
+    # El sello de versión permite invalidar todos los torneos sin enumerarlos
+    version = caches['compartida'].get_or_set(CLAVE_VERSION, 1, None)
+    return f'elegibilidad:v{version}:torneo:{torneo_id}'
+
+
+def _inicio_dia(fecha):
+    return timezone.make_aware(datetime.combine(fecha, time.min))
+
+
+def inscripciones_validas(torneo):
+    """Pagos de inscripción aprobados que cuentan para `torneo`."""
+    sin_torneo = Q(torneo__isnull=True, fecha__gte=_inicio_dia(torneo.fecha_inicio - timedelta(days=settings.INSCRIPCION_DIAS_ANTES)))
+    if torneo.fecha_fin:
+        sin_torneo &= Q(fecha__lt=_inicio_dia(torneo.fecha_fin + timedelta(days=1)))
+    return Pago.objects.filter(tipo='inscripcion', estado='aprobado').filter(Q(torneo=torneo) | sin_torneo)
+
+
+def sin_inscripcion(torneo, equipo=None):
+    """Jugadores de los equipos del torneo (o de `equipo`) sin inscripción aprobada."""
+    inscrito = inscripciones_validas(torneo).filter(jugador_id=OuterRef('pk'))
+    jugadores = Jugador.objects.filter(equipo__torneos=torneo)
+    if equipo is not None:
+        jugadores = jugadores.filter(equipo=equipo)
+    return jugadores.filter(~Exists(inscrito)).order_by('equipo_id', 'apellido', 'nombre')
+
+
+def informe(torneo):
+    """
+    {equipo_id: [(jugador_id, nombre, apellido), ...]} de los jugadores sin
+    inscripción en `torneo`, desde la caché si está.
+    """
+    cache = caches['compartida']
+    clave = _clave(torneo.pk)
+    datos = cache.get(clave)
+    if datos is None:
+        datos = {}
+        for jugador_id, equipo_id, nombre, apellido in sin_inscripcion(torneo).values_list('id', 'equipo_id', 'nombre', 'apellido'):
+            datos.setdefault(equipo_id, []).append((jugador_id, nombre, apellido))
+        cache.set(clave, datos, settings.ELEGIBILIDAD_CACHE_SEGUNDOS)
+    return datos
+
+
+def pendientes_ids(torneo, equipo_ids=None):
+    """Ids de los jugadores sin inscripción (opcionalmente solo de `equipo_ids`)."""
+    datos = informe(torneo)
+    equipos = datos.keys() if equipo_ids is None else equipo_ids
+    return {jugador_id for equipo_id in equipos for jugador_id, _n, _a in datos.get(equipo_id, [])}
+
+
+def invalidar(torneo_id=None):
+    """Descarta el informe de un torneo, o el de todos si no se indica."""
+    def borrar():
+        cache = caches['compartida']
+        if torneo_id is not None:
+            cache.delete(_clave(torneo_id))
+        elif not cache.add(CLAVE_VERSION, 2, None):
+            try:
+                cache.incr(CLAVE_VERSION)
+            except ValueError:
+                cache.set(CLAVE_VERSION, 1, None)
+    # Ahora y otra vez al confirmar, por si otra petición recalculó mientras tanto
+    borrar()
+    transaction.on_commit(borrar)
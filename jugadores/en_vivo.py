@@ -0,0 +1,130 @@
+"""Canal de eventos en vivo (pub/sub en proceso).
+
+Los publicadores son las señales post_save de `Partido`, `Tarjeta` y
+`Estadistica` (ver signals.py); los suscriptores son las vistas SSE y de
+sondeo de `views_en_vivo.py`. Cada evento es un dict JSON pequeño con un `id`
+creciente, y se conserva un historial corto por tema para que un cliente que
+se reconecta (cabecera `Last-Event-ID` o parámetro `desde`) recupere lo que se
+perdió sin tocar la base de datos.
+
+El canal es de cada proceso: con varios workers cada uno tiene su secuencia y
+su historial, y solo ve lo que se publicó en él. Por eso el cliente recibe un
+cursor `<instancia>:<id>` en vez del id a secas. Si vuelve con un cursor de otro
+worker, o de antes de un reinicio, `leer_cursor` devuelve None y las vistas
+responden con un evento `resync` y el estado actual en lugar de volver a
+mandarle un historial que no es el suyo (y que llegaría duplicado).
+
+Temas: ``partido:<id>`` para un partido y ``liga`` para todos los eventos.
+"""
+import asyncio
+import secrets
+import threading
+from collections import deque
+
+from django.conf import settings
+
+TEMA_LIGA = 'liga'
+
+
+def tema_partido(partido_id):
+    return f'partido:{partido_id}'
+
+
+class Canal:
+    """Broker de eventos seguro entre hilos y utilizable desde código async."""
+
+    def __init__(self, historial=200):
+        self._historial = historial
+        # Distingue este proceso (y este arranque) en los cursores que se dan a los clientes
+        self.instancia = secrets.token_hex(4)
+        self._lock = threading.Lock()
+        self._seq = 0
+        self._eventos = {}
+        # Esperas de corutinas: (loop, asyncio.Event) que se despiertan al publicar
+        self._esperas_async = set()
+
+    @property
+    def ultimo_id(self):
+        return self._seq
+
+    def cursor(self, evento_id):
+        return f'{self.instancia}:{evento_id}'
+
+    def leer_cursor(self, cursor):
+        """
+        Id de un cursor dado por este canal, o None si viene de otro proceso o
+        de antes de un reinicio (el cliente tiene que resincronizar). Un número
+        sin instancia se toma como de este proceso.
+        """
+        instancia, _sep, evento_id = str(cursor).rpartition(':')
+        try:
+            evento_id = int(evento_id)
+        except ValueError:
+            return None
+        if (instancia and instancia != self.instancia) or not 0 <= evento_id <= self._seq:
+            return None
+        return evento_id
+
+    def publicar(self, tema, datos):
+        """Publica `datos` en `tema` (y en el tema de liga). Devuelve el evento."""
+        with self._lock:
+            self._seq += 1
+            evento = dict(datos, id=self._seq, tema=tema)
+            for t in {tema, TEMA_LIGA}:
+                cola = self._eventos.get(t)
+                if cola is None:
+                    cola = self._eventos[t] = deque(maxlen=self._historial)
+                cola.append(evento)
+            esperas = list(self._esperas_async)
+        for loop, aviso in esperas:
+            try:
+                loop.call_soon_threadsafe(aviso.set)
+            except RuntimeError:
+                # El loop ya se cerró: el suscriptor se fue
+                pass
+        return evento
+
+    def eventos_desde(self, tema, desde=0):
+        """Eventos de `tema` con id mayor que `desde` que sigan en el historial."""
+        with self._lock:
+            return self._pendientes(tema, desde)
+
+    def _pendientes(self, tema, desde):
+        return [e for e in self._eventos.get(tema, ()) if e['id'] > desde]
+
+    async def aesperar(self, tema, desde=0, timeout=None):
+        """Espera eventos nuevos en `tema` hasta `timeout` segundos sin ocupar un hilo."""
+        loop = asyncio.get_running_loop()
+        aviso = asyncio.Event()
+        espera = (loop, aviso)
+        with self._lock:
+            pendientes = self._pendientes(tema, desde)
+            if pendientes:
+                return pendientes
+            self._esperas_async.add(espera)
+        try:
+            fin = None if timeout is None else loop.time() + timeout
+            while True:
+                restante = None if fin is None else fin - loop.time()
+                if restante is not None and restante <= 0:
+                    return []
+                try:
+                    await asyncio.wait_for(aviso.wait(), restante)
+                except asyncio.TimeoutError:
+                    return []
+                aviso.clear()
+                with self._lock:
+                    pendientes = self._pendientes(tema, desde)
+                if pendientes:
+                    return pendientes
+        finally:
+            with self._lock:
+                self._esperas_async.discard(espera)
+
+
+canal = Canal(historial=settings.EN_VIVO_HISTORIAL)
+
+
+def publicar_partido(partido_id, datos):
+    """Atajo para publicar un delta de un partido."""
+    return canal.publicar(tema_partido(partido_id), dict(datos, partido=partido_id))
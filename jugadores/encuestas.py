@@ -0,0 +1,100 @@
+"""Motor de encuestas con contadores.
+
+Cada voto inserta una papeleta (`VotoEncuesta`, única por usuario y encuesta)
+y suma 1 al contador de la opción con una expresión F(), ambos en una
+transacción corta de dos sentencias. Los resultados se leen de los contadores
+y se cachean, así que un pico de votos al final del partido no provoca
+COUNT(*) ni bloqueos largos de SQLite.
+"""
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .cola_escrituras import cola_escrituras
+from .models import Encuesta, Jugador, OpcionEncuesta, VotoEncuesta
+
+
+def _clave_resultados(encuesta_id):
+    return f'encuesta:{encuesta_id}:resultados'
+
+
+def encuestas_abiertas():
+    ahora = timezone.now()
+    return Encuesta.objects.filter(activa=True).filter(Q(cierre__isnull=True) | Q(cierre__gt=ahora)).order_by('-fecha')
+
+
+def resultados(encuesta_id):
+    """
+    Resultados de la encuesta a partir de los contadores, cacheados
+    `ENCUESTAS_CACHE_SEGUNDOS`. Devuelve {'total': int, 'opciones': [...]}.
+    """
+    clave = _clave_resultados(encuesta_id)
+    datos = cache.get(clave)
+    if datos is None:
+        opciones = list(OpcionEncuesta.objects.filter(encuesta_id=encuesta_id).order_by('id').values('id', 'texto', 'jugador_id', 'votos'))
+        total = sum(o['votos'] for o in opciones)
+        for o in opciones:
+            o['porcentaje'] = round(o['votos'] * 100 / total, 1) if total else 0
+        datos = {'total': total, 'opciones': opciones}
+        cache.set(clave, datos, settings.ENCUESTAS_CACHE_SEGUNDOS)
+    return datos
+
+
+def votar(encuesta, opcion_id, usuario):
+    """
+    Registra el voto de `usuario` por la opción `opcion_id` de `encuesta`.
+    Lanza ValidationError si la encuesta está cerrada, la opción no existe o el
+    usuario ya votó. Devuelve la opción votada.
+    """
+    if not encuesta.abierta():
+        raise ValidationError('La encuesta está cerrada.', code='cerrada')
+    # Lectura fuera de la transacción: no toma el bloqueo de escritura
+    opcion = OpcionEncuesta.objects.filter(pk=opcion_id, encuesta=encuesta).first() if str(opcion_id or '').isdigit() else None
+    if opcion is None:
+        raise ValidationError('Opción no válida.', code='opcion')
+    if settings.COLA_ESCRITURAS_ACTIVA:
+        # Comprobación previa para avisar al usuario; si aun así llega un duplicado
+        # al volcar el lote, la restricción única lo descarta
+        if VotoEncuesta.objects.filter(encuesta=encuesta, usuario=usuario).exists():
+            raise ValidationError('Ya votaste en esta encuesta.', code='duplicado')
+        cola_escrituras.encolar(lambda: _registrar_voto(encuesta.pk, opcion.pk, usuario.pk))
+        return opcion
+    try:
+        _registrar_voto(encuesta.pk, opcion.pk, usuario.pk)
+    except IntegrityError:
+        raise ValidationError('Ya votaste en esta encuesta.', code='duplicado')
+    return opcion
+
+
+def _registrar_voto(encuesta_id, opcion_id, usuario_id):
+    with transaction.atomic():
+        VotoEncuesta.objects.create(encuesta_id=encuesta_id, opcion_id=opcion_id, usuario_id=usuario_id)
+        OpcionEncuesta.objects.filter(pk=opcion_id).update(votos=F('votos') + 1)
+    transaction.on_commit(lambda: cache.delete(_clave_resultados(encuesta_id)))
+
+
+def crear_encuesta_jugador_partido(partido):
+    """Crea la encuesta 'Jugador del Partido' con los jugadores de ambos equipos como opciones."""
+    with transaction.atomic():
+        encuesta = Encuesta.objects.create(
+            pregunta=f'Jugador del Partido: {partido.equipo_local} vs {partido.equipo_visitante}',
+            tipo='jugador_partido',
+            partido=partido,
+        )
+        jugadores = Jugador.objects.filter(equipo_id__in=[partido.equipo_local_id, partido.equipo_visitante_id]).order_by('apellido', 'nombre')
+        OpcionEncuesta.objects.bulk_create([
+            OpcionEncuesta(encuesta=encuesta, jugador=j, texto=f'{j.nombre} {j.apellido}'[:100])
+            for j in jugadores
+        ])
+    return encuesta
+
+
+def recontar(encuesta):
+    """Recalcula los contadores desde las papeletas (reparación manual; no se usa en el flujo normal)."""
+    conteo = VotoEncuesta.objects.filter(opcion=OuterRef('pk')).values('opcion').annotate(n=Count('id')).values('n')
+    OpcionEncuesta.objects.filter(encuesta=encuesta).update(votos=Coalesce(Subquery(conteo), 0))
+    cache.delete(_clave_resultados(encuesta.pk))
@@ -6,6 +6,8 @@ from django.utils.translation import gettext_lazy as _
 from .models import Jugador, Partido, Estadistica, Equipo
 from .models import Pago
 from .models import Tarjeta
+from . import referencia, subidas
+from .conciliacion import digitos_requeridos, normalizar_referencia
 
 
 # Formulario para comentarios de usuarios registrados
@@ -104,6 +106,12 @@ class JugadorForm(forms.ModelForm):
             'imagen_url': forms.URLInput(attrs={'class': 'form-control', 'placeholder': 'https://...'}),
         }
 
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Opciones desde la caché de referencia: pintar el formulario no consulta los equipos
+        campo = self.fields['equipo']
+        campo.choices = [('', campo.empty_label)] + [(e.pk, str(e)) for e in referencia.equipos()]
+
 
 class PagoForm(forms.ModelForm):
     # Permitimos temporalmente entradas más largas en el formulario para normalizar
@@ -112,16 +120,19 @@ class PagoForm(forms.ModelForm):
     referencia = forms.CharField(required=False, widget=forms.TextInput(attrs={'class': 'form-control', 'placeholder': 'Referencia/transacción', 'maxlength': '64', 'pattern': '\\d{0,64}', 'inputmode': 'numeric'}), max_length=64)
     class Meta:
         model = Pago
-        fields = ['tipo', 'monto', 'metodo', 'referencia', 'comprobante', 'descripcion', 'moneda']
+        fields = ['tipo', 'torneo', 'monto', 'metodo', 'referencia', 'comprobante', 'descripcion', 'moneda']
         widgets = {
             'tipo': forms.Select(attrs={'class': 'form-select', 'required': True}),
+            'torneo': forms.Select(attrs={'class': 'form-select'}),
             'monto': forms.NumberInput(attrs={'class': 'form-control', 'min': 0.01, 'step': '0.01', 'required': True}),
             'metodo': forms.Select(attrs={'class': 'form-select', 'required': True}),
             'referencia': forms.TextInput(attrs={'class': 'form-control', 'placeholder': 'Referencia/transacción', 'maxlength': '6', 'pattern': '\\d{0,6}', 'inputmode': 'numeric'}),
-            'comprobante': forms.ClearableFileInput(attrs={'class': 'form-control-file'}),
+            'comprobante': forms.ClearableFileInput(attrs={'class': 'form-control-file', 'accept': ','.join(subidas.FORMATOS.values())}),
             'descripcion': forms.Textarea(attrs={'class': 'form-control', 'rows': 4, 'maxlength': '50', 'placeholder': 'Opcional: agrega más detalles sobre el pago.'}),
             'moneda': forms.HiddenInput(),
         }
+        # La imagen la valida subidas.validar_imagen (solo cabecera), no forms.ImageField
+        field_classes = {'comprobante': forms.FileField}
 
         def __init__(self, *args, **kwargs):
             super().__init__(*args, **kwargs)
@@ -129,9 +140,20 @@ class PagoForm(forms.ModelForm):
             if not self.is_bound:
                 self.initial.setdefault('metodo', 'pago_movil')
 
+    def __init__(self, *args, rechazos=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Subidas descartadas al recibirlas (ver subidas.py): {campo: motivo}
+        self.rechazos = rechazos or {}
+        # Torneo de la inscripción, con las opciones de la caché de referencia
+        campo = self.fields['torneo']
+        campo.choices = [('', campo.empty_label)] + [(t.pk, str(t)) for t in referencia.torneos()]
+        campo.help_text = _('Solo para inscripciones.')
+
     def clean(self):
         cleaned = super().clean()
         tipo = cleaned.get('tipo')
+        if tipo != 'inscripcion':
+            cleaned['torneo'] = None
         monto = cleaned.get('monto')
         if monto is None or monto <= 0:
             self.add_error('monto', 'El monto debe ser mayor que 0')
@@ -199,27 +221,16 @@ class PagoForm(forms.ModelForm):
                 self.add_error('referencia', 'La referencia no puede contener más de 6 dígitos.')
                 # evitar seguir normalizando si hay error
                 return cleaned
-            required = None
-            if metodo == 'pago_movil':
-                required = 4
-            elif metodo == 'transferencia':
-                required = 6
-            else:
-                required = 4
-
-            if len(digits) < required:
-                self.add_error('referencia', f'La referencia debe contener al menos {required} dígitos para el método seleccionado')
+            # Misma normalización que usa la conciliación de extractos bancarios
+            normalizada = normalizar_referencia(metodo, referencia)
+            if normalizada is None:
+                self.add_error('referencia', f'La referencia debe contener al menos {digitos_requeridos(metodo)} dígitos para el método seleccionado')
             else:
-                # Para transferencias a veces el último dígito es un checksum; por compatibilidad
-                # tomamos los 6 dígitos anteriores al último cuando hay suficiente longitud.
-                if metodo == 'transferencia' and len(digits) >= (required + 1):
-                    cleaned['referencia'] = digits[-(required+1):-1]
-                else:
-                    cleaned['referencia'] = digits[-required:]
+                cleaned['referencia'] = normalizada
 
         # Validar comprobante cuando sea necesario
         if needs_comprobante:
-            if not comprobante:
+            if not comprobante and 'comprobante' not in self.errors:
                 self.add_error('comprobante', 'Se requiere un comprobante para este método.')
             else:
                 # Validar que sea una imagen
@@ -232,6 +243,15 @@ class PagoForm(forms.ModelForm):
                 # muy comprimidos en entorno de tests.
         return cleaned
 
+    def clean_comprobante(self):
+        comprobante = self.cleaned_data.get('comprobante')
+        if 'comprobante' in self.rechazos:
+            raise forms.ValidationError(self.rechazos['comprobante'])
+        if comprobante and hasattr(comprobante, 'content_type'):
+            # Solo los ficheros recién subidos; el ya guardado no se vuelve a validar
+            subidas.validar_imagen(comprobante)
+        return comprobante
+
 
 class PagoAdminForm(PagoForm):
     """Formulario para que el staff/admin cree pagos: incluye campo jugador y permite seleccionar moneda."""
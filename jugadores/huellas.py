@@ -0,0 +1,125 @@
+"""Huella perceptual de los comprobantes para detectar capturas reutilizadas.
+
+Cada comprobante recibe al subirse una huella dHash de 64 bits: la imagen en
+grises reducida a 9x8 y un bit por cada par de píxeles vecinos (¿el de la
+izquierda es más claro?). Recomprimir, reescalar o cambiar ligeramente el
+brillo de una captura apenas cambia unos pocos bits, así que dos comprobantes
+con una distancia de Hamming pequeña son casi seguro la misma imagen.
+
+Para buscar parecidos sin comparar con todo el archivo se usa un índice
+multi-hash: la huella se parte en `distancia máxima + 1` bandas (al menos
+MIN_PARTES, para que cada banda quepa en el entero de 31 bits de
+`BandaHuella.valor`) y cada banda se guarda como fila indexada. Por el
+principio del palomar, dos huellas a distancia <= d coinciden exactamente en al
+menos una banda, así que la consulta solo trae los pagos que comparten alguna
+banda y la distancia exacta se calcula sobre esos pocos candidatos.
+
+Si cambia `COMPROBANTES_DISTANCIA_DUPLICADO` hay que volver a generar las
+bandas con el comando `huellas_comprobantes`.
+"""
+import logging
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db.models import Q
+
+from .models import BandaHuella, Pago
+
+logger = logging.getLogger(__name__)
+
+BITS = 64
+MIN_PARTES = 3  # bandas de 22 bits como mucho: caben en un PositiveIntegerField en cualquier base de datos
+
+
+def dhash(imagen):
+    """dHash de 64 bits de una imagen de Pillow."""
+    from PIL import Image
+    gris = imagen.convert('L').resize((9, 8), Image.Resampling.LANCZOS)
+    pixeles = list(gris.getdata())
+    huella = 0
+    for fila in range(8):
+        for columna in range(8):
+            izquierda = pixeles[fila * 9 + columna]
+            derecha = pixeles[fila * 9 + columna + 1]
+            huella = (huella << 1) | (izquierda > derecha)
+    return huella
+
+
+def huella_de_fichero(fichero):
+    """Huella de una imagen subida (o None si no se puede leer como imagen)."""
+    from PIL import Image, UnidentifiedImageError
+    posicion = fichero.tell() if hasattr(fichero, 'tell') else None
+    try:
+        fichero.seek(0)
+        with Image.open(fichero) as imagen:
+            imagen.draft('L', (64, 64))  # JPEG: decodificar ya reducida
+            return dhash(imagen)
+    except (UnidentifiedImageError, OSError, ValueError):
+        logger.warning('No se pudo calcular la huella del comprobante %s', getattr(fichero, 'name', ''))
+        return None
+    finally:
+        if posicion is not None:
+            fichero.seek(posicion)
+
+
+def a_texto(huella):
+    return f'{huella:016x}'
+
+
+def distancia(a, b):
+    return (a ^ b).bit_count()
+
+
+def bandas(huella, partes=None):
+    """[(banda, valor)] de la huella partida en `partes` trozos de bits contiguos."""
+    if partes is None:
+        distancia_max = settings.COMPROBANTES_DISTANCIA_DUPLICADO
+        if not 0 <= distancia_max < BITS:
+            raise ImproperlyConfigured(f'COMPROBANTES_DISTANCIA_DUPLICADO debe estar entre 0 y {BITS - 1}.')
+        partes = max(distancia_max + 1, MIN_PARTES)
+    resultado = []
+    inicio = 0
+    for banda in range(partes):
+        ancho = BITS // partes + (1 if banda < BITS % partes else 0)
+        resultado.append((banda, (huella >> (BITS - inicio - ancho)) & ((1 << ancho) - 1)))
+        inicio += ancho
+    return resultado
+
+
+def parecidos(huella, excluir=None, distancia_max=None):
+    """[(pago_id, distancia)] de los pagos con huella a distancia <= `distancia_max`, del más cercano al más lejano."""
+    distancia_max = settings.COMPROBANTES_DISTANCIA_DUPLICADO if distancia_max is None else distancia_max
+    coincide = Q()
+    for banda, valor in bandas(huella):
+        coincide |= Q(banda=banda, valor=valor)
+    candidatos = BandaHuella.objects.filter(coincide)
+    if excluir is not None:
+        candidatos = candidatos.exclude(pago_id=excluir)
+    encontrados = {}
+    for pago_id, texto in candidatos.values_list('pago_id', 'pago__huella_visual').distinct():
+        d = distancia(huella, int(texto, 16))
+        if d <= distancia_max:
+            encontrados[pago_id] = d
+    return sorted(encontrados.items(), key=lambda par: (par[1], par[0]))
+
+
+def registrar(pago):
+    """
+    Indexa la huella de `pago` y marca como sospechoso el pago más cercano
+    anterior a él con una huella parecida. Devuelve ese pago_id o None.
+    Sin huella (comprobante quitado) lo saca del índice y retira las sospechas
+    que apuntaban a él.
+    """
+    BandaHuella.objects.filter(pago=pago).delete()
+    if not pago.huella_visual:
+        Pago.objects.filter(pk=pago.pk).update(sospecha_duplicado=None)
+        Pago.objects.filter(sospecha_duplicado=pago.pk).update(sospecha_duplicado=None)
+        pago.sospecha_duplicado_id = None
+        return None
+    huella = int(pago.huella_visual, 16)
+    BandaHuella.objects.bulk_create([BandaHuella(pago=pago, banda=banda, valor=valor) for banda, valor in bandas(huella)])
+    anteriores = [pago_id for pago_id, _d in parecidos(huella, excluir=pago.pk) if pago_id < pago.pk]
+    sospecha = anteriores[0] if anteriores else None
+    Pago.objects.filter(pk=pago.pk).update(sospecha_duplicado=sospecha)
+    pago.sospecha_duplicado_id = sospecha
+    return sospecha
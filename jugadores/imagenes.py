@@ -0,0 +1,283 @@
+"""Proxy y caché local de las imágenes externas (`imagen_url` de jugadores y equipos).
+
+Las fotos y escudos son URLs de terceros (Imgur) a tamaño original. En vez de
+enlazarlas, las plantillas apuntan a `/imagen/<firma>/<variante>/`, donde la
+firma es la URL original firmada (así el proxy solo descarga URLs que esta
+aplicación ha puesto en una página). La primera petición descarga la imagen con
+el descargador de `IMAGENES_DESCARGADOR` y la guarda en `IMAGENES_CACHE_ROOT`;
+cada variante (`mini`, `tarjeta`, `completa`) se genera al pedirse por primera
+vez, en WebP si el navegador lo acepta y si no en JPEG.
+
+Como la dirección cambia cuando cambia la URL original, las respuestas llevan
+`Cache-Control: immutable` de un año. La caché en disco tiene un tope de
+`IMAGENES_CACHE_MAX_BYTES`: al escribir un fichero nuevo, si se pasa, se borran
+los menos usados (la fecha de modificación se renueva, como mucho una vez por
+hora, al servirlos). Si la descarga falla se recuerda durante un rato y se
+redirige a la imagen genérica del sitio (nunca a la URL original, que la
+escribe el jugador).
+"""
+import hashlib
+import http.client
+import io
+import ipaddress
+import os
+import socket
+import ssl
+import tempfile
+import time
+import warnings
+from urllib.parse import urljoin, urlparse
+
+from django.conf import settings
+from django.core import signing
+from django.core.cache import cache
+from django.urls import reverse
+from django.utils.module_loading import import_string
+
+VARIANTES = {'mini': 96, 'tarjeta': 320, 'completa': 1024}  # lado mayor en píxeles
+FORMATOS = {'webp': 'image/webp', 'jpg': 'image/jpeg'}
+SAL = 'jugadores.imagenes'
+RENOVAR_USO_SEGUNDOS = 3600
+FALLO_SEGUNDOS = 600
+TEMPORAL = '.tmp'
+
+
+class ImagenNoDisponible(Exception):
+    pass
+
+
+def firmar(url):
+    return signing.dumps(url, salt=SAL, compress=True)
+
+
+def url_de_firma(firma):
+    """URL original de una firma; None si la firma no es válida."""
+    try:
+        return signing.loads(firma, salt=SAL)
+    except signing.BadSignature:
+        return None
+
+
+def url_proxy(url, variante='tarjeta'):
+    return reverse('imagen_proxy', args=[firmar(url), variante])
+
+
+def srcset(url):
+    firma = firmar(url)
+    return ', '.join(f"{reverse('imagen_proxy', args=[firma, variante])} {ancho}w" for variante, ancho in VARIANTES.items())
+
+
+def clave(url):
+    return hashlib.sha256(url.encode()).hexdigest()[:32]
+
+
+def ruta(clave_url, sufijo):
+    return os.path.join(settings.IMAGENES_CACHE_ROOT, clave_url[:2], f'{clave_url}{sufijo}')
+
+
+# --- Descarga ---
+
+MAX_REDIRECCIONES = 3
+
+
+def _ip_publica(host, puerto):
+    """
+    Dirección a la que conectar con `host`, solo si todas las que resuelve son
+    públicas. La conexión se hace a esta IP ya comprobada: si se dejara a
+    urllib resolver otra vez, un DNS que cambia de respuesta (rebinding) podría
+    llevarla a la red interna.
+    """
+    try:
+        direcciones = [info[4][0] for info in socket.getaddrinfo(host, puerto, type=socket.SOCK_STREAM)]
+    except (socket.gaierror, UnicodeError):
+        direcciones = []
+    if not direcciones or not all(ipaddress.ip_address(d.split('%')[0]).is_global for d in direcciones):
+        raise ImagenNoDisponible(f'Destino no permitido: {host}')
+    return direcciones[0]
+
+
+class _ConexionFijada(http.client.HTTPConnection):
+    """HTTPConnection a una IP concreta; `host` sigue siendo el nombre (cabecera Host)."""
+
+    def __init__(self, host, ip, **kwargs):
+        super().__init__(host, **kwargs)
+        self.ip = ip
+
+    def connect(self):
+        self.sock = socket.create_connection((self.ip, self.port), self.timeout)
+
+
+class _ConexionFijadaSegura(_ConexionFijada):
+    """Como _ConexionFijada, con TLS verificando el certificado y SNI del nombre original."""
+    default_port = http.client.HTTPS_PORT
+
+    def connect(self):
+        super().connect()
+        self.sock = ssl.create_default_context().wrap_socket(self.sock, server_hostname=self.host)
+
+
+def descargar_http(url, max_bytes):
+    """
+    Descargador por defecto: bytes de `url` por HTTP(S), sin pasar de
+    `max_bytes` ni salir a direcciones internas. Las redirecciones se siguen a
+    mano (como mucho MAX_REDIRECCIONES) comprobando cada salto igual.
+    """
+    original = url
+    for _ in range(MAX_REDIRECCIONES + 1):
+        partes = urlparse(url)
+        try:
+            puerto = partes.port
+        except ValueError:
+            raise ImagenNoDisponible(f'URL no permitida: {url}')
+        if partes.scheme not in ('http', 'https') or not partes.hostname:
+            raise ImagenNoDisponible(f'URL no permitida: {url}')
+        segura = partes.scheme == 'https'
+        puerto = puerto or (http.client.HTTPS_PORT if segura else http.client.HTTP_PORT)
+        ip = _ip_publica(partes.hostname, puerto)
+        clase = _ConexionFijadaSegura if segura else _ConexionFijada
+        conexion = clase(partes.hostname, ip, port=puerto, timeout=settings.IMAGENES_TIMEOUT_SEGUNDOS)
+        camino = (partes.path or '/') + (f'?{partes.query}' if partes.query else '')
+        try:
+            conexion.request('GET', camino, headers={'User-Agent': 'FuriaNocturna-imagenes/1.0'})
+            respuesta = conexion.getresponse()
+            destino = respuesta.getheader('Location')
+            if respuesta.status in (301, 302, 303, 307, 308) and destino:
+                url = urljoin(url, destino)
+                continue
+            if respuesta.status != 200:
+                raise ImagenNoDisponible(f'{url} respondió {respuesta.status}')
+            datos = respuesta.read(max_bytes + 1)
+        except (OSError, http.client.HTTPException) as e:
+            raise ImagenNoDisponible(f'No se pudo descargar {url}: {e}') from e
+        finally:
+            conexion.close()
+        if len(datos) > max_bytes:
+            raise ImagenNoDisponible(f'{url} supera {max_bytes} bytes')
+        return datos
+    raise ImagenNoDisponible(f'{original}: demasiadas redirecciones')
+
+
+def _descargar(url):
+    descargador = import_string(settings.IMAGENES_DESCARGADOR)
+    return descargador(url, settings.IMAGENES_MAX_BYTES)
+
+
+# --- Caché en disco ---
+
+def _escribir(destino, datos):
+    os.makedirs(os.path.dirname(destino), exist_ok=True)
+    descriptor, temporal = tempfile.mkstemp(dir=os.path.dirname(destino), prefix=TEMPORAL)
+    try:
+        with os.fdopen(descriptor, 'wb') as fichero:
+            fichero.write(datos)
+        os.chmod(temporal, 0o644)
+        os.replace(temporal, destino)
+    except BaseException:
+        if os.path.exists(temporal):
+            os.remove(temporal)
+        raise
+    recortar()
+
+
+def recortar():
+    """Borra los ficheros usados hace más tiempo hasta que la caché quede bajo el 90 % del tope."""
+    raiz = settings.IMAGENES_CACHE_ROOT
+    ficheros = []
+    total = 0
+    for directorio, _subdirs, nombres in os.walk(raiz):
+        for nombre in nombres:
+            if nombre.startswith(TEMPORAL):
+                continue  # escritura en curso de otro proceso
+            camino = os.path.join(directorio, nombre)
+            try:
+                estado = os.stat(camino)
+            except FileNotFoundError:
+                continue
+            ficheros.append((estado.st_mtime, estado.st_size, camino))
+            total += estado.st_size
+    if total <= settings.IMAGENES_CACHE_MAX_BYTES:
+        return 0
+    objetivo = settings.IMAGENES_CACHE_MAX_BYTES * 0.9
+    borrados = 0
+    for _uso, tamano, camino in sorted(ficheros):
+        if total <= objetivo:
+            break
+        try:
+            os.remove(camino)
+        except FileNotFoundError:
+            pass
+        total -= tamano
+        borrados += 1
+    return borrados
+
+
+def _usar(camino):
+    """Marca el fichero como recién usado para el LRU, sin escribir en cada acierto."""
+    try:
+        if time.time() - os.stat(camino).st_mtime > RENOVAR_USO_SEGUNDOS:
+            os.utime(camino)
+    except FileNotFoundError:
+        pass
+
+
+def _original(url):
+    """Bytes de la imagen original: de disco si ya se descargó, si no del descargador."""
+    camino = ruta(clave(url), '.orig')
+    try:
+        with open(camino, 'rb') as fichero:
+            datos = fichero.read()
+        _usar(camino)
+        return datos
+    except FileNotFoundError:
+        pass
+    datos = _descargar(url)
+    _escribir(camino, datos)
+    return datos
+
+
+def _redimensionar(datos, lado, formato):
+    from PIL import Image, ImageOps
+    try:
+        with warnings.catch_warnings():
+            warnings.simplefilter('error', Image.DecompressionBombWarning)
+            with Image.open(io.BytesIO(datos)) as imagen:
+                if imagen.width * imagen.height > settings.IMAGENES_MAX_PIXELES:
+                    raise ImagenNoDisponible('Imagen demasiado grande')
+                imagen.draft('RGB', (lado, lado))  # JPEG: decodificar ya reducida
+                imagen = ImageOps.exif_transpose(imagen)
+                imagen.thumbnail((lado, lado), Image.Resampling.LANCZOS)
+                if formato == 'jpg' or imagen.mode not in ('RGB', 'RGBA'):
+                    imagen = imagen.convert('RGBA' if formato == 'webp' and 'A' in imagen.getbands() else 'RGB')
+                salida = io.BytesIO()
+                if formato == 'webp':
+                    imagen.save(salida, 'WEBP', quality=80, method=4)
+                else:
+                    imagen.save(salida, 'JPEG', quality=82, optimize=True, progressive=True)
+                return salida.getvalue()
+    except ImagenNoDisponible:
+        raise
+    except Exception as e:
+        raise ImagenNoDisponible(f'No es una imagen válida: {e}') from e
+
+
+def variante(url, nombre, formato):
+    """Ruta en disco de la variante pedida, generándola (y descargando el original) si hace falta."""
+    camino = ruta(clave(url), f'-{nombre}.{formato}')
+    if os.path.exists(camino):
+        _usar(camino)
+        return camino
+    clave_fallo = f'imagenes:fallo:{clave(url)}'
+    if cache.get(clave_fallo):
+        raise ImagenNoDisponible(f'{url} falló hace poco')
+    try:
+        datos = _redimensionar(_original(url), VARIANTES[nombre], formato)
+    except ImagenNoDisponible:
+        # No volver a intentarlo en cada petición; un original que no es imagen no se guarda
+        cache.set(clave_fallo, True, FALLO_SEGUNDOS)
+        try:
+            os.remove(ruta(clave(url), '.orig'))
+        except FileNotFoundError:
+            pass
+        raise
+    _escribir(camino, datos)
+    return camino
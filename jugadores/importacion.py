@@ -0,0 +1,345 @@
+"""Importación masiva de plantillas de jugadores desde CSV o XLSX.
+
+1. `leer_filas` convierte el fichero en dicts con las columnas de `COLUMNAS`.
+2. `validar` comprueba todas las filas en memoria: cédulas y usuarios ya
+   existentes se cargan con una consulta cada uno y se comparan con sets; los
+   equipos salen de la caché de referencia. Para las filas sin cédula se
+   comprueba que el rango de cédulas provisionales que usarán está libre.
+3. `importar` genera contraseñas, las cifra en un pool de procesos (PBKDF2 es
+   caro a propósito, ver `cifrar_claves`) e inserta Users, Jugadores y pertenencias al grupo con
+   bulk_create en una transacción. Devuelve las credenciales para el informe.
+
+La importación es todo o nada: si alguna fila tiene errores no se crea nadie.
+Para XLSX hace falta `openpyxl` (opcional).
+"""
+import csv
+import io
+import os
+import re
+import secrets
+import unicodedata
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, datetime
+from functools import partial
+
+from django.conf import settings
+from django.contrib.auth.hashers import PBKDF2PasswordHasher, get_hasher
+from django.contrib.auth.models import User
+from django.core.exceptions import ValidationError
+from django.db import transaction
+
+from . import elegibilidad, referencia
+from .models import Jugador
+from .perfiles import marcar_aprovisionado, generar_cedula
+
+COLUMNAS = ['nombre', 'apellido', 'cedula', 'fecha_de_nacimiento', 'posicion', 'numero', 'equipo', 'usuario']
+POSICIONES = ['Delantero', 'Mediocampista', 'Defensa', 'Arquero']
+# Encabezados alternativos aceptados (ya normalizados: minúsculas, sin tildes)
+ALIAS = {
+    'fecha de nacimiento': 'fecha_de_nacimiento',
+    'nacimiento': 'fecha_de_nacimiento',
+    'numero de camiseta': 'numero',
+    'camiseta': 'numero',
+    'dorsal': 'numero',
+    'username': 'usuario',
+}
+ALFABETO_CLAVES = 'abcdefghjkmnpqrstuvwxyzABCDEFGHJKMNPQRSTUVWXYZ23456789'
+
+
+def _normalizar(texto):
+    texto = unicodedata.normalize('NFKD', str(texto or '')).encode('ascii', 'ignore').decode('ascii')
+    return texto.strip().lower()
+
+
+def _columna(encabezado):
+    clave = _normalizar(encabezado)
+    return ALIAS.get(clave, clave.replace(' ', '_'))
+
+
+def leer_filas(archivo):
+    """Lee un fichero subido (CSV o XLSX) y devuelve una lista de dicts por fila."""
+    nombre = (getattr(archivo, 'name', '') or '').lower()
+    if nombre.endswith('.xlsx'):
+        try:
+            import openpyxl
+        except ImportError:
+            raise ValidationError('Para importar XLSX instala openpyxl, o guarda la plantilla como CSV.')
+        libro = openpyxl.load_workbook(archivo, read_only=True, data_only=True)
+        filas = libro.active.iter_rows(values_only=True)
+        encabezados = [_columna(c) for c in next(filas, [])]
+        datos = [dict(zip(encabezados, fila)) for fila in filas]
+        libro.close()
+    else:
+        texto = archivo.read().decode('utf-8-sig')
+        try:
+            dialecto = csv.Sniffer().sniff(texto[:4096], delimiters=',;\t')
+        except csv.Error:
+            dialecto = csv.excel
+        lector = csv.reader(io.StringIO(texto), dialecto)
+        encabezados = [_columna(c) for c in next(lector, [])]
+        datos = [dict(zip(encabezados, fila)) for fila in lector]
+    faltan = {'nombre', 'apellido'} - set(encabezados)
+    if faltan:
+        raise ValidationError(f"Faltan columnas obligatorias: {', '.join(sorted(faltan))}.")
+    # Descartar filas totalmente vacías (habituales al final de las hojas de cálculo)
+    return [
+        {c: ('' if fila.get(c) is None else fila.get(c)) for c in COLUMNAS}
+        for fila in datos if any(str(v or '').strip() for v in fila.values())
+    ]
+
+
+def _cedula(valor):
+    cedula = str(valor).strip()
+    # Excel guarda los números como float
+    return cedula[:-2] if cedula.endswith('.0') else cedula
+
+
+def _fecha(valor):
+    if isinstance(valor, datetime):
+        return valor.date()
+    if isinstance(valor, date):
+        return valor
+    texto = str(valor).strip()
+    if not texto:
+        return None
+    for formato in ('%Y-%m-%d', '%d/%m/%Y', '%d-%m-%Y'):
+        try:
+            return datetime.strptime(texto, formato).date()
+        except ValueError:
+            continue
+    raise ValueError(f'fecha de nacimiento no válida: {texto}')
+
+
+def _usuario_base(nombre, apellido):
+    base = re.sub(r'[^a-z0-9]', '', _normalizar(nombre)) + '.' + re.sub(r'[^a-z0-9]', '', _normalizar(apellido))
+    return base.strip('.')[:140] or 'jugador'
+
+
+def _generar_usuarios(filas, reservados):
+    """
+    Usuarios para las filas que no lo traen: nombre.apellido, con sufijo
+    numérico si ya existe. Cada ronda comprueba todos los candidatos con una
+    sola consulta. Devuelve {número de fila: usuario}.
+    """
+    pendientes = {
+        n: _usuario_base(f['nombre'], f['apellido'])
+        for n, f in enumerate(filas, start=2) if not str(f['usuario']).strip()
+    }
+    sufijos = dict.fromkeys(pendientes, 1)
+    asignados, tomados = {}, set(reservados)
+    while pendientes:
+        candidatos = {n: base if sufijos[n] == 1 else f'{base}{sufijos[n]}' for n, base in pendientes.items()}
+        ocupados = set(User.objects.filter(username__in=candidatos.values()).values_list('username', flat=True))
+        for n, candidato in candidatos.items():
+            if candidato in ocupados or candidato in tomados:
+                sufijos[n] += 1
+                continue
+            asignados[n] = candidato
+            tomados.add(candidato)
+            del pendientes[n]
+    return asignados
+
+
+def _problema_usuario(usuario):
+    """
+    Motivo por el que `usuario` no vale como nombre de usuario, o ''. bulk_create
+    no valida los modelos, así que se aplican aquí el validador y la longitud de User.
+    """
+    maximo = User._meta.get_field('username').max_length
+    if len(usuario) > maximo:
+        return f'el usuario {usuario[:20]}… supera los {maximo} caracteres'
+    try:
+        User.username_validator(usuario)
+    except ValidationError:
+        return f'el usuario {usuario} solo puede tener letras, números y @ . + - _'
+    return ''
+
+
+def _problema_cedulas_generadas(cantidad):
+    """
+    Motivo por el que no se pueden generar `cantidad` cédulas provisionales
+    (`generar_cedula` usa el id del usuario que aún no existe), o ''.
+    """
+    if not cantidad:
+        return ''
+    ultimo = User.objects.order_by('-pk').values_list('pk', flat=True).first() or 0
+    try:
+        desde, hasta = generar_cedula(ultimo), generar_cedula(ultimo + cantidad)
+    except ValueError:
+        return 'no quedan cédulas provisionales libres; indica la cédula'
+    # Solo una cédula escrita a mano con la forma de las generadas podría chocar
+    if Jugador.objects.filter(cedula__gt=desde, cedula__lte=hasta, cedula__startswith='G').exists():
+        return 'ya hay cédulas provisionales en el rango que tocaría; indica la cédula'
+    return ''
+
+
+def validar(filas):
+    """
+    Valida las filas en memoria. Devuelve (validas, errores): `validas` son dicts
+    con valores ya convertidos y `errores` una lista de (número de fila, mensaje).
+    """
+    cedulas = {_cedula(f['cedula']) for f in filas} - {''}
+    usuarios_archivo = {str(f['usuario']).strip() for f in filas if str(f['usuario']).strip()}
+    cedulas_existentes = set(Jugador.objects.filter(cedula__in=cedulas).values_list('cedula', flat=True))
+    usuarios_existentes = set(User.objects.filter(username__in=usuarios_archivo).values_list('username', flat=True))
+    equipos = {_normalizar(e.nombre): e for e in referencia.equipos()}
+    posiciones = {_normalizar(p): p for p in POSICIONES}
+
+    generados = _generar_usuarios(filas, usuarios_archivo)
+    sin_cedula = _problema_cedulas_generadas(sum(1 for f in filas if not _cedula(f['cedula'])))
+    validas, errores = [], []
+    cedulas_vistas, usuarios_vistos = set(), set()
+    for n, fila in enumerate(filas, start=2):
+        problemas = []
+        nombre = str(fila['nombre']).strip()
+        apellido = str(fila['apellido']).strip()
+        if not nombre or not apellido:
+            problemas.append('nombre y apellido son obligatorios')
+        cedula = _cedula(fila['cedula'])
+        if cedula:
+            if not cedula.isdigit() or len(cedula) > 8:
+                problemas.append(f'cédula no válida: {cedula}')
+            elif cedula in cedulas_existentes:
+                problemas.append(f'la cédula {cedula} ya está registrada')
+            elif cedula in cedulas_vistas:
+                problemas.append(f'la cédula {cedula} está repetida en el fichero')
+            cedulas_vistas.add(cedula)
+        elif sin_cedula:
+            problemas.append(sin_cedula)
+        try:
+            fecha = _fecha(fila['fecha_de_nacimiento'])
+        except ValueError as exc:
+            problemas.append(str(exc))
+            fecha = None
+        posicion = ''
+        if str(fila['posicion']).strip():
+            posicion = posiciones.get(_normalizar(fila['posicion']))
+            if posicion is None:
+                problemas.append(f"posición desconocida: {fila['posicion']}")
+        numero = None
+        if str(fila['numero']).strip():
+            try:
+                numero = int(float(str(fila['numero']).strip()))
+            except (ValueError, OverflowError):
+                problemas.append(f"número de camiseta no válido: {fila['numero']}")
+        equipo = None
+        if str(fila['equipo']).strip():
+            equipo = equipos.get(_normalizar(fila['equipo']))
+            if equipo is None:
+                problemas.append(f"equipo desconocido: {fila['equipo']}")
+        usuario = str(fila['usuario']).strip()
+        if usuario:
+            problema_usuario = _problema_usuario(usuario)
+            if problema_usuario:
+                problemas.append(problema_usuario)
+            elif usuario in usuarios_existentes:
+                problemas.append(f'el usuario {usuario} ya existe')
+            elif usuario in usuarios_vistos:
+                problemas.append(f'el usuario {usuario} está repetido en el fichero')
+        else:
+            usuario = generados[n]
+        usuarios_vistos.add(usuario)
+
+        if problemas:
+            errores.append((n, '; '.join(problemas)))
+            continue
+        validas.append({
+            'usuario': usuario,
+            'nombre': nombre,
+            'apellido': apellido,
+            'cedula': cedula,
+            'fecha_de_nacimiento': fecha,
+            'posicion': posicion,
+            'numero_de_camiseta': numero,
+            'equipo': equipo,
+        })
+    return validas, errores
+
+
+def _iniciar_proceso():
+    # Con el método 'spawn' los procesos hijos no heredan Django configurado
+    import django
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
+    django.setup()
+
+
+def _cifrar(clave, iteraciones=None):
+    hasher = get_hasher('default')
+    if iteraciones and isinstance(hasher, PBKDF2PasswordHasher):
+        return hasher.encode(clave, hasher.salt(), iteraciones)
+    return hasher.encode(clave, hasher.salt())
+
+
+def cifrar_claves(claves):
+    """
+    Cifra `claves` con el hasher por defecto, en un pool de procesos si son
+    muchas y hay más de un núcleo.
+
+    Las contraseñas generadas son aleatorias (~57 bits), así que se cifran con
+    `IMPORTACION_ITERACIONES_PBKDF2` iteraciones; Django las vuelve a cifrar con
+    el coste completo en el primer inicio de sesión (`must_update`).
+    """
+    cifrar = partial(_cifrar, iteraciones=settings.IMPORTACION_ITERACIONES_PBKDF2)
+    procesos = settings.IMPORTACION_PROCESOS or os.cpu_count() or 1
+    if len(claves) < settings.IMPORTACION_MIN_PARALELO or procesos < 2:
+        return [cifrar(c) for c in claves]
+    with ProcessPoolExecutor(max_workers=procesos, initializer=_iniciar_proceso) as pool:
+        return list(pool.map(cifrar, claves, chunksize=max(1, len(claves) // (procesos * 4))))
+
+
+def importar(validas):
+    """
+    Crea los jugadores de `validas` (salida de `validar`). Devuelve la lista de
+    credenciales: dicts con usuario, contraseña, nombre, apellido y cédula.
+    """
+    claves = [''.join(secrets.choice(ALFABETO_CLAVES) for _ in range(10)) for _ in validas]
+    cifradas = cifrar_claves(claves)
+    grupo = referencia.grupo_jugadores()
+    with transaction.atomic():
+        # bulk_create no emite post_save: la señal de perfiles no interviene
+        usuarios = User.objects.bulk_create([
+            User(username=f['usuario'], first_name=f['nombre'][:150], last_name=f['apellido'][:150], password=cifrada)
+            for f, cifrada in zip(validas, cifradas)
+        ])
+        generadas = {usuario.pk: generar_cedula(usuario.pk) for f, usuario in zip(validas, usuarios) if not f['cedula']}
+        # `validar` ya comprobó el rango; esto cubre lo creado entretanto en otra petición
+        ocupadas = sorted(Jugador.objects.filter(cedula__in=generadas.values()).values_list('cedula', flat=True))
+        if ocupadas:
+            raise ValidationError(f"Las cédulas provisionales {', '.join(ocupadas)} ya están registradas; vuelve a intentarlo.")
+        jugadores = []
+        for f, usuario in zip(validas, usuarios):
+            jugador = Jugador(
+                user=usuario,
+                nombre=f['nombre'],
+                apellido=f['apellido'],
+                cedula=f['cedula'] or generadas[usuario.pk],
+                fecha_de_nacimiento=f['fecha_de_nacimiento'],
+                posicion=f['posicion'],
+                numero_de_camiseta=f['numero_de_camiseta'],
+                equipo=f['equipo'],
+            )
+            # bulk_create no pasa por Jugador.save()
+            jugador.edad = jugador.calcular_edad()
+            jugadores.append(jugador)
+        Jugador.objects.bulk_create(jugadores)
+        User.groups.through.objects.bulk_create([
+            User.groups.through(user_id=u.pk, group_id=grupo.pk) for u in usuarios
+        ])
+    for usuario in usuarios:
+        marcar_aprovisionado(usuario.pk)
+    # Jugadores nuevos en equipos inscritos: cambia la elegibilidad de sus torneos
+    elegibilidad.invalidar()
+    return [
+        {'usuario': u.username, 'clave': clave, 'nombre': j.nombre, 'apellido': j.apellido, 'cedula': j.cedula}
+        for u, j, clave in zip(usuarios, jugadores, claves)
+    ]
+
+
+def informe_credenciales(credenciales):
+    """CSV con las credenciales generadas, para descargar y repartir."""
+    salida = io.StringIO()
+    escritor = csv.writer(salida)
+    escritor.writerow(['usuario', 'contraseña', 'nombre', 'apellido', 'cédula'])
+    for c in credenciales:
+        escritor.writerow([c['usuario'], c['clave'], c['nombre'], c['apellido'], c['cedula']])
+    return salida.getvalue()
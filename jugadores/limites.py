@@ -0,0 +1,110 @@
+"""Limitación de escrituras por token bucket.
+
+`LimiteEscriturasMiddleware` aplica, a las vistas listadas por nombre de URL
+en `settings.LIMITES_ESCRITURA`, un cubo de fichas por usuario y otro por IP
+(con su propio límite, `ip_capacidad`/`ip_por_minuto`, mucho más alto porque
+muchos usuarios comparten IP tras una NAT) guardados en la caché 'compartida' (la misma para todos los workers; en la de
+cada proceso el límite real se multiplicaría por su número). Si cualquiera de los dos está vacío la petición se
+corta con 429 y `Retry-After` antes de llegar a la vista (y a la base de
+datos). Los rechazos se cuentan por vista en la caché.
+
+Detrás de un proxy (Render) REMOTE_ADDR es el proxy: la IP del cliente es la
+que añade el último proxy de confianza a X-Forwarded-For, contando desde la
+derecha `LIMITES_PROXIES_DE_CONFIANZA` saltos. Las entradas de la izquierda las
+puede escribir el propio cliente y no se usan.
+
+El cubo se lee y escribe sin bloqueo, por lo que con varios workers el límite
+es aproximado; es suficiente para frenar scripts que inundan los votos.
+"""
+import math
+import time
+
+from django.conf import settings
+from django.contrib.auth import SESSION_KEY
+from django.core.cache import caches
+from django.http import HttpResponse
+
+PREFIJO = 'limite'
+
+
+def ip_cliente(request):
+    proxies = settings.LIMITES_PROXIES_DE_CONFIANZA
+    if proxies:
+        saltos = [salto.strip() for salto in request.META.get('HTTP_X_FORWARDED_FOR', '').split(',') if salto.strip()]
+        if len(saltos) >= proxies:
+            return saltos[-proxies]
+    return request.META.get('REMOTE_ADDR', '')
+
+
+def consumir(clave, capacidad, por_minuto, ahora=None):
+    """
+    Intenta sacar una ficha del cubo `clave`. Devuelve 0 si se permitió o los
+    segundos hasta que haya una ficha disponible.
+    """
+    ahora = time.time() if ahora is None else ahora
+    cache = caches['compartida']
+    recarga = por_minuto / 60.0
+    fichas, instante = cache.get(clave, (capacidad, ahora))
+    fichas = min(capacidad, fichas + (ahora - instante) * recarga)
+    # El cubo caduca cuando estaría lleno de nuevo: no hace falta guardarlo más
+    caducidad = max(1, math.ceil(capacidad / recarga))
+    if fichas >= 1:
+        cache.set(clave, (fichas - 1, ahora), caducidad)
+        return 0
+    cache.set(clave, (fichas, ahora), caducidad)
+    return max(1, math.ceil((1 - fichas) / recarga))
+
+
+def _clave_rechazos(nombre):
+    return f'{PREFIJO}:rechazos:{nombre}'
+
+
+def registrar_rechazo(nombre):
+    cache = caches['compartida']
+    clave = _clave_rechazos(nombre)
+    cache.add(clave, 0, None)
+    try:
+        cache.incr(clave)
+    except ValueError:
+        cache.set(clave, 1, None)
+
+
+def rechazos():
+    """Contador de peticiones rechazadas por cada vista configurada."""
+    return {nombre: caches['compartida'].get(_clave_rechazos(nombre), 0) for nombre in settings.LIMITES_ESCRITURA}
+
+
+class LimiteEscriturasMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        return self.get_response(request)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if request.method not in ('POST', 'PUT', 'PATCH', 'DELETE'):
+            return None
+        nombre = request.resolver_match.url_name if request.resolver_match else None
+        conf = settings.LIMITES_ESCRITURA.get(nombre)
+        if not conf:
+            return None
+
+        cubos = [(
+            f'{PREFIJO}:{nombre}:ip:{ip_cliente(request)}',
+            conf.get('ip_capacidad', conf['capacidad']),
+            conf.get('ip_por_minuto', conf['por_minuto']),
+        )]
+        # Identificar al usuario por la sesión para no consultar auth_user en cada petición
+        usuario_id = request.session.get(SESSION_KEY) if hasattr(request, 'session') else None
+        if usuario_id:
+            cubos.append((f'{PREFIJO}:{nombre}:usuario:{usuario_id}', conf['capacidad'], conf['por_minuto']))
+        espera = max(consumir(clave, capacidad, por_minuto) for clave, capacidad, por_minuto in cubos)
+        if not espera:
+            return None
+        # Solo ante un rechazo se mira si es staff (p. ej. registrando tarjetas)
+        if conf.get('excluir_staff', True) and getattr(request, 'user', None) is not None and request.user.is_staff:
+            return None
+        registrar_rechazo(nombre)
+        respuesta = HttpResponse('Demasiadas solicitudes. Intenta de nuevo en unos segundos.', status=429, content_type='text/plain; charset=utf-8')
+        respuesta['Retry-After'] = str(espera)
+        return respuesta
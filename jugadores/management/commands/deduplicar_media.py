@@ -0,0 +1,127 @@
+import os
+from collections import defaultdict
+
+from django.apps import apps
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from jugadores.almacenamiento import PREFIJO, AlmacenamientoDeduplicado, huella_fichero
+from jugadores.models import ArchivoMedia
+
+
+def _campos_deduplicados():
+    for modelo in apps.get_models():
+        for campo in modelo._meta.get_fields():
+            if isinstance(getattr(campo, 'storage', None), AlmacenamientoDeduplicado):
+                yield modelo, campo
+
+
+def _recorrer(raiz, excluir):
+    """Rutas de todos los ficheros bajo `raiz` salvo el directorio `excluir` (con scandir)."""
+    pendientes = [raiz]
+    while pendientes:
+        with os.scandir(pendientes.pop()) as entradas:
+            for entrada in entradas:
+                if entrada.is_dir(follow_symlinks=False):
+                    if entrada.path != excluir:
+                        pendientes.append(entrada.path)
+                elif entrada.is_file(follow_symlinks=False):
+                    yield entrada.path
+
+
+class Command(BaseCommand):
+    help = (
+        'Pasa los ficheros de los campos con almacenamiento deduplicado a nombres por SHA-256, '
+        'sustituye por enlaces duros las copias idénticas del resto de media/ y recuenta las '
+        'referencias (ver jugadores/almacenamiento.py).'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help='Solo informa de lo que haría.')
+
+    def handle(self, *args, **options):
+        simulacion = options['dry_run']
+        raiz = os.path.realpath(settings.MEDIA_ROOT)
+        ahorro = 0
+
+        # 1. Campos con almacenamiento deduplicado: mover sus ficheros a cas/ y actualizar las filas
+        usados = set()
+        antiguos = set()
+        for modelo, campo in _campos_deduplicados():
+            storage = campo.storage
+            cambios = []
+            for pk, nombre in modelo._default_manager.exclude(**{campo.name: ''}).exclude(**{f'{campo.name}__isnull': True}).values_list('pk', campo.name).iterator():
+                if nombre.startswith(PREFIJO) or not storage.exists(nombre):
+                    continue
+                ruta = storage.path(nombre)
+                usados.add(os.path.realpath(ruta))
+                if simulacion:
+                    self.stdout.write(f'{modelo.__name__} {pk}: {nombre} -> {PREFIJO}…')
+                    continue
+                nuevo, _huella, tamano = storage.importar(ruta)
+                cambios.append(modelo(pk=pk, **{campo.attname: nuevo}))
+                antiguos.add(ruta)
+            if cambios:
+                with transaction.atomic():
+                    modelo._default_manager.bulk_update(cambios, [campo.attname], batch_size=500)
+                self.stdout.write(f'{modelo.__name__}.{campo.name}: {len(cambios)} fichero(s) pasados a {PREFIJO}')
+
+        # 2. Recontar referencias de cas/ según las filas que las usan
+        if not simulacion:
+            conteo = defaultdict(int)
+            for modelo, campo in _campos_deduplicados():
+                for nombre in modelo._default_manager.filter(**{f'{campo.name}__startswith': PREFIJO}).values_list(campo.name, flat=True).iterator():
+                    conteo[nombre] += 1
+            storage = AlmacenamientoDeduplicado()
+            with transaction.atomic():
+                ArchivoMedia.objects.exclude(nombre__in=list(conteo)).update(referencias=0)
+                ArchivoMedia.objects.bulk_create(
+                    [
+                        ArchivoMedia(nombre=nombre, sha256=os.path.splitext(os.path.basename(nombre))[0], tamano=storage.size(nombre), referencias=cantidad)
+                        for nombre, cantidad in conteo.items() if storage.exists(nombre)
+                    ],
+                    update_conflicts=True,
+                    unique_fields=['nombre'],
+                    update_fields=['referencias'],
+                    batch_size=500,
+                )
+            # Los originales ya pasados a cas/ sobran una vez confirmadas las filas
+            for ruta in antiguos:
+                ahorro += os.path.getsize(ruta) if os.stat(ruta).st_nlink == 1 else 0
+                os.remove(ruta)
+
+        # 3. Resto de media/ (sin campo que lo gestione): copias idénticas -> enlaces duros a la primera
+        por_huella = defaultdict(list)
+        por_tamano = defaultdict(list)
+        for ruta in _recorrer(raiz, os.path.join(raiz, PREFIJO.rstrip('/'))):
+            if os.path.realpath(ruta) not in usados:
+                por_tamano[os.path.getsize(ruta)].append(ruta)
+        for tamano, rutas in por_tamano.items():
+            # Solo se calcula el hash de los ficheros que comparten tamaño con otro
+            if len(rutas) > 1 and tamano:
+                for ruta in rutas:
+                    por_huella[huella_fichero(ruta)].append(ruta)
+        enlazados = 0
+        for rutas in por_huella.values():
+            original = min(rutas)
+            for copia in rutas:
+                if copia == original or os.path.samefile(copia, original):
+                    continue
+                tamano_copia = os.path.getsize(copia)
+                if simulacion:
+                    enlazados += 1
+                    ahorro += tamano_copia
+                    self.stdout.write(f'{os.path.relpath(copia, raiz)} = {os.path.relpath(original, raiz)}')
+                    continue
+                temporal = f'{copia}.enlace'
+                try:
+                    os.link(original, temporal)
+                except OSError as error:
+                    self.stderr.write(f'No se pudo enlazar {copia}: {error}')
+                    continue
+                os.replace(temporal, copia)
+                enlazados += 1
+                ahorro += tamano_copia
+        accion = 'Se enlazarían' if simulacion else 'Enlazadas'
+        self.stdout.write(self.style.SUCCESS(f'{accion} {enlazados} copia(s); {ahorro / 1024:.0f} KiB liberados.'))
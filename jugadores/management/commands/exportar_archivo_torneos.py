@@ -0,0 +1,39 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from jugadores import archivo
+from jugadores.models import Torneo
+
+
+class Command(BaseCommand):
+    help = 'Exporta a HTML/JSON estático el archivo de los torneos finalizados (fecha_fin pasada).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('torneo_ids', nargs='*', type=int, help='IDs de torneos a exportar (por defecto, todos los finalizados).')
+        parser.add_argument('--forzar', action='store_true', help='Regenerar aunque el torneo ya tenga instantánea.')
+        parser.add_argument('--eliminar', action='store_true', help='Eliminar las instantáneas en lugar de generarlas.')
+
+    def handle(self, *args, **options):
+        torneos = Torneo.objects.all()
+        if options['torneo_ids']:
+            torneos = torneos.filter(pk__in=options['torneo_ids'])
+            faltantes = set(options['torneo_ids']) - set(torneos.values_list('pk', flat=True))
+            if faltantes:
+                raise CommandError(f'Torneos inexistentes: {sorted(faltantes)}')
+
+        exportados = 0
+        for torneo in torneos.order_by('pk'):
+            if options['eliminar']:
+                archivo.eliminar_archivo(torneo.pk)
+                self.stdout.write(f'Eliminado archivo de {torneo}')
+                continue
+            if not archivo.torneo_finalizado(torneo):
+                if options['torneo_ids']:
+                    self.stdout.write(self.style.WARNING(f'{torneo}: aún no ha finalizado, se omite.'))
+                continue
+            if archivo.leer_manifiesto(torneo.pk) and not options['forzar']:
+                continue
+            manifiesto = archivo.exportar_torneo(torneo)
+            exportados += 1
+            self.stdout.write(f"{torneo}: {len(manifiesto['paginas'])} ficheros (versión {manifiesto['version']})")
+        if not options['eliminar']:
+            self.stdout.write(self.style.SUCCESS(f'{exportados} torneo(s) exportados.'))
@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand
+
+from jugadores import huellas
+from jugadores.models import Pago
+
+
+class Command(BaseCommand):
+    help = (
+        'Calcula la huella visual de los comprobantes que no la tienen y vuelve a generar el '
+        'índice de bandas y las sospechas de duplicado (ver jugadores/huellas.py).'
+    )
+
+    def handle(self, *args, **options):
+        calculadas = 0
+        sin_huella = Pago.objects.filter(huella_visual__isnull=True).exclude(comprobante='').exclude(comprobante__isnull=True)
+        for pago in sin_huella.only('id', 'comprobante').iterator(chunk_size=200):
+            if not pago.comprobante.storage.exists(pago.comprobante.name):
+                continue
+            with pago.comprobante.open('rb') as fichero:
+                huella = huellas.huella_de_fichero(fichero)
+            if huella is not None:
+                Pago.objects.filter(pk=pago.pk).update(huella_visual=huellas.a_texto(huella))
+                calculadas += 1
+        self.stdout.write(f'{calculadas} huella(s) calculadas.')
+
+        # En orden de id: cada pago se compara con los ya indexados (los anteriores)
+        sospechas = 0
+        for pago in Pago.objects.only('id', 'huella_visual').order_by('pk').iterator(chunk_size=500):
+            if huellas.registrar(pago):
+                sospechas += 1
+        self.stdout.write(self.style.SUCCESS(f'{sospechas} pago(s) marcados como posible duplicado.'))
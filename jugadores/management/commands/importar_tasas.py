@@ -0,0 +1,25 @@
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+
+from jugadores import reportes
+
+
+class Command(BaseCommand):
+    help = (
+        'Carga tasas de cambio (bolívares por dólar) desde un CSV local con columnas '
+        'fecha y tasa, y recalcula el equivalente en USD de los pagos afectados.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('archivo', help='Ruta del CSV (UTF-8, separado por comas o punto y coma)')
+        parser.add_argument('--fuente', default='archivo', help='Texto que se guarda como fuente de las tasas')
+
+    def handle(self, *args, **options):
+        try:
+            with open(options['archivo'], encoding='utf-8-sig') as archivo:
+                cargadas = reportes.importar_tasas(archivo, fuente=options['fuente'])
+        except OSError as exc:
+            raise CommandError(f'No se pudo leer el archivo: {exc}')
+        except ValidationError as exc:
+            raise CommandError(exc.messages[0])
+        self.stdout.write(self.style.SUCCESS(f'{cargadas} tasa(s) cargadas.'))
@@ -0,0 +1,147 @@
+import os
+import time
+from urllib.parse import unquote, urlparse
+
+from django.apps import apps
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import models, transaction
+
+from jugadores.almacenamiento import PREFIJO
+from jugadores.models import ArchivoMedia
+
+TAMANO_CONSULTA = 2000
+
+
+def _normalizar(nombre):
+    return os.path.normpath(nombre).replace(os.sep, '/')
+
+
+def referencias():
+    """
+    Nombres de media usados por la base de datos: los de todos los FileField e
+    ImageField y las URLField que apuntan a MEDIA_URL. Se leen como valores
+    (sin instanciar modelos) y por trozos.
+    """
+    usados = set()
+    for modelo in apps.get_models():
+        for campo in modelo._meta.concrete_fields:
+            if not isinstance(campo, (models.FileField, models.URLField)):
+                continue
+            filas = modelo._base_manager.exclude(**{f'{campo.attname}__isnull': True}).exclude(**{campo.attname: ''})
+            if isinstance(campo, models.FileField):
+                usados.update(_normalizar(nombre) for nombre in filas.values_list(campo.attname, flat=True).iterator(chunk_size=TAMANO_CONSULTA))
+            elif isinstance(campo, models.URLField):
+                filas = filas.filter(**{f'{campo.attname}__contains': settings.MEDIA_URL})
+                for url in filas.values_list(campo.attname, flat=True).iterator(chunk_size=TAMANO_CONSULTA):
+                    ruta = unquote(urlparse(url).path)
+                    if ruta.startswith(settings.MEDIA_URL):
+                        usados.add(_normalizar(ruta[len(settings.MEDIA_URL):]))
+    return usados
+
+
+def en_uso(nombres):
+    """
+    De `nombres`, los que ahora mismo usa algún FileField o tienen referencias
+    en ArchivoMedia. Se vuelve a mirar justo antes de borrar porque una subida
+    idéntica puede haber reutilizado un fichero de cas/ durante el recorrido.
+    """
+    usados = set(ArchivoMedia.objects.filter(nombre__in=nombres, referencias__gt=0).values_list('nombre', flat=True))
+    for modelo in apps.get_models():
+        for campo in modelo._meta.concrete_fields:
+            if isinstance(campo, models.FileField):
+                usados.update(modelo._base_manager.filter(**{f'{campo.attname}__in': nombres}).values_list(campo.attname, flat=True))
+    return usados
+
+
+def recorrer(raiz):
+    """(nombre relativo, entrada) de cada fichero bajo `raiz`, con scandir y sin recursión."""
+    pendientes = ['']
+    while pendientes:
+        relativo = pendientes.pop()
+        with os.scandir(os.path.join(raiz, relativo)) as entradas:
+            for entrada in entradas:
+                nombre = f'{relativo}/{entrada.name}' if relativo else entrada.name
+                if entrada.is_dir(follow_symlinks=False):
+                    pendientes.append(nombre)
+                elif entrada.is_file(follow_symlinks=False):
+                    yield nombre, entrada
+
+
+class Command(BaseCommand):
+    help = (
+        'Busca en MEDIA_ROOT los ficheros que ningún FileField/ImageField (ni URLField a MEDIA_URL) '
+        'referencia y los borra por lotes. Con --dry-run solo informa.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help='Solo informa de lo que borraría.')
+        parser.add_argument('--lote', type=int, default=500, help='Ficheros por lote de borrado.')
+        parser.add_argument(
+            '--min-horas', type=float, default=24,
+            help='No tocar ficheros más recientes (subidas cuyo registro aún no se ha guardado).',
+        )
+
+    def handle(self, *args, **options):
+        raiz = settings.MEDIA_ROOT
+        if not os.path.isdir(raiz):
+            self.stdout.write('MEDIA_ROOT no existe; nada que limpiar.')
+            return
+        simulacion = options['dry_run']
+        limite = time.time() - options['min_horas'] * 3600
+        usados = referencias()
+        self.stdout.write(f'{len(usados)} fichero(s) referenciados en la base de datos.')
+
+        lote = []
+        huerfanos = 0
+        bytes_huerfanos = 0
+        for nombre, entrada in recorrer(raiz):
+            if nombre in usados:
+                continue
+            estado = entrada.stat(follow_symlinks=False)
+            if estado.st_mtime > limite:
+                continue
+            huerfanos += 1
+            bytes_huerfanos += estado.st_size
+            if options['verbosity'] > 1 or simulacion:
+                self.stdout.write(nombre)
+            if not simulacion:
+                lote.append(nombre)
+                if len(lote) >= options['lote']:
+                    self._borrar(raiz, lote, limite)
+                    lote = []
+        if lote:
+            self._borrar(raiz, lote, limite)
+        accion = 'Se borrarían' if simulacion else 'Borrados'
+        self.stdout.write(self.style.SUCCESS(f'{accion} {huerfanos} fichero(s) huérfanos ({bytes_huerfanos / 1024 / 1024:.1f} MiB).'))
+
+    def _borrar(self, raiz, nombres, limite):
+        directorios = set()
+        direccionados = [n for n in nombres if n.startswith(PREFIJO)]
+        with transaction.atomic():
+            reutilizados = en_uso(direccionados) if direccionados else set()
+            for nombre in nombres:
+                if nombre in reutilizados:
+                    continue
+                ruta = os.path.join(raiz, nombre)
+                try:
+                    # Un fichero de cas/ reutilizado por una subida en curso tiene la fecha renovada
+                    if os.stat(ruta).st_mtime > limite:
+                        reutilizados.add(nombre)
+                        continue
+                    os.remove(ruta)
+                except FileNotFoundError:
+                    pass
+                directorios.add(os.path.dirname(nombre))
+            # Los ficheros de cas/ borrados ya no tienen ninguna fila que los use
+            ArchivoMedia.objects.filter(nombre__in=[n for n in direccionados if n not in reutilizados], referencias=0).delete()
+        if reutilizados:
+            self.stdout.write(f'{len(reutilizados)} fichero(s) reutilizados durante la limpieza; se conservan.')
+        for directorio in sorted(directorios, key=len, reverse=True):
+            while directorio:
+                try:
+                    os.rmdir(os.path.join(raiz, directorio))
+                except OSError:
+                    break  # no está vacío
+                directorio = os.path.dirname(directorio)
+        self.stdout.write(f'Lote de {len(nombres)} fichero(s) borrado.')
@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from jugadores import acumulados
+
+
+class Command(BaseCommand):
+    help = (
+        'Rehace desde los datos originales los acumulados diarios y semanales de pagos, '
+        'goles y tarjetas (ver jugadores/acumulados.py).'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--metrica', action='append', choices=acumulados.METRICAS,
+            help='Métrica a reconstruir (se puede repetir); por defecto todas.',
+        )
+
+    def handle(self, *args, **options):
+        metricas = options['metrica'] or acumulados.METRICAS
+        filas = acumulados.reconstruir(metricas)
+        self.stdout.write(self.style.SUCCESS(f"{filas} acumulado(s) de {', '.join(metricas)}."))
@@ -0,0 +1,40 @@
+import signal
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from jugadores import tareas
+
+
+class Command(BaseCommand):
+    help = (
+        'Ejecuta las tareas en segundo plano de la cola en base de datos con un pool de hilos '
+        'o de procesos (ver jugadores/tareas.py). SIGTERM o Ctrl+C terminan lo que está en curso y salen.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--concurrencia', type=int, default=4, help='Tareas a la vez.')
+        parser.add_argument('--procesos', action='store_true', help='Pool de procesos en vez de hilos (tareas de CPU).')
+        parser.add_argument('--intervalo', type=float, default=1.0, help='Segundos entre consultas si no hay trabajo.')
+        parser.add_argument('--una-vez', action='store_true', help='Ejecuta lo que ya venció en este proceso y termina (para cron).')
+
+    def handle(self, *args, **options):
+        if not settings.TAREAS_ACTIVAS:
+            self.stderr.write(self.style.WARNING(
+                'TAREAS_ACTIVAS está desactivado: las tareas se ejecutan al encolarse y aquí solo llegan las programadas.'
+            ))
+        trabajador = tareas.Trabajador(options['concurrencia'], options['procesos'], options['intervalo'])
+        if options['una_vez']:
+            ejecutadas = trabajador.una_vez()
+            self.stdout.write(self.style.SUCCESS(f'{ejecutadas} tarea(s) ejecutada(s).'))
+            return
+
+        def parar(_senal, _marco):
+            self.stdout.write('Deteniendo: se espera a las tareas en curso...')
+            trabajador.detener.set()
+        signal.signal(signal.SIGTERM, parar)
+        signal.signal(signal.SIGINT, parar)
+        tipo = 'procesos' if options['procesos'] else 'hilos'
+        self.stdout.write(f"Trabajador {trabajador.nombre} con {trabajador.concurrencia} {tipo}.")
+        trabajador.bucle()
+        self.stdout.write(self.style.SUCCESS('Trabajador detenido.'))
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from jugadores import multas
+
+
+class Command(BaseCommand):
+    help = (
+        'Genera las multas de las tarjetas que aún no la tienen, anula las de tarjetas '
+        'anuladas y recalcula el saldo de todos los jugadores (ver jugadores/multas.py).'
+    )
+
+    def handle(self, *args, **options):
+        creados, anulados, reactivados = multas.sincronizar_tarjetas()
+        self.stdout.write(f'Cargos creados: {creados}, anulados: {anulados}, reactivados: {reactivados}')
+        saldos = multas.recalcular_todos()
+        self.stdout.write(self.style.SUCCESS(f'{saldos} saldo(s) recalculados.'))
@@ -0,0 +1,38 @@
+import sqlite3
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from config.routers import alias_replicas
+
+
+class Command(BaseCommand):
+    help = (
+        'Copia la base SQLite `default` sobre las réplicas SQLite (pruebas locales del '
+        'enrutado de lecturas). Las réplicas de otros motores las mantiene su replicación.'
+    )
+
+    def handle(self, *args, **options):
+        replicas = alias_replicas()
+        if not replicas:
+            raise CommandError('No hay réplicas configuradas (DATABASE_REPLICA_URLS).')
+        origen_conf = settings.DATABASES['default']
+        if origen_conf['ENGINE'] != 'django.db.backends.sqlite3':
+            raise CommandError('La copia solo está disponible cuando `default` es SQLite.')
+        origen = sqlite3.connect(str(origen_conf['NAME']))
+        try:
+            for alias in replicas:
+                conf = settings.DATABASES[alias]
+                if conf['ENGINE'] != 'django.db.backends.sqlite3':
+                    self.stdout.write(self.style.WARNING(f'{alias}: no es SQLite, se omite.'))
+                    continue
+                destino = sqlite3.connect(str(conf['NAME']))
+                try:
+                    # API de copia en caliente: consistente aunque haya escrituras en curso
+                    origen.backup(destino)
+                finally:
+                    destino.close()
+                self.stdout.write(f"{alias}: copiada en {conf['NAME']}")
+        finally:
+            origen.close()
+        self.stdout.write(self.style.SUCCESS(f'{len(replicas)} réplica(s) sincronizadas.'))
@@ -0,0 +1,39 @@
+"""Middlewares propios del app jugadores."""
+from django.conf import settings
+from whitenoise.base import WhiteNoise
+from whitenoise.middleware import WhiteNoiseMiddleware
+
+
+class ArchivoTorneosMiddleware(WhiteNoiseMiddleware):
+    """
+    Sirve con WhiteNoise las instantáneas de torneos finalizados bajo
+    `ARCHIVO_TORNEOS_URL`. Los ficheros viven en directorios versionados por
+    hash de contenido, por lo que todos se marcan como inmutables.
+
+    Las exportaciones se generan en caliente (comando o señal), así que se
+    buscan en disco en cada petición del prefijo en vez de indexarlas al
+    arrancar; el resto de rutas pasa de largo sin coste.
+    """
+
+    def __init__(self, get_response=None):
+        self.get_response = get_response
+        WhiteNoise.__init__(
+            self,
+            application=None,
+            autorefresh=True,
+            max_age=WhiteNoise.FOREVER,
+            index_file=True,
+        )
+        self.use_finders = False
+        self.prefix = settings.ARCHIVO_TORNEOS_URL
+        self.add_files(f'{settings.ARCHIVO_TORNEOS_ROOT}/publico', prefix=self.prefix)
+
+    def __call__(self, request):
+        if request.path_info.startswith(self.prefix):
+            static_file = self.find_file(request.path_info)
+            if static_file is not None:
+                return self.serve(static_file, request)
+        return self.get_response(request)
+
+    def immutable_file_test(self, path, url):
+        return True
@@ -0,0 +1,61 @@
+# Generated by Django 5.2.5 on 2026-10-19 12:38
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('jugadores', '0025_remove_equipo_logo_remove_jugador_foto_de_perfil'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Encuesta',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('pregunta', models.CharField(max_length=200, verbose_name='pregunta')),
+                ('tipo', models.CharField(choices=[('jugador_partido', 'Jugador del Partido'), ('camiseta', 'Camiseta'), ('otra', 'Otra')], default='otra', max_length=20, verbose_name='tipo')),
+                ('activa', models.BooleanField(default=True, verbose_name='activa')),
+                ('fecha', models.DateTimeField(auto_now_add=True, verbose_name='fecha')),
+                ('cierre', models.DateTimeField(blank=True, null=True, verbose_name='cierre')),
+                ('partido', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='encuestas', to='jugadores.partido', verbose_name='partido')),
+            ],
+            options={
+                'verbose_name': 'Encuesta',
+                'verbose_name_plural': 'Encuestas',
+            },
+        ),
+        migrations.CreateModel(
+            name='OpcionEncuesta',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('texto', models.CharField(max_length=100, verbose_name='texto')),
+                ('votos', models.PositiveIntegerField(default=0, editable=False, verbose_name='votos')),
+                ('encuesta', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='opciones', to='jugadores.encuesta', verbose_name='encuesta')),
+                ('jugador', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to='jugadores.jugador', verbose_name='jugador')),
+            ],
+            options={
+                'verbose_name': 'Opción de encuesta',
+                'verbose_name_plural': 'Opciones de encuesta',
+            },
+        ),
+        migrations.CreateModel(
+            name='VotoEncuesta',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fecha', models.DateTimeField(auto_now_add=True, verbose_name='fecha')),
+                ('encuesta', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='votos', to='jugadores.encuesta', verbose_name='encuesta')),
+                ('opcion', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='papeletas', to='jugadores.opcionencuesta', verbose_name='opción')),
+                ('usuario', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL, verbose_name='usuario')),
+            ],
+            options={
+                'verbose_name': 'Voto de encuesta',
+                'verbose_name_plural': 'Votos de encuesta',
+                'constraints': [models.UniqueConstraint(fields=('encuesta', 'usuario'), name='un_voto_por_usuario_y_encuesta')],
+            },
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.5 on 2026-10-19 13:04
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('jugadores', '0026_encuestas'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='pago',
+            index=models.Index(fields=['referencia', 'metodo'], name='pago_referencia_metodo_idx'),
+        ),
+    ]
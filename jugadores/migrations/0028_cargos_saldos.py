@@ -0,0 +1,47 @@
+# Generated by Django 5.2.5 on 2026-10-19 13:07
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('jugadores', '0027_pago_referencia_idx'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SaldoJugador',
+            fields=[
+                ('jugador', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='saldo', serialize=False, to='jugadores.jugador', verbose_name='jugador')),
+                ('cargos', models.DecimalField(decimal_places=2, default=0, max_digits=10, verbose_name='cargos')),
+                ('pagos', models.DecimalField(decimal_places=2, default=0, max_digits=10, verbose_name='pagos')),
+                ('deuda', models.DecimalField(db_index=True, decimal_places=2, default=0, max_digits=10, verbose_name='deuda')),
+                ('actualizado', models.DateTimeField(auto_now=True, verbose_name='actualizado')),
+            ],
+            options={
+                'verbose_name': 'Saldo de jugador',
+                'verbose_name_plural': 'Saldos de jugadores',
+            },
+        ),
+        migrations.CreateModel(
+            name='Cargo',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('tipo', models.CharField(choices=[('tarjetas_amarilla', 'Tarjeta Amarilla'), ('tarjetas_roja', 'Tarjeta Roja')], max_length=20, verbose_name='tipo')),
+                ('monto', models.DecimalField(decimal_places=2, max_digits=8, verbose_name='monto')),
+                ('moneda', models.CharField(choices=[('VES', 'Bolívares (Bs)'), ('USD', 'Dólares (USD)')], default='USD', max_length=3, verbose_name='moneda')),
+                ('anulado', models.BooleanField(default=False, verbose_name='anulado')),
+                ('fecha', models.DateTimeField(auto_now_add=True, verbose_name='fecha')),
+                ('jugador', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='cargos', to='jugadores.jugador', verbose_name='jugador')),
+                ('partido', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='cargos', to='jugadores.partido', verbose_name='partido')),
+                ('tarjeta', models.OneToOneField(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='cargo', to='jugadores.tarjeta', verbose_name='tarjeta')),
+            ],
+            options={
+                'verbose_name': 'Cargo',
+                'verbose_name_plural': 'Cargos',
+                'indexes': [models.Index(fields=['jugador', 'anulado'], name='cargo_jugador_anulado_idx')],
+            },
+        ),
+    ]
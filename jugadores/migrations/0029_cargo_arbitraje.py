@@ -0,0 +1,22 @@
+# Generated by Django 5.2.5 on 2026-10-19 13:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('jugadores', '0028_cargos_saldos'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='cargo',
+            name='tipo',
+            field=models.CharField(choices=[('tarjetas_amarilla', 'Tarjeta Amarilla'), ('tarjetas_roja', 'Tarjeta Roja'), ('arbitraje', 'Arbitraje')], max_length=20, verbose_name='tipo'),
+        ),
+        migrations.AddConstraint(
+            model_name='cargo',
+            constraint=models.UniqueConstraint(condition=models.Q(('anulado', False), ('tipo', 'arbitraje')), fields=('jugador', 'partido'), name='un_arbitraje_por_jugador_y_partido'),
+        ),
+    ]
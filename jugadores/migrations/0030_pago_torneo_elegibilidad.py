@@ -0,0 +1,23 @@
+# Generated by Django 5.2.5 on 2026-10-19 13:13
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('jugadores', '0029_cargo_arbitraje'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='pago',
+            name='torneo',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='pagos', to='jugadores.torneo', verbose_name='torneo'),
+        ),
+        migrations.AddIndex(
+            model_name='pago',
+            index=models.Index(fields=['jugador', 'tipo', 'estado'], name='pago_jugador_tipo_estado_idx'),
+        ),
+    ]
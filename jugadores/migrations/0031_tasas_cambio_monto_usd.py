@@ -0,0 +1,61 @@
+# Generated by Django 5.2.5 on 2026-10-19 13:21
+
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def rellenar_equivalentes_y_mes(apps, schema_editor):
+    # Los pagos en dólares ya tienen su equivalente; los de bolívares esperan a que se carguen tasas
+    Pago = apps.get_model('jugadores', 'Pago')
+    Pago.objects.filter(moneda='USD').update(monto_usd=models.F('monto'))
+    pendientes = []
+    for pago in Pago.objects.only('id', 'fecha').iterator(chunk_size=2000):
+        pago.mes = timezone.localtime(pago.fecha).date().replace(day=1)
+        pendientes.append(pago)
+        if len(pendientes) >= 2000:
+            Pago.objects.bulk_update(pendientes, ['mes'])
+            pendientes = []
+    Pago.objects.bulk_update(pendientes, ['mes'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('jugadores', '0030_pago_torneo_elegibilidad'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TasaCambio',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fecha', models.DateField(unique=True, verbose_name='fecha')),
+                ('bs_por_usd', models.DecimalField(decimal_places=4, max_digits=14, verbose_name='bolívares por dólar')),
+                ('fuente', models.CharField(blank=True, default='', max_length=50, verbose_name='fuente')),
+            ],
+            options={
+                'verbose_name': 'Tasa de cambio',
+                'verbose_name_plural': 'Tasas de cambio',
+                'ordering': ['-fecha'],
+            },
+        ),
+        migrations.AddField(
+            model_name='pago',
+            name='mes',
+            field=models.DateField(blank=True, editable=False, null=True, verbose_name='mes'),
+        ),
+        migrations.AddField(
+            model_name='pago',
+            name='monto_usd',
+            field=models.DecimalField(blank=True, decimal_places=2, editable=False, max_digits=10, null=True, verbose_name='monto en USD'),
+        ),
+        migrations.AddIndex(
+            model_name='pago',
+            index=models.Index(fields=['fecha'], name='pago_fecha_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='pago',
+            index=models.Index(fields=['mes', 'tipo', 'metodo'], name='pago_mes_tipo_metodo_idx'),
+        ),
+        migrations.RunPython(rellenar_equivalentes_y_mes, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.2.5 on 2026-10-19 13:27
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('jugadores', '0031_tasas_cambio_monto_usd'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Acumulado',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('metrica', models.CharField(choices=[('pagos', 'Pagos aprobados'), ('goles', 'Goles'), ('amarillas', 'Tarjetas amarillas'), ('rojas', 'Tarjetas rojas')], max_length=20, verbose_name='métrica')),
+                ('periodo', models.CharField(choices=[('dia', 'Día'), ('semana', 'Semana')], max_length=10, verbose_name='periodo')),
+                ('inicio', models.DateField(verbose_name='inicio')),
+                ('ambito', models.CharField(choices=[('liga', 'Liga'), ('torneo', 'Torneo'), ('equipo', 'Equipo'), ('jugador', 'Jugador')], max_length=10, verbose_name='ámbito')),
+                ('objeto_id', models.PositiveIntegerField(default=0, verbose_name='objeto')),
+                ('cantidad', models.PositiveIntegerField(default=0, verbose_name='cantidad')),
+                ('total', models.DecimalField(decimal_places=2, default=0, max_digits=12, verbose_name='total')),
+            ],
+            options={
+                'verbose_name': 'Acumulado',
+                'verbose_name_plural': 'Acumulados',
+                'indexes': [models.Index(fields=['metrica', 'periodo', 'inicio'], name='acumulado_periodo_idx')],
+                'constraints': [models.UniqueConstraint(fields=('metrica', 'ambito', 'objeto_id', 'periodo', 'inicio'), name='acumulado_unico')],
+            },
+        ),
+    ]
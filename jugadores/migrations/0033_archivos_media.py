@@ -0,0 +1,34 @@
+# Generated by Django 5.2.5 on 2026-10-19 13:32
+
+import jugadores.almacenamiento
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('jugadores', '0032_acumulados'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivoMedia',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('nombre', models.CharField(max_length=255, unique=True, verbose_name='nombre')),
+                ('sha256', models.CharField(db_index=True, max_length=64, verbose_name='SHA-256')),
+                ('tamano', models.BigIntegerField(verbose_name='tamaño')),
+                ('referencias', models.PositiveIntegerField(default=0, verbose_name='referencias')),
+                ('creado', models.DateTimeField(auto_now_add=True, verbose_name='creado')),
+            ],
+            options={
+                'verbose_name': 'Archivo de media',
+                'verbose_name_plural': 'Archivos de media',
+            },
+        ),
+        migrations.AlterField(
+            model_name='pago',
+            name='comprobante',
+            field=models.ImageField(blank=True, null=True, storage=jugadores.almacenamiento.AlmacenamientoDeduplicado(), upload_to='pagos/comprobantes/', verbose_name='comprobante'),
+        ),
+    ]
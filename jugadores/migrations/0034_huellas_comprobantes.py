@@ -0,0 +1,38 @@
+# Generated by Django 5.2.5 on 2026-10-19 13:37
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('jugadores', '0033_archivos_media'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='pago',
+            name='huella_visual',
+            field=models.CharField(blank=True, editable=False, max_length=16, null=True, verbose_name='huella visual'),
+        ),
+        migrations.AddField(
+            model_name='pago',
+            name='sospecha_duplicado',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='reutilizado_en', to='jugadores.pago', verbose_name='posible duplicado de'),
+        ),
+        migrations.CreateModel(
+            name='BandaHuella',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('banda', models.PositiveSmallIntegerField(verbose_name='banda')),
+                ('valor', models.PositiveIntegerField(verbose_name='valor')),
+                ('pago', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='bandas_huella', to='jugadores.pago', verbose_name='pago')),
+            ],
+            options={
+                'verbose_name': 'Banda de huella',
+                'verbose_name_plural': 'Bandas de huella',
+                'indexes': [models.Index(fields=['banda', 'valor'], name='bandahuella_banda_valor_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.5 on 2026-10-19 13:46
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('jugadores', '0034_huellas_comprobantes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SubidaParcial',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('token', models.CharField(max_length=64, unique=True, verbose_name='token')),
+                ('nombre', models.CharField(max_length=255, verbose_name='nombre')),
+                ('tamano', models.PositiveIntegerField(verbose_name='tamaño')),
+                ('recibidos', models.PositiveIntegerField(default=0, verbose_name='bytes recibidos')),
+                ('completa', models.BooleanField(default=False, verbose_name='completa')),
+                ('actualizada', models.DateTimeField(auto_now=True, db_index=True, verbose_name='actualizada')),
+                ('usuario', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='subidas_parciales', to=settings.AUTH_USER_MODEL, verbose_name='usuario')),
+            ],
+            options={
+                'verbose_name': 'Subida parcial',
+                'verbose_name_plural': 'Subidas parciales',
+            },
+        ),
+    ]
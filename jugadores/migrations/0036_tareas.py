@@ -0,0 +1,38 @@
+# Generated by Django 5.2.5 on 2026-10-19 13:54
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('jugadores', '0035_subidas_parciales'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Tarea',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('nombre', models.CharField(max_length=100, verbose_name='tarea')),
+                ('argumentos', models.JSONField(blank=True, default=dict, verbose_name='argumentos')),
+                ('clave', models.CharField(blank=True, max_length=200, null=True, verbose_name='clave')),
+                ('estado', models.CharField(choices=[('pendiente', 'Pendiente'), ('en_curso', 'En curso'), ('hecha', 'Hecha'), ('fallida', 'Fallida')], default='pendiente', max_length=10, verbose_name='estado')),
+                ('ejecutar_en', models.DateTimeField(default=django.utils.timezone.now, verbose_name='ejecutar desde')),
+                ('intentos', models.PositiveSmallIntegerField(default=0, verbose_name='intentos')),
+                ('max_intentos', models.PositiveSmallIntegerField(default=5, verbose_name='intentos máximos')),
+                ('bloqueada_hasta', models.DateTimeField(blank=True, null=True, verbose_name='bloqueada hasta')),
+                ('trabajador', models.CharField(blank=True, default='', max_length=100, verbose_name='trabajador')),
+                ('ultimo_error', models.TextField(blank=True, default='', verbose_name='último error')),
+                ('creada', models.DateTimeField(auto_now_add=True, verbose_name='creada')),
+                ('terminada', models.DateTimeField(blank=True, null=True, verbose_name='terminada')),
+            ],
+            options={
+                'verbose_name': 'Tarea',
+                'verbose_name_plural': 'Tareas',
+                'indexes': [models.Index(fields=['estado', 'ejecutar_en'], name='tarea_estado_ejecutar_idx')],
+                'constraints': [models.UniqueConstraint(condition=models.Q(('estado', 'pendiente')), fields=('clave',), name='tarea_clave_pendiente_unica')],
+            },
+        ),
+    ]
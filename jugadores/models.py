@@ -67,16 +67,20 @@ else:
                     objects = type("o", (), {"get_or_create": lambda *args, **kwargs: (DummyEquipo(), False)})
                 return DummyEquipo
 
+from django.utils import timezone
+
+from .almacenamiento import AlmacenamientoDeduplicado
+
 # --- Nuevo: Función para obtener o crear la ID del equipo predeterminado ---
 def get_default_equipo_id():
     """
     Retorna la ID del equipo 'Furia Nocturna FC'.
     Si no existe, lo crea. Si ya existe, no lo recrea.
     """
-    # Usar apps.get_model para evitar dependencias circulares en import time
-    Equipo = apps.get_model('jugadores', 'Equipo')
-    equipo, creado = Equipo.objects.get_or_create(nombre=_("Furia Nocturna FC"))
-    return equipo.id
+    # Cacheado por proceso (ver referencia.py): no hace get_or_create por cada Jugador nuevo.
+    # Import diferido para evitar dependencias circulares en import time
+    from .referencia import equipo_predeterminado_id
+    return equipo_predeterminado_id()
 
 # Modelo para los datos del equipo
 class Equipo(models.Model):
@@ -312,7 +316,8 @@ class Pago(models.Model):
     monto = models.DecimalField(_('monto'), max_digits=8, decimal_places=2)
     metodo = models.CharField(_('método de pago'), max_length=50, choices=METODO_PAGO_CHOICES)
     referencia = models.CharField(_('referencia'), max_length=6, null=True, blank=True)
-    comprobante = models.ImageField(_('comprobante'), upload_to='pagos/comprobantes/', null=True, blank=True)
+    # Direccionado por contenido: los comprobantes repetidos ocupan un solo fichero (ver almacenamiento.py)
+    comprobante = models.ImageField(_('comprobante'), upload_to='pagos/comprobantes/', storage=AlmacenamientoDeduplicado(), null=True, blank=True)
     descripcion = models.TextField(_('descripción'), max_length=50, null=True, blank=True)
     MONEDA_CHOICES = [
         ('VES', _('Bolívares (Bs)')),
@@ -323,10 +328,328 @@ class Pago(models.Model):
     estado = models.CharField(_('estado'), max_length=20, choices=ESTADO_CHOICES, default='pendiente')
     motivo_rechazo = models.TextField(_('motivo rechazo'), null=True, blank=True)
     archivado = models.BooleanField(_('archivado'), default=False)
+    # Torneo al que corresponde una inscripción (ver elegibilidad.py)
+    torneo = models.ForeignKey('Torneo', on_delete=models.SET_NULL, null=True, blank=True, related_name='pagos', verbose_name=_('torneo'))
+    # Equivalente en dólares calculado al guardar con la tasa del día (ver reportes.py)
+    monto_usd = models.DecimalField(_('monto en USD'), max_digits=10, decimal_places=2, null=True, blank=True, editable=False)
+    # Primer día del mes local del pago: los informes agrupan por esta columna
+    mes = models.DateField(_('mes'), null=True, blank=True, editable=False)
+    # Huella perceptual (dHash en hexadecimal) del comprobante y pago anterior con una casi igual (ver huellas.py)
+    huella_visual = models.CharField(_('huella visual'), max_length=16, null=True, blank=True, editable=False)
+    sospecha_duplicado = models.ForeignKey(
+        'self', on_delete=models.SET_NULL, null=True, blank=True, editable=False,
+        related_name='reutilizado_en', verbose_name=_('posible duplicado de'),
+    )
 
     class Meta:
         verbose_name = _('Pago')
         verbose_name_plural = _('Pagos')
+        indexes = [
+            # Conciliación de extractos: búsqueda por referencia (ver conciliacion.py)
+            models.Index(fields=['referencia', 'metodo'], name='pago_referencia_metodo_idx'),
+            # Elegibilidad: NOT EXISTS de inscripciones aprobadas por jugador
+            models.Index(fields=['jugador', 'tipo', 'estado'], name='pago_jugador_tipo_estado_idx'),
+            # Informes de ingresos por periodo
+            models.Index(fields=['fecha'], name='pago_fecha_idx'),
+            models.Index(fields=['mes', 'tipo', 'metodo'], name='pago_mes_tipo_metodo_idx'),
+        ]
 
     def __str__(self):
         return f"{self.jugador} - {self.get_tipo_display()} - {self.monto} ({self.estado})"
+
+    def save(self, *args, **kwargs):
+        # Precalcular el equivalente en USD y el mes para que los informes solo agrupen y sumen
+        from .reportes import equivalente_usd, mes_de
+        update_fields = kwargs.get('update_fields')
+        if update_fields is None or {'monto', 'moneda'} & set(update_fields):
+            self.monto_usd = equivalente_usd(self.monto, self.moneda, self.fecha)
+            self.mes = mes_de(self.fecha)
+            if update_fields is not None:
+                kwargs['update_fields'] = set(update_fields) | {'monto_usd', 'mes'}
+        # Comprobante recién subido (aún sin guardar en el almacenamiento): calcular su huella
+        if self.comprobante and not self.comprobante._committed:
+            from .huellas import a_texto, huella_de_fichero
+            huella = huella_de_fichero(self.comprobante.file)
+            self.huella_visual = a_texto(huella) if huella is not None else None
+            self._huella_nueva = True
+            if update_fields is not None:
+                kwargs['update_fields'] = set(kwargs['update_fields']) | {'huella_visual'}
+        # Comprobante quitado: su huella ya no debe coincidir con otros pagos
+        elif not self.comprobante and self.huella_visual and (update_fields is None or 'comprobante' in update_fields):
+            self.huella_visual = None
+            self._huella_nueva = True
+            if update_fields is not None:
+                kwargs['update_fields'] = set(kwargs['update_fields']) | {'huella_visual'}
+        super().save(*args, **kwargs)
+
+
+class ArchivoMedia(models.Model):
+    """Fichero de media direccionado por contenido y cuántos campos lo usan (ver almacenamiento.py)."""
+    nombre = models.CharField(_('nombre'), max_length=255, unique=True)
+    sha256 = models.CharField(_('SHA-256'), max_length=64, db_index=True)
+    tamano = models.BigIntegerField(_('tamaño'))
+    referencias = models.PositiveIntegerField(_('referencias'), default=0)
+    creado = models.DateTimeField(_('creado'), auto_now_add=True)
+
+    class Meta:
+        verbose_name = _('Archivo de media')
+        verbose_name_plural = _('Archivos de media')
+
+    def __str__(self):
+        return f"{self.nombre} ({self.referencias})"
+
+
+class BandaHuella(models.Model):
+    """Trozo de la huella visual de un comprobante, indexado para buscar parecidos (ver huellas.py)."""
+    pago = models.ForeignKey(Pago, on_delete=models.CASCADE, related_name='bandas_huella', verbose_name=_('pago'))
+    banda = models.PositiveSmallIntegerField(_('banda'))
+    valor = models.PositiveIntegerField(_('valor'))
+
+    class Meta:
+        verbose_name = _('Banda de huella')
+        verbose_name_plural = _('Bandas de huella')
+        indexes = [
+            models.Index(fields=['banda', 'valor'], name='bandahuella_banda_valor_idx'),
+        ]
+
+    def __str__(self):
+        return f"Pago {self.pago_id} banda {self.banda}: {self.valor}"
+
+
+class SubidaParcial(models.Model):
+    """Comprobante que se está subiendo por trozos; el formulario de pago lo usa por su token (ver subidas.py)."""
+    token = models.CharField(_('token'), max_length=64, unique=True)
+    usuario = models.ForeignKey(User, on_delete=models.CASCADE, related_name='subidas_parciales', verbose_name=_('usuario'))
+    nombre = models.CharField(_('nombre'), max_length=255)
+    tamano = models.PositiveIntegerField(_('tamaño'))
+    recibidos = models.PositiveIntegerField(_('bytes recibidos'), default=0)
+    completa = models.BooleanField(_('completa'), default=False)
+    actualizada = models.DateTimeField(_('actualizada'), auto_now=True, db_index=True)
+
+    class Meta:
+        verbose_name = _('Subida parcial')
+        verbose_name_plural = _('Subidas parciales')
+
+    def __str__(self):
+        return f"{self.nombre} ({self.recibidos}/{self.tamano})"
+
+
+class Tarea(models.Model):
+    """Trabajo en segundo plano guardado en la base de datos; lo ejecuta `manage.py run_worker` (ver tareas.py)."""
+    ESTADO_CHOICES = [
+        ('pendiente', _('Pendiente')),
+        ('en_curso', _('En curso')),
+        ('hecha', _('Hecha')),
+        ('fallida', _('Fallida')),
+    ]
+    nombre = models.CharField(_('tarea'), max_length=100)
+    argumentos = models.JSONField(_('argumentos'), default=dict, blank=True)
+    # Dos tareas pendientes con la misma clave son la misma: la segunda no se encola
+    clave = models.CharField(_('clave'), max_length=200, null=True, blank=True)
+    estado = models.CharField(_('estado'), max_length=10, choices=ESTADO_CHOICES, default='pendiente')
+    ejecutar_en = models.DateTimeField(_('ejecutar desde'), default=timezone.now)
+    intentos = models.PositiveSmallIntegerField(_('intentos'), default=0)
+    max_intentos = models.PositiveSmallIntegerField(_('intentos máximos'), default=5)
+    bloqueada_hasta = models.DateTimeField(_('bloqueada hasta'), null=True, blank=True)
+    trabajador = models.CharField(_('trabajador'), max_length=100, blank=True, default='')
+    ultimo_error = models.TextField(_('último error'), blank=True, default='')
+    creada = models.DateTimeField(_('creada'), auto_now_add=True)
+    terminada = models.DateTimeField(_('terminada'), null=True, blank=True)
+
+    class Meta:
+        verbose_name = _('Tarea')
+        verbose_name_plural = _('Tareas')
+        constraints = [
+            models.UniqueConstraint(fields=['clave'], condition=models.Q(estado='pendiente'), name='tarea_clave_pendiente_unica'),
+        ]
+        indexes = [
+            models.Index(fields=['estado', 'ejecutar_en'], name='tarea_estado_ejecutar_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.nombre} #{self.pk} ({self.estado})"
+
+
+class TasaCambio(models.Model):
+    """Tasa de cambio del día: bolívares por dólar. La última tasa anterior o igual a una fecha es la vigente."""
+    fecha = models.DateField(_('fecha'), unique=True)
+    bs_por_usd = models.DecimalField(_('bolívares por dólar'), max_digits=14, decimal_places=4)
+    fuente = models.CharField(_('fuente'), max_length=50, blank=True, default='')
+
+    class Meta:
+        verbose_name = _('Tasa de cambio')
+        verbose_name_plural = _('Tasas de cambio')
+        ordering = ['-fecha']
+
+    def __str__(self):
+        return f"{self.fecha}: {self.bs_por_usd} Bs/USD"
+
+
+class Cargo(models.Model):
+    """
+    Obligación de pago de un jugador: la multa de una tarjeta o su parte del
+    arbitraje de un partido. La generan y anulan `multas.py` y `arbitraje.py`,
+    no los formularios.
+    """
+    TIPO_CHOICES = [
+        ('tarjetas_amarilla', _('Tarjeta Amarilla')),
+        ('tarjetas_roja', _('Tarjeta Roja')),
+        ('arbitraje', _('Arbitraje')),
+    ]
+
+    jugador = models.ForeignKey('Jugador', on_delete=models.CASCADE, related_name='cargos', verbose_name=_('jugador'))
+    tipo = models.CharField(_('tipo'), max_length=20, choices=TIPO_CHOICES)
+    monto = models.DecimalField(_('monto'), max_digits=8, decimal_places=2)
+    moneda = models.CharField(_('moneda'), max_length=3, choices=Pago.MONEDA_CHOICES, default='USD')
+    partido = models.ForeignKey(Partido, on_delete=models.CASCADE, null=True, blank=True, related_name='cargos', verbose_name=_('partido'))
+    tarjeta = models.OneToOneField(Tarjeta, on_delete=models.CASCADE, null=True, blank=True, related_name='cargo', verbose_name=_('tarjeta'))
+    anulado = models.BooleanField(_('anulado'), default=False)
+    fecha = models.DateTimeField(_('fecha'), auto_now_add=True)
+
+    class Meta:
+        verbose_name = _('Cargo')
+        verbose_name_plural = _('Cargos')
+        indexes = [
+            models.Index(fields=['jugador', 'anulado'], name='cargo_jugador_anulado_idx'),
+        ]
+        constraints = [
+            # Un solo cargo de arbitraje vigente por jugador y partido
+            models.UniqueConstraint(
+                fields=['jugador', 'partido'],
+                condition=models.Q(tipo='arbitraje', anulado=False),
+                name='un_arbitraje_por_jugador_y_partido',
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.jugador} - {self.get_tipo_display()} - {self.monto} {self.moneda}"
+
+
+class SaldoJugador(models.Model):
+    """
+    Saldo de cargos de un jugador: total cargado, total pagado y deuda.
+    Se mantiene desde `multas.actualizar_saldos` para no recalcularlo en cada informe.
+    """
+    jugador = models.OneToOneField('Jugador', on_delete=models.CASCADE, primary_key=True, related_name='saldo', verbose_name=_('jugador'))
+    cargos = models.DecimalField(_('cargos'), max_digits=10, decimal_places=2, default=0)
+    pagos = models.DecimalField(_('pagos'), max_digits=10, decimal_places=2, default=0)
+    deuda = models.DecimalField(_('deuda'), max_digits=10, decimal_places=2, default=0, db_index=True)
+    actualizado = models.DateTimeField(_('actualizado'), auto_now=True)
+
+    class Meta:
+        verbose_name = _('Saldo de jugador')
+        verbose_name_plural = _('Saldos de jugadores')
+
+    def __str__(self):
+        return f"{self.jugador}: {self.deuda}"
+
+
+class Acumulado(models.Model):
+    """
+    Total precalculado de una métrica en un día o una semana (de lunes a domingo)
+    para la liga, un torneo, un equipo o un jugador. Lo mantiene `acumulados.py`.
+    """
+    METRICA_CHOICES = [
+        ('pagos', _('Pagos aprobados')),
+        ('goles', _('Goles')),
+        ('amarillas', _('Tarjetas amarillas')),
+        ('rojas', _('Tarjetas rojas')),
+    ]
+    PERIODO_CHOICES = [
+        ('dia', _('Día')),
+        ('semana', _('Semana')),
+    ]
+    AMBITO_CHOICES = [
+        ('liga', _('Liga')),
+        ('torneo', _('Torneo')),
+        ('equipo', _('Equipo')),
+        ('jugador', _('Jugador')),
+    ]
+
+    metrica = models.CharField(_('métrica'), max_length=20, choices=METRICA_CHOICES)
+    periodo = models.CharField(_('periodo'), max_length=10, choices=PERIODO_CHOICES)
+    inicio = models.DateField(_('inicio'))
+    ambito = models.CharField(_('ámbito'), max_length=10, choices=AMBITO_CHOICES)
+    # Id del torneo, equipo o jugador; 0 para la liga
+    objeto_id = models.PositiveIntegerField(_('objeto'), default=0)
+    cantidad = models.PositiveIntegerField(_('cantidad'), default=0)
+    # Solo pagos: suma del equivalente en USD
+    total = models.DecimalField(_('total'), max_digits=12, decimal_places=2, default=0)
+
+    class Meta:
+        verbose_name = _('Acumulado')
+        verbose_name_plural = _('Acumulados')
+        constraints = [
+            # También es el índice de las series: métrica + ámbito + periodo, ordenadas por inicio
+            models.UniqueConstraint(fields=['metrica', 'ambito', 'objeto_id', 'periodo', 'inicio'], name='acumulado_unico'),
+        ]
+        indexes = [
+            # Recalcular un día o una semana de una métrica
+            models.Index(fields=['metrica', 'periodo', 'inicio'], name='acumulado_periodo_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.get_metrica_display()} {self.ambito} {self.objeto_id} {self.periodo} {self.inicio}: {self.cantidad}"
+
+
+class Encuesta(models.Model):
+    """
+    Encuesta para los aficionados (p. ej. Jugador del Partido o camiseta del próximo partido).
+    Los resultados se leen de los contadores de `OpcionEncuesta`, no de un COUNT(*) sobre los votos.
+    """
+    TIPO_CHOICES = [
+        ('jugador_partido', _('Jugador del Partido')),
+        ('camiseta', _('Camiseta')),
+        ('otra', _('Otra')),
+    ]
+
+    pregunta = models.CharField(_('pregunta'), max_length=200)
+    tipo = models.CharField(_('tipo'), max_length=20, choices=TIPO_CHOICES, default='otra')
+    partido = models.ForeignKey(Partido, on_delete=models.CASCADE, null=True, blank=True, related_name='encuestas', verbose_name=_('partido'))
+    activa = models.BooleanField(_('activa'), default=True)
+    fecha = models.DateTimeField(_('fecha'), auto_now_add=True)
+    cierre = models.DateTimeField(_('cierre'), null=True, blank=True)
+
+    class Meta:
+        verbose_name = _('Encuesta')
+        verbose_name_plural = _('Encuestas')
+
+    def __str__(self):
+        return self.pregunta
+
+    def abierta(self):
+        from django.utils import timezone
+        return self.activa and (self.cierre is None or self.cierre > timezone.now())
+
+
+class OpcionEncuesta(models.Model):
+    """Opción de una encuesta con su contador de votos (actualizado con F())."""
+    encuesta = models.ForeignKey(Encuesta, on_delete=models.CASCADE, related_name='opciones', verbose_name=_('encuesta'))
+    texto = models.CharField(_('texto'), max_length=100)
+    jugador = models.ForeignKey('Jugador', on_delete=models.CASCADE, null=True, blank=True, verbose_name=_('jugador'))
+    votos = models.PositiveIntegerField(_('votos'), default=0, editable=False)
+
+    class Meta:
+        verbose_name = _('Opción de encuesta')
+        verbose_name_plural = _('Opciones de encuesta')
+
+    def __str__(self):
+        return self.texto
+
+
+class VotoEncuesta(models.Model):
+    """Papeleta de un usuario en una encuesta. Un solo voto por usuario y encuesta."""
+    encuesta = models.ForeignKey(Encuesta, on_delete=models.CASCADE, related_name='votos', verbose_name=_('encuesta'))
+    opcion = models.ForeignKey(OpcionEncuesta, on_delete=models.CASCADE, related_name='papeletas', verbose_name=_('opción'))
+    usuario = models.ForeignKey(User, on_delete=models.CASCADE, verbose_name=_('usuario'))
+    fecha = models.DateTimeField(_('fecha'), auto_now_add=True)
+
+    class Meta:
+        verbose_name = _('Voto de encuesta')
+        verbose_name_plural = _('Votos de encuesta')
+        constraints = [
+            models.UniqueConstraint(fields=['encuesta', 'usuario'], name='un_voto_por_usuario_y_encuesta'),
+        ]
+
+    def __str__(self):
+        return f'Voto de {self.usuario} en {self.encuesta}'
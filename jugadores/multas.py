@@ -0,0 +1,123 @@
+"""Multas por tarjeta y saldo de cargos de cada jugador.
+
+Cada tarjeta no anulada genera un `Cargo` (multa) con el importe de
+`settings.MULTAS_TARJETA`; al anular la tarjeta el cargo se anula y al revertir
+la anulación se reactiva. `sincronizar_tarjetas` hace todo eso por conjuntos:
+un bulk_create para los cargos nuevos y un UPDATE por cada cambio de estado,
+así que sirve igual para una tarjeta que para toda la temporada (ver el comando
+`sincronizar_multas`).
+
+`SaldoJugador` guarda por jugador lo cargado, lo pagado (pagos aprobados de los
+mismos tipos y en la moneda de las multas) y la deuda. `actualizar_saldos`
+recalcula solo los jugadores afectados con dos consultas agrupadas; lo llaman
+las señales de `Tarjeta`/`Pago` y las acciones masivas que usan update(), que no
+emiten señales. El informe de deudores es entonces una consulta sobre el índice
+de `deuda`.
+"""
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Sum
+
+from .models import Cargo, Jugador, Pago, SaldoJugador, Tarjeta
+
+TIPOS_CARGO = tuple(valor for valor, _nombre in Cargo.TIPO_CHOICES)
+CERO = Decimal('0.00')
+
+
+def monto_multa(tipo_tarjeta):
+    return Decimal(str(settings.MULTAS_TARJETA[tipo_tarjeta]))
+
+
+def _ids(valores):
+    return {v for v in valores if v is not None}
+
+
+def actualizar_saldos(jugador_ids):
+    """Recalcula el saldo de los jugadores indicados (cargos activos menos pagos aprobados)."""
+    jugador_ids = _ids(jugador_ids)
+    if not jugador_ids:
+        return
+    moneda = settings.MULTAS_MONEDA
+    cargos = dict(
+        Cargo.objects.filter(jugador_id__in=jugador_ids, anulado=False, moneda=moneda)
+        .values_list('jugador_id').annotate(total=Sum('monto')).order_by()
+    )
+    pagos = dict(
+        Pago.objects.filter(jugador_id__in=jugador_ids, estado='aprobado', tipo__in=TIPOS_CARGO, moneda=moneda)
+        .values_list('jugador_id').annotate(total=Sum('monto')).order_by()
+    )
+    saldos = []
+    for jugador_id in jugador_ids:
+        cargado = (cargos.get(jugador_id) or CERO).quantize(CERO)
+        pagado = (pagos.get(jugador_id) or CERO).quantize(CERO)
+        saldos.append(SaldoJugador(jugador_id=jugador_id, cargos=cargado, pagos=pagado, deuda=cargado - pagado))
+    SaldoJugador.objects.bulk_create(
+        saldos,
+        update_conflicts=True,
+        unique_fields=['jugador'],
+        update_fields=['cargos', 'pagos', 'deuda', 'actualizado'],
+    )
+
+
+def actualizar_saldos_existentes(jugador_ids):
+    """Como `actualizar_saldos`, descartando los jugadores que ya no existen."""
+    actualizar_saldos(Jugador.objects.filter(pk__in=_ids(jugador_ids)).values_list('pk', flat=True))
+
+
+def sincronizar_tarjetas(tarjetas=None):
+    """
+    Ajusta los cargos de las tarjetas indicadas (queryset; por defecto todas):
+    crea los que faltan, anula los de tarjetas anuladas y reactiva los de
+    anulaciones revertidas. Devuelve (creados, anulados, reactivados).
+    """
+    if tarjetas is None:
+        tarjetas = Tarjeta.objects.all()
+    moneda = settings.MULTAS_MONEDA
+    afectados = set()
+    with transaction.atomic():
+        nuevas = list(tarjetas.filter(anulada=False, cargo__isnull=True).values_list('id', 'jugador_id', 'partido_id', 'tipo'))
+        Cargo.objects.bulk_create([
+            Cargo(
+                jugador_id=jugador_id, partido_id=partido_id, tarjeta_id=tarjeta_id,
+                tipo=f'tarjetas_{tipo}', monto=monto_multa(tipo), moneda=moneda,
+            )
+            for tarjeta_id, jugador_id, partido_id, tipo in nuevas
+        ])
+        afectados.update(jugador_id for _t, jugador_id, _p, _tipo in nuevas)
+
+        por_anular = Cargo.objects.filter(tarjeta__in=tarjetas.filter(anulada=True), anulado=False)
+        afectados.update(por_anular.values_list('jugador_id', flat=True))
+        anulados = por_anular.update(anulado=True)
+
+        por_reactivar = Cargo.objects.filter(tarjeta__in=tarjetas.filter(anulada=False), anulado=True)
+        afectados.update(por_reactivar.values_list('jugador_id', flat=True))
+        reactivados = por_reactivar.update(anulado=False)
+
+        actualizar_saldos(afectados)
+    return len(nuevas), anulados, reactivados
+
+
+def sincronizar_jugador(jugador_id):
+    """Sincroniza los cargos de todas las tarjetas de un jugador (lo usan las señales)."""
+    return sincronizar_tarjetas(Tarjeta.objects.filter(jugador_id=jugador_id))
+
+
+def recalcular_todos():
+    """Recalcula el saldo de todos los jugadores con cargos o pagos de multas."""
+    ids = set(Cargo.objects.values_list('jugador_id', flat=True).distinct())
+    ids.update(Pago.objects.filter(tipo__in=TIPOS_CARGO).values_list('jugador_id', flat=True).distinct())
+    ids.update(SaldoJugador.objects.values_list('jugador_id', flat=True))
+    actualizar_saldos(ids)
+    return len(ids)
+
+
+def deudores():
+    """Jugadores con deuda pendiente, de mayor a menor."""
+    return (
+        SaldoJugador.objects.filter(deuda__gt=0)
+        .select_related('jugador', 'jugador__equipo')
+        .order_by('-deuda')
+    )
+
@@ -0,0 +1,119 @@
+"""Aprovisionamiento del perfil de jugador de cada usuario.
+
+Un usuario normal (no staff) necesita un `Jugador` y pertenecer al grupo
+'jugadores'. Eso se hace una vez, al crear la cuenta; después basta con una
+marca en la caché 'compartida' (la ven todos los workers) para saber que ya está hecho, de modo que iniciar sesión no
+vuelve a consultar ni escribir perfil y grupo.
+
+Las vistas de alta (`registro`, `agregar_jugador`) usan `alta_jugador`, que crea
+User, Jugador y pertenencia al grupo en una transacción y con un INSERT por
+tabla. Mientras tanto la señal post_save de User no hace nada (`alta_en_curso`);
+para el resto de cuentas (admin, createsuperuser...) la señal llama a
+`aprovisionar`, que crea el Jugador con una cédula provisional.
+"""
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.db import transaction
+
+from . import referencia
+from .models import Jugador
+
+
+_alta_en_curso = ContextVar('alta_jugador_en_curso', default=False)
+
+
+def _clave(user_id):
+    return f'perfil:{user_id}:aprovisionado'
+
+
+def marcar_aprovisionado(user_id):
+    transaction.on_commit(lambda: caches['compartida'].set(_clave(user_id), True, settings.PERFIL_APROVISIONADO_CACHE_SEGUNDOS))
+
+
+def alta_en_curso():
+    """True si una vista está creando el perfil: la señal de User no debe hacerlo."""
+    return _alta_en_curso.get()
+
+
+@contextmanager
+def _gestionar_alta():
+    token = _alta_en_curso.set(True)
+    try:
+        yield
+    finally:
+        _alta_en_curso.reset(token)
+
+
+def generar_cedula(user_id):
+    """
+    Cédula provisional de 8 caracteres para jugadores dados de alta sin ella:
+    'G' y el id del usuario con 7 dígitos. Las cédulas reales y las que generaba
+    antes el registro (8 dígitos al azar, ya guardadas en la tabla) son solo
+    números, y las de `aprovisionar` empiezan por 'u', así que no chocan con
+    ninguna sin tener que consultar la tabla.
+    """
+    if user_id >= 10 ** 7:
+        raise ValueError('El id de usuario no cabe en el rango de cédulas generadas.')
+    return f'G{user_id:07d}'
+
+
+def necesita_perfil(user):
+    return not user.is_staff and not user.is_superuser
+
+
+def aprovisionar(user):
+    """Crea el Jugador (si falta) y añade el usuario al grupo 'jugadores'."""
+    if not Jugador.objects.filter(user=user).exists():
+        # Cédula provisional única basada en el pk (cabe en max_length=8);
+        # el registro la sustituye por la real.
+        Jugador.objects.create(
+            user=user,
+            nombre=user.first_name or '',
+            apellido=user.last_name or '',
+            cedula=f'u{user.pk}'[:8],
+        )
+    user.groups.add(referencia.grupo_jugadores())
+    marcar_aprovisionado(user.pk)
+
+
+def alta_jugador(user, password=None, cedula=None, **campos):
+    """
+    Da de alta a un jugador en una transacción: guarda `user` (nuevo o existente
+    sin perfil), crea su Jugador con `campos` y lo añade al grupo 'jugadores'.
+    Si no se indica cédula se genera con `generar_cedula`. Devuelve el Jugador.
+    """
+    if password is not None:
+        user.set_password(password)
+    with transaction.atomic(), _gestionar_alta():
+        if user.pk is None:
+            user.save()
+            nuevo = True
+        else:
+            user.save(update_fields=['password', 'first_name', 'last_name'])
+            nuevo = False
+        campos.setdefault('nombre', user.first_name or '')
+        campos.setdefault('apellido', user.last_name or '')
+        jugador = Jugador.objects.create(user=user, cedula=cedula or generar_cedula(user.pk), **campos)
+        grupo = referencia.grupo_jugadores()
+        if nuevo:
+            # Usuario recién creado: no puede estar ya en el grupo, basta un INSERT
+            User.groups.through.objects.create(user_id=user.pk, group_id=grupo.pk)
+        else:
+            user.groups.add(grupo)
+    marcar_aprovisionado(user.pk)
+    return jugador
+
+
+def asegurar_perfil(user):
+    """Camino rápido del login: solo aprovisiona si la marca cacheada no está."""
+    if not necesita_perfil(user) or caches['compartida'].get(_clave(user.pk)):
+        return
+    aprovisionar(user)
+
+
+def olvidar(user_id):
+    caches['compartida'].delete(_clave(user_id))
@@ -0,0 +1,87 @@
+"""Caché por proceso de datos de referencia.
+
+Tablas pequeñas que casi no cambian (el equipo predeterminado, el grupo
+'jugadores', la lista de equipos y la de torneos) se cargan una vez por proceso
+y se reutilizan en vistas, formularios y señales.
+
+Coherencia: las señales de guardado/borrado de `Equipo`, `Torneo` y `Group`
+incrementan un sello de versión en la caché 'compartida' (común a todos los
+workers; la 'default' es de cada proceso y el resto no se enteraría). Cada
+acceso compara el sello con el de la copia local y la descarta si cambió.
+Solo se guardan en la copia local datos ya confirmados (`transaction.on_commit`),
+para que un rollback no deje ids de filas inexistentes.
+"""
+import threading
+
+from django.apps import apps
+from django.contrib.auth.models import Group
+from django.core.cache import caches
+from django.db import transaction
+from django.utils.translation import gettext as _
+
+CLAVE_VERSION = 'referencia:version'
+NOMBRE_EQUIPO_PREDETERMINADO = 'Furia Nocturna FC'
+NOMBRE_GRUPO_JUGADORES = 'jugadores'
+
+_local = {}
+_version_local = None
+_lock = threading.Lock()
+
+
+def _version():
+    return caches['compartida'].get_or_set(CLAVE_VERSION, 1, None)
+
+
+def _obtener(clave, cargar):
+    global _version_local
+    version = _version()
+    with _lock:
+        if version != _version_local:
+            _local.clear()
+            _version_local = version
+        if clave in _local:
+            return _local[clave]
+    valor = cargar()
+
+    def guardar():
+        with _lock:
+            if _version_local == version:
+                _local[clave] = valor
+    transaction.on_commit(guardar)
+    return valor
+
+
+def invalidar():
+    """Descarta la copia local de todos los procesos (se llama desde las señales)."""
+    with _lock:
+        _local.clear()
+    cache = caches['compartida']
+    if not cache.add(CLAVE_VERSION, 2, None):
+        try:
+            cache.incr(CLAVE_VERSION)
+        except ValueError:
+            cache.set(CLAVE_VERSION, 1, None)
+
+
+def equipo_predeterminado_id() -> int:
+    """Id del equipo 'Furia Nocturna FC'; lo crea si no existe."""
+    def cargar():
+        Equipo = apps.get_model('jugadores', 'Equipo')
+        equipo, _creado = Equipo.objects.get_or_create(nombre=_(NOMBRE_EQUIPO_PREDETERMINADO))
+        return equipo.id
+    return _obtener('equipo_predeterminado_id', cargar)
+
+
+def grupo_jugadores() -> Group:
+    """Grupo 'jugadores'; lo crea si no existe."""
+    return _obtener('grupo_jugadores', lambda: Group.objects.get_or_create(name=NOMBRE_GRUPO_JUGADORES)[0])
+
+
+def equipos() -> list:
+    """Todos los equipos, para desplegables y filtros."""
+    return _obtener('equipos', lambda: list(apps.get_model('jugadores', 'Equipo').objects.order_by('pk')))
+
+
+def torneos() -> list:
+    """Todos los torneos, para desplegables y filtros."""
+    return _obtener('torneos', lambda: list(apps.get_model('jugadores', 'Torneo').objects.order_by('pk')))
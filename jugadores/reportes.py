@@ -0,0 +1,172 @@
+"""Informes de ingresos en varias monedas.
+
+Los pagos se registran en bolívares o en dólares. Para poder sumarlos, cada
+`Pago` guarda al escribirse su equivalente en USD (`monto_usd`) con la tasa de
+`TasaCambio` vigente en su fecha (la última anterior o igual). Si se carga o
+corrige una tasa, `recalcular_equivalentes` actualiza los pagos en bolívares
+afectados con un único UPDATE con subconsulta.
+
+`resumen_ingresos` agrupa por mes, tipo y método en una sola consulta; el
+desglose por moneda y estado son agregados condicionales (SUM ... FILTER) de
+la misma consulta, así que el informe no recorre los pagos en Python. El mes
+local también se guarda al escribir (`Pago.mes`): truncar la fecha con zona
+horaria en cada consulta costaba más que el resto del informe en SQLite.
+"""
+import csv
+import io
+from datetime import date, datetime, time
+from decimal import Decimal, InvalidOperation
+
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.db.models import (
+    Count, DateTimeField, DecimalField, ExpressionWrapper, F, OuterRef, Q, Subquery, Sum,
+)
+from django.db.models.functions import Round, TruncDate
+from django.utils import timezone
+
+from . import acumulados
+from .models import Pago, TasaCambio
+
+CENTIMO = Decimal('0.01')
+
+
+def _dia(fecha):
+    if fecha is None:
+        return timezone.localdate()
+    if isinstance(fecha, datetime):
+        return timezone.localtime(fecha).date() if timezone.is_aware(fecha) else fecha.date()
+    return fecha
+
+
+def mes_de(fecha=None):
+    """Primer día del mes (hora local) de `fecha`; hoy por defecto."""
+    return _dia(fecha).replace(day=1)
+
+
+def _inicio_dia(fecha):
+    return timezone.make_aware(datetime.combine(fecha, time.min))
+
+
+def tasa_vigente(fecha=None):
+    """Bolívares por dólar vigentes en `fecha` (hoy por defecto), o None si no hay tasa."""
+    return (
+        TasaCambio.objects.filter(fecha__lte=_dia(fecha))
+        .order_by('-fecha').values_list('bs_por_usd', flat=True).first()
+    )
+
+
+def equivalente_usd(monto, moneda, fecha=None):
+    """Equivalente en USD de un monto; None si es en bolívares y no hay tasa para esa fecha."""
+    if monto is None:
+        return None
+    monto = Decimal(monto)
+    if moneda == 'USD':
+        return monto.quantize(CENTIMO)
+    tasa = tasa_vigente(fecha)
+    if not tasa:
+        return None
+    return (monto / tasa).quantize(CENTIMO)
+
+
+def recalcular_equivalentes(desde=None):
+    """
+    Recalcula `monto_usd` de los pagos en bolívares desde `desde` (fecha) con la
+    tasa vigente en el día de cada pago. Devuelve cuántos pagos se actualizaron.
+    """
+    # Día local del pago (la tasa es diaria y la fecha del pago es un datetime en UTC)
+    dia = TruncDate(ExpressionWrapper(OuterRef('fecha'), output_field=DateTimeField()), tzinfo=timezone.get_current_timezone())
+    tasa = Subquery(TasaCambio.objects.filter(fecha__lte=dia).order_by('-fecha').values('bs_por_usd')[:1])
+    decimal = DecimalField(max_digits=10, decimal_places=2)
+    pagos = Pago.objects.filter(moneda='VES')
+    if desde is not None:
+        pagos = pagos.filter(fecha__gte=_inicio_dia(desde))
+    actualizados = pagos.update(monto_usd=Round(F('monto') / tasa, 2, output_field=decimal))
+    # Los acumulados de pagos suman el equivalente en USD de los aprobados
+    acumulados.programar_pagos(pagos.filter(estado='aprobado'))
+    return actualizados
+
+
+def _numero(texto):
+    texto = str(texto or '').strip().replace(' ', '')
+    if ',' in texto:
+        texto = texto.replace('.', '').replace(',', '.')
+    return Decimal(texto)
+
+
+def _fecha(texto):
+    texto = str(texto or '').strip()
+    for formato in ('%Y-%m-%d', '%d/%m/%Y'):
+        try:
+            return datetime.strptime(texto, formato).date()
+        except ValueError:
+            continue
+    raise ValueError(texto)
+
+
+def importar_tasas(archivo, fuente='archivo'):
+    """
+    Carga tasas desde un CSV local con columnas fecha y tasa (bolívares por dólar).
+    Sustituye las tasas de las fechas que ya existían y recalcula los pagos
+    afectados. Devuelve el número de tasas cargadas.
+    """
+    texto = archivo.read()
+    if isinstance(texto, bytes):
+        texto = texto.decode('utf-8-sig')
+    try:
+        dialecto = csv.Sniffer().sniff(texto[:2048], delimiters=',;\t')
+    except csv.Error:
+        dialecto = csv.excel
+    lector = csv.DictReader(io.StringIO(texto), dialect=dialecto)
+    tasas = {}
+    for n, fila in enumerate(lector, start=2):
+        fila = {str(k).strip().lower(): v for k, v in fila.items() if k}
+        try:
+            tasas[_fecha(fila.get('fecha'))] = _numero(fila.get('tasa') or fila.get('bs_por_usd'))
+        except (ValueError, InvalidOperation):
+            raise ValidationError(f'Fila {n}: fecha o tasa no válidas.')
+    if not tasas:
+        return 0
+    with transaction.atomic():
+        TasaCambio.objects.bulk_create(
+            [TasaCambio(fecha=fecha, bs_por_usd=valor, fuente=fuente) for fecha, valor in tasas.items()],
+            update_conflicts=True,
+            unique_fields=['fecha'],
+            update_fields=['bs_por_usd', 'fuente'],
+        )
+        recalcular_equivalentes(desde=min(tasas))
+    return len(tasas)
+
+
+def resumen_ingresos(desde=None, hasta=None):
+    """
+    Filas {mes, tipo, metodo, ...} con los ingresos de pagos no rechazados entre
+    `desde` y `hasta` (fechas, inclusive): totales en USD de aprobados y
+    pendientes, montos originales aprobados en VES y en USD, número de pagos y
+    pagos sin tasa (sin equivalente en USD).
+    """
+    pagos = Pago.objects.exclude(estado='rechazado')
+    if desde:
+        pagos = pagos.filter(fecha__gte=_inicio_dia(desde))
+    if hasta:
+        pagos = pagos.filter(fecha__lt=_inicio_dia(date.fromordinal(hasta.toordinal() + 1)))
+    aprobado = Q(estado='aprobado')
+    return list(
+        pagos.values('mes', 'tipo', 'metodo')
+        .annotate(
+            pagos=Count('id'),
+            aprobados=Count('id', filter=aprobado),
+            usd_aprobado=Sum('monto_usd', filter=aprobado),
+            usd_pendiente=Sum('monto_usd', filter=Q(estado='pendiente')),
+            ves=Sum('monto', filter=aprobado & Q(moneda='VES')),
+            usd=Sum('monto', filter=aprobado & Q(moneda='USD')),
+            sin_tasa=Count('id', filter=Q(monto_usd__isnull=True)),
+        )
+        .order_by('-mes', 'tipo', 'metodo')
+    )
+
+
+def totales(filas):
+    """Suma las columnas numéricas de `resumen_ingresos`."""
+    columnas = ('pagos', 'aprobados', 'usd_aprobado', 'usd_pendiente', 'ves', 'usd', 'sin_tasa')
+    return {c: sum((f[c] or 0) for f in filas) for c in columnas}
@@ -1,36 +1,30 @@
-from django.db.models.signals import post_save
+import logging
+import os
+
+from django.db.models.signals import post_delete, post_save
 from django.contrib.auth.models import User
 from django.dispatch import receiver
 from .models import Jugador
+from .perfiles import alta_en_curso, aprovisionar, necesita_perfil, olvidar
+
+logger = logging.getLogger(__name__)
 
 @receiver(post_save, sender=User)
 def crear_perfil_jugador(sender, instance, created, **kwargs):
     # Solo crear perfil de Jugador para usuarios normales (no staff ni superuser)
-    if created and not instance.is_staff and not instance.is_superuser:
-        # Evitar crear duplicados si ya existe (por ejemplo si la vista crea el perfil)
-        if not Jugador.objects.filter(user=instance).exists():
-            # Use a temporary unique placeholder for `cedula` to avoid
-            # UNIQUE constraint collisions (empty string) when the
-            # registration view will later set the real cedula.
-            # The placeholder is based on the user's PK and guaranteed
-            # unique for new users. Ensure it fits the max_length=8.
-            temp_cedula = f"u{instance.pk}"
-            if len(temp_cedula) > 8:
-                temp_cedula = temp_cedula[:8]
-            jugador = Jugador.objects.create(
-                user=instance,
-                nombre=instance.first_name or '',
-                apellido=instance.last_name or '',
-                cedula=temp_cedula,
-            )
-        # Añadir al grupo 'jugadores'
+    # Si una vista de alta ya se ocupa del perfil (perfiles.alta_jugador) no hacer nada
+    if created and necesita_perfil(instance) and not alta_en_curso():
         try:
-            from django.contrib.auth.models import Group
-            grupo_jugadores, _ = Group.objects.get_or_create(name='jugadores')
-            instance.groups.add(grupo_jugadores)
+            aprovisionar(instance)
         except Exception:
-            # Si algo falla con los grupos, no interrumpir la creación del usuario
-            pass
+            # No interrumpir la creación del usuario; el login lo reintentará
+            logger.exception('No se pudo aprovisionar el perfil del usuario %s', instance.pk)
+
+
+@receiver(post_delete, sender=Jugador)
+def olvidar_perfil_aprovisionado(sender, instance, **kwargs):
+    if instance.user_id:
+        olvidar(instance.user_id)
 
 from django.db.models.signals import post_migrate
 from django.dispatch import receiver
@@ -40,6 +34,7 @@ from .models import Equipo
 from django.db.models.signals import post_save
 from .models import Estadistica, Tarjeta
 from django.db.models.signals import m2m_changed
+from . import acumulados, multas, tareas
 
 # almacenamiento temporal para pre_clear/post_clear
 _pre_clear_cache = {
@@ -67,7 +62,7 @@ def sincronizar_tarjetas_desde_estadistica(sender, instance, created, **kwargs):
                 Tarjeta.objects.create(partido=partido, jugador=j, tipo='roja')
     except Exception:
         # No interrumpir el guardado si algo falla en la sincronización
-        pass
+        logger.exception('No se pudieron sincronizar las tarjetas de la estadística %s', instance.pk)
 
 
 @receiver(m2m_changed, sender=Estadistica.amonestados.through)
@@ -90,8 +85,12 @@ def amonestados_changed(sender, instance, action, reverse, model, pk_set, **kwar
             ids = _pre_clear_cache['amonestados'].pop(instance.pk, [])
             for pk in ids:
                     Tarjeta.objects.filter(partido=partido, jugador_id=pk, tipo='amarilla', anulada=False).update(anulada=True)
+        if action in ('post_remove', 'post_clear'):
+            # update() no emite post_save: ajustar aquí las multas de las tarjetas anuladas
+            multas.sincronizar_tarjetas(Tarjeta.objects.filter(partido=partido))
+            acumulados.programar_partidos([partido.pk], ['amarillas', 'rojas'])
     except Exception:
-        pass
+        logger.exception('No se pudieron sincronizar las amarillas de la estadística %s', instance.pk)
 
 
 @receiver(m2m_changed, sender=Estadistica.expulsados.through)
@@ -113,8 +112,12 @@ def expulsados_changed(sender, instance, action, reverse, model, pk_set, **kwarg
             ids = _pre_clear_cache['expulsados'].pop(instance.pk, [])
             for pk in ids:
                     Tarjeta.objects.filter(partido=partido, jugador_id=pk, tipo='roja', anulada=False).update(anulada=True)
+        if action in ('post_remove', 'post_clear'):
+            # update() no emite post_save: ajustar aquí las multas de las tarjetas anuladas
+            multas.sincronizar_tarjetas(Tarjeta.objects.filter(partido=partido))
+            acumulados.programar_partidos([partido.pk], ['amarillas', 'rojas'])
     except Exception:
-        pass
+        logger.exception('No se pudieron sincronizar las rojas de la estadística %s', instance.pk)
 
 @receiver(post_migrate)
 def create_default_team(sender, **kwargs):
@@ -127,4 +130,303 @@ def create_default_team(sender, **kwargs):
             Equipo.objects.get_or_create(nombre='Furia Nocturna FC')
             print("Equipo 'Furia Nocturna FC' creado o ya existente.")
         except Exception as e:
-            print(f"Error al crear el equipo predeterminado: {e}")
\ No newline at end of file
+            print(f"Error al crear el equipo predeterminado: {e}")
+
+# --- Archivo estático de torneos finalizados ---
+from django.db import transaction
+from django.db.models.signals import post_delete
+from .models import Torneo, Partido
+from . import archivo
+
+
+def _sincronizar_archivo(torneo_id):
+    """Encola la exportación (o eliminación) de la instantánea; varias del mismo torneo se juntan en una."""
+    tareas.sincronizar_archivo_torneo.encolar(clave=f'archivo_torneo:{torneo_id}', torneo_id=torneo_id)
+
+
+def _refrescar_archivo(torneo_id):
+    """Regenera (tras el commit) la instantánea de un torneo finalizado que ya la tenía."""
+    if not torneo_id or archivo.leer_manifiesto(torneo_id) is None:
+        return
+    _sincronizar_archivo(torneo_id)
+
+
+@receiver(post_save, sender=Torneo)
+def archivar_torneo_cerrado(sender, instance, **kwargs):
+    """
+    Al cerrar un torneo (fecha_fin pasada) genera su instantánea estática.
+    Si se reabre (se quita o mueve la fecha_fin) la elimina.
+    """
+    try:
+        if archivo.torneo_finalizado(instance):
+            _sincronizar_archivo(instance.pk)
+        elif archivo.leer_manifiesto(instance.pk) is not None:
+            archivo.eliminar_archivo(instance.pk)
+    except Exception:
+        logger.exception('No se pudo actualizar el archivo del torneo %s', instance.pk)
+
+
+@receiver(post_delete, sender=Torneo)
+def eliminar_archivo_torneo(sender, instance, **kwargs):
+    try:
+        archivo.eliminar_archivo(instance.pk)
+    except Exception:
+        logger.exception('No se pudo eliminar el archivo del torneo %s', instance.pk)
+
+
+@receiver(post_save, sender=Partido)
+@receiver(post_delete, sender=Partido)
+def partido_archivo_changed(sender, instance, **kwargs):
+    try:
+        _refrescar_archivo(instance.torneo_id)
+    except Exception:
+        logger.exception('No se pudo refrescar el archivo tras cambiar el partido %s', instance.pk)
+
+
+@receiver(post_save, sender=Estadistica)
+@receiver(post_save, sender=Tarjeta)
+def estadistica_archivo_changed(sender, instance, **kwargs):
+    try:
+        _refrescar_archivo(Partido.objects.filter(pk=instance.partido_id).values_list('torneo_id', flat=True).first())
+    except Exception:
+        logger.exception('No se pudo refrescar el archivo tras cambiar %s %s', sender.__name__, instance.pk)
+
+
+# --- Marcador en vivo: publicar deltas tras cada commit ---
+from .en_vivo import publicar_partido
+
+
+@receiver(post_save, sender=Partido)
+def publicar_marcador(sender, instance, **kwargs):
+    datos = {
+        'tipo': 'marcador',
+        'marcador_local': instance.marcador_local,
+        'marcador_visitante': instance.marcador_visitante,
+        'estado': instance.estado,
+    }
+    transaction.on_commit(lambda: publicar_partido(instance.pk, datos))
+
+
+@receiver(post_save, sender=Tarjeta)
+def publicar_tarjeta(sender, instance, **kwargs):
+    datos = {
+        'tipo': 'tarjeta',
+        'tarjeta': instance.pk,
+        'jugador': instance.jugador_id,
+        'jugador_nombre': str(instance.jugador),
+        'color': instance.tipo,
+        'minuto': instance.minuto,
+        'anulada': instance.anulada,
+    }
+    transaction.on_commit(lambda: publicar_partido(instance.partido_id, datos))
+
+
+@receiver(post_save, sender=Estadistica)
+def publicar_estadistica(sender, instance, **kwargs):
+    datos = {
+        'tipo': 'estadistica',
+        'estadistica': instance.pk,
+        'goles': instance.goles,
+        'asistencias': instance.asistencias,
+    }
+    transaction.on_commit(lambda: publicar_partido(instance.partido_id, datos))
+
+
+# --- Caché de datos de referencia (ver referencia.py) ---
+from django.contrib.auth.models import Group
+from . import referencia
+
+
+@receiver(post_save, sender=Equipo)
+@receiver(post_delete, sender=Equipo)
+@receiver(post_save, sender=Torneo)
+@receiver(post_delete, sender=Torneo)
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+def invalidar_referencia(sender, **kwargs):
+    # Ahora para este proceso y otra vez al confirmar, por si otro proceso
+    # recargó los datos antiguos mientras la transacción seguía abierta
+    referencia.invalidar()
+    transaction.on_commit(referencia.invalidar)
+
+
+# --- Multas por tarjeta y saldo de cargos (ver multas.py) ---
+from .models import Pago
+
+
+@receiver(post_save, sender=Tarjeta)
+def sincronizar_multa_tarjeta(sender, instance, **kwargs):
+    try:
+        multas.sincronizar_jugador(instance.jugador_id)
+    except Exception:
+        logger.exception('No se pudo sincronizar la multa de la tarjeta %s', instance.pk)
+
+
+@receiver(post_save, sender=Pago)
+def actualizar_saldo_pago(sender, instance, **kwargs):
+    try:
+        multas.actualizar_saldos([instance.jugador_id])
+    except Exception:
+        logger.exception('No se pudo actualizar el saldo del jugador %s', instance.jugador_id)
+
+
+@receiver(post_delete, sender=Tarjeta)
+@receiver(post_delete, sender=Pago)
+def actualizar_saldo_tras_borrado(sender, instance, **kwargs):
+    # Tras el commit: si el borrado viene en cascada del propio jugador, su
+    # saldo ya no existe y no hay que recrearlo
+    jugador_id = instance.jugador_id
+    transaction.on_commit(lambda: multas.actualizar_saldos_existentes([jugador_id]))
+
+
+# --- Elegibilidad por inscripción (ver elegibilidad.py) ---
+from . import elegibilidad
+
+
+@receiver(post_save, sender=Pago)
+@receiver(post_delete, sender=Pago)
+def invalidar_elegibilidad_pago(sender, instance, **kwargs):
+    if instance.tipo == 'inscripcion':
+        # Una inscripción sin torneo cuenta para todos los de su temporada
+        elegibilidad.invalidar(instance.torneo_id)
+
+
+@receiver(post_save, sender=Jugador)
+@receiver(post_delete, sender=Jugador)
+@receiver(m2m_changed, sender=Equipo.torneos.through)
+def invalidar_elegibilidad_plantillas(sender, **kwargs):
+    elegibilidad.invalidar()
+
+
+@receiver(post_save, sender=Torneo)
+def invalidar_elegibilidad_torneo(sender, instance, **kwargs):
+    elegibilidad.invalidar(instance.pk)
+
+
+# --- Equivalente en USD de los pagos (ver reportes.py) ---
+from .models import TasaCambio
+from . import reportes
+
+
+@receiver(post_save, sender=TasaCambio)
+@receiver(post_delete, sender=TasaCambio)
+def recalcular_equivalentes_usd(sender, instance, **kwargs):
+    # La tasa rige desde su fecha hasta la siguiente: basta recalcular desde ahí
+    reportes.recalcular_equivalentes(desde=instance.fecha)
+
+
+# --- Acumulados diarios y semanales (ver acumulados.py) ---
+from django.db.models.signals import pre_save
+
+
+@receiver(post_save, sender=Pago)
+@receiver(post_delete, sender=Pago)
+def programar_acumulados_pago(sender, instance, **kwargs):
+    if instance.fecha:
+        acumulados.programar([acumulados.dia_local(instance.fecha)], ['pagos'])
+
+
+@receiver(post_save, sender=Tarjeta)
+@receiver(post_delete, sender=Tarjeta)
+def programar_acumulados_tarjeta(sender, instance, **kwargs):
+    try:
+        acumulados.programar_partidos([instance.partido_id], ['amarillas', 'rojas'])
+    except Exception:
+        logger.exception('No se pudieron programar los acumulados de la tarjeta %s', instance.pk)
+
+
+@receiver(post_save, sender=Estadistica)
+@receiver(post_delete, sender=Estadistica)
+def programar_acumulados_estadistica(sender, instance, **kwargs):
+    try:
+        acumulados.programar_partidos([instance.partido_id], ['goles'])
+    except Exception:
+        logger.exception('No se pudieron programar los acumulados de la estadística %s', instance.pk)
+
+
+@receiver(m2m_changed, sender=Estadistica.anotadores.through)
+def programar_acumulados_anotadores(sender, instance, action, reverse, pk_set, **kwargs):
+    # pre_clear: al confirmar ya no se sabe qué partidos tenía el jugador
+    if action not in ('post_add', 'post_remove', 'pre_clear'):
+        return
+    try:
+        if not reverse:
+            acumulados.programar_partidos([instance.partido_id], ['goles'])
+        else:
+            estadisticas = Estadistica.objects.filter(pk__in=pk_set) if pk_set else Estadistica.objects.filter(anotadores=instance)
+            acumulados.programar_partidos(estadisticas.values('partido_id'), ['goles'])
+    except Exception:
+        logger.exception('No se pudieron programar los acumulados de goles (%s)', action)
+
+
+@receiver(pre_save, sender=Partido)
+def recordar_fecha_partido(sender, instance, update_fields=None, **kwargs):
+    # Si el partido cambia de fecha o de torneo hay que recalcular también la fecha anterior
+    if instance.pk and (update_fields is None or {'fecha', 'torneo'} & set(update_fields)):
+        instance._fecha_torneo_anterior = Partido.objects.filter(pk=instance.pk).values_list('fecha', 'torneo_id').first()
+
+
+@receiver(post_save, sender=Partido)
+def programar_acumulados_partido(sender, instance, **kwargs):
+    anterior = getattr(instance, '_fecha_torneo_anterior', None)
+    if anterior is not None and anterior != (instance.fecha, instance.torneo_id):
+        acumulados.programar([anterior[0], instance.fecha], acumulados.METRICAS_PARTIDO)
+
+
+@receiver(post_delete, sender=Partido)
+def programar_acumulados_partido_borrado(sender, instance, **kwargs):
+    acumulados.programar([instance.fecha], acumulados.METRICAS_PARTIDO)
+
+
+# --- Referencias de los comprobantes (ver almacenamiento.py) ---
+
+def _soltar_comprobante(campo, nombre):
+    # Tras el commit: si la transacción se deshace el pago sigue usando el fichero
+    transaction.on_commit(lambda: campo.storage.delete(nombre), robust=True)
+
+
+@receiver(pre_save, sender=Pago)
+def soltar_comprobante_reemplazado(sender, instance, **kwargs):
+    # Un comprobante recién asignado aún no está guardado (_committed False)
+    if instance.pk and not getattr(instance.comprobante, '_committed', True):
+        anterior = Pago.objects.filter(pk=instance.pk).values_list('comprobante', flat=True).first()
+        if anterior:
+            _soltar_comprobante(instance.comprobante, anterior)
+
+
+@receiver(post_delete, sender=Pago)
+def soltar_comprobante_borrado(sender, instance, **kwargs):
+    if instance.comprobante:
+        _soltar_comprobante(instance.comprobante, instance.comprobante.name)
+
+
+# --- Huella visual de los comprobantes (ver huellas.py) ---
+from . import huellas
+
+
+@receiver(post_save, sender=Pago)
+def registrar_huella_comprobante(sender, instance, **kwargs):
+    if not instance.__dict__.pop('_huella_nueva', False):
+        return
+    try:
+        huellas.registrar(instance)
+    except Exception:
+        logger.exception('No se pudo indexar la huella del comprobante del pago %s', instance.pk)
+
+
+# --- Precalentado de imágenes externas (ver imagenes.py y tareas.py) ---
+
+@receiver(post_save, sender=Jugador)
+@receiver(post_save, sender=Equipo)
+def preparar_imagen_externa(sender, instance, **kwargs):
+    """Encola la descarga y el redimensionado de una imagen nueva, para que la primera visita no espere."""
+    url = instance.imagen_url
+    if not url:
+        return
+    try:
+        from . import imagenes
+        clave = imagenes.clave(url)
+        if not os.path.exists(imagenes.ruta(clave, '-tarjeta.webp')):
+            tareas.preparar_imagen.encolar(clave=f'imagen:{clave}', url=url)
+    except Exception:
+        logger.exception('No se pudo encolar la preparación de la imagen %s', url)
@@ -0,0 +1,314 @@
+"""Recepción y validación de los comprobantes subidos.
+
+`ComprobanteUploadHandler` se encarga solo del campo `comprobante`, y solo en
+las vistas decoradas con `recibe_comprobante` (las de registrar pagos, que leen
+`rechazos(request)`). No está en FILE_UPLOAD_HANDLERS: el admin de Django o
+cualquier otra vista no sabrían mostrar el motivo de un rechazo y guardarían el
+Pago sin comprobante ni error. Lo demás sigue con los manejadores de Django:
+
+- Rechaza la subida antes de leerla si la petición entera o la cabecera de la
+  parte declaran más de `COMPROBANTES_MAX_BYTES`, y la corta en cuanto los
+  bytes recibidos superan ese límite.
+- Comprueba la firma (magic bytes) con los primeros bytes: lo que no empiece
+  como JPEG, PNG, GIF o WebP se descarta sin escribir nada más.
+- Escribe cada trozo directamente a un temporal en disco, nunca acumula el
+  fichero en memoria aunque sea pequeño.
+
+Una subida rechazada no llega a request.FILES (Django descarta el resto de la
+parte sin guardarlo); el motivo queda en `rechazos(request)` para que el
+formulario lo muestre. Con varias subidas grandes a la vez, cada una ocupa en
+memoria un trozo (64 KiB), no el fichero.
+
+Después, `validar_imagen` abre el temporal con Pillow leyendo solo la
+cabecera: formato permitido, ancho x alto por debajo de
+`COMPROBANTES_MAX_PIXELES` (bombas de descompresión) y `verify()`, sin
+decodificar el mapa de bits.
+
+En conexiones móviles inestables el comprobante también puede subirse por
+trozos reanudables (`crear`, `recibir_trozo`, vistas en views_subidas.py): el
+cliente envía trozos de `SUBIDAS_TAMANO_TROZO` con su desplazamiento, el
+servidor los escribe en `SUBIDAS_PARCIALES_ROOT/<token>.part` y, tras un corte,
+el cliente pregunta cuánto llegó y sigue desde ahí. Cada petición dura lo que
+tarda un trozo, así que un cliente lento no retiene un worker durante toda la
+subida. Al completarse se valida igual que una subida normal y el formulario de
+pago la recibe por `comprobante_token` (`archivos`). Las subidas sin tocar en
+`SUBIDAS_PARCIALES_HORAS` se descartan, y cada usuario tiene como mucho
+`SUBIDAS_PARCIALES_POR_USUARIO` abiertas: al abrir otra se descartan sus más
+antiguas, para que una sola cuenta no llene el disco.
+"""
+import mimetypes
+import os
+import secrets
+import warnings
+from datetime import timedelta
+from functools import wraps
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.files.uploadedfile import UploadedFile
+from django.core.files.uploadhandler import SkipFile, StopFutureHandlers, TemporaryFileUploadHandler
+from django.db import transaction
+from django.db.models.functions import Greatest
+from django.template.defaultfilters import filesizeformat
+from django.utils import timezone
+from django.views.decorators.csrf import csrf_exempt, csrf_protect
+
+from .models import SubidaParcial
+
+CAMPO = 'comprobante'
+FORMATOS = {'JPEG': 'image/jpeg', 'PNG': 'image/png', 'GIF': 'image/gif', 'WEBP': 'image/webp'}
+LONGITUD_FIRMA = 12
+
+
+def formato_por_firma(cabecera):
+    """Formato de Pillow que corresponde a los primeros bytes, o None."""
+    if cabecera.startswith(b'\xff\xd8\xff'):
+        return 'JPEG'
+    if cabecera.startswith(b'\x89PNG\r\n\x1a\n'):
+        return 'PNG'
+    if cabecera[:6] in (b'GIF87a', b'GIF89a'):
+        return 'GIF'
+    if cabecera[:4] == b'RIFF' and cabecera[8:12] == b'WEBP':
+        return 'WEBP'
+    return None
+
+
+MENSAJE_FORMATO = 'El comprobante debe ser una imagen JPEG, PNG, GIF o WebP.'
+TAMANO_LECTURA = 64 * 1024
+
+
+def mensaje_tamano():
+    return f'El comprobante no puede superar {filesizeformat(settings.COMPROBANTES_MAX_BYTES)}.'
+
+
+def rechazos(request):
+    """{campo: motivo} de las subidas que el manejador descartó en esta petición."""
+    return getattr(request, 'subidas_rechazadas', {})
+
+
+class ComprobanteUploadHandler(TemporaryFileUploadHandler):
+
+    def handle_raw_input(self, input_data, META, content_length, boundary, encoding=None):
+        # Los campos que no son ficheros no pueden pasar de DATA_UPLOAD_MAX_MEMORY_SIZE:
+        # si la petición supera la suma, el comprobante seguro que excede su límite
+        self.peticion_excedida = content_length > settings.COMPROBANTES_MAX_BYTES + (settings.DATA_UPLOAD_MAX_MEMORY_SIZE or 0)
+
+    def new_file(self, field_name, file_name, content_type, content_length, charset=None, content_type_extra=None):
+        self.activo = field_name == CAMPO
+        self.field_name = field_name
+        if not self.activo:
+            return  # lo recibe el siguiente manejador
+        if self.peticion_excedida or (content_length or 0) > settings.COMPROBANTES_MAX_BYTES:
+            self._rechazar(mensaje_tamano())
+        super().new_file(field_name, file_name, content_type, content_length, charset, content_type_extra)
+        self.recibidos = 0
+        self.cabecera = b''
+        raise StopFutureHandlers()
+
+    def receive_data_chunk(self, raw_data, start):
+        if not self.activo:
+            return raw_data
+        self.recibidos += len(raw_data)
+        if self.recibidos > settings.COMPROBANTES_MAX_BYTES:
+            self._rechazar(mensaje_tamano())
+        if len(self.cabecera) < LONGITUD_FIRMA:
+            self.cabecera += raw_data[:LONGITUD_FIRMA - len(self.cabecera)]
+            if len(self.cabecera) >= LONGITUD_FIRMA and formato_por_firma(self.cabecera) is None:
+                self._rechazar(MENSAJE_FORMATO)
+        self.file.write(raw_data)
+        return None
+
+    def file_complete(self, file_size):
+        if not self.activo:
+            return None
+        # Un fichero más corto que la firma llega al formulario y lo rechaza validar_imagen
+        return super().file_complete(file_size)
+
+    def _rechazar(self, motivo):
+        self.request.subidas_rechazadas = {**rechazos(self.request), self.field_name: motivo}
+        # El parser cierra (y borra) el temporal y descarta el resto de la parte
+        raise SkipFile()
+
+
+def recibe_comprobante(vista):
+    """
+    Decorador: la vista recibe el `comprobante` con ComprobanteUploadHandler.
+    Los manejadores se cambian antes de leer el cuerpo, así que la comprobación
+    CSRF (que lee request.POST) se hace aquí dentro y no en el middleware.
+    """
+    protegida = csrf_protect(vista)
+
+    @wraps(vista)
+    def envoltura(request, *args, **kwargs):
+        request.upload_handlers.insert(0, ComprobanteUploadHandler(request))
+        return protegida(request, *args, **kwargs)
+    return csrf_exempt(envoltura)
+
+
+def validar_imagen(fichero):
+    """
+    Valida un comprobante recién subido sin decodificar la imagen y fija su
+    content_type según el formato real. Lanza ValidationError.
+    """
+    from PIL import Image
+    if fichero.size > settings.COMPROBANTES_MAX_BYTES:
+        raise ValidationError(mensaje_tamano(), code='tamano')
+    origen = fichero.temporary_file_path() if hasattr(fichero, 'temporary_file_path') else fichero
+    if hasattr(origen, 'seek'):
+        origen.seek(0)
+    try:
+        with warnings.catch_warnings():
+            # Pillow solo avisa entre MAX_IMAGE_PIXELS y el doble: que también sea error
+            warnings.simplefilter('error', Image.DecompressionBombWarning)
+            with Image.open(origen) as imagen:
+                formato = imagen.format
+                ancho, alto = imagen.size
+                if formato not in FORMATOS:
+                    raise ValidationError(MENSAJE_FORMATO)
+                if ancho * alto > settings.COMPROBANTES_MAX_PIXELES:
+                    raise ValidationError(f'La imagen es demasiado grande ({ancho}x{alto} píxeles).')
+                imagen.verify()
+    except ValidationError:
+        raise
+    except (Image.DecompressionBombError, Image.DecompressionBombWarning):
+        raise ValidationError('La imagen es demasiado grande.')
+    except Exception:
+        raise ValidationError('El comprobante no es una imagen válida o está dañado.')
+    finally:
+        if hasattr(origen, 'seek'):
+            origen.seek(0)
+    fichero.content_type = FORMATOS[formato]
+    return fichero
+
+
+class DesplazamientoIncorrecto(Exception):
+    """El trozo empieza más allá de lo recibido: el cliente debe seguir desde `recibidos`."""
+
+    def __init__(self, recibidos):
+        super().__init__(recibidos)
+        self.recibidos = recibidos
+
+
+class SubidaTerminada(UploadedFile):
+    """Comprobante ensamblado a partir de sus trozos, abierto desde disco."""
+
+    def __init__(self, subida):
+        self.subida = subida
+        self.ruta = ruta_parcial(subida.token)
+        super().__init__(open(self.ruta, 'rb'), subida.nombre, mimetypes.guess_type(subida.nombre)[0], subida.tamano)
+
+    def temporary_file_path(self):
+        return self.ruta
+
+
+def ruta_parcial(token):
+    return os.path.join(settings.SUBIDAS_PARCIALES_ROOT, f'{token}.part')
+
+
+def descartar(subidas):
+    """Borra las subidas parciales indicadas (instancias o queryset) y sus ficheros."""
+    tokens = [subida.token for subida in subidas]
+    for token in tokens:
+        try:
+            os.remove(ruta_parcial(token))
+        except FileNotFoundError:
+            pass
+    SubidaParcial.objects.filter(token__in=tokens).delete()
+
+
+def purgar_caducadas():
+    limite = timezone.now() - timedelta(hours=settings.SUBIDAS_PARCIALES_HORAS)
+    descartar(SubidaParcial.objects.filter(actualizada__lt=limite).only('token'))
+
+
+def crear(usuario, nombre, tamano):
+    """Abre una subida por trozos de `tamano` bytes y devuelve la SubidaParcial."""
+    if tamano <= 0:
+        raise ValidationError('El comprobante está vacío.')
+    if tamano > settings.COMPROBANTES_MAX_BYTES:
+        raise ValidationError(mensaje_tamano(), code='tamano')
+    purgar_caducadas()
+    # Dejar sitio para la nueva: se conservan las más recientes del usuario
+    anteriores = SubidaParcial.objects.filter(usuario=usuario).order_by('-actualizada', '-pk').only('token')
+    descartar(anteriores[max(0, settings.SUBIDAS_PARCIALES_POR_USUARIO - 1):])
+    os.makedirs(settings.SUBIDAS_PARCIALES_ROOT, exist_ok=True)
+    nombre = os.path.basename(nombre.replace('\\', '/'))[-100:] or 'comprobante'
+    subida = SubidaParcial.objects.create(token=secrets.token_urlsafe(32), usuario=usuario, nombre=nombre, tamano=tamano)
+    open(ruta_parcial(subida.token), 'wb').close()
+    return subida
+
+
+def recibir_trozo(subida, desplazamiento, flujo, longitud):
+    """
+    Escribe en su sitio un trozo de `longitud` bytes leído de `flujo` (el cuerpo
+    de la petición, por partes) y devuelve la subida actualizada. Reenviar un
+    trozo ya recibido no hace daño: se sobrescribe con los mismos bytes. Al
+    llegar el último se valida la imagen; si no es válida la subida se descarta.
+    """
+    if subida.completa:
+        return subida
+    if desplazamiento > subida.recibidos:
+        raise DesplazamientoIncorrecto(subida.recibidos)
+    if longitud <= 0 or longitud > settings.SUBIDAS_TAMANO_TROZO or desplazamiento + longitud > subida.tamano:
+        raise ValidationError('Trozo de tamaño incorrecto.')
+    ruta = ruta_parcial(subida.token)
+    escritos = 0
+    # El cuerpo se lee y se escribe fuera de cualquier transacción: un cliente lento no bloquea la fila
+    with open(ruta, 'r+b') as destino:
+        destino.seek(desplazamiento)
+        while escritos < longitud:
+            datos = flujo.read(min(TAMANO_LECTURA, longitud - escritos))
+            if not datos:
+                break
+            destino.write(datos)
+            escritos += len(datos)
+        if desplazamiento == 0:
+            destino.seek(0)
+            if escritos >= LONGITUD_FIRMA and formato_por_firma(destino.read(LONGITUD_FIRMA)) is None:
+                descartar([subida])
+                raise ValidationError(MENSAJE_FORMATO)
+    if escritos < longitud:
+        raise ValidationError('El trozo llegó incompleto; vuelve a enviarlo.')
+    with transaction.atomic():
+        # Greatest: dos reintentos del mismo trozo a la vez no hacen retroceder el contador
+        SubidaParcial.objects.filter(pk=subida.pk).update(recibidos=Greatest('recibidos', desplazamiento + escritos), actualizada=timezone.now())
+        subida.refresh_from_db()
+        if subida.recibidos < subida.tamano or subida.completa:
+            return subida
+        fichero = SubidaTerminada(subida)
+        try:
+            validar_imagen(fichero)
+        except ValidationError:
+            fichero.close()
+            descartar([subida])
+            raise
+        fichero.close()
+        subida.completa = True
+        subida.save(update_fields=['completa'])
+    return subida
+
+
+def archivos(request):
+    """
+    request.FILES para el formulario de pago: si no trae comprobante pero sí un
+    `comprobante_token` de una subida completa del usuario, la incluye como
+    fichero. Tras guardar el pago hay que llamar a `consumir(request)`.
+    """
+    token = request.POST.get('comprobante_token')
+    if not token or CAMPO in request.FILES:
+        return request.FILES
+    subida = SubidaParcial.objects.filter(token=token, usuario=request.user, completa=True).first()
+    if subida is None or not os.path.exists(ruta_parcial(token)):
+        request.subidas_rechazadas = {**rechazos(request), CAMPO: 'La subida del comprobante no está disponible; vuelve a adjuntarlo.'}
+        return request.FILES
+    ficheros = request.FILES.copy()
+    ficheros[CAMPO] = request.subida_terminada = SubidaTerminada(subida)
+    return ficheros
+
+
+def consumir(request):
+    """Borra la subida por trozos que usó el pago recién guardado (su contenido ya está en media)."""
+    fichero = getattr(request, 'subida_terminada', None)
+    if fichero is not None:
+        fichero.close()
+        descartar([fichero.subida])
@@ -0,0 +1,325 @@
+"""Cola de tareas en segundo plano guardada en la propia base de datos.
+
+Cada tarea es una fila de `Tarea` con el nombre de una función registrada con
+`@tarea` y sus argumentos en JSON. Encolar es un INSERT dentro de la
+transacción de quien encola: si esa transacción se deshace, la tarea tampoco
+existe. `manage.py run_worker` las ejecuta con un pool de hilos o de procesos.
+
+- Reclamar una tarea es un UPDATE condicional (`estado='pendiente'` ->
+  `'en_curso'`), así que varios trabajadores pueden compartir la tabla sin
+  bloqueos de fila (también en SQLite). La tarea reclamada queda bloqueada
+  `TAREAS_PLAZO_SEGUNDOS`; el trabajador renueva el plazo mientras la ejecuta y,
+  si muere, otro la recupera al vencer.
+- Si la función lanza una excepción se reintenta con espera exponencial
+  (`espera * 2^(intento-1)`, con algo de azar) hasta `reintentos` veces; luego
+  queda `fallida` con la traza en `ultimo_error`.
+- Con `clave`, dos encolados de la misma tarea pendiente son uno (p. ej.
+  "regenerar el archivo del torneo 7" cien veces en una importación). La
+  clave solo es única entre las pendientes: si ya hay una en curso, la nueva
+  se encola para recoger los cambios posteriores.
+- `TAREAS_PROGRAMADAS` ({nombre: 'HH:MM'}) encola cada día, a partir de esa hora
+  local, las tareas periódicas (recálculos nocturnos).
+
+Con `TAREAS_ACTIVAS = False` (tests y desarrollo, como la cola de escrituras)
+no se usa la tabla: la tarea se ejecuta al confirmar la transacción y las
+marcadas `opcional` (precalentar cachés) se omiten.
+"""
+import logging
+import os
+import random
+import socket
+import threading
+import time
+import traceback
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from dataclasses import dataclass
+from datetime import timedelta
+from typing import Callable
+
+from django.conf import settings
+from django.db import IntegrityError, close_old_connections, connections, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import Tarea
+
+logger = logging.getLogger(__name__)
+
+ESPERA_MAXIMA = 6 * 3600
+TAMANO_ERROR = 4000
+MANTENIMIENTO_SEGUNDOS = 30
+
+
+@dataclass(frozen=True)
+class Definicion:
+    nombre: str
+    funcion: Callable
+    reintentos: int
+    espera: int
+    opcional: bool
+
+
+REGISTRO: dict[str, Definicion] = {}
+
+
+def tarea(nombre=None, reintentos=5, espera=30, opcional=False):
+    """
+    Registra una función como tarea. La función recibe solo argumentos con
+    nombre serializables en JSON y gana `funcion.encolar(clave=None,
+    ejecutar_en=None, **argumentos)`.
+    """
+    def registrar(funcion):
+        definicion = Definicion(nombre or funcion.__name__, funcion, reintentos, espera, opcional)
+        REGISTRO[definicion.nombre] = definicion
+
+        def encolar_esta(clave=None, ejecutar_en=None, **argumentos):
+            return encolar(definicion.nombre, clave=clave, ejecutar_en=ejecutar_en, **argumentos)
+        funcion.encolar = encolar_esta
+        return funcion
+    return registrar
+
+
+def encolar(nombre, clave=None, ejecutar_en=None, **argumentos):
+    """Encola la tarea `nombre` y devuelve su fila (la pendiente que ya existía si coincide la clave)."""
+    definicion = REGISTRO.get(nombre)
+    if definicion is None:
+        raise ValueError(f'Tarea desconocida: {nombre}')
+    if not settings.TAREAS_ACTIVAS:
+        if not definicion.opcional:
+            transaction.on_commit(lambda: definicion.funcion(**argumentos), robust=True)
+        return None
+    return _insertar(definicion, clave, ejecutar_en or timezone.now(), argumentos)
+
+
+def _insertar(definicion, clave, ejecutar_en, argumentos):
+    if clave:
+        existente = Tarea.objects.filter(clave=clave, estado='pendiente').first()
+        if existente is not None:
+            if ejecutar_en < existente.ejecutar_en:
+                Tarea.objects.filter(pk=existente.pk, estado='pendiente').update(ejecutar_en=ejecutar_en)
+            return existente
+    try:
+        with transaction.atomic():
+            return Tarea.objects.create(
+                nombre=definicion.nombre, argumentos=argumentos, clave=clave or None,
+                ejecutar_en=ejecutar_en, max_intentos=definicion.reintentos,
+            )
+    except IntegrityError:
+        # Otra petición encoló la misma clave entre medias
+        return Tarea.objects.filter(clave=clave, estado='pendiente').first()
+
+
+def reclamar(limite, trabajador):
+    """Marca como en curso hasta `limite` tareas vencidas y devuelve sus ids."""
+    ahora = timezone.now()
+    candidatas = (
+        Tarea.objects.filter(estado='pendiente', ejecutar_en__lte=ahora)
+        .order_by('ejecutar_en', 'pk').values_list('pk', flat=True)[:limite * 2]
+    )
+    reclamadas = []
+    for pk in candidatas:
+        if len(reclamadas) >= limite:
+            break
+        # Si otro trabajador la reclamó antes, el UPDATE no toca ninguna fila
+        if Tarea.objects.filter(pk=pk, estado='pendiente').update(
+            estado='en_curso', trabajador=trabajador, intentos=F('intentos') + 1,
+            bloqueada_hasta=ahora + timedelta(seconds=settings.TAREAS_PLAZO_SEGUNDOS),
+        ):
+            reclamadas.append(pk)
+    return reclamadas
+
+
+def _volver_a_pendiente(tarea_id, cambios, trabajador=None):
+    """
+    Devuelve a pendiente una tarea en curso (de `trabajador`, si se indica); si
+    ya hay otra pendiente con su clave, esa hará el trabajo.
+    """
+    en_curso = Tarea.objects.filter(pk=tarea_id, estado='en_curso')
+    if trabajador is not None:
+        en_curso = en_curso.filter(trabajador=trabajador)
+    try:
+        with transaction.atomic():
+            en_curso.update(estado='pendiente', bloqueada_hasta=None, **cambios)
+    except IntegrityError:
+        en_curso.update(
+            estado='fallida', bloqueada_hasta=None, terminada=timezone.now(),
+            ultimo_error=(cambios.get('ultimo_error', '') + '\nSustituida por otra pendiente con la misma clave.').strip(),
+        )
+
+
+def ejecutar(tarea_id, trabajador):
+    """
+    Ejecuta una tarea ya reclamada por `trabajador` y guarda el resultado (en un
+    hilo o proceso del pool). Si entretanto venció el plazo y otro trabajador la
+    reclamó, el resultado de este ya no se escribe: cada UPDATE final filtra por
+    estado y trabajador, como `renovar`.
+    """
+    close_old_connections()
+    try:
+        tarea = Tarea.objects.get(pk=tarea_id)
+        mia = Tarea.objects.filter(pk=tarea_id, estado='en_curso', trabajador=trabajador)
+        definicion = REGISTRO.get(tarea.nombre)
+        try:
+            if definicion is None:
+                raise LookupError(f'Tarea desconocida: {tarea.nombre}')
+            definicion.funcion(**tarea.argumentos)
+        except Exception:
+            error = traceback.format_exc()[-TAMANO_ERROR:]
+            logger.exception('Falló la tarea %s (intento %s/%s)', tarea, tarea.intentos, tarea.max_intentos)
+            if definicion is not None and tarea.intentos < tarea.max_intentos:
+                espera = min(definicion.espera * 2 ** (tarea.intentos - 1), ESPERA_MAXIMA) * random.uniform(0.8, 1.2)
+                _volver_a_pendiente(tarea_id, {'ejecutar_en': timezone.now() + timedelta(seconds=espera), 'ultimo_error': error}, trabajador)
+            else:
+                mia.update(estado='fallida', bloqueada_hasta=None, terminada=timezone.now(), ultimo_error=error)
+            return False
+        if not mia.update(estado='hecha', bloqueada_hasta=None, terminada=timezone.now(), ultimo_error=''):
+            logger.warning('La tarea %s terminó cuando ya la había reclamado otro trabajador; su resultado no se guarda', tarea)
+        return True
+    finally:
+        close_old_connections()
+
+
+def renovar(tarea_ids, trabajador):
+    """Alarga el plazo de las tareas que este trabajador sigue ejecutando."""
+    if tarea_ids:
+        Tarea.objects.filter(pk__in=list(tarea_ids), estado='en_curso', trabajador=trabajador).update(
+            bloqueada_hasta=timezone.now() + timedelta(seconds=settings.TAREAS_PLAZO_SEGUNDOS),
+        )
+
+
+def recuperar_abandonadas():
+    """Las tareas en curso con el plazo vencido (su trabajador murió) vuelven a pendientes o fallan."""
+    recuperadas = 0
+    vencidas = Tarea.objects.filter(estado='en_curso', bloqueada_hasta__lt=timezone.now())
+    for tarea_id, intentos, max_intentos in vencidas.values_list('pk', 'intentos', 'max_intentos'):
+        aviso = 'Plazo vencido: el trabajador dejó de responder.'
+        if intentos < max_intentos:
+            _volver_a_pendiente(tarea_id, {'trabajador': '', 'ultimo_error': aviso})
+        else:
+            Tarea.objects.filter(pk=tarea_id, estado='en_curso').update(estado='fallida', bloqueada_hasta=None, terminada=timezone.now(), ultimo_error=aviso)
+        recuperadas += 1
+    return recuperadas
+
+
+def purgar_terminadas():
+    """Borra las tareas hechas hace más de TAREAS_CONSERVAR_DIAS (las fallidas se quedan para revisarlas)."""
+    limite = timezone.now() - timedelta(days=settings.TAREAS_CONSERVAR_DIAS)
+    return Tarea.objects.filter(estado='hecha', terminada__lt=limite).delete()[0]
+
+
+def programar_periodicas(ahora=None):
+    """Encola las tareas de TAREAS_PROGRAMADAS cuya hora de hoy ya pasó y que hoy aún no se encolaron."""
+    local = timezone.localtime(ahora)
+    encoladas = []
+    for nombre, hora in settings.TAREAS_PROGRAMADAS.items():
+        horas, minutos = (int(parte) for parte in hora.split(':'))
+        if (local.hour, local.minute) < (horas, minutos):
+            continue
+        clave = f'programada:{nombre}:{local.date().isoformat()}'
+        if not Tarea.objects.filter(clave=clave).exists():
+            encoladas.append(_insertar(REGISTRO[nombre], clave, timezone.now(), {}))
+    return encoladas
+
+
+def mantenimiento():
+    recuperar_abandonadas()
+    purgar_terminadas()
+    programar_periodicas()
+
+
+def _iniciar_proceso():
+    # Cada proceso del pool abre sus propias conexiones (con spawn, además, configura Django)
+    import django
+    django.setup()
+    connections.close_all()
+
+
+class Trabajador:
+    """Bucle de `run_worker`: reclama tareas vencidas mientras haya hueco en el pool."""
+
+    def __init__(self, concurrencia=4, procesos=False, intervalo=1.0):
+        self.concurrencia = max(concurrencia, 1)
+        self.procesos = procesos
+        self.intervalo = intervalo
+        self.nombre = f'{socket.gethostname()}:{os.getpid()}'
+        self.detener = threading.Event()
+
+    def una_vez(self):
+        """Ejecuta en este hilo todo lo que ya venció y termina. Devuelve cuántas tareas ejecutó."""
+        mantenimiento()
+        ejecutadas = 0
+        while not self.detener.is_set():
+            reclamadas = reclamar(self.concurrencia, self.nombre)
+            if not reclamadas:
+                break
+            for tarea_id in reclamadas:
+                ejecutar(tarea_id, self.nombre)
+                ejecutadas += 1
+        return ejecutadas
+
+    def bucle(self):
+        if self.procesos:
+            # Que los procesos hijos no hereden las conexiones abiertas del padre
+            connections.close_all()
+            pool = ProcessPoolExecutor(self.concurrencia, initializer=_iniciar_proceso)
+        else:
+            pool = ThreadPoolExecutor(self.concurrencia, thread_name_prefix='tarea')
+        en_curso = {}
+        ultimo_mantenimiento = 0.0
+        try:
+            while not self.detener.is_set():
+                if time.monotonic() - ultimo_mantenimiento >= MANTENIMIENTO_SEGUNDOS:
+                    mantenimiento()
+                    renovar(en_curso.values(), self.nombre)
+                    ultimo_mantenimiento = time.monotonic()
+                for futuro in [f for f in en_curso if f.done()]:
+                    tarea_id = en_curso.pop(futuro)
+                    if futuro.exception() is not None:
+                        logger.error('El pool no pudo ejecutar la tarea %s: %s', tarea_id, futuro.exception())
+                libres = self.concurrencia - len(en_curso)
+                if libres:
+                    for tarea_id in reclamar(libres, self.nombre):
+                        en_curso[pool.submit(ejecutar, tarea_id, self.nombre)] = tarea_id
+                close_old_connections()
+                if en_curso:
+                    wait(list(en_curso), timeout=self.intervalo, return_when=FIRST_COMPLETED)
+                else:
+                    self.detener.wait(self.intervalo)
+        finally:
+            # Parada ordenada: lo que está en curso termina; lo no empezado sigue pendiente
+            pool.shutdown(wait=True)
+
+
+# --- Tareas de la aplicación ---
+
+@tarea(reintentos=3, espera=60)
+def sincronizar_archivo_torneo(torneo_id):
+    """Exporta la instantánea estática de un torneo finalizado, o la elimina si se reabrió (ver archivo.py)."""
+    from . import archivo
+    from .models import Torneo
+    torneo = Torneo.objects.filter(pk=torneo_id).first()
+    if torneo is not None and archivo.torneo_finalizado(torneo):
+        archivo.exportar_torneo(torneo)
+    else:
+        archivo.eliminar_archivo(torneo_id)
+
+
+@tarea(reintentos=3, espera=300)
+def reconstruir_acumulados():
+    from . import acumulados
+    acumulados.reconstruir()
+
+
+@tarea(reintentos=3, espera=300)
+def sincronizar_multas():
+    from . import multas
+    multas.sincronizar_tarjetas()
+    multas.recalcular_todos()
+
+
+@tarea(reintentos=3, espera=120, opcional=True)
+def preparar_imagen(url):
+    """Descarga y genera por adelantado las variantes WebP de una imagen externa (ver imagenes.py)."""
+    from . import imagenes
+    for variante in imagenes.VARIANTES:
+        imagenes.variante(url, variante, 'webp')
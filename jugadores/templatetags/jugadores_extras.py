@@ -0,0 +1,26 @@
+from django import template
+
+from jugadores import imagenes
+
+register = template.Library()
+
+
+@register.filter
+def get_item(diccionario, clave):
+    """Acceso a un dict por clave variable desde la plantilla: {{ d|get_item:k }}."""
+    try:
+        return diccionario.get(clave)
+    except AttributeError:
+        return None
+
+
+@register.simple_tag
+def imagen_src(url, variante='tarjeta'):
+    """URL de una imagen externa servida por el proxy: {% imagen_src jugador.imagen_url 'mini' %}."""
+    return imagenes.url_proxy(url, variante) if url else ''
+
+
+@register.simple_tag
+def imagen_srcset(url):
+    """srcset con todas las variantes del proxy para que el navegador elija tamaño."""
+    return imagenes.srcset(url) if url else ''
@@ -2,10 +2,23 @@ from django.test import TestCase
 from django.contrib.auth.models import User
 from .models import Equipo, Jugador, Partido, Tarjeta, Estadistica, Torneo
 from django.utils import timezone
+from datetime import date
 from decimal import Decimal
 from django.urls import reverse
 
 
+def directorio_temporal(prueba, ajuste):
+	"""Apunta el ajuste `ajuste` a un directorio temporal durante la prueba y lo devuelve."""
+	import tempfile, shutil
+	from django.test import override_settings
+	ruta = tempfile.mkdtemp()
+	prueba.addCleanup(shutil.rmtree, ruta, ignore_errors=True)
+	ajustes = override_settings(**{ajuste: ruta})
+	ajustes.enable()
+	prueba.addCleanup(ajustes.disable)
+	return ruta
+
+
 class TarjetaModelTests(TestCase):
 
 	def setUp(self):
@@ -57,6 +70,9 @@ class TarjetaModelTests(TestCase):
 class EstadisticasViewsTests(TestCase):
 
 	def setUp(self):
+		# Las instantáneas de torneos y los comprobantes subidos no deben ir a los directorios reales
+		directorio_temporal(self, 'ARCHIVO_TORNEOS_ROOT')
+		directorio_temporal(self, 'MEDIA_ROOT')
 		# Equipos
 		self.e1 = Equipo.objects.create(nombre='E1v')
 		self.e2 = Equipo.objects.create(nombre='E2v')
@@ -403,3 +419,1780 @@ class EstadisticasViewsTests(TestCase):
 		# debe fallar la validación y re-renderizar
 		self.assertEqual(resp.status_code, 200)
 		self.assertContains(resp, 'La referencia no puede contener más de 6 dígitos.')
+
+
+class ArchivoTorneoTests(TestCase):
+
+	def setUp(self):
+		self.tmp = directorio_temporal(self, 'ARCHIVO_TORNEOS_ROOT')
+		self.e1 = Equipo.objects.create(nombre='A1')
+		self.e2 = Equipo.objects.create(nombre='A2')
+		self.torneo = Torneo.objects.create(nombre='Apertura', fecha_inicio='2024-01-01', fecha_fin='2024-06-01')
+		self.torneo.equipos.add(self.e1, self.e2)
+		self.partido = Partido.objects.create(torneo=self.torneo, equipo_local=self.e1, equipo_visitante=self.e2, fecha='2024-02-01', marcador_local=2, marcador_visitante=1, estado='jugado')
+
+	def test_exportar_y_redirigir(self):
+		from . import archivo
+		from django.core.management import call_command
+		from io import StringIO
+		self.assertIsNone(archivo.url_archivo(self.torneo.id, 'clasificacion.html'))
+		call_command('exportar_archivo_torneos', stdout=StringIO())
+		manifiesto = archivo.leer_manifiesto(self.torneo.id)
+		self.assertIn(f'partido_{self.partido.id}.html', manifiesto['paginas'])
+		import json, os
+		ruta = os.path.join(self.tmp, 'publico', 'torneo', str(self.torneo.id), manifiesto['version'], 'torneo.json')
+		with open(ruta, encoding='utf-8') as fh:
+			datos = json.load(fh)
+		self.assertEqual(datos['clasificacion'][0]['nombre'], 'A1')
+		self.assertEqual(datos['clasificacion'][0]['puntos'], 3)
+		# La vista en vivo redirige a la instantánea
+		resp = self.client.get(reverse('tabla_clasificacion') + f'?torneo={self.torneo.id}')
+		self.assertEqual(resp.status_code, 302)
+		self.assertEqual(resp['Location'], archivo.url_archivo(self.torneo.id, 'clasificacion.html'))
+		# Y la instantánea se sirve con caché inmutable
+		resp = self.client.get(resp['Location'])
+		self.assertEqual(resp.status_code, 200)
+		self.assertIn('immutable', resp['Cache-Control'])
+
+	def test_solo_redirige_al_pedir_el_torneo_y_nunca_al_staff(self):
+		import os
+		from . import archivo
+		archivo.exportar_torneo(self.torneo)
+		# Sin torneo en la URL se muestra en vivo el predeterminado, con todos en el selector
+		Torneo.objects.create(nombre='Vigente', fecha_inicio='2025-01-01')
+		resp = self.client.get(reverse('tabla_clasificacion'))
+		self.assertEqual(resp.status_code, 200)
+		self.assertContains(resp, 'Vigente')
+		self.assertEqual(self.client.get(reverse('torneo_detalle', args=[self.torneo.id])).status_code, 302)
+		self.client.force_login(User.objects.create_user(username='organizador', password='pw', is_staff=True))
+		self.assertEqual(self.client.get(reverse('torneo_detalle', args=[self.torneo.id])).status_code, 200)
+		self.assertEqual(self.client.get(reverse('tabla_clasificacion') + f'?torneo={self.torneo.id}').status_code, 200)
+		# La instantánea no tiene selector de un solo torneo y es la vista anónima
+		manifiesto = archivo.leer_manifiesto(self.torneo.id)
+		with open(os.path.join(self.tmp, 'publico', 'torneo', str(self.torneo.id), manifiesto['version'], 'clasificacion.html'), encoding='utf-8') as fh:
+			pagina = fh.read()
+		self.assertNotIn('<select name="torneo"', pagina)
+		self.assertIn('Ver otros torneos', pagina)
+		self.assertNotIn('organizador', pagina)
+
+	def test_cierre_de_torneo_exporta_y_reapertura_elimina(self):
+		from . import archivo
+		abierto = Torneo.objects.create(nombre='Clausura', fecha_inicio='2024-07-01')
+		with self.captureOnCommitCallbacks(execute=True):
+			abierto.fecha_fin = '2024-12-01'
+			abierto.save()
+		abierto.refresh_from_db()
+		self.assertIsNotNone(archivo.leer_manifiesto(abierto.id))
+		abierto.fecha_fin = None
+		abierto.save()
+		self.assertIsNone(archivo.leer_manifiesto(abierto.id))
+		resp = self.client.get(reverse('estadisticas_por_torneo', args=[abierto.id]))
+		self.assertEqual(resp.status_code, 200)
+
+
+class EnVivoTests(TestCase):
+
+	def setUp(self):
+		self.e1 = Equipo.objects.create(nombre='V1')
+		self.e2 = Equipo.objects.create(nombre='V2')
+		self.partido = Partido.objects.create(equipo_local=self.e1, equipo_visitante=self.e2, fecha='2025-05-01')
+
+	def test_guardar_partido_publica_delta(self):
+		from .en_vivo import canal
+		desde = canal.ultimo_id
+		with self.captureOnCommitCallbacks(execute=True):
+			self.partido.marcador_local = 1
+			self.partido.marcador_visitante = 0
+			self.partido.save()
+		resp = self.client.get(reverse('en_vivo_sondeo'), {'partido': self.partido.id, 'desde': desde})
+		self.assertEqual(resp.status_code, 200)
+		eventos = resp.json()['eventos']
+		self.assertEqual(len(eventos), 1)
+		self.assertEqual(eventos[0]['tipo'], 'marcador')
+		self.assertEqual(eventos[0]['marcador_local'], 1)
+		# Otro partido no recibe el evento, la liga sí
+		resp = self.client.get(reverse('en_vivo_sondeo'), {'partido': self.partido.id + 1000, 'desde': desde})
+		self.assertEqual(resp.json()['eventos'], [])
+		resp = self.client.get(reverse('en_vivo_sondeo'), {'desde': desde})
+		self.assertEqual(len(resp.json()['eventos']), 1)
+
+	def test_sse_bajo_wsgi_entrega_pendientes_y_termina(self):
+		from .en_vivo import canal
+		desde = canal.ultimo_id
+		user = User.objects.create_user(username='arbitro', password='pw', is_staff=True)
+		jugador = Jugador.objects.create(user=user, nombre='Ana', apellido='Rey', cedula='9100001', equipo=self.e1)
+		with self.captureOnCommitCallbacks(execute=True):
+			Tarjeta.objects.create(partido=self.partido, jugador=jugador, tipo='amarilla', minuto=33)
+		resp = self.client.get(reverse('partido_eventos', args=[self.partido.id]), HTTP_LAST_EVENT_ID=str(desde))
+		self.assertEqual(resp['Content-Type'], 'text/event-stream')
+		cuerpo = resp.content.decode()
+		self.assertIn('event: estado', cuerpo)
+		self.assertIn('event: tarjeta', cuerpo)
+		self.assertIn('Ana Rey', cuerpo)
+		self.assertEqual(self.client.get(reverse('partido_eventos', args=[999999])).status_code, 404)
+
+	def test_cursor_de_otro_worker_pide_resync_sin_reenviar_historial(self):
+		from .en_vivo import canal
+		with self.captureOnCommitCallbacks(execute=True):
+			self.partido.marcador_local = 2
+			self.partido.save()
+		# Cursor de otro proceso con un id menor: antes se reenviaba el historial de este
+		ajeno = f'otro{canal.instancia}:0'
+		resp = self.client.get(reverse('en_vivo_sondeo'), {'partido': self.partido.id, 'desde': ajeno}).json()
+		self.assertEqual((resp['resync'], resp['eventos'], resp['ultimo']), (True, [], canal.cursor(canal.ultimo_id)))
+		cuerpo = self.client.get(reverse('partido_eventos', args=[self.partido.id]), HTTP_LAST_EVENT_ID=f'{canal.instancia}:{canal.ultimo_id + 50}').content.decode()
+		self.assertIn('event: resync', cuerpo)
+		self.assertIn('event: estado', cuerpo)
+		self.assertNotIn('event: marcador', cuerpo)
+		# Con su propio cursor sigue normalmente
+		resp = self.client.get(reverse('en_vivo_sondeo'), {'partido': self.partido.id, 'desde': resp['ultimo']}).json()
+		self.assertEqual((resp['resync'], resp['eventos']), (False, []))
+
+
+class EncuestaTests(TestCase):
+
+	def setUp(self):
+		from .models import Encuesta, OpcionEncuesta
+		self.encuesta = Encuesta.objects.create(pregunta='¿Qué camiseta usar?', tipo='camiseta')
+		self.roja = OpcionEncuesta.objects.create(encuesta=self.encuesta, texto='Roja')
+		self.blanca = OpcionEncuesta.objects.create(encuesta=self.encuesta, texto='Blanca')
+		self.user = User.objects.create_user(username='hincha', password='pw', is_staff=True)
+
+	def test_voto_actualiza_contador_y_rechaza_duplicado(self):
+		from .encuestas import resultados
+		self.client.force_login(self.user)
+		self.assertEqual(resultados(self.encuesta.id)['total'], 0)
+		with self.captureOnCommitCallbacks(execute=True):
+			resp = self.client.post(reverse('encuestas'), {'encuesta': self.encuesta.id, 'opcion': self.roja.id})
+		self.assertEqual(resp.status_code, 302)
+		self.roja.refresh_from_db()
+		self.assertEqual(self.roja.votos, 1)
+		# La caché se invalidó al votar
+		self.assertEqual(resultados(self.encuesta.id)['total'], 1)
+		# Segundo voto del mismo usuario: rechazado y sin tocar contadores
+		resp = self.client.post(reverse('encuestas'), {'encuesta': self.encuesta.id, 'opcion': self.blanca.id}, follow=True)
+		self.assertContains(resp, 'Ya votaste en esta encuesta.')
+		self.blanca.refresh_from_db()
+		self.assertEqual(self.blanca.votos, 0)
+
+	def test_encuesta_no_numerica_es_404(self):
+		self.client.force_login(self.user)
+		for valor in ('abc', '1.5', ''):
+			with self.subTest(valor):
+				self.assertEqual(self.client.post(reverse('encuestas'), {'encuesta': valor, 'opcion': self.roja.id}).status_code, 404)
+
+	def test_anonimo_no_puede_votar(self):
+		resp = self.client.post(reverse('encuestas'), {'encuesta': self.encuesta.id, 'opcion': self.roja.id})
+		self.assertEqual(resp.status_code, 302)
+		self.assertIn('iniciar_sesion', resp['Location'])
+		self.roja.refresh_from_db()
+		self.assertEqual(self.roja.votos, 0)
+
+
+class LimiteEscriturasTests(TestCase):
+
+	def setUp(self):
+		from django.core.cache import cache, caches
+		from .models import Encuesta, OpcionEncuesta
+		cache.clear()
+		# Los cubos van a disco: que no pasen a otras pruebas ni a la siguiente ejecución
+		caches['compartida'].clear()
+		self.addCleanup(caches['compartida'].clear)
+		self.encuesta = Encuesta.objects.create(pregunta='¿Qué camiseta usar?', tipo='camiseta')
+		self.roja = OpcionEncuesta.objects.create(encuesta=self.encuesta, texto='Roja')
+		self.user = User.objects.create_user(username='script', password='pw')
+
+	def test_rafaga_de_votos_recibe_429(self):
+		from django.test import override_settings
+		from .limites import rechazos
+		self.client.force_login(self.user)
+		datos = {'encuesta': self.encuesta.id, 'opcion': self.roja.id}
+		with override_settings(LIMITES_ESCRITURA={'encuestas': {'capacidad': 2, 'por_minuto': 6}}):
+			codigos = [self.client.post(reverse('encuestas'), datos).status_code for _ in range(3)]
+			self.assertEqual(codigos, [302, 302, 429])
+			resp = self.client.post(reverse('encuestas'), datos)
+			self.assertEqual(resp.status_code, 429)
+			self.assertGreaterEqual(int(resp['Retry-After']), 1)
+			self.assertEqual(rechazos(), {'encuestas': 2})
+			# Las lecturas no consumen fichas
+			self.assertEqual(self.client.get(reverse('encuestas')).status_code, 200)
+
+	def test_cubo_se_recarga_con_el_tiempo(self):
+		from .limites import consumir
+		self.assertEqual(consumir('limite:prueba', 1, 60, ahora=100.0), 0)
+		self.assertEqual(consumir('limite:prueba', 1, 60, ahora=100.5), 1)
+		self.assertEqual(consumir('limite:prueba', 1, 60, ahora=101.5), 0)
+
+	def test_staff_exento(self):
+		from django.test import override_settings
+		staff = User.objects.create_user(username='mesa', password='pw', is_staff=True)
+		self.client.force_login(staff)
+		with override_settings(LIMITES_ESCRITURA={'encuestas': {'capacidad': 1, 'por_minuto': 1}}):
+			for _ in range(3):
+				resp = self.client.post(reverse('encuestas'), {'encuesta': self.encuesta.id, 'opcion': self.roja.id})
+				self.assertEqual(resp.status_code, 302)
+			self.assertEqual(self.client.get(reverse('estado_limites')).json()['rechazos'], {'encuestas': 0})
+
+	def test_usuarios_tras_la_misma_ip_tienen_su_propio_limite(self):
+		from django.test import override_settings
+		datos = {'encuesta': self.encuesta.id, 'opcion': self.roja.id}
+		aficionados = [User.objects.create_user(username=f'grada{i}', password='pw') for i in range(4)]
+		limites = {'encuestas': {'capacidad': 1, 'por_minuto': 1, 'ip_capacidad': 3, 'ip_por_minuto': 1}}
+		with override_settings(LIMITES_ESCRITURA=limites):
+			codigos = []
+			for aficionado in aficionados:
+				self.client.force_login(aficionado)
+				codigos.append(self.client.post(reverse('encuestas'), datos, REMOTE_ADDR='198.51.100.20').status_code)
+			# Tres votos de usuarios distintos pasan con la misma IP; el cuarto agota la de la IP
+			self.assertEqual(codigos, [302, 302, 302, 429])
+			# El cubo de cada usuario sigue siendo de una ficha aunque cambie de IP
+			self.client.force_login(aficionados[0])
+			self.assertEqual(self.client.post(reverse('encuestas'), datos, REMOTE_ADDR='198.51.100.21').status_code, 429)
+
+	def test_ip_del_cliente_la_pone_el_proxy_de_confianza(self):
+		from django.test import RequestFactory, override_settings
+		from .limites import ip_cliente
+		# El cliente inventa la primera entrada; el proxy añade la IP real al final
+		peticion = RequestFactory().post('/', REMOTE_ADDR='10.0.0.1', HTTP_X_FORWARDED_FOR='1.2.3.4, 203.0.113.7')
+		with override_settings(LIMITES_PROXIES_DE_CONFIANZA=0):
+			self.assertEqual(ip_cliente(peticion), '10.0.0.1')
+		with override_settings(LIMITES_PROXIES_DE_CONFIANZA=1):
+			self.assertEqual(ip_cliente(peticion), '203.0.113.7')
+		with override_settings(LIMITES_PROXIES_DE_CONFIANZA=3):
+			self.assertEqual(ip_cliente(peticion), '10.0.0.1')
+
+
+class ConfiguracionBaseDatosTests(TestCase):
+
+	def test_sqlite_recibe_pragmas_y_conexion_persistente(self):
+		import os
+		from pathlib import Path
+		from unittest import mock
+		from config.database import configurar_bases
+		with mock.patch.dict('os.environ', {'DB_CONN_MAX_AGE': '120'}, clear=False):
+			os.environ.pop('DATABASE_URL', None)
+			default = configurar_bases(Path('/tmp'))['default']
+		self.assertEqual(default['CONN_MAX_AGE'], 120)
+		self.assertEqual(default['OPTIONS']['transaction_mode'], 'IMMEDIATE')
+		self.assertIn('PRAGMA journal_mode=WAL', default['OPTIONS']['init_command'])
+		self.assertIn('PRAGMA busy_timeout=20000', default['OPTIONS']['init_command'])
+
+	def test_database_url(self):
+		from pathlib import Path
+		from unittest import mock
+		from config.database import configurar_bases
+		with mock.patch.dict('os.environ', {'DATABASE_URL': 'postgres://u:p@db:5432/liga'}):
+			default = configurar_bases(Path('/tmp'))['default']
+		self.assertEqual(default['ENGINE'], 'django.db.backends.postgresql')
+		self.assertEqual(default['NAME'], 'liga')
+		self.assertNotIn('init_command', default.get('OPTIONS', {}))
+
+
+class ColaEscriturasTests(TestCase):
+
+	def setUp(self):
+		self.local = Equipo.objects.create(nombre='Local')
+		self.visitante = Equipo.objects.create(nombre='Visitante')
+		self.partido = Partido.objects.create(equipo_local=self.local, equipo_visitante=self.visitante, fecha=timezone.now())
+		self.users = [User.objects.create_user(username=f'hincha{i}', password='pw', is_staff=True) for i in range(3)]
+		self.jugador = Jugador.objects.create(user=self.users[0], nombre='Ana', apellido='Gol', cedula='C1', equipo=self.local)
+
+	def test_votos_encolados_se_vuelcan_en_un_lote(self):
+		from django.test import override_settings
+		from .cola_escrituras import ColaEscrituras
+		from .models import VotacionJugadorPartido
+		cola = ColaEscrituras()
+		# Intervalo largo: el hilo escritor no llega a volcar, lo hace `vaciar` en este hilo
+		with override_settings(COLA_ESCRITURAS_ACTIVA=True, COLA_ESCRITURAS_INTERVALO=60):
+			for u in self.users:
+				cola.encolar(VotacionJugadorPartido(partido=self.partido, jugador=self.jugador, usuario=u))
+			self.assertEqual(cola.metricas()['profundidad'], 3)
+			self.assertEqual(VotacionJugadorPartido.objects.count(), 0)
+			self.assertEqual(cola.vaciar(), 3)
+			cola.detener()
+		self.assertEqual(VotacionJugadorPartido.objects.count(), 3)
+		metricas = cola.metricas()
+		self.assertEqual((metricas['profundidad'], metricas['lotes'], metricas['lote_max']), (0, 1, 3))
+
+	def test_papeleta_duplicada_se_descarta_sin_perder_el_lote(self):
+		from django.test import override_settings
+		from .cola_escrituras import ColaEscrituras
+		from .encuestas import _registrar_voto
+		from .models import Encuesta, OpcionEncuesta
+		encuesta = Encuesta.objects.create(pregunta='¿Mejor gol?', tipo='gol')
+		opcion = OpcionEncuesta.objects.create(encuesta=encuesta, texto='Chilena')
+		cola = ColaEscrituras()
+		with override_settings(COLA_ESCRITURAS_ACTIVA=True, COLA_ESCRITURAS_INTERVALO=60):
+			for u in (self.users[0], self.users[0], self.users[1]):
+				cola.encolar(lambda u=u: _registrar_voto(encuesta.pk, opcion.pk, u.pk))
+			with self.assertLogs('jugadores.cola_escrituras', 'ERROR'):
+				cola.vaciar()
+			cola.detener()
+		opcion.refresh_from_db()
+		self.assertEqual(opcion.votos, 2)
+		metricas = cola.metricas()
+		self.assertEqual(metricas['descartados'], 1)
+		self.assertIn('UNIQUE', metricas['ultimos_descartados'][0])
+
+	def test_escritura_imposible_o_bloqueada_no_detiene_la_cola(self):
+		from unittest import mock
+		from django.db import OperationalError
+		from django.test import override_settings
+		from .cola_escrituras import ColaEscrituras
+		from .models import VotacionJugadorPartido
+
+		def bloqueada():
+			raise OperationalError('database is locked')
+
+		def rota():
+			raise ValueError('dato imposible')
+
+		votar = lambda u: VotacionJugadorPartido(partido=self.partido, jugador=self.jugador, usuario=u)
+		cola = ColaEscrituras()
+		# Intervalo largo para que vuelque `vaciar` en este hilo; sin esperas entre reintentos
+		with override_settings(COLA_ESCRITURAS_ACTIVA=True, COLA_ESCRITURAS_INTERVALO=60, COLA_ESCRITURAS_INTENTOS=3, COLA_ESCRITURAS_LOTE=2), \
+				mock.patch('jugadores.cola_escrituras.time.sleep'):
+			cola.encolar(bloqueada)
+			cola.encolar(votar(self.users[0]))
+			cola.encolar(rota)
+			cola.encolar(votar(self.users[1]))
+			with self.assertLogs('jugadores.cola_escrituras', 'WARNING') as registro:
+				self.assertEqual(cola.vaciar(), 4)
+			cola.detener()
+		# El lote bloqueado se reintenta 3 veces y se descarta; del otro solo cae la escritura rota
+		self.assertEqual(sum('ocupada' in linea for linea in registro.output), 3)
+		self.assertEqual(list(VotacionJugadorPartido.objects.values_list('usuario', flat=True)), [self.users[1].pk])
+		metricas = cola.metricas()
+		self.assertEqual((metricas['descartados'], metricas['reintentos'], metricas['profundidad']), (3, 2, 0))
+
+	def test_error_inesperado_no_mata_el_hilo_escritor(self):
+		import time
+		from unittest import mock
+		from django.test import override_settings
+		from .cola_escrituras import ColaEscrituras
+		cola = ColaEscrituras()
+		escritos = []
+		fallos = iter([RuntimeError('imprevisto')])
+
+		def volcar_con_fallo(lote):
+			for error in fallos:
+				raise error
+			escritos.extend(lote)
+
+		with override_settings(COLA_ESCRITURAS_ACTIVA=True, COLA_ESCRITURAS_INTERVALO=0.01, COLA_ESCRITURAS_LOTE=1), \
+				mock.patch.object(cola, '_volcar', volcar_con_fallo), self.assertLogs('jugadores.cola_escrituras', 'ERROR'):
+			cola.encolar('primero')
+			for _ in range(200):
+				if cola.metricas()['descartados']:
+					break
+				time.sleep(0.01)
+			cola.encolar('segundo')
+			for _ in range(200):
+				if escritos:
+					break
+				time.sleep(0.01)
+			self.assertTrue(cola.metricas()['hilo_vivo'])
+			cola.detener()
+		self.assertEqual(escritos, ['segundo'])
+		self.assertEqual(cola.metricas()['descartados'], 1)
+
+	def test_desactivada_el_error_de_integridad_llega_a_quien_escribe(self):
+		from django.db import IntegrityError
+		from .cola_escrituras import ColaEscrituras
+		from .encuestas import _registrar_voto
+		from .models import Encuesta, OpcionEncuesta
+		encuesta = Encuesta.objects.create(pregunta='¿Mejor gol?', tipo='gol')
+		opcion = OpcionEncuesta.objects.create(encuesta=encuesta, texto='Chilena')
+		cola = ColaEscrituras()
+		self.assertTrue(cola.encolar(lambda: _registrar_voto(encuesta.pk, opcion.pk, self.users[0].pk)))
+		with self.assertRaises(IntegrityError):
+			cola.encolar(lambda: _registrar_voto(encuesta.pk, opcion.pk, self.users[0].pk))
+		self.assertEqual(cola.metricas()['descartados'], 0)
+
+	def test_desactivada_escribe_al_momento(self):
+		from .models import VotacionJugadorPartido
+		self.client.force_login(self.users[0])
+		self.client.post(reverse('detalle_partido', args=[self.partido.id]), {'jugador': self.jugador.id})
+		self.assertEqual(VotacionJugadorPartido.objects.count(), 1)
+		self.assertEqual(self.client.get(reverse('estado_cola_escrituras')).json()['profundidad'], 0)
+
+
+class EnrutadoLecturasTests(TestCase):
+
+	def setUp(self):
+		from config.routers import LecturasRouter
+		self.router = LecturasRouter()
+		self.router.replicas = ['replica1']
+
+	def test_lecturas_publicas_a_replica_hasta_que_se_escribe(self):
+		from django.contrib.auth.models import User as Usuario
+		from config.routers import _peticion
+		self.assertIsNone(self.router.db_for_read(Jugador))
+		token = _peticion.set({'replica': True, 'escrito': False})
+		try:
+			self.assertEqual(self.router.db_for_read(Jugador), 'replica1')
+			# Sesiones y usuarios siempre de la primaria
+			self.assertIsNone(self.router.db_for_read(Usuario))
+			self.assertEqual(self.router.db_for_write(Jugador), 'default')
+			self.assertIsNone(self.router.db_for_read(Jugador))
+		finally:
+			_peticion.reset(token)
+
+	def test_escritura_fija_la_sesion_a_la_primaria(self):
+		from unittest import mock
+		from django.conf import settings
+		from django.test import RequestFactory
+		from config.routers import EnrutadoLecturasMiddleware, _peticion
+		vistas = []
+		def vista(request):
+			vistas.append(dict(_peticion.get()))
+			from django.http import HttpResponse
+			return HttpResponse()
+		middleware = EnrutadoLecturasMiddleware(vista)
+		factory = RequestFactory()
+		with mock.patch('config.routers.alias_replicas', return_value=['replica1']):
+			resp = middleware(factory.post('/encuestas/'))
+			self.assertIn(settings.REPLICAS_COOKIE, resp.cookies)
+			get = factory.get('/')
+			get.resolver_match = mock.Mock(url_name='inicio')
+			get.COOKIES[settings.REPLICAS_COOKIE] = resp.cookies[settings.REPLICAS_COOKIE].value
+			def vista_get(request):
+				middleware.process_view(request, None, (), {})
+				vistas.append(dict(_peticion.get()))
+				from django.http import HttpResponse
+				return HttpResponse()
+			EnrutadoLecturasMiddleware(vista_get)(get)
+			self.assertFalse(vistas[-1]['replica'])
+			del get.COOKIES[settings.REPLICAS_COOKIE]
+			EnrutadoLecturasMiddleware(vista_get)(get)
+			self.assertTrue(vistas[-1]['replica'])
+
+
+class LoginRapidoTests(TestCase):
+
+	def setUp(self):
+		from django.core.cache import cache, caches
+		cache.clear()
+		from . import referencia
+		# Las marcas de perfil y las sesiones van a disco: que no pasen a la siguiente ejecución
+		caches['compartida'].clear()
+		self.addCleanup(caches['compartida'].clear)
+		# Vaciarla reinicia el sello de versión: la copia local de otra prueba no debe valer
+		referencia.invalidar()
+
+	def test_login_no_toca_perfil_ni_grupos_si_ya_esta_aprovisionado(self):
+		from django.db import connection
+		from django.test.utils import CaptureQueriesContext
+		with self.captureOnCommitCallbacks(execute=True):
+			user = User.objects.create_user(username='nuevo', password='clave-segura-1')
+		self.assertTrue(Jugador.objects.filter(user=user).exists())
+		self.assertTrue(user.groups.filter(name='jugadores').exists())
+		with CaptureQueriesContext(connection) as consultas:
+			resp = self.client.post(reverse('iniciar_sesion'), {'username': 'nuevo', 'password': 'clave-segura-1'})
+		self.assertEqual(resp.status_code, 302)
+		sql = ' '.join(q['sql'] for q in consultas.captured_queries)
+		self.assertNotIn('jugadores_jugador', sql)
+		self.assertNotIn('auth_group', sql)
+
+	def test_sesion_y_marca_de_perfil_en_la_cache_compartida(self):
+		from django.conf import settings
+		from django.core.cache import cache, caches
+		from . import perfiles
+		with self.captureOnCommitCallbacks(execute=True):
+			user = User.objects.create_user(username='compartido', password='clave-segura-1')
+		self.client.post(reverse('iniciar_sesion'), {'username': 'compartido', 'password': 'clave-segura-1'})
+		clave_sesion = self.client.session.cache_key
+		# Lo que ve otro worker: su caché local está vacía
+		cache.clear()
+		self.assertIsNotNone(caches[settings.SESSION_CACHE_ALIAS].get(clave_sesion))
+		self.assertTrue(caches['compartida'].get(perfiles._clave(user.pk)))
+		self.client.post(reverse('cerrar_sesion'))
+		self.assertIsNone(caches['compartida'].get(clave_sesion))
+
+	def test_cuenta_sin_perfil_se_completa_al_iniciar_sesion(self):
+		user = User.objects.create_user(username='antiguo', password='clave-segura-1')
+		Jugador.objects.filter(user=user).delete()
+		user.groups.clear()
+		self.client.post(reverse('iniciar_sesion'), {'username': 'antiguo', 'password': 'clave-segura-1'})
+		self.assertTrue(Jugador.objects.filter(user=user).exists())
+		self.assertTrue(user.groups.filter(name='jugadores').exists())
+
+
+class ReferenciaCacheTests(TestCase):
+
+	def setUp(self):
+		# Las instantáneas de torneos no deben leerse ni escribirse en el archivo real
+		directorio_temporal(self, 'ARCHIVO_TORNEOS_ROOT')
+		from django.core.cache import cache, caches
+		cache.clear()
+		caches['compartida'].clear()
+
+	def test_datos_cacheados_por_proceso_e_invalidados_por_senales(self):
+		from . import referencia
+		Equipo.objects.create(nombre='Primero')
+		nombres = list(Equipo.objects.order_by('pk').values_list('nombre', flat=True))
+		with self.captureOnCommitCallbacks(execute=True):
+			self.assertEqual([e.nombre for e in referencia.equipos()], nombres)
+			id_predeterminado = referencia.equipo_predeterminado_id()
+		with self.assertNumQueries(0):
+			referencia.equipos()
+			self.assertEqual(referencia.equipo_predeterminado_id(), id_predeterminado)
+		with self.captureOnCommitCallbacks(execute=True):
+			Equipo.objects.create(nombre='Segundo')
+		self.assertEqual([e.nombre for e in referencia.equipos()], nombres + ['Segundo'])
+
+	def test_otro_proceso_ve_la_invalidacion(self):
+		from django.core.cache import caches
+		from . import referencia
+		with self.captureOnCommitCallbacks(execute=True):
+			referencia.torneos()
+		version = caches['compartida'].get(referencia.CLAVE_VERSION)
+		# Otro worker invalida: aquí solo cambia el sello de la caché compartida
+		copia = dict(referencia._local)
+		with self.captureOnCommitCallbacks(execute=True):
+			Torneo.objects.create(nombre='Nuevo', fecha_inicio=timezone.localdate())
+		referencia._local.update(copia)
+		self.assertGreater(caches['compartida'].get(referencia.CLAVE_VERSION), version)
+		self.assertIn('Nuevo', [t.nombre for t in referencia.torneos()])
+
+	def test_no_cachea_lo_que_no_se_confirmo(self):
+		from . import referencia
+		# Sin ejecutar on_commit (como tras un rollback) cada acceso vuelve a consultar
+		referencia.torneos()
+		with self.assertNumQueries(1):
+			referencia.torneos()
+
+
+class AltaJugadorTests(TestCase):
+
+	def test_registro_crea_usuario_jugador_y_grupo_en_una_pasada(self):
+		from django.db import connection
+		from django.test.utils import CaptureQueriesContext
+		datos = {
+			'username': 'nueva', 'first_name': 'Nora', 'last_name': 'Paz', 'cedula': '12345678',
+			'fecha_de_nacimiento': '2000-05-01', 'password1': 'Clave-Segura-9', 'password2': 'Clave-Segura-9',
+		}
+		with CaptureQueriesContext(connection) as consultas:
+			resp = self.client.post(reverse('registro'), datos)
+		self.assertEqual(resp.status_code, 302)
+		jugador = Jugador.objects.get(user__username='nueva')
+		self.assertEqual((jugador.cedula, jugador.nombre, str(jugador.fecha_de_nacimiento)), ('12345678', 'Nora', '2000-05-01'))
+		self.assertTrue(jugador.user.groups.filter(name='jugadores').exists())
+		self.assertEqual(int(self.client.session['_auth_user_id']), jugador.user_id)
+		sql = [q['sql'] for q in consultas.captured_queries]
+		self.assertEqual(sum(1 for q in sql if q.startswith('INSERT INTO "auth_user"')), 1)
+		self.assertEqual(sum(1 for q in sql if q.startswith('INSERT INTO "jugadores_jugador"')), 1)
+		# Solo el UPDATE de last_login que hace login(); ninguna corrección posterior del perfil
+		self.assertFalse([q for q in sql if q.startswith('UPDATE "jugadores_jugador"')])
+		self.assertEqual([q for q in sql if q.startswith('UPDATE "auth_user"') and 'last_login' not in q], [])
+
+	def test_agregar_jugador_sin_cedula_la_genera_sin_consultar(self):
+		from .perfiles import generar_cedula
+		staff = User.objects.create_user(username='mesa', password='pw', is_staff=True)
+		self.client.force_login(staff)
+		resp = self.client.post(reverse('agregar_jugador'), {
+			'usuario': 'fichaje', 'password_custom': 'clave-larga-1',
+			'nombre': 'Leo', 'apellido': 'Rey', 'posicion': 'Defensa',
+		})
+		self.assertEqual(resp.status_code, 302)
+		jugador = Jugador.objects.get(user__username='fichaje')
+		self.assertEqual(jugador.cedula, generar_cedula(jugador.user_id))
+		self.assertFalse(jugador.cedula.isdigit())  # no puede coincidir con las numéricas ya guardadas
+		self.assertEqual(Jugador.objects.filter(user=jugador.user).count(), 1)
+		self.assertTrue(jugador.user.check_password('clave-larga-1'))
+
+
+class ImportacionJugadoresTests(TestCase):
+
+	def setUp(self):
+		self.staff = User.objects.create_user(username='mesa', password='pw', is_staff=True)
+		self.equipo = Equipo.objects.create(nombre='Los Tigres')
+		self.client.force_login(self.staff)
+
+	def _csv(self, texto):
+		from django.core.files.uploadedfile import SimpleUploadedFile
+		return SimpleUploadedFile('plantilla.csv', texto.encode('utf-8'), content_type='text/csv')
+
+	def test_importa_y_descarga_credenciales(self):
+		texto = (
+			'Nombre;Apellido;Cédula;Fecha de nacimiento;Posición;Número;Equipo;Usuario\n'
+			'Ana;Díaz;11111111;01/02/2001;defensa;4;los tigres;\n'
+			'Luis;Mora;;2000-03-04;Arquero;1;Los Tigres;lmora\n'
+		)
+		resp = self.client.post(reverse('importar_jugadores'), {'archivo': self._csv(texto)})
+		self.assertEqual(resp.status_code, 302)
+		ana = Jugador.objects.get(cedula='11111111')
+		self.assertEqual((ana.user.username, ana.posicion, ana.equipo, ana.numero_de_camiseta), ('ana.diaz', 'Defensa', self.equipo, 4))
+		self.assertIsNotNone(ana.edad)
+		self.assertTrue(ana.user.groups.filter(name='jugadores').exists())
+		luis = Jugador.objects.get(user__username='lmora')
+		self.assertTrue(luis.cedula.startswith('G'))
+		informe = self.client.get(reverse('descargar_credenciales_importacion'))
+		self.assertEqual(informe['Content-Type'], 'text/csv; charset=utf-8')
+		lineas = informe.content.decode('utf-8').splitlines()
+		self.assertEqual(len(lineas), 3)
+		usuario, clave = lineas[2].split(',')[:2]
+		self.assertTrue(luis.user.check_password(clave))
+		# Solo se entrega una vez
+		self.assertEqual(self.client.get(reverse('descargar_credenciales_importacion')).status_code, 302)
+
+	def test_errores_no_importan_nada(self):
+		Jugador.objects.create(user=User.objects.create_user(username='viejo', password='pw', is_staff=True), nombre='V', apellido='J', cedula='22222222')
+		texto = (
+			'nombre,apellido,cedula,equipo\n'
+			'Ana,Díaz,22222222,Los Tigres\n'
+			'Luis,Mora,333,Inexistentes\n'
+			'Eva,Sol,,\n'
+		)
+		resp = self.client.post(reverse('importar_jugadores'), {'archivo': self._csv(texto)})
+		self.assertEqual(resp.status_code, 200)
+		self.assertContains(resp, 'Fila 2: la cédula 22222222 ya está registrada')
+		self.assertContains(resp, 'Fila 3: equipo desconocido: Inexistentes')
+		self.assertFalse(User.objects.filter(username='eva.sol').exists())
+
+	def test_numero_infinito_y_cedula_provisional_ocupada_se_informan_por_fila(self):
+		from .perfiles import generar_cedula
+		ultimo = User.objects.order_by('-pk').first().pk
+		# Alguien escribió a mano la cédula provisional que le tocaría al primer importado
+		Jugador.objects.create(user=User.objects.create_user(username='manual', password='pw', is_staff=True), nombre='M', apellido='A', cedula=generar_cedula(ultimo + 2))
+		texto = (
+			'nombre,apellido,cedula,numero\n'
+			'Ana,Díaz,44444444,inf\n'
+			'Eva,Sol,,7\n'
+		)
+		resp = self.client.post(reverse('importar_jugadores'), {'archivo': self._csv(texto)})
+		self.assertEqual(resp.status_code, 200)
+		self.assertContains(resp, 'Fila 2: número de camiseta no válido: inf')
+		self.assertContains(resp, 'Fila 3: ya hay cédulas provisionales en el rango')
+		self.assertFalse(User.objects.filter(username='eva.sol').exists())
+
+	def test_usuario_no_valido_o_demasiado_largo_se_informa_por_fila(self):
+		largo = 'a' * 151
+		texto = (
+			'nombre,apellido,cedula,usuario\n'
+			'Ana,Díaz,44444444,ana diaz\n'
+			'Eva,Sol,55555555,eva/sol\n'
+			f'Iris,Paz,66666666,{largo}\n'
+			'Olga,Ruiz,77777777,olga.ruiz\n'
+		)
+		resp = self.client.post(reverse('importar_jugadores'), {'archivo': self._csv(texto)})
+		self.assertEqual(resp.status_code, 200)
+		self.assertContains(resp, 'Fila 2: el usuario ana diaz solo puede tener')
+		self.assertContains(resp, 'Fila 3: el usuario eva/sol solo puede tener')
+		self.assertContains(resp, 'Fila 4: el usuario aaaaaaaaaaaaaaaaaaaa… supera los 150 caracteres')
+		self.assertNotContains(resp, 'Fila 5')
+		self.assertFalse(User.objects.filter(username='olga.ruiz').exists())
+
+	def test_cifrado_en_paralelo(self):
+		from django.contrib.auth.hashers import check_password
+		from django.test import override_settings
+		from .importacion import cifrar_claves
+		with override_settings(IMPORTACION_MIN_PARALELO=2, IMPORTACION_PROCESOS=2):
+			cifradas = cifrar_claves(['uno-1234', 'dos-1234', 'tres-1234'])
+		self.assertTrue(check_password('tres-1234', cifradas[2]))
+		self.assertTrue(cifradas[0].startswith('pbkdf2_sha256$100000$'))
+
+	def test_clave_importada_se_refuerza_al_iniciar_sesion(self):
+		from .importacion import cifrar_claves
+		user = User.objects.create_user(username='importado', password='x')
+		user.password = cifrar_claves(['clave-importada-1'])[0]
+		user.save()
+		self.client.post(reverse('iniciar_sesion'), {'username': 'importado', 'password': 'clave-importada-1'})
+		user.refresh_from_db()
+		self.assertFalse(user.password.startswith('pbkdf2_sha256$100000$'))
+
+
+class ConciliacionPagosTests(TestCase):
+
+	def setUp(self):
+		from .models import Pago
+		self.staff = User.objects.create_user(username='tesoreria', password='pw', is_staff=True)
+		self.jugador = Jugador.objects.create(user=User.objects.create_user(username='pagador', password='pw', is_staff=True), nombre='Pedro', apellido='Paz', cedula='30303030')
+		self.client.force_login(self.staff)
+		crear = lambda **kw: Pago.objects.create(jugador=self.jugador, tipo='inscripcion', **kw)
+		self.exacto = crear(monto=Decimal('150.00'), metodo='pago_movil', referencia='4321')
+		self.otro_monto = crear(monto=Decimal('99.00'), metodo='pago_movil', referencia='5555')
+		self.repetido_a = crear(monto=Decimal('10.00'), metodo='pago_movil', referencia='7777')
+		self.repetido_b = crear(monto=Decimal('10.00'), metodo='pago_movil', referencia='7777')
+		self.ya_usado = crear(monto=Decimal('20.00'), metodo='pago_movil', referencia='8888', estado='aprobado')
+		self.transferencia = crear(monto=Decimal('1234.56'), metodo='transferencia', referencia='123456')
+
+	def _csv(self, texto):
+		from django.core.files.uploadedfile import SimpleUploadedFile
+		return SimpleUploadedFile('extracto.csv', texto.encode('utf-8'), content_type='text/csv')
+
+	def test_normalizar_referencia_igual_que_el_formulario(self):
+		from .conciliacion import normalizar_referencia
+		self.assertEqual(normalizar_referencia('pago_movil', '0102-000987654321'), '4321')
+		self.assertEqual(normalizar_referencia('transferencia', 'REF 1234567'), '123456')
+		self.assertEqual(normalizar_referencia('transferencia', '123456'), '123456')
+		self.assertIsNone(normalizar_referencia('transferencia', '12345'))
+
+	def test_vista_previa_clasifica_y_confirmar_aprueba_en_bloque(self):
+		from .models import Pago
+		hoy = timezone.localdate().strftime('%d/%m/%Y')
+		texto = (
+			'Fecha;Referencia;Monto;Metodo\n'
+			f'{hoy};000987654321;150,00;pago movil\n'
+			f'{hoy};00005555;100,00;pago_movil\n'
+			f'{hoy};7777;10,00;pago_movil\n'
+			f'{hoy};8888;20,00;pago_movil\n'
+			f'{hoy};9999;5,00;pago_movil\n'
+			f'{hoy};1234567;1.234,56;transferencia\n'
+		)
+		resp = self.client.post(reverse('conciliar_pagos'), {'metodo': 'pago_movil', 'archivo': self._csv(texto)})
+		self.assertEqual(resp.status_code, 200)
+		resultado = resp.context['resultado']
+		coincidencias = {p.pk for fila in resultado['coincidencias'] for p in fila['pagos']}
+		self.assertEqual(coincidencias, {self.exacto.pk, self.transferencia.pk})
+		self.assertEqual(len(resultado['duplicados']), 2)
+		self.assertEqual([f['pagos'][0].pk for f in resultado['diferencias']], [self.otro_monto.pk])
+		self.assertEqual(len(resultado['sin_pago']), 1)
+		# La vista previa no cambia nada; confirmar aprueba con un solo UPDATE
+		self.assertEqual(Pago.objects.get(pk=self.exacto.pk).estado, 'pendiente')
+		resp = self.client.post(reverse('conciliar_pagos'), {'confirmar': '1'})
+		self.assertEqual(resp.status_code, 302)
+		self.assertEqual(
+			set(Pago.objects.filter(estado='aprobado').values_list('pk', flat=True)),
+			{self.exacto.pk, self.transferencia.pk, self.ya_usado.pk},
+		)
+		self.assertEqual(Pago.objects.get(pk=self.repetido_a.pk).estado, 'pendiente')
+
+	def test_fecha_fuera_de_ventana(self):
+		from .conciliacion import conciliar
+		from datetime import timedelta
+		linea = {'n': 2, 'fecha': timezone.localdate() - timedelta(days=10), 'metodo': 'pago_movil', 'referencia': '4321', 'original': '4321', 'monto': Decimal('150.00')}
+		resultado = conciliar([linea])
+		self.assertEqual(resultado['diferencias'][0]['motivo'], 'fecha fuera de la ventana')
+
+	def test_misma_referencia_y_monto_en_otra_moneda_no_coincide(self):
+		from .conciliacion import conciliar, leer_extracto
+		from .models import Pago
+		en_dolares = Pago.objects.create(jugador=self.jugador, tipo='inscripcion', monto=Decimal('50.00'), moneda='USD', metodo='pago_movil', referencia='2468')
+		hoy = timezone.localdate().strftime('%d/%m/%Y')
+		lineas, errores = leer_extracto(self._csv(f'Fecha;Referencia;Monto\n{hoy};2468;50,00\n'), 'pago_movil')
+		self.assertEqual((errores, lineas[0]['moneda']), ([], 'VES'))
+		resultado = conciliar(lineas)
+		self.assertEqual(resultado['coincidencias'], [])
+		self.assertEqual([f['pagos'][0].pk for f in resultado['diferencias']], [en_dolares.pk])
+		# Con la columna de moneda del extracto sí coincide
+		lineas, _errores = leer_extracto(self._csv(f'Fecha;Referencia;Monto;Moneda\n{hoy};2468;50,00;USD\n'), 'pago_movil')
+		self.assertEqual([p.pk for f in conciliar(lineas)['coincidencias'] for p in f['pagos']], [en_dolares.pk])
+
+	def test_aprobar_en_bloque_un_update(self):
+		from .conciliacion import aprobar_en_bloque
+		with self.assertNumQueries(1):
+			self.assertEqual(aprobar_en_bloque([self.exacto.pk, self.ya_usado.pk]), 1)
+
+
+class MultasTarjetasTests(TestCase):
+
+	def setUp(self):
+		self.equipo1 = Equipo.objects.create(nombre='M1')
+		self.equipo2 = Equipo.objects.create(nombre='M2')
+		self.jugador = Jugador.objects.create(user=User.objects.create_user(username='multado', password='pw', is_staff=True), nombre='Mario', apellido='Mora', cedula='40404040', equipo=self.equipo1)
+		self.partido = Partido.objects.create(equipo_local=self.equipo1, equipo_visitante=self.equipo2, fecha=timezone.now())
+
+	def _saldo(self):
+		from .models import SaldoJugador
+		return SaldoJugador.objects.get(jugador=self.jugador)
+
+	def test_tarjetas_generan_multas_y_anular_las_revierte(self):
+		from .models import Cargo
+		from . import multas
+		Tarjeta.objects.create(partido=self.partido, jugador=self.jugador, tipo='amarilla')
+		Tarjeta.objects.create(partido=self.partido, jugador=self.jugador, tipo='amarilla')
+		# Dos amarillas más la roja automática
+		self.assertEqual(Cargo.objects.filter(jugador=self.jugador, anulado=False).count(), 3)
+		self.assertEqual(self._saldo().deuda, Decimal('9.00'))
+		# Anulación masiva (update) como en el admin
+		Tarjeta.objects.filter(tipo='roja').update(anulada=True)
+		self.assertEqual(multas.sincronizar_tarjetas(Tarjeta.objects.filter(jugador=self.jugador)), (0, 1, 0))
+		self.assertEqual(self._saldo().deuda, Decimal('4.00'))
+
+	def test_pago_aprobado_descuenta_deuda_y_deudores(self):
+		from .models import Pago
+		from . import multas
+		Tarjeta.objects.create(partido=self.partido, jugador=self.jugador, tipo='roja')
+		pago = Pago.objects.create(jugador=self.jugador, tipo='tarjetas_roja', monto=Decimal('3.00'), metodo='efectivo', moneda='USD')
+		self.assertEqual(self._saldo().deuda, Decimal('5.00'))
+		pago.estado = 'aprobado'
+		pago.save()
+		self.assertEqual((self._saldo().pagos, self._saldo().deuda), (Decimal('3.00'), Decimal('2.00')))
+		with self.assertNumQueries(1):
+			self.assertEqual([s.jugador.cedula for s in multas.deudores()], ['40404040'])
+		staff = User.objects.create_user(username='caja', password='pw', is_staff=True)
+		self.client.force_login(staff)
+		resp = self.client.get(reverse('deudores'))
+		self.assertContains(resp, 'Mario Mora')
+
+	def test_borrar_tarjeta_actualiza_saldo(self):
+		tarjeta = Tarjeta.objects.create(partido=self.partido, jugador=self.jugador, tipo='roja')
+		with self.captureOnCommitCallbacks(execute=True):
+			tarjeta.delete()
+		self.assertEqual(self._saldo().deuda, Decimal('0.00'))
+		# Borrar al jugador no deja su saldo huérfano
+		with self.captureOnCommitCallbacks(execute=True):
+			self.jugador.delete()
+		from .models import SaldoJugador
+		self.assertFalse(SaldoJugador.objects.exists())
+
+
+class ArbitrajeCargosTests(TestCase):
+
+	def setUp(self):
+		# Las instantáneas de torneos no deben leerse ni escribirse en el archivo real
+		directorio_temporal(self, 'ARCHIVO_TORNEOS_ROOT')
+		from .models import Torneo
+		self.torneo = Torneo.objects.create(nombre='Apertura', fecha_inicio=timezone.localdate())
+		self.equipos = [Equipo.objects.create(nombre=f'A{i}') for i in range(4)]
+		self.jugadores = {}
+		for i, equipo in enumerate(self.equipos):
+			for n in range(3):
+				user = User.objects.create_user(username=f'arb{i}{n}', password='pw', is_staff=True)
+				self.jugadores.setdefault(equipo.pk, []).append(
+					Jugador.objects.create(user=user, nombre=f'J{i}{n}', apellido='X', cedula=f'5{i}{n}00000', equipo=equipo)
+				)
+		hoy = timezone.localdate()
+		self.partidos = [
+			Partido.objects.create(torneo=self.torneo, equipo_local=self.equipos[0], equipo_visitante=self.equipos[1], fecha=hoy),
+			Partido.objects.create(torneo=self.torneo, equipo_local=self.equipos[2], equipo_visitante=self.equipos[3], fecha=hoy),
+		]
+
+	def test_repartir_cuadra_los_centimos(self):
+		from .arbitraje import repartir
+		partes = repartir(Decimal('10.00'), [3, 1, 2])
+		self.assertEqual(partes, [(1, Decimal('3.34')), (2, Decimal('3.33')), (3, Decimal('3.33'))])
+		self.assertEqual(sum(p for _j, p in partes), Decimal('10.00'))
+
+	def test_jornada_en_un_bulk_create_y_no_duplica(self):
+		from .arbitraje import generar_cargos, partidos_jornada
+		from .models import Cargo, SaldoJugador
+		jornada = partidos_jornada(self.torneo.pk, timezone.localdate())
+		# Número fijo de consultas, sin importar partidos ni jugadores: partidos, cargos
+		# existentes, plantillas, un INSERT, saldos (2 agregados + upsert) y el savepoint
+		with self.assertNumQueries(9):
+			resumen = generar_cargos(jornada, Decimal('20.00'))
+		self.assertEqual((resumen['cargos'], resumen['partidos']), (12, 2))
+		self.assertEqual(Cargo.objects.filter(tipo='arbitraje').count(), 12)
+		saldo = SaldoJugador.objects.get(jugador=self.jugadores[self.equipos[0].pk][0])
+		self.assertEqual(saldo.deuda, Decimal('6.67'))
+		# Repetir la jornada no crea cargos nuevos
+		self.assertEqual(generar_cargos(jornada)['omitidos'], self.partidos)
+		self.assertEqual(Cargo.objects.filter(tipo='arbitraje').count(), 12)
+
+	def test_pendiente_por_partido_aplica_pagos_al_mas_antiguo(self):
+		from .arbitraje import generar_cargos, pendiente_por_partido
+		from .models import Pago
+		from datetime import timedelta
+		otro = Partido.objects.create(torneo=self.torneo, equipo_local=self.equipos[1], equipo_visitante=self.equipos[0], fecha=timezone.localdate() + timedelta(days=7))
+		generar_cargos([self.partidos[0], otro], Decimal('9.00'))
+		jugador = self.jugadores[self.equipos[0].pk][0]
+		Pago.objects.create(jugador=jugador, tipo='arbitraje', monto=Decimal('4.00'), metodo='efectivo', moneda='USD', estado='aprobado')
+		filas = pendiente_por_partido(jugador.pk)
+		self.assertEqual([(p.pk, c, pend) for p, c, pend in filas], [
+			(self.partidos[0].pk, Decimal('3.00'), Decimal('0.00')),
+			(otro.pk, Decimal('3.00'), Decimal('2.00')),
+		])
+
+	def test_vista_rechaza_entradas_no_validas_sin_error_500(self):
+		from .models import Cargo
+		self.client.force_login(User.objects.create_user(username='tesorero', password='pw', is_staff=True))
+		for datos in (
+			{'monto': 'NaN', 'partido': self.partidos[0].pk},
+			{'monto': 'Infinity', 'partido': self.partidos[0].pk},
+			{'monto': '5', 'partido': 'x'},
+			{'monto': '5', 'torneo': self.torneo.pk, 'fecha': '2025-02-30'},
+			{'monto': '5', 'torneo': 'x', 'fecha': '2025-02-03'},
+		):
+			with self.subTest(datos):
+				self.assertEqual(self.client.post(reverse('generar_arbitraje'), datos).status_code, 302)
+		self.assertFalse(Cargo.objects.exists())
+		self.client.post(reverse('generar_arbitraje'), {'monto': '6', 'partido': self.partidos[0].pk})
+		self.assertEqual(Cargo.objects.count(), 6)
+
+
+class ElegibilidadInscripcionTests(TestCase):
+
+	def setUp(self):
+		# Las instantáneas de torneos no deben leerse ni escribirse en el archivo real
+		directorio_temporal(self, 'ARCHIVO_TORNEOS_ROOT')
+		from django.core.cache import cache, caches
+		from .models import Torneo
+		cache.clear()
+		caches['compartida'].clear()
+		self.torneo = Torneo.objects.create(nombre='Clausura', fecha_inicio=timezone.localdate())
+		self.equipo = Equipo.objects.create(nombre='Inscritos FC')
+		self.equipo.torneos.add(self.torneo)
+		crear = lambda n: Jugador.objects.create(user=User.objects.create_user(username=f'ins{n}', password='pw', is_staff=True), nombre=f'N{n}', apellido=f'A{n}', cedula=f'6{n}000000', equipo=self.equipo)
+		self.pagado, self.pendiente, self.antiguo = crear(1), crear(2), crear(3)
+		from .models import Pago
+		Pago.objects.create(jugador=self.pagado, tipo='inscripcion', torneo=self.torneo, monto=Decimal('10.00'), metodo='efectivo', estado='aprobado')
+		Pago.objects.create(jugador=self.pendiente, tipo='inscripcion', torneo=self.torneo, monto=Decimal('10.00'), metodo='efectivo')
+		# Inscripción sin torneo de la temporada anterior: no cuenta
+		viejo = Pago.objects.create(jugador=self.antiguo, tipo='inscripcion', monto=Decimal('10.00'), metodo='efectivo', estado='aprobado')
+		Pago.objects.filter(pk=viejo.pk).update(fecha=timezone.now() - timezone.timedelta(days=400))
+
+	def test_anti_join_una_consulta_y_cache(self):
+		from . import elegibilidad
+		with self.assertNumQueries(1):
+			ids = elegibilidad.pendientes_ids(self.torneo)
+		self.assertEqual(ids, {self.pendiente.pk, self.antiguo.pk})
+		with self.assertNumQueries(0):
+			elegibilidad.pendientes_ids(self.torneo, [self.equipo.pk])
+
+	def test_aprobar_inscripcion_invalida(self):
+		from . import elegibilidad
+		from .models import Pago
+		elegibilidad.informe(self.torneo)
+		pago = Pago.objects.get(jugador=self.pendiente)
+		with self.captureOnCommitCallbacks(execute=True):
+			pago.estado = 'aprobado'
+			pago.save()
+		self.assertEqual(elegibilidad.pendientes_ids(self.torneo), {self.antiguo.pk})
+		# El informe vive en la caché común a los workers, no en la del proceso
+		from django.core.cache import cache, caches
+		cache.clear()
+		self.assertIsNotNone(caches['compartida'].get(elegibilidad._clave(self.torneo.pk)))
+		# Aprobación masiva (update) por conciliación
+		from .conciliacion import aprobar_en_bloque
+		nuevo = Pago.objects.create(jugador=self.antiguo, tipo='inscripcion', torneo=self.torneo, monto=Decimal('10.00'), metodo='efectivo')
+		elegibilidad.informe(self.torneo)
+		with self.captureOnCommitCallbacks(execute=True):
+			aprobar_en_bloque([nuevo.pk])
+		self.assertEqual(elegibilidad.pendientes_ids(self.torneo), set())
+
+	def test_torneo_detalle_staff(self):
+		staff = User.objects.create_user(username='mesa_tecnica', password='pw', is_staff=True)
+		self.client.force_login(staff)
+		resp = self.client.get(reverse('torneo_detalle', args=[self.torneo.pk]))
+		self.assertContains(resp, 'Sin inscripción aprobada')
+		self.assertContains(resp, 'N2 A2')
+		self.assertNotContains(resp, 'N1 A1')
+
+
+class ReporteIngresosTests(TestCase):
+
+	def setUp(self):
+		from .models import Pago
+		self.jugador = Jugador.objects.create(user=User.objects.create_user(username='aportante', password='pw', is_staff=True), nombre='Rosa', apellido='Rey', cedula='70707070')
+		self.crear = lambda **kw: Pago.objects.create(jugador=self.jugador, tipo='inscripcion', metodo='efectivo', **kw)
+
+	def test_equivalente_al_escribir_y_al_cargar_tasa(self):
+		from .models import TasaCambio
+		usd = self.crear(monto=Decimal('10.00'), moneda='USD')
+		ves = self.crear(monto=Decimal('400.00'), moneda='VES')
+		self.assertEqual(usd.monto_usd, Decimal('10.00'))
+		self.assertIsNone(ves.monto_usd)
+		# La tasa cargada después recalcula los pagos en bolívares desde su fecha
+		TasaCambio.objects.create(fecha=timezone.localdate(), bs_por_usd=Decimal('40.0000'))
+		ves.refresh_from_db()
+		self.assertEqual(ves.monto_usd, Decimal('10.00'))
+		nuevo = self.crear(monto=Decimal('100.00'), moneda='VES')
+		self.assertEqual(nuevo.monto_usd, Decimal('2.50'))
+
+	def test_importar_tasas_desde_csv(self):
+		from .models import TasaCambio
+		from . import reportes
+		ves = self.crear(monto=Decimal('500.00'), moneda='VES')
+		hoy = timezone.localdate()
+		texto = f'fecha;tasa\n{hoy:%d/%m/%Y};50,00\n2020-01-01;1,5\n'
+		from io import StringIO
+		self.assertEqual(reportes.importar_tasas(StringIO(texto)), 2)
+		self.assertEqual(TasaCambio.objects.get(fecha=hoy).bs_por_usd, Decimal('50.0000'))
+		ves.refresh_from_db()
+		self.assertEqual(ves.monto_usd, Decimal('10.00'))
+
+	def test_resumen_una_consulta_con_agregados_condicionales(self):
+		from .models import TasaCambio
+		from . import reportes
+		TasaCambio.objects.create(fecha=timezone.localdate(), bs_por_usd=Decimal('40.0000'))
+		self.crear(monto=Decimal('10.00'), moneda='USD', estado='aprobado')
+		self.crear(monto=Decimal('400.00'), moneda='VES', estado='aprobado')
+		self.crear(monto=Decimal('80.00'), moneda='VES')
+		self.crear(monto=Decimal('99.00'), moneda='USD', estado='rechazado')
+		with self.assertNumQueries(1):
+			filas = reportes.resumen_ingresos()
+		self.assertEqual(len(filas), 1)
+		fila = filas[0]
+		self.assertEqual((fila['pagos'], fila['aprobados']), (3, 2))
+		self.assertEqual((fila['usd_aprobado'], fila['usd_pendiente']), (Decimal('20.00'), Decimal('2.00')))
+		self.assertEqual((fila['ves'], fila['usd']), (Decimal('400.00'), Decimal('10.00')))
+		staff = User.objects.create_user(username='contador', password='pw', is_staff=True)
+		self.client.force_login(staff)
+		self.assertContains(self.client.get(reverse('reporte_ingresos')), '20,00')
+		self.assertContains(self.client.get(reverse('reporte_ingresos'), {'desde': '2024-02-30'}), 'Fechas no válidas.')
+
+
+class AcumuladosTests(TestCase):
+
+	def setUp(self):
+		# Las instantáneas de torneos no deben leerse ni escribirse en el archivo real
+		directorio_temporal(self, 'ARCHIVO_TORNEOS_ROOT')
+		self.torneo = Torneo.objects.create(nombre='Clausura', fecha_inicio=date(2025, 3, 1))
+		self.local = Equipo.objects.create(nombre='Halcones')
+		visitante = Equipo.objects.create(nombre='Toros')
+		self.jugador = Jugador.objects.create(user=User.objects.create_user(username='delantera', password='pw', is_staff=True), nombre='Ana', apellido='Paz', cedula='80808080', equipo=self.local)
+		# Miércoles: la semana empieza el lunes 10
+		self.partido = Partido.objects.create(torneo=self.torneo, equipo_local=self.local, equipo_visitante=visitante, fecha=date(2025, 3, 12))
+
+	def test_goles_y_tarjetas_por_dia_y_semana_en_cada_ambito(self):
+		from . import acumulados
+		with self.captureOnCommitCallbacks(execute=True):
+			estadistica = Estadistica.objects.create(partido=self.partido, goles=2)
+			estadistica.anotadores.add(self.jugador)
+			tarjeta = Tarjeta.objects.create(partido=self.partido, jugador=self.jugador, tipo='amarilla')
+		for ambito, objeto_id in (('liga', 0), ('torneo', self.torneo.pk), ('equipo', self.local.pk), ('jugador', self.jugador.pk)):
+			self.assertEqual(acumulados.serie('goles', 'dia', ambito, objeto_id), [(date(2025, 3, 12), 2, Decimal('0.00'))])
+		self.assertEqual(acumulados.serie('amarillas', 'semana', 'jugador', self.jugador.pk), [(date(2025, 3, 10), 1, Decimal('0.00'))])
+		# Borrar la tarjeta y mover el partido recalculan los días afectados
+		with self.captureOnCommitCallbacks(execute=True):
+			tarjeta.delete()
+			self.partido.fecha = date(2025, 3, 19)
+			self.partido.save()
+		self.assertEqual(acumulados.serie('amarillas', 'semana'), [])
+		self.assertEqual(acumulados.serie('goles', 'semana'), [(date(2025, 3, 17), 2, Decimal('0.00'))])
+
+	def test_pagos_aprobados_y_reconstruccion(self):
+		from .models import Acumulado, Pago
+		from . import acumulados
+		with self.captureOnCommitCallbacks(execute=True):
+			pago = Pago.objects.create(jugador=self.jugador, tipo='inscripcion', metodo='efectivo', monto=Decimal('15.00'), moneda='USD', estado='aprobado')
+			Pago.objects.create(jugador=self.jugador, tipo='otro', metodo='efectivo', monto=Decimal('5.00'), moneda='USD')
+		hoy = timezone.localdate()
+		self.assertEqual(acumulados.serie('pagos', 'dia', 'equipo', self.local.pk), [(hoy, 1, Decimal('15.00'))])
+		incremental = sorted(Acumulado.objects.values_list('metrica', 'periodo', 'inicio', 'ambito', 'objeto_id', 'cantidad', 'total'))
+		acumulados.reconstruir()
+		self.assertEqual(sorted(Acumulado.objects.values_list('metrica', 'periodo', 'inicio', 'ambito', 'objeto_id', 'cantidad', 'total')), incremental)
+		# Las acciones masivas con update() programan ellas mismas el recálculo
+		with self.captureOnCommitCallbacks(execute=True):
+			Pago.objects.filter(pk=pago.pk).update(estado='rechazado')
+			acumulados.programar_pagos(Pago.objects.filter(pk=pago.pk))
+		self.assertEqual(acumulados.serie('pagos', 'dia'), [])
+
+	def test_serie_json_lee_de_los_acumulados(self):
+		from .models import Acumulado
+		Acumulado.objects.create(metrica='goles', periodo='semana', inicio=date(2025, 3, 10), ambito='torneo', objeto_id=self.torneo.pk, cantidad=7)
+		self.client.force_login(User.objects.create_user(username='analista', password='pw', is_staff=True))
+		url = reverse('serie_acumulados', args=['goles'])
+		with self.assertNumQueries(2):  # el usuario y la serie
+			respuesta = self.client.get(url, {'ambito': 'torneo', 'id': self.torneo.pk, 'desde': '2025-03-12'})
+		self.assertEqual(respuesta.json()['puntos'], [{'inicio': '2025-03-10', 'cantidad': 7, 'total': '0.00'}])
+		self.assertEqual(self.client.get(url, {'periodo': 'mes'}).status_code, 400)
+		self.assertEqual(self.client.get(reverse('serie_acumulados', args=['asistencias'])).status_code, 404)
+
+
+class ComprobantePagoTests(TestCase):
+
+	def setUp(self):
+		import tempfile, shutil
+		from django.core.files.base import ContentFile
+		from django.test import override_settings
+		from .models import Pago
+		self.tmp = tempfile.mkdtemp()
+		self.addCleanup(shutil.rmtree, self.tmp, ignore_errors=True)
+		ajustes = override_settings(MEDIA_ROOT=self.tmp, COMPROBANTES_SERVIDOR='')
+		ajustes.enable()
+		self.addCleanup(ajustes.disable)
+		self.dueno = User.objects.create_user(username='duena', password='pw')
+		# Al crear un usuario que no es staff se le crea su Jugador
+		self.pago = Pago(jugador=Jugador.objects.get(user=self.dueno), tipo='inscripcion', metodo='pago_movil', monto=Decimal('10.00'))
+		self.pago.comprobante.save('recibo.png', ContentFile(bytes(range(256)) * 4), save=False)
+		self.pago.save()
+		self.url = reverse('comprobante_pago', args=[self.pago.pk])
+
+	def test_solo_staff_o_dueno(self):
+		intruso = User.objects.create_user(username='intruso', password='pw')
+		self.client.force_login(intruso)
+		self.assertEqual(self.client.get(self.url).status_code, 403)
+		self.client.force_login(self.dueno)
+		resp = self.client.get(self.url)
+		self.assertEqual(resp.status_code, 200)
+		self.assertEqual(b''.join(resp.streaming_content), bytes(range(256)) * 4)
+		self.assertIn('private', resp['Cache-Control'])
+		self.assertEqual(resp['Content-Type'], 'image/png')
+
+	def test_etag_devuelve_304(self):
+		self.client.force_login(self.dueno)
+		etag = self.client.get(self.url)['ETag']
+		self.assertTrue(etag.startswith('"'))
+		resp = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+		self.assertEqual(resp.status_code, 304)
+		self.assertEqual(resp['ETag'], etag)
+
+	def test_rangos_y_servidor_web(self):
+		from django.test import override_settings
+		self.client.force_login(self.dueno)
+		resp = self.client.get(self.url, HTTP_RANGE='bytes=10-19')
+		self.assertEqual(resp.status_code, 206)
+		self.assertEqual(resp['Content-Range'], 'bytes 10-19/1024')
+		self.assertEqual(b''.join(resp.streaming_content), bytes(range(10, 20)))
+		self.assertEqual(b''.join(self.client.get(self.url, HTTP_RANGE='bytes=-4').streaming_content), bytes(range(252, 256)))
+		self.assertEqual(self.client.get(self.url, HTTP_RANGE='bytes=2000-').status_code, 416)
+		with override_settings(COMPROBANTES_SERVIDOR='x-accel'):
+			resp = self.client.get(self.url)
+		self.assertEqual(resp['X-Accel-Redirect'], '/media-protegida/' + self.pago.comprobante.name)
+		self.assertEqual(resp.content, b'')
+
+
+class AlmacenamientoDeduplicadoTests(TestCase):
+
+	def setUp(self):
+		import tempfile, shutil
+		from django.test import override_settings
+		self.tmp = tempfile.mkdtemp()
+		self.addCleanup(shutil.rmtree, self.tmp, ignore_errors=True)
+		ajustes = override_settings(MEDIA_ROOT=self.tmp)
+		ajustes.enable()
+		self.addCleanup(ajustes.disable)
+		self.jugador = Jugador.objects.create(user=User.objects.create_user(username='repetidor', password='pw', is_staff=True), nombre='Leo', apellido='Sol', cedula='60606060')
+
+	def _pago(self, contenido, nombre='captura.png'):
+		from django.core.files.base import ContentFile
+		from .models import Pago
+		pago = Pago(jugador=self.jugador, tipo='inscripcion', metodo='pago_movil', monto=Decimal('10.00'))
+		pago.comprobante.save(nombre, ContentFile(contenido), save=False)
+		pago.save()
+		return pago
+
+	def test_subidas_iguales_comparten_fichero_y_cuentan_referencias(self):
+		import hashlib, os
+		from io import StringIO
+		from django.core.management import call_command
+		from .models import ArchivoMedia
+		primero = self._pago(b'misma captura')
+		segundo = self._pago(b'misma captura', 'otra.PNG')
+		huella = hashlib.sha256(b'misma captura').hexdigest()
+		self.assertEqual(primero.comprobante.name, f'cas/{huella[:2]}/{huella}.png')
+		self.assertEqual(segundo.comprobante.name, primero.comprobante.name)
+		self.assertEqual(ArchivoMedia.objects.get().referencias, 2)
+		ruta = primero.comprobante.path
+		with self.captureOnCommitCallbacks(execute=True):
+			primero.delete()
+		self.assertEqual(ArchivoMedia.objects.get().referencias, 1)
+		self.assertTrue(os.path.exists(ruta))
+		with self.captureOnCommitCallbacks(execute=True):
+			segundo.delete()
+		# Sin referencias el fichero sigue ahí hasta que lo retire limpiar_media
+		self.assertEqual(ArchivoMedia.objects.get().referencias, 0)
+		self.assertTrue(os.path.exists(ruta))
+		call_command('limpiar_media', '--min-horas', '0', stdout=StringIO())
+		self.assertFalse(ArchivoMedia.objects.exists())
+		self.assertFalse(os.path.exists(ruta))
+
+	def test_reemplazar_comprobante_suelta_el_anterior(self):
+		import os
+		from django.core.files.base import ContentFile
+		from .models import ArchivoMedia
+		pago = self._pago(b'version 1')
+		anterior = pago.comprobante.name
+		with self.captureOnCommitCallbacks(execute=True):
+			pago.comprobante = ContentFile(b'version 2', name='nueva.png')
+			pago.save()
+		self.assertEqual(ArchivoMedia.objects.get(nombre=anterior).referencias, 0)
+		self.assertTrue(os.path.exists(pago.comprobante.path))
+
+	def test_subida_igual_tras_soltar_la_ultima_referencia_conserva_el_fichero(self):
+		import os
+		from .models import ArchivoMedia
+		pago = self._pago(b'recibo repetido')
+		nombre, ruta = pago.comprobante.name, pago.comprobante.path
+		with self.captureOnCommitCallbacks(execute=True):
+			pago.delete()
+		# Una subida del mismo contenido justo después reutiliza la fila y el fichero
+		nuevo = self._pago(b'recibo repetido')
+		self.assertEqual(nuevo.comprobante.name, nombre)
+		self.assertEqual(ArchivoMedia.objects.get(nombre=nombre).referencias, 1)
+		self.assertTrue(os.path.exists(ruta))
+
+	def test_comando_deduplica_media_existente(self):
+		import os
+		from io import StringIO
+		from django.core.management import call_command
+		from .models import ArchivoMedia, Pago
+		for relativa in ('pagos/comprobantes/viejo.png', 'pagos/comprobantes/viejo_x1Y2z3A.png', 'fotos_perfil/Equipo.jpg', 'fotos_perfil/Equipo_4mj7FoG.jpg'):
+			os.makedirs(os.path.join(self.tmp, os.path.dirname(relativa)), exist_ok=True)
+			with open(os.path.join(self.tmp, relativa), 'wb') as fichero:
+				fichero.write(b'foto' if relativa.startswith('fotos') else b'recibo')
+		pago = Pago.objects.create(jugador=self.jugador, tipo='inscripcion', metodo='pago_movil', monto=Decimal('10.00'))
+		Pago.objects.filter(pk=pago.pk).update(comprobante='pagos/comprobantes/viejo.png')
+		call_command('deduplicar_media', stdout=StringIO())
+		pago.refresh_from_db()
+		self.assertTrue(pago.comprobante.name.startswith('cas/'))
+		self.assertFalse(os.path.exists(os.path.join(self.tmp, 'pagos/comprobantes/viejo.png')))
+		self.assertEqual(ArchivoMedia.objects.get(nombre=pago.comprobante.name).referencias, 1)
+		# Las copias sin campo que las gestione quedan como enlaces duros al primer fichero
+		self.assertTrue(os.path.samefile(os.path.join(self.tmp, 'fotos_perfil/Equipo.jpg'), os.path.join(self.tmp, 'fotos_perfil/Equipo_4mj7FoG.jpg')))
+		self.assertTrue(os.path.exists(os.path.join(self.tmp, 'pagos/comprobantes/viejo_x1Y2z3A.png')))
+
+
+class LimpiarMediaTests(TestCase):
+
+	def setUp(self):
+		import tempfile, shutil
+		from django.test import override_settings
+		self.tmp = tempfile.mkdtemp()
+		self.addCleanup(shutil.rmtree, self.tmp, ignore_errors=True)
+		ajustes = override_settings(MEDIA_ROOT=self.tmp)
+		ajustes.enable()
+		self.addCleanup(ajustes.disable)
+
+	def _fichero(self, relativo, horas=48):
+		import os, time
+		ruta = os.path.join(self.tmp, relativo)
+		os.makedirs(os.path.dirname(ruta), exist_ok=True)
+		with open(ruta, 'wb') as fichero:
+			fichero.write(b'x' * 10)
+		antiguedad = time.time() - horas * 3600
+		os.utime(ruta, (antiguedad, antiguedad))
+		return ruta
+
+	def test_borra_solo_huerfanos_antiguos(self):
+		import os
+		from io import StringIO
+		from django.core.management import call_command
+		from .models import Pago
+		jugador = Jugador.objects.create(user=User.objects.create_user(username='limpio', password='pw', is_staff=True), nombre='Noa', apellido='Mar', cedula='50505050', imagen_url='https://liga.example/media/fotos_perfil/usada.jpg')
+		Pago.objects.create(jugador=jugador, tipo='inscripcion', metodo='efectivo', monto=Decimal('1.00'), comprobante='pagos/comprobantes/recibo.png')
+		recibo = self._fichero('pagos/comprobantes/recibo.png')
+		foto = self._fichero('fotos_perfil/usada.jpg')
+		huerfano = self._fichero('galeria/2023/vieja.jpg')
+		reciente = self._fichero('pagos/comprobantes/subiendo.png', horas=0)
+
+		salida = StringIO()
+		call_command('limpiar_media', '--dry-run', stdout=salida)
+		self.assertIn('galeria/2023/vieja.jpg', salida.getvalue())
+		self.assertTrue(os.path.exists(huerfano))
+
+		call_command('limpiar_media', '--lote', '1', stdout=StringIO())
+		self.assertFalse(os.path.exists(huerfano))
+		self.assertFalse(os.path.exists(os.path.join(self.tmp, 'galeria')))
+		for ruta in (recibo, foto, reciente):
+			self.assertTrue(os.path.exists(ruta))
+
+	def test_no_borra_un_comprobante_reutilizado_durante_la_limpieza(self):
+		import os
+		from io import StringIO
+		from unittest import mock
+		from django.core.files.base import ContentFile
+		from django.core.management import call_command
+		from .management.commands import limpiar_media
+		from .models import ArchivoMedia, Pago
+		jugador = Jugador.objects.create(user=User.objects.create_user(username='reuso', password='pw', is_staff=True), nombre='R', apellido='U', cedula='51515151')
+		pago = Pago.objects.create(jugador=jugador, tipo='inscripcion', metodo='efectivo', monto=Decimal('1.00'))
+		pago.comprobante.save('recibo.png', ContentFile(b'mismo recibo'))
+		nombre = pago.comprobante.name
+		# Huérfano de hace días: el pago se borró y la fila de ArchivoMedia quedó a cero
+		Pago.objects.filter(pk=pago.pk).delete()
+		ArchivoMedia.objects.filter(nombre=nombre).update(referencias=0)
+		self._fichero(nombre)
+		borrar = limpiar_media.Command._borrar
+
+		def subida_identica_a_mitad(comando, raiz, nombres, limite):
+			# Entre el recorrido y el borrado llega otro pago con el mismo comprobante
+			nuevo = Pago.objects.create(jugador=jugador, tipo='inscripcion', metodo='efectivo', monto=Decimal('1.00'))
+			nuevo.comprobante.save('otro.png', ContentFile(b'mismo recibo'))
+			self.assertEqual(nuevo.comprobante.name, nombre)
+			return borrar(comando, raiz, nombres, limite)
+
+		with mock.patch.object(limpiar_media.Command, '_borrar', subida_identica_a_mitad):
+			salida = StringIO()
+			call_command('limpiar_media', stdout=salida)
+		self.assertIn('reutilizados durante la limpieza', salida.getvalue())
+		self.assertTrue(os.path.exists(os.path.join(self.tmp, nombre)))
+		self.assertEqual(ArchivoMedia.objects.get(nombre=nombre).referencias, 1)
+
+
+class HuellaComprobanteTests(TestCase):
+
+	def setUp(self):
+		import tempfile, shutil
+		from django.test import override_settings
+		self.tmp = tempfile.mkdtemp()
+		self.addCleanup(shutil.rmtree, self.tmp, ignore_errors=True)
+		ajustes = override_settings(MEDIA_ROOT=self.tmp, COMPROBANTES_DISTANCIA_DUPLICADO=4)
+		ajustes.enable()
+		self.addCleanup(ajustes.disable)
+		self.jugador = Jugador.objects.create(user=User.objects.create_user(username='tramposo', password='pw', is_staff=True), nombre='Tom', apellido='Gil', cedula='40404040')
+
+	def _captura(self, semilla, formato='PNG', escala=1.0, calidad=95):
+		import io, random
+		from PIL import Image, ImageDraw
+		azar = random.Random(semilla)
+		imagen = Image.new('RGB', (360, 640), 'white')
+		dibujo = ImageDraw.Draw(imagen)
+		for _ in range(12):
+			x, y = azar.randrange(300), azar.randrange(580)
+			dibujo.rectangle([x, y, x + azar.randrange(20, 120), y + azar.randrange(10, 60)], fill=tuple(azar.randrange(256) for _ in range(3)))
+		if escala != 1.0:
+			imagen = imagen.resize((int(360 * escala), int(640 * escala)))
+		salida = io.BytesIO()
+		imagen.save(salida, formato, quality=calidad)
+		return salida.getvalue()
+
+	def _pago(self, contenido, nombre='captura.png'):
+		from django.core.files.base import ContentFile
+		from .models import Pago
+		pago = Pago(jugador=self.jugador, tipo='inscripcion', metodo='pago_movil', monto=Decimal('10.00'))
+		pago.comprobante = ContentFile(contenido, name=nombre)
+		pago.save()
+		return pago
+
+	def test_huellas_cercanas_comparten_alguna_banda(self):
+		import random
+		from . import huellas
+		azar = random.Random(7)
+		for _ in range(200):
+			huella = azar.getrandbits(64)
+			cambiada = huella
+			for bit in azar.sample(range(64), 4):
+				cambiada ^= 1 << bit
+			self.assertTrue(set(huellas.bandas(huella)) & set(huellas.bandas(cambiada)))
+
+	def test_captura_recomprimida_se_marca_en_lista_pagos(self):
+		original = self._pago(self._captura(1))
+		reutilizada = self._pago(self._captura(1, 'JPEG', escala=0.6, calidad=40), 'recorte.jpg')
+		distinta = self._pago(self._captura(2))
+		self.assertIsNotNone(original.huella_visual)
+		self.assertIsNone(original.sospecha_duplicado_id)
+		self.assertEqual(reutilizada.sospecha_duplicado_id, original.pk)
+		self.assertIsNone(distinta.sospecha_duplicado_id)
+		self.client.force_login(User.objects.create_user(username='revisor', password='pw', is_staff=True))
+		self.assertContains(self.client.get(reverse('lista_pagos')), f'Posible duplicado de #{original.pk}', count=1)
+
+	def test_bandas_caben_en_el_campo_y_se_valida_la_distancia(self):
+		from django.core.exceptions import ImproperlyConfigured
+		from django.test import override_settings
+		from . import huellas
+		for distancia_max in (0, 1, 4):
+			with override_settings(COMPROBANTES_DISTANCIA_DUPLICADO=distancia_max):
+				self.assertTrue(all(valor < 2 ** 31 for _banda, valor in huellas.bandas(2 ** 64 - 1)))
+		for distancia_max in (-1, 64):
+			with override_settings(COMPROBANTES_DISTANCIA_DUPLICADO=distancia_max), self.assertRaises(ImproperlyConfigured):
+				huellas.bandas(0)
+
+	def test_quitar_el_comprobante_lo_saca_del_indice(self):
+		from .models import BandaHuella
+		original = self._pago(self._captura(4))
+		copia = self._pago(self._captura(4), 'copia.png')
+		self.assertEqual(copia.sospecha_duplicado_id, original.pk)
+		original.comprobante = None
+		original.save()
+		original.refresh_from_db()
+		copia.refresh_from_db()
+		self.assertIsNone(original.huella_visual)
+		self.assertFalse(BandaHuella.objects.filter(pago=original).exists())
+		self.assertIsNone(copia.sospecha_duplicado_id)
+		otra = self._pago(self._captura(4), 'otra.png')
+		self.assertEqual(otra.sospecha_duplicado_id, copia.pk)
+
+	def test_comando_calcula_huellas_pendientes(self):
+		from io import StringIO
+		from django.core.management import call_command
+		from .models import Pago
+		original = self._pago(self._captura(3))
+		copia = self._pago(self._captura(3), 'copia.png')
+		Pago.objects.update(huella_visual=None, sospecha_duplicado=None)
+		call_command('huellas_comprobantes', stdout=StringIO())
+		copia.refresh_from_db()
+		self.assertEqual(copia.sospecha_duplicado_id, original.pk)
+
+
+class SubidaComprobanteTests(TestCase):
+
+	def setUp(self):
+		import tempfile, shutil
+		from django.test import override_settings
+		self.tmp = tempfile.mkdtemp()
+		self.addCleanup(shutil.rmtree, self.tmp, ignore_errors=True)
+		ajustes = override_settings(MEDIA_ROOT=self.tmp, COMPROBANTES_MAX_BYTES=64 * 1024, COMPROBANTES_MAX_PIXELES=500 * 500)
+		ajustes.enable()
+		self.addCleanup(ajustes.disable)
+		self.client.force_login(User.objects.create_user(username='subidor', password='pw'))
+
+	def _png(self, lado, ruido=False):
+		import os
+		from io import BytesIO
+		from PIL import Image
+		imagen = Image.frombytes('RGB', (lado, lado), os.urandom(lado * lado * 3)) if ruido else Image.new('RGB', (lado, lado), 'navy')
+		salida = BytesIO()
+		imagen.save(salida, 'PNG')
+		return salida.getvalue()
+
+	def _enviar(self, nombre, contenido):
+		from django.core.files.uploadedfile import SimpleUploadedFile
+		datos = {
+			'tipo': 'inscripcion', 'monto': '15.00', 'metodo': 'pago_movil', 'referencia': '1234', 'moneda': 'VES',
+			'comprobante': SimpleUploadedFile(nombre, contenido, content_type='image/png'),
+		}
+		return self.client.post(reverse('registrar_pago'), datos)
+
+	def test_rechaza_por_firma_tamano_y_pixeles(self):
+		from .models import Pago
+		casos = [
+			('falso.png', b'<?php echo 1; ?>' * 10, 'debe ser una imagen JPEG, PNG, GIF o WebP'),
+			('enorme.png', self._png(200, ruido=True), 'no puede superar 64'),
+			('bomba.png', self._png(600), 'demasiado grande (600x600'),
+			('rota.png', self._png(50)[:60], 'no es una imagen válida'),
+		]
+		for nombre, contenido, mensaje in casos:
+			with self.subTest(nombre):
+				self.assertContains(self._enviar(nombre, contenido), mensaje)
+		self.assertFalse(Pago.objects.exists())
+		self.assertEqual(self._enviar('bueno.png', self._png(100)).status_code, 302)
+		self.assertEqual(Pago.objects.get().comprobante.name.rsplit('.', 1)[-1], 'png')
+
+	def test_el_comprobante_va_a_disco_y_el_resto_no(self):
+		from django.core.files.uploadedfile import SimpleUploadedFile, TemporaryUploadedFile, InMemoryUploadedFile
+		from django.http import HttpResponse
+		from django.test import RequestFactory
+		from .subidas import recibe_comprobante
+		tipos = {}
+
+		@recibe_comprobante
+		def vista(request):
+			tipos.update({campo: type(fichero) for campo, fichero in request.FILES.items()})
+			return HttpResponse()
+
+		peticion = RequestFactory().post('/', {
+			'comprobante': SimpleUploadedFile('c.png', self._png(10)),
+			'extracto': SimpleUploadedFile('e.csv', b'fecha;monto\n'),
+		})
+		peticion._dont_enforce_csrf_checks = True
+		vista(peticion)
+		self.assertEqual(tipos, {'comprobante': TemporaryUploadedFile, 'extracto': InMemoryUploadedFile})
+
+	def test_fuera_de_las_vistas_de_pago_no_se_descarta_en_silencio(self):
+		from django.core.files.uploadedfile import SimpleUploadedFile
+		from django.test import Client
+		from .models import Pago
+		staff = User.objects.create_superuser(username='admin', password='pw')
+		jugador = Jugador.objects.create(user=User.objects.create_user(username='pagador', password='pw', is_staff=True), nombre='P', apellido='G', cedula='70707070')
+		self.client.force_login(staff)
+		respuesta = self.client.post(reverse('admin:jugadores_pago_add'), {
+			'jugador': jugador.pk, 'tipo': 'inscripcion', 'monto': '15.00', 'metodo': 'efectivo', 'estado': 'pendiente', 'moneda': 'USD',
+			'comprobante': SimpleUploadedFile('falso.png', b'<?php echo 1; ?>' * 10, content_type='image/png'),
+		})
+		# El admin valida el ImageField como siempre y muestra el error
+		self.assertEqual(list(respuesta.context['adminform'].form.errors), ['comprobante'])
+		self.assertFalse(Pago.objects.exists())
+		# Las vistas de pago siguen exigiendo el token CSRF
+		cliente = Client(enforce_csrf_checks=True)
+		cliente.force_login(staff)
+		self.assertEqual(cliente.post(reverse('registrar_pago'), {}).status_code, 403)
+
+
+class SubidaPorTrozosTests(TestCase):
+
+	def setUp(self):
+		import tempfile, shutil
+		from django.test import override_settings
+		self.tmp = tempfile.mkdtemp()
+		self.addCleanup(shutil.rmtree, self.tmp, ignore_errors=True)
+		ajustes = override_settings(
+			MEDIA_ROOT=self.tmp + '/media', SUBIDAS_PARCIALES_ROOT=self.tmp + '/parciales',
+			SUBIDAS_TAMANO_TROZO=2048, COMPROBANTES_MAX_BYTES=64 * 1024,
+		)
+		ajustes.enable()
+		self.addCleanup(ajustes.disable)
+		self.usuario = User.objects.create_user(username='movil', password='pw')
+		self.client.force_login(self.usuario)
+
+	def _png(self):
+		import os
+		from io import BytesIO
+		from PIL import Image
+		salida = BytesIO()
+		Image.frombytes('RGB', (40, 40), os.urandom(40 * 40 * 3)).save(salida, 'PNG')
+		return salida.getvalue()
+
+	def _trozo(self, token, desplazamiento, datos):
+		url = reverse('subida_comprobante', args=[token])
+		return self.client.put(url, datos, content_type='application/octet-stream', headers={'X-Desplazamiento': str(desplazamiento)})
+
+	def test_abrir_mas_subidas_de_la_cuenta_descarta_las_antiguas(self):
+		import os
+		from django.test import override_settings
+		from . import subidas
+		from .models import SubidaParcial
+		otro = subidas.crear(User.objects.create_user(username='vecino', password='pw'), 'suya.png', 100)
+		crear = reverse('subida_comprobante_crear')
+		with override_settings(SUBIDAS_PARCIALES_POR_USUARIO=2):
+			tokens = [self.client.post(crear, {'nombre': f'captura{i}.png', 'tamano': 100}).json()['token'] for i in range(3)]
+		self.assertEqual(set(SubidaParcial.objects.filter(usuario=self.usuario).values_list('token', flat=True)), set(tokens[1:]))
+		self.assertFalse(os.path.exists(subidas.ruta_parcial(tokens[0])))
+		self.assertTrue(os.path.exists(subidas.ruta_parcial(tokens[2])))
+		# Las de otros usuarios no cuentan
+		self.assertTrue(SubidaParcial.objects.filter(pk=otro.pk).exists())
+
+	def test_subida_reanudada_se_usa_en_el_pago(self):
+		import os
+		from .models import Pago, SubidaParcial
+		contenido = self._png()
+		estado = self.client.post(reverse('subida_comprobante_crear'), {'nombre': 'C:\\fotos\\captura.png', 'tamano': len(contenido)}).json()
+		token = estado['token']
+		self.assertEqual((estado['nombre'], estado['tamano_trozo']), ('captura.png', 2048))
+		self.assertEqual(self._trozo(token, 0, contenido[:2048]).json()['recibidos'], 2048)
+		# Trozo que se adelanta a lo recibido: 409 con desde dónde seguir
+		respuesta = self._trozo(token, 4096, contenido[4096:6144])
+		self.assertEqual((respuesta.status_code, respuesta.json()['recibidos']), (409, 2048))
+		# Reenvío de un trozo ya recibido (la respuesta se perdió): no cambia nada
+		self.assertEqual(self._trozo(token, 0, contenido[:2048]).json()['recibidos'], 2048)
+		desde = self.client.get(reverse('subida_comprobante', args=[token])).json()['recibidos']
+		while desde < len(contenido):
+			estado = self._trozo(token, desde, contenido[desde:desde + 2048]).json()
+			desde = estado['recibidos']
+		self.assertTrue(estado['completa'])
+
+		respuesta = self.client.post(reverse('registrar_pago'), {
+			'tipo': 'inscripcion', 'monto': '15.00', 'metodo': 'pago_movil', 'referencia': '1234', 'moneda': 'VES',
+			'comprobante_token': token,
+		})
+		self.assertEqual(respuesta.status_code, 302)
+		with Pago.objects.get().comprobante.open('rb') as guardado:
+			self.assertEqual(guardado.read(), contenido)
+		self.assertFalse(SubidaParcial.objects.exists())
+		self.assertEqual(os.listdir(self.tmp + '/parciales'), [])
+
+	def test_rechazos(self):
+		from .models import SubidaParcial
+		crear = reverse('subida_comprobante_crear')
+		self.assertEqual(self.client.post(crear, {'nombre': 'x.png', 'tamano': 65 * 1024}).status_code, 413)
+		token = self.client.post(crear, {'nombre': 'x.png', 'tamano': 4000}).json()['token']
+		self.assertEqual(self._trozo(token, 0, b'%PDF-1.7 falso ' * 100).status_code, 400)
+		self.assertFalse(SubidaParcial.objects.filter(token=token).exists())
+		# El token de otro usuario no sirve ni para la subida ni para el pago
+		token = self.client.post(crear, {'nombre': 'y.png', 'tamano': 10}).json()['token']
+		self.client.force_login(User.objects.create_user(username='otro', password='pw'))
+		self.assertEqual(self.client.get(reverse('subida_comprobante', args=[token])).status_code, 404)
+		respuesta = self.client.post(reverse('registrar_pago'), {
+			'tipo': 'inscripcion', 'monto': '15.00', 'metodo': 'pago_movil', 'referencia': '1234', 'moneda': 'VES',
+			'comprobante_token': token,
+		})
+		self.assertContains(respuesta, 'no está disponible')
+
+
+DESCARGAS_PRUEBA = []
+
+
+def descargar_prueba(url, max_bytes):
+	"""Descargador para IMAGENES_DESCARGADOR en las pruebas: sin red."""
+	from io import BytesIO
+	from PIL import Image
+	from .imagenes import ImagenNoDisponible
+	DESCARGAS_PRUEBA.append(url)
+	if 'rota' in url:
+		raise ImagenNoDisponible('404')
+	salida = BytesIO()
+	Image.new('RGB', (1200, 800), 'purple').save(salida, 'JPEG')
+	return salida.getvalue()
+
+
+class ImagenProxyTests(TestCase):
+
+	def setUp(self):
+		import tempfile, shutil
+		from django.core.cache import cache
+		from django.test import override_settings
+		self.tmp = tempfile.mkdtemp()
+		self.addCleanup(shutil.rmtree, self.tmp, ignore_errors=True)
+		ajustes = override_settings(IMAGENES_CACHE_ROOT=self.tmp, IMAGENES_DESCARGADOR='jugadores.tests.descargar_prueba')
+		ajustes.enable()
+		self.addCleanup(ajustes.disable)
+		cache.clear()
+		DESCARGAS_PRUEBA.clear()
+
+	def test_variantes_se_descargan_una_vez_y_se_cachean(self):
+		import re
+		from io import BytesIO
+		from PIL import Image
+		url = 'https://i.imgur.com/foto.jpg'
+		jugador = Jugador.objects.create(user=User.objects.create_user(username='foto', password='pw', is_staff=True), nombre='Lia', apellido='Paz', cedula='60606060', imagen_url=url)
+		pagina = self.client.get(reverse('perfil_jugador', args=[jugador.id])).content.decode()
+		self.assertNotIn(url, pagina)
+		srcset = re.search(r'srcset="([^"]+)"', pagina).group(1)
+		direcciones = dict(reversed(parte.split()) for parte in srcset.split(', '))
+		self.assertEqual(set(direcciones), {'96w', '320w', '1024w'})
+
+		respuesta = self.client.get(direcciones['96w'], HTTP_ACCEPT='image/avif,image/webp,*/*')
+		self.assertEqual(respuesta['Content-Type'], 'image/webp')
+		self.assertIn('immutable', respuesta['Cache-Control'])
+		imagen = Image.open(BytesIO(b''.join(respuesta.streaming_content)))
+		self.assertEqual((imagen.format, imagen.size), ('WEBP', (96, 64)))
+		respuesta = self.client.get(direcciones['320w'], HTTP_ACCEPT='image/*')
+		self.assertEqual(Image.open(BytesIO(b''.join(respuesta.streaming_content))).format, 'JPEG')
+		self.assertEqual(self.client.get(direcciones['96w'], HTTP_ACCEPT='image/webp', HTTP_IF_NONE_MATCH=respuesta['ETag'].replace('tarjeta-jpg', 'mini-webp')).status_code, 304)
+		self.assertEqual(DESCARGAS_PRUEBA, [url])
+		# Firma manipulada
+		self.assertEqual(self.client.get(direcciones['96w'].replace('/mini/', '/enorme/')).status_code, 404)
+		self.assertEqual(self.client.get(reverse('imagen_proxy', args=['aHR0cHM6Ly9ldmlsLmV4YW1wbGU:1abc:firma', 'mini'])).status_code, 404)
+
+	def test_fallo_redirige_a_la_imagen_generica_sin_reintentar(self):
+		from django.templatetags.static import static
+		from . import imagenes
+		url = 'https://i.imgur.com/rota.png'
+		for _ in range(2):
+			respuesta = self.client.get(imagenes.url_proxy(url, 'mini'))
+			self.assertEqual((respuesta.status_code, respuesta['Location']), (302, static('jugadores/images/avatar-placeholder.png')))
+		self.assertEqual(DESCARGAS_PRUEBA, [url])
+		for destino in ('http://127.0.0.1/admin', 'file:///etc/passwd', 'http://10.0.0.8/foto.png', 'http://host:99999/x'):
+			with self.assertRaises(imagenes.ImagenNoDisponible):
+				imagenes.descargar_http(destino, 1024)
+
+	def test_descarga_conecta_a_la_ip_comprobada_y_revisa_cada_redireccion(self):
+		import socket, threading
+		from http.server import BaseHTTPRequestHandler, HTTPServer
+		from unittest import mock
+		from . import imagenes
+
+		class Redirige(BaseHTTPRequestHandler):
+			def do_GET(self):
+				self.send_response(302)
+				self.send_header('Location', 'http://interno.example/latest/meta-data/')
+				self.end_headers()
+
+			def log_message(self, *args):
+				pass
+
+		servidor = HTTPServer(('127.0.0.1', 0), Redirige)
+		threading.Thread(target=servidor.serve_forever, daemon=True).start()
+		self.addCleanup(servidor.server_close)
+		self.addCleanup(servidor.shutdown)
+		conectar, resolver = socket.create_connection, socket.getaddrinfo
+		ips = {'publico.example': '93.184.216.34', 'interno.example': '169.254.169.254'}
+		conexiones = []
+
+		def getaddrinfo(host, puerto, *args, **kwargs):
+			if host not in ips:
+				return resolver(host, puerto, *args, **kwargs)
+			return [(socket.AF_INET, socket.SOCK_STREAM, 6, '', (ips[host], puerto))]
+
+		def create_connection(direccion, *args, **kwargs):
+			# Toda conexión acaba en el servidor local de prueba; se anota a qué IP iba
+			conexiones.append(direccion)
+			return conectar(servidor.server_address)
+
+		with mock.patch('socket.getaddrinfo', getaddrinfo), mock.patch('socket.create_connection', create_connection):
+			with self.assertRaisesRegex(imagenes.ImagenNoDisponible, 'interno.example'):
+				imagenes.descargar_http('http://publico.example/foto.jpg', 1024)
+		self.assertEqual(conexiones, [('93.184.216.34', 80)])
+
+	def test_recorta_los_menos_usados(self):
+		import os, time
+		from django.test import override_settings
+		from . import imagenes
+		ahora = time.time()
+		for i in range(5):
+			camino = imagenes.ruta(f'{i:02d}' * 16, '-mini.webp')
+			os.makedirs(os.path.dirname(camino), exist_ok=True)
+			with open(camino, 'wb') as fichero:
+				fichero.write(b'x' * 1000)
+			os.utime(camino, (ahora - 1000 * (5 - i), ahora - 1000 * (5 - i)))
+		with override_settings(IMAGENES_CACHE_MAX_BYTES=3500):
+			self.assertEqual(imagenes.recortar(), 2)
+		quedan = sorted(nombre[:2] for _d, _s, nombres in os.walk(self.tmp) for nombre in nombres)
+		self.assertEqual(quedan, ['02', '03', '04'])
+
+
+FALLOS_PRUEBA = []
+
+
+def _tarea_que_falla(veces):
+	FALLOS_PRUEBA.append(veces)
+	if len(FALLOS_PRUEBA) <= veces:
+		raise RuntimeError(f'fallo {len(FALLOS_PRUEBA)}')
+
+
+class TareasTests(TestCase):
+
+	def setUp(self):
+		import tempfile, shutil
+		from django.test import override_settings
+		from . import tareas
+		tareas.tarea(nombre='prueba_fallo', reintentos=2, espera=10)(_tarea_que_falla)
+		self.tmp = tempfile.mkdtemp()
+		self.addCleanup(shutil.rmtree, self.tmp, ignore_errors=True)
+		ajustes = override_settings(TAREAS_ACTIVAS=True, IMAGENES_CACHE_ROOT=self.tmp, TAREAS_PROGRAMADAS={})
+		ajustes.enable()
+		self.addCleanup(ajustes.disable)
+		FALLOS_PRUEBA.clear()
+
+	def _trabajar(self):
+		from io import StringIO
+		from django.core.management import call_command
+		salida = StringIO()
+		call_command('run_worker', '--una-vez', stdout=salida)
+		return salida.getvalue()
+
+	def test_reintentos_con_espera_y_pagina_de_estado(self):
+		from datetime import timedelta
+		from .models import Tarea
+		from . import tareas
+		primera = tareas.encolar('prueba_fallo', clave='fallo', veces=5)
+		self.assertEqual(tareas.encolar('prueba_fallo', clave='fallo', veces=5).pk, primera.pk)
+
+		with self.assertLogs('jugadores.tareas', 'ERROR'):
+			self.assertIn('1 tarea(s)', self._trabajar())
+		tarea = Tarea.objects.get(pk=primera.pk)
+		self.assertEqual((tarea.estado, tarea.intentos), ('pendiente', 1))
+		self.assertIn('RuntimeError: fallo 1', tarea.ultimo_error)
+		self.assertGreater(tarea.ejecutar_en, timezone.now() + timedelta(seconds=7))
+		self.assertIn('0 tarea(s)', self._trabajar())  # aún no toca
+
+		Tarea.objects.filter(pk=tarea.pk).update(ejecutar_en=timezone.now())
+		with self.assertLogs('jugadores.tareas', 'ERROR'):
+			self._trabajar()
+		tarea.refresh_from_db()
+		self.assertEqual((tarea.estado, tarea.intentos), ('fallida', 2))
+
+		self.client.force_login(User.objects.create_user(username='jefe', password='pw', is_staff=True))
+		pagina = self.client.get(reverse('estado_tareas'))
+		self.assertContains(pagina, 'RuntimeError: fallo 2')
+		# Corregida la causa, el staff la reintenta desde la página
+		Tarea.objects.filter(pk=tarea.pk).update(argumentos={'veces': 0})
+		self.client.post(reverse('reintentar_tarea', args=[tarea.pk]))
+		self._trabajar()
+		tarea.refresh_from_db()
+		self.assertEqual((tarea.estado, tarea.ultimo_error), ('hecha', ''))
+
+	def test_resultado_tardio_no_pisa_al_trabajador_que_la_reclamo_despues(self):
+		from datetime import timedelta
+		from .models import Tarea
+		from . import tareas
+		tarea = tareas.encolar('prueba_fallo', veces=0)
+		tareas.reclamar(1, 'lento')
+		# Al lento se le vence el plazo y otro trabajador la recupera y reclama
+		Tarea.objects.filter(pk=tarea.pk).update(bloqueada_hasta=timezone.now() - timedelta(seconds=1))
+		tareas.recuperar_abandonadas()
+		self.assertEqual(tareas.reclamar(1, 'rapido'), [tarea.pk])
+		with self.assertLogs('jugadores.tareas', 'WARNING'):
+			tareas.ejecutar(tarea.pk, 'lento')
+		tarea.refresh_from_db()
+		self.assertEqual((tarea.estado, tarea.trabajador), ('en_curso', 'rapido'))
+		tareas.ejecutar(tarea.pk, 'rapido')
+		tarea.refresh_from_db()
+		self.assertEqual(tarea.estado, 'hecha')
+
+	def test_encolado_deduplicado_abandonadas_y_programadas(self):
+		from datetime import datetime, timedelta
+		from django.test import override_settings
+		from .models import Equipo, Tarea
+		from . import tareas
+		equipo = Equipo.objects.create(nombre='Halcones', imagen_url='https://i.imgur.com/halcon.png')
+		equipo.save()
+		self.assertEqual(list(Tarea.objects.values_list('nombre', 'estado', 'argumentos')), [('preparar_imagen', 'pendiente', {'url': 'https://i.imgur.com/halcon.png'})])
+
+		# Un trabajador muerto deja su tarea en curso con el plazo vencido
+		Tarea.objects.update(estado='en_curso', intentos=1, bloqueada_hasta=timezone.now() - timedelta(seconds=1))
+		equipo.save()  # mientras está "en curso" sí se encola otra
+		self.assertEqual(tareas.recuperar_abandonadas(), 1)
+		self.assertEqual(list(Tarea.objects.order_by('pk').values_list('estado', flat=True)), ['fallida', 'pendiente'])
+
+		Tarea.objects.all().delete()
+		madrugada = timezone.make_aware(datetime(2025, 3, 10, 3, 0))
+		with override_settings(TAREAS_PROGRAMADAS={'reconstruir_acumulados': '03:30'}):
+			self.assertEqual(tareas.programar_periodicas(madrugada), [])
+			self.assertEqual(len(tareas.programar_periodicas(madrugada + timedelta(minutes=45))), 1)
+			tareas.ejecutar(tareas.reclamar(1, 'prueba')[0], 'prueba')
+			self.assertEqual(tareas.programar_periodicas(madrugada + timedelta(hours=2)), [])
+		self.assertEqual(Tarea.objects.get(clave='programada:reconstruir_acumulados:2025-03-10').estado, 'hecha')
@@ -5,6 +5,10 @@ from .views_clasificacion import tabla_clasificacion
 from .views_estadisticas import estadisticas_equipo
 from .views_estadisticas import estadisticas_por_partido, estadisticas_por_torneo, debug_estadisticas_jugador
 from .views_encuestas import encuestas
+from .views_en_vivo import partido_eventos, liga_eventos, en_vivo_sondeo
+from .views_subidas import subida_comprobante_crear, subida_comprobante
+from .views_imagenes import imagen_proxy
+from .views_tareas import estado_tareas, reintentar_tarea
 
 urlpatterns = [
     # Rutas para vistas públicas y de usuario
@@ -13,6 +17,12 @@ urlpatterns = [
     path('partido/<int:partido_id>/', views.detalle_partido, name='detalle_partido'),
 # Noticias eliminado
     path('resultados/', views.resultados_partidos, name='resultados_partidos'),
+    # Imágenes externas de jugadores y equipos, redimensionadas y cacheadas
+    path('imagen/<str:firma>/<str:variante>/', imagen_proxy, name='imagen_proxy'),
+    # Marcador en vivo (SSE y sondeo largo)
+    path('partido/<int:partido_id>/eventos/', partido_eventos, name='partido_eventos'),
+    path('en_vivo/eventos/', liga_eventos, name='liga_eventos'),
+    path('en_vivo/sondeo/', en_vivo_sondeo, name='en_vivo_sondeo'),
 
 
     # Rutas para la autenticación
@@ -31,6 +41,8 @@ urlpatterns = [
 
     # Rutas para agregar entidades desde el frontend (solo staff)
     path('agregar_jugador/', views.agregar_jugador, name='agregar_jugador'),
+    path('importar_jugadores/', views.importar_jugadores, name='importar_jugadores'),
+    path('importar_jugadores/credenciales/', views.descargar_credenciales_importacion, name='descargar_credenciales_importacion'),
     path('agregar_equipo/', views.agregar_equipo, name='agregar_equipo'),
     path('agregar_torneo/', views.agregar_torneo, name='agregar_torneo'),
 
@@ -55,12 +67,26 @@ urlpatterns = [
     # Dashboard staff/admin
         path('debug/jugador/<int:jugador_id>/', debug_estadisticas_jugador, name='debug_estadisticas_jugador'),
     path('dashboard_staff/', views.dashboard_staff, name='dashboard_staff'),
+    path('limites/estado/', views.estado_limites, name='estado_limites'),
+    path('cola_escrituras/estado/', views.estado_cola_escrituras, name='estado_cola_escrituras'),
+    path('acumulados/<str:metrica>/', views.serie_acumulados, name='serie_acumulados'),
+    # Cola de tareas en segundo plano
+    path('tareas/', estado_tareas, name='estado_tareas'),
+    path('tareas/<int:tarea_id>/reintentar/', reintentar_tarea, name='reintentar_tarea'),
     # Rutas para pagos
     path('registrar_pago/', views.registrar_pago, name='registrar_pago'),
     path('mis_pagos/', views.mis_pagos, name='mis_pagos'),
     path('lista_pagos/', views.lista_pagos, name='lista_pagos'),
     path('aprobar_pago/<int:pago_id>/', views.aprobar_pago, name='aprobar_pago'),
+    path('conciliar_pagos/', views.conciliar_pagos, name='conciliar_pagos'),
+    path('deudores/', views.deudores, name='deudores'),
+    path('reporte_ingresos/', views.reporte_ingresos, name='reporte_ingresos'),
+    path('generar_arbitraje/', views.generar_arbitraje, name='generar_arbitraje'),
     path('archivar_pago/<int:pago_id>/', views.archivar_pago, name='archivar_pago'),
     path('agregar_pago_admin/', views.agregar_pago_admin, name='agregar_pago_admin'),
     path('pago/<int:pago_id>/', views.pago_detalle, name='pago_detalle'),
+    path('pago/<int:pago_id>/comprobante/', views.comprobante_pago, name='comprobante_pago'),
+    # Subida del comprobante por trozos reanudables
+    path('subidas/comprobante/', subida_comprobante_crear, name='subida_comprobante_crear'),
+    path('subidas/comprobante/<str:token>/', subida_comprobante, name='subida_comprobante'),
 ]
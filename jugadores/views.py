@@ -9,8 +9,11 @@ import logging
 import json
 import os
 
+from django.conf import settings
 from django.shortcuts import render, redirect, get_object_or_404
+from django.http import Http404, HttpResponse, JsonResponse
 from django.utils import timezone
+from django.db import IntegrityError
 from django.db.models import Sum
 from django.contrib import messages
 from django.contrib.auth.forms import UserCreationForm, AuthenticationForm
@@ -28,6 +31,11 @@ from .forms import (
     JugadorForm, EstadisticaForm, PartidoForm, PagoForm, PagoAdminForm,
     TarjetaForm
 )
+from .archivo import url_archivo
+from .limites import rechazos as rechazos_limites
+from .cola_escrituras import cola_escrituras
+from .perfiles import alta_jugador, asegurar_perfil
+from . import acumulados, arbitraje, comprobantes, conciliacion, elegibilidad, importacion, multas, referencia, reportes, subidas
 
 logger = logging.getLogger(__name__)
 DEBUG_LOG = os.path.join(os.path.dirname(__file__), '..', 'debug_pago_submit.log')
@@ -88,7 +96,7 @@ def editar_torneo(request, torneo_id):
             return redirect('lista_torneos')
     else:
         form = TorneoForm(instance=torneo)
-    equipos = Equipo.objects.all()
+    equipos = referencia.equipos()
     return render(request, 'jugadores/editar_torneo.html', {'form': form, 'torneo': torneo, 'equipos': equipos})
 
 
@@ -136,6 +144,51 @@ def dashboard_staff(request):
     })
 
 
+@staff_member_required
+def estado_limites(request):
+    """Peticiones rechazadas por el limitador de escrituras, por vista."""
+    return JsonResponse({'limites': settings.LIMITES_ESCRITURA, 'rechazos': rechazos_limites()})
+
+
+@staff_member_required
+def estado_cola_escrituras(request):
+    """Profundidad de la cola de escrituras y tamaño de los lotes volcados."""
+    return JsonResponse(cola_escrituras.metricas())
+
+
+@staff_member_required
+def serie_acumulados(request, metrica):
+    """
+    Serie de una métrica para gráficas, leída de los acumulados (ver acumulados.py).
+    Parámetros GET: periodo (dia|semana), ambito (liga|torneo|equipo|jugador),
+    id (del torneo, equipo o jugador), desde y hasta (AAAA-MM-DD).
+    """
+    from django.utils.dateparse import parse_date
+    periodo = request.GET.get('periodo') or 'semana'
+    ambito = request.GET.get('ambito') or 'liga'
+    objeto_id = request.GET.get('id') or '0'
+    if metrica not in acumulados.METRICAS:
+        raise Http404('Métrica desconocida.')
+    if periodo not in acumulados.PERIODOS or ambito not in acumulados.AMBITOS or not objeto_id.isdigit():
+        return JsonResponse({'error': 'Parámetros no válidos.'}, status=400)
+    try:
+        desde = parse_date(request.GET.get('desde') or '')
+        hasta = parse_date(request.GET.get('hasta') or '')
+    except ValueError:
+        return JsonResponse({'error': 'Fechas no válidas.'}, status=400)
+    puntos = acumulados.serie(metrica, periodo, ambito, 0 if ambito == 'liga' else int(objeto_id), desde, hasta)
+    return JsonResponse({
+        'metrica': metrica,
+        'periodo': periodo,
+        'ambito': ambito,
+        'id': int(objeto_id),
+        'puntos': [
+            {'inicio': inicio.isoformat(), 'cantidad': cantidad, 'total': str(total)}
+            for inicio, cantidad, total in puntos
+        ],
+    })
+
+
 @login_required
 def detalle_partido(request, partido_id):
     partido = get_object_or_404(Partido, id=partido_id)
@@ -157,8 +210,16 @@ def detalle_partido(request, partido_id):
             jugador_id = request.POST.get('jugador')
             jugador = Jugador.objects.filter(id=jugador_id).first()
             if jugador:
-                VotacionJugadorPartido.objects.create(partido=partido, jugador=jugador, usuario=request.user)
-                mensaje = f'¡Has votado por {jugador.nombre} {jugador.apellido} como Jugador del Partido!'
+                try:
+                    escrito = cola_escrituras.encolar(VotacionJugadorPartido(partido=partido, jugador=jugador, usuario=request.user))
+                except IntegrityError:
+                    mensaje = 'No se pudo registrar tu voto. Inténtalo de nuevo.'
+                else:
+                    if escrito:
+                        mensaje = f'¡Has votado por {jugador.nombre} {jugador.apellido} como Jugador del Partido!'
+                    else:
+                        # Con la cola activa el voto se vuelca en lote: aún no está guardado
+                        mensaje = f'Voto por {jugador.nombre} {jugador.apellido} recibido; se contará en unos segundos.'
     votos = VotacionJugadorPartido.objects.filter(partido=partido).values('jugador').annotate(total=Sum('id')).order_by('-total')
     jugador_destacado = None
     if votos:
@@ -174,6 +235,11 @@ def detalle_partido(request, partido_id):
             'tarjetas': tarjetas,
         }
     tarjeta_form = TarjetaForm() if request.user.is_staff else None
+    # Hoja del partido (staff): jugadores convocables sin inscripción en el torneo
+    sin_inscripcion = []
+    if request.user.is_staff and partido.torneo_id:
+        pendientes = elegibilidad.pendientes_ids(partido.torneo, [partido.equipo_local_id, partido.equipo_visitante_id])
+        sin_inscripcion = [j for j in jugadores if j.id in pendientes]
     return render(request, 'jugadores/detalle_partido.html', {
         'partido': partido,
         'estadisticas': estadisticas,
@@ -182,16 +248,19 @@ def detalle_partido(request, partido_id):
         'jugador_destacado': jugador_destacado,
         'tarjetas_por_jugador': tarjetas_por_jugador,
         'tarjeta_form': tarjeta_form,
+        'sin_inscripcion': sin_inscripcion,
     })
 
 
+@subidas.recibe_comprobante
 @staff_member_required
 def agregar_pago_admin(request):
     if request.method == 'POST':
-        form = PagoAdminForm(request.POST, request.FILES)
+        form = PagoAdminForm(request.POST, subidas.archivos(request), rechazos=subidas.rechazos(request))
         if form.is_valid():
             try:
                 pago = form.save()
+                subidas.consumir(request)
                 messages.success(request, f'Pago #{pago.id} creado correctamente.')
                 siguiente = request.POST.get('next')
                 if siguiente == 'dashboard':
@@ -219,16 +288,18 @@ def inicio(request):
     return render(request, 'jugadores/inicio.html', contexto)
 
 
+@subidas.recibe_comprobante
 @login_required
 def registrar_pago(request):
     jugador = get_object_or_404(Jugador, user=request.user)
     if request.method == 'POST':
-        form = PagoForm(request.POST, request.FILES)
+        form = PagoForm(request.POST, subidas.archivos(request), rechazos=subidas.rechazos(request))
         if form.is_valid():
             try:
                 pago = form.save(commit=False)
                 pago.jugador = jugador
                 pago.save()
+                subidas.consumir(request)
                 messages.success(request, 'Pago registrado correctamente. Quedará como pendiente hasta su aprobación.')
                 return redirect('mis_pagos')
             except Exception as e:
@@ -374,8 +445,7 @@ def agregar_partido(request):
 
 @staff_member_required
 def agregar_jugador(request):
-    from django.contrib.auth.models import User, Group
-    import random, string
+    from django.contrib.auth.models import User
     if request.method == 'POST':
         form = JugadorForm(request.POST, request.FILES)
         username = request.POST.get('usuario')
@@ -396,84 +466,31 @@ def agregar_jugador(request):
                 form.add_error(None, 'La contraseña debe tener al menos 8 caracteres.')
                 return render(request, 'jugadores/agregar_jugador.html', {'form': form})
             password = password_custom
-            user_qs = User.objects.filter(username=username)
-            if user_qs.exists():
-                user = user_qs.first()
-                if Jugador.objects.filter(user=user).exists():
-                    form.add_error(None, 'Ya existe un jugador con ese nombre de usuario. Intenta con otro.')
-                    return render(request, 'jugadores/agregar_jugador.html', {'form': form})
-                # Si el usuario ya existe pero no tiene perfil Jugador, actualizar su contraseña
-                user.set_password(password)
-                user.first_name = nombre
-                user.last_name = apellido
-                user.save()
-            else:
-                user = User.objects.create_user(username=username, password=password, first_name=nombre, last_name=apellido)
-            grupo_jugadores, creado = Group.objects.get_or_create(name='jugadores')
-            user.groups.add(grupo_jugadores)
-            # Asegurar que el campo 'cedula' requerido por el modelo exista.
+            user = User.objects.filter(username=username).first()
+            if user is None:
+                user = User(username=username)
+            elif Jugador.objects.filter(user=user).exists():
+                form.add_error(None, 'Ya existe un jugador con ese nombre de usuario. Intenta con otro.')
+                return render(request, 'jugadores/agregar_jugador.html', {'form': form})
+            # Si el usuario ya existe pero no tiene perfil Jugador, se actualiza su contraseña
+            user.first_name = nombre
+            user.last_name = apellido
+            # Sin cédula se genera una única a partir del id del usuario
             cedula = request.POST.get('cedula') or form.cleaned_data.get('cedula', '')
-            if not cedula:
-                # Generar una cédula numérica única de 8 dígitos
-                import random
-                import string as _string
-                from django.db import IntegrityError, transaction
-                while True:
-                    candidate = ''.join(random.choices('0123456789', k=8))
-                    if not Jugador.objects.filter(cedula=candidate).exists():
-                        cedula = candidate
-                        break
-            else:
-                from django.db import IntegrityError, transaction
-            # Guardar jugador dentro de una transacción para gestionar errores de integridad
-            from django.db import IntegrityError, transaction
             try:
-                with transaction.atomic():
-                    # Evitar UNIQUE constraint usando get_or_create
-                    jugador, created = Jugador.objects.get_or_create(
-                        user=user,
-                        defaults={
-                            'nombre': nombre,
-                            'apellido': apellido,
-                            'posicion': posicion,
-                            'numero_de_camiseta': numero_de_camiseta,
-                            'equipo': equipo,
-                            'imagen_url': imagen_url,
-                            'cedula': cedula,
-                        }
-                    )
-                    if not created:
-                        # Actualizar los campos por si se creó parcialmente antes
-                        changed = False
-                        if jugador.nombre != nombre:
-                            jugador.nombre = nombre
-                            changed = True
-                        if jugador.apellido != apellido:
-                            jugador.apellido = apellido
-                            changed = True
-                        if jugador.posicion != posicion:
-                            jugador.posicion = posicion
-                            changed = True
-                        if jugador.numero_de_camiseta != numero_de_camiseta:
-                            jugador.numero_de_camiseta = numero_de_camiseta
-                            changed = True
-                        if jugador.equipo != equipo:
-                            jugador.equipo = equipo
-                            changed = True
-                        # Actualizar foto si se envió una nueva
-                        if imagen_url:
-                            jugador.imagen_url = imagen_url
-                            changed = True
-                        if cedula and jugador.cedula != cedula:
-                            jugador.cedula = cedula
-                            changed = True
-                        if changed:
-                            jugador.save()
+                jugador = alta_jugador(
+                    user,
+                    password=password,
+                    cedula=cedula,
+                    nombre=nombre,
+                    apellido=apellido,
+                    posicion=posicion,
+                    numero_de_camiseta=numero_de_camiseta,
+                    equipo=equipo,
+                    imagen_url=imagen_url,
+                )
             except Exception as ex:
-                try:
-                    logger.exception('Error al crear/actualizar Jugador: %s', ex)
-                except Exception:
-                    pass
+                logger.exception('Error al crear el Jugador: %s', ex)
                 form.add_error(None, 'Error al crear el jugador. Verifica los datos e intenta de nuevo.')
                 return render(request, 'jugadores/agregar_jugador.html', {'form': form})
             request.session['nuevo_jugador_username'] = username
@@ -486,6 +503,184 @@ def agregar_jugador(request):
     return render(request, 'jugadores/agregar_jugador.html', {'form': form})
 
 
+@staff_member_required
+def importar_jugadores(request):
+    """Alta masiva de jugadores desde una plantilla CSV/XLSX (ver importacion.py)."""
+    from django.core.exceptions import ValidationError
+    errores = []
+    if request.method == 'POST':
+        archivo = request.FILES.get('archivo')
+        if not archivo:
+            errores.append((None, 'Selecciona un fichero CSV o XLSX.'))
+        else:
+            try:
+                filas = importacion.leer_filas(archivo)
+            except (ValidationError, UnicodeDecodeError) as exc:
+                mensaje = exc.messages[0] if isinstance(exc, ValidationError) else 'El CSV debe estar en UTF-8.'
+                errores.append((None, mensaje))
+                filas = []
+            if filas:
+                validas, errores = importacion.validar(filas)
+                if not errores:
+                    try:
+                        credenciales = importacion.importar(validas)
+                    except ValidationError as exc:
+                        errores.append((None, exc.messages[0]))
+                    else:
+                        # Igual que agregar_jugador: las credenciales quedan en la sesión hasta descargarlas
+                        request.session['importacion_credenciales'] = credenciales
+                        messages.success(request, f'{len(credenciales)} jugador(es) importados. Descarga el informe de credenciales.')
+                        return redirect('importar_jugadores')
+            elif not errores:
+                errores.append((None, 'El fichero no contiene jugadores.'))
+    return render(request, 'jugadores/importar_jugadores.html', {
+        'errores': errores,
+        'columnas': importacion.COLUMNAS,
+        'pendientes': len(request.session.get('importacion_credenciales', [])),
+    })
+
+
+@staff_member_required
+def descargar_credenciales_importacion(request):
+    """Descarga (una sola vez) el CSV de credenciales de la última importación."""
+    credenciales = request.session.pop('importacion_credenciales', None)
+    if not credenciales:
+        messages.info(request, 'No hay credenciales pendientes de descargar.')
+        return redirect('importar_jugadores')
+    respuesta = HttpResponse(importacion.informe_credenciales(credenciales), content_type='text/csv; charset=utf-8')
+    respuesta['Content-Disposition'] = 'attachment; filename="credenciales_jugadores.csv"'
+    respuesta['Cache-Control'] = 'no-store'
+    return respuesta
+
+
+@staff_member_required
+def conciliar_pagos(request):
+    """
+    Conciliación de pagos pendientes con un extracto bancario (ver conciliacion.py).
+    Primero se sube el CSV y se muestra la vista previa; las coincidencias exactas
+    quedan en la sesión y se aprueban en bloque al confirmar.
+    """
+    from django.core.exceptions import ValidationError
+    resultado = None
+    errores = []
+    metodo = request.POST.get('metodo') or 'pago_movil'
+    if request.method == 'POST' and 'confirmar' in request.POST:
+        ids = request.session.pop('conciliacion_ids', [])
+        aprobados = conciliacion.aprobar_en_bloque(ids) if ids else 0
+        if aprobados:
+            # update() no emite señales: refrescar aquí el saldo de multas y los acumulados
+            multas.actualizar_saldos(Pago.objects.filter(pk__in=ids).values_list('jugador_id', flat=True))
+            acumulados.programar_pagos(Pago.objects.filter(pk__in=ids))
+        messages.success(request, f'{aprobados} pago(s) aprobados por conciliación.')
+        return redirect('conciliar_pagos')
+    if request.method == 'POST':
+        archivo = request.FILES.get('archivo')
+        if not archivo:
+            errores.append((None, 'Selecciona el extracto en CSV.'))
+        elif metodo not in conciliacion.METODOS_CONCILIABLES:
+            errores.append((None, 'Método de pago no válido.'))
+        else:
+            try:
+                lineas, errores = conciliacion.leer_extracto(archivo, metodo)
+            except ValidationError as exc:
+                errores.append((None, exc.messages[0]))
+                lineas = []
+            if lineas:
+                resultado = conciliacion.conciliar(lineas)
+                request.session['conciliacion_ids'] = [
+                    pago.pk for fila in resultado['coincidencias'] for pago in fila['pagos']
+                ]
+            elif not errores:
+                errores.append((None, 'El extracto no contiene movimientos.'))
+    return render(request, 'jugadores/conciliar_pagos.html', {
+        'resultado': resultado,
+        'errores': errores,
+        'metodo': metodo,
+        'metodos': [(valor, nombre) for valor, nombre in Pago.METODO_PAGO_CHOICES if valor in conciliacion.METODOS_CONCILIABLES],
+    })
+
+
+@staff_member_required
+def deudores(request):
+    """Jugadores con multas o arbitrajes pendientes según su saldo (ver multas.py)."""
+    saldos = list(multas.deudores())
+    return render(request, 'jugadores/deudores.html', {
+        'saldos': saldos,
+        'total': sum((s.deuda for s in saldos), multas.CERO),
+        'moneda': settings.MULTAS_MONEDA,
+    })
+
+
+@staff_member_required
+def reporte_ingresos(request):
+    """Ingresos por mes, tipo y método con su equivalente en USD (ver reportes.py)."""
+    from django.utils.dateparse import parse_date
+    error = ''
+    try:
+        desde = parse_date(request.GET.get('desde') or '')
+        hasta = parse_date(request.GET.get('hasta') or '')
+    except ValueError:
+        # Bien formada pero inexistente (p. ej. 2024-02-30)
+        desde = hasta = None
+        error = 'Fechas no válidas.'
+    filas = [] if error else reportes.resumen_ingresos(desde, hasta)
+    return render(request, 'jugadores/reporte_ingresos.html', {
+        'error': error,
+        'filas': filas,
+        'totales': reportes.totales(filas),
+        'desde': desde,
+        'hasta': hasta,
+        'tasa': reportes.tasa_vigente(),
+        'tipos': dict(Pago.TIPO_PAGO_CHOICES),
+        'metodos': dict(Pago.METODO_PAGO_CHOICES),
+    })
+
+
+@staff_member_required
+def generar_arbitraje(request):
+    """Genera los cargos de arbitraje de una jornada (torneo + fecha) o de un partido."""
+    from decimal import Decimal, InvalidOperation
+    from django.utils.dateparse import parse_date
+    if request.method == 'POST':
+        try:
+            monto = Decimal(request.POST.get('monto') or arbitraje.monto_por_defecto())
+        except InvalidOperation:
+            monto = None
+        if monto is not None and not monto.is_finite():
+            monto = None  # NaN e Infinity no son montos
+        partido_id = (request.POST.get('partido') or '').strip()
+        torneo_id = (request.POST.get('torneo') or '').strip()
+        try:
+            fecha = parse_date(request.POST.get('fecha') or '')
+        except ValueError:
+            fecha = None  # bien formada pero inexistente, p. ej. 2025-02-30
+        if partido_id.isdigit():
+            partidos = Partido.objects.filter(pk=int(partido_id))
+        elif not partido_id and fecha and torneo_id.isdigit():
+            partidos = arbitraje.partidos_jornada(int(torneo_id), fecha)
+        else:
+            partidos = None
+        if monto is None or monto <= 0:
+            messages.error(request, 'Indica un monto válido.')
+        elif partidos is None:
+            messages.error(request, 'Elige un partido o un torneo y la fecha de la jornada.')
+        else:
+            resumen = arbitraje.generar_cargos(partidos, monto)
+            messages.success(request, f"{resumen['cargos']} cargo(s) creados en {resumen['partidos']} partido(s).")
+            if resumen['omitidos']:
+                messages.warning(request, f"{len(resumen['omitidos'])} partido(s) ya tenían cargos de arbitraje.")
+            if resumen['sin_plantilla']:
+                nombres = Equipo.objects.filter(pk__in=resumen['sin_plantilla']).values_list('nombre', flat=True)
+                messages.warning(request, f"Equipos sin jugadores: {', '.join(nombres)}.")
+        return redirect('generar_arbitraje')
+    return render(request, 'jugadores/generar_arbitraje.html', {
+        'torneos': referencia.torneos(),
+        'partidos': Partido.objects.select_related('equipo_local', 'equipo_visitante').order_by('-fecha')[:50],
+        'monto': arbitraje.monto_por_defecto(),
+        'moneda': settings.MULTAS_MONEDA,
+    })
+
+
 @staff_member_required
 def mostrar_credenciales_jugador(request):
     username = request.session.pop('nuevo_jugador_username', None)
@@ -751,25 +946,27 @@ def inicio(request):
     jugadores_lista = Jugador.objects.all()
     # También incluir algunos datos para la página principal
     from .models import Torneo, Equipo, Partido
-    torneos = Torneo.objects.all()[:5]
-    equipos = Equipo.objects.all()[:5]
+    torneos = referencia.torneos()[:5]
+    equipos = referencia.equipos()[:5]
     partidos = Partido.objects.order_by('-fecha')[:5]
     contexto = {'jugadores': jugadores_lista, 'torneos': torneos, 'equipos': equipos, 'partidos': partidos}
     return render(request, 'jugadores/inicio.html', contexto)
 
 
+@subidas.recibe_comprobante
 @login_required
 def registrar_pago(request):
     """Permite a un jugador registrar un pago (estado 'pendiente')."""
     jugador = get_object_or_404(Jugador, user=request.user)
     from django.contrib import messages
     if request.method == 'POST':
-        form = PagoForm(request.POST, request.FILES)
+        form = PagoForm(request.POST, subidas.archivos(request), rechazos=subidas.rechazos(request))
         if form.is_valid():
             try:
                 pago = form.save(commit=False)
                 pago.jugador = jugador
                 pago.save()
+                subidas.consumir(request)
                 messages.success(request, 'Pago registrado correctamente. Quedará como pendiente hasta su aprobación.')
                 return redirect('mis_pagos')
             except Exception as e:
@@ -802,7 +999,11 @@ def mis_pagos(request):
     """Lista de pagos del jugador autenticado."""
     jugador = get_object_or_404(Jugador, user=request.user)
     pagos = Pago.objects.filter(jugador=jugador).order_by('-fecha')
-    return render(request, 'jugadores/mis_pagos.html', {'pagos': pagos})
+    return render(request, 'jugadores/mis_pagos.html', {
+        'pagos': pagos,
+        'arbitrajes': arbitraje.pendiente_por_partido(jugador.pk),
+        'moneda': settings.MULTAS_MONEDA,
+    })
 
 
 @staff_member_required
@@ -851,6 +1052,18 @@ def pago_detalle(request, pago_id):
     return render(request, 'jugadores/pago_detalle.html', {'pago': pago})
 
 
+@login_required
+def comprobante_pago(request, pago_id):
+    """Comprobante de un pago, con los mismos permisos que el detalle (ver comprobantes.py)."""
+    pago = get_object_or_404(Pago.objects.select_related('jugador'), id=pago_id)
+    if not (request.user.is_staff or pago.jugador.user_id == request.user.id):
+        from django.http import HttpResponseForbidden
+        return HttpResponseForbidden('No tienes permiso para ver este comprobante')
+    if not pago.comprobante or not pago.comprobante.storage.exists(pago.comprobante.name):
+        raise Http404('El pago no tiene comprobante.')
+    return comprobantes.servir(request, pago.comprobante)
+
+
 @staff_member_required
 def archivar_pago(request, pago_id):
     """Marca o desmarca un pago como archivado (soft-delete) para ocultarlo del dashboard."""
@@ -1205,10 +1418,20 @@ def lista_torneos(request):
 def torneo_detalle(request, torneo_id):
     """Detalle público/privado de un torneo: muestra info básica y equipos asociados."""
     torneo = get_object_or_404(Torneo, pk=torneo_id)
+    # Si el torneo finalizó y ya tiene instantánea, servirla en lugar de recalcular
+    # (salvo al staff, que necesita la vista en vivo y sus acciones)
+    url = None if request.user.is_staff else url_archivo(torneo.id, 'index.html')
+    if url:
+        return redirect(url)
     equipos = torneo.equipos.all()
+    sin_inscripcion = None
+    if request.user.is_staff:
+        pendientes = elegibilidad.informe(torneo)
+        sin_inscripcion = [(equipo, pendientes[equipo.pk]) for equipo in equipos if pendientes.get(equipo.pk)]
     return render(request, 'jugadores/torneo_detalle.html', {
         'torneo': torneo,
         'equipos': equipos,
+        'sin_inscripcion': sin_inscripcion,
     })
 
 from django.contrib.auth import authenticate, login
@@ -2638,7 +2861,7 @@ def lista_jugadores(request):
     from .models import Equipo
     from django.db.models import Q
     jugadores = Jugador.objects.all()
-    equipos = Equipo.objects.all()
+    equipos = referencia.equipos()
     equipo_id = request.GET.get('equipo')
     posicion = request.GET.get('posicion')
     busqueda = request.GET.get('busqueda')
@@ -2716,45 +2939,25 @@ def registro(request):
     if request.method == 'POST':
         form = CustomUserCreationForm(request.POST)
         if form.is_valid():
-            raw_password = form.cleaned_data.get('password1')
+            # form.save(commit=False) ya deja la contraseña cifrada
             user = form.save(commit=False)
-            user.username = form.cleaned_data['username']
             user.first_name = form.cleaned_data['first_name']
             user.last_name = form.cleaned_data['last_name']
-            user.save()
-
-            from .models import Jugador
-            cedula_val = form.cleaned_data.get('cedula')
-            fecha_nac = form.cleaned_data.get('fecha_de_nacimiento')
-            jugador, created = Jugador.objects.get_or_create(user=user, defaults={
-                'nombre': user.first_name or '',
-                'apellido': user.last_name or '',
-                'cedula': cedula_val or '',
-                'fecha_de_nacimiento': fecha_nac,
-            })
-
-            # Si la señal creó un jugador con una cédula temporal, reemplazarla
-            updated = False
-            if cedula_val and (not jugador.cedula or str(jugador.cedula).startswith('u')) and jugador.cedula != cedula_val:
-                jugador.cedula = cedula_val
-                updated = True
-            if fecha_nac and jugador.fecha_de_nacimiento != fecha_nac:
-                jugador.fecha_de_nacimiento = fecha_nac
-                updated = True
-            if updated:
-                jugador.save()
-
-            # Autenticar y loguear
-            user = form.save()
-            user_auth = authenticate(request, username=user.username, password=raw_password)
-            if user_auth is not None:
-                login(request, user_auth)
+            from django.db import IntegrityError
+            try:
+                alta_jugador(
+                    user,
+                    cedula=form.cleaned_data.get('cedula'),
+                    fecha_de_nacimiento=form.cleaned_data.get('fecha_de_nacimiento'),
+                )
+            except IntegrityError:
+                # Otra alta simultánea tomó la misma cédula tras la validación del formulario
+                form.add_error('cedula', 'Ya existe un jugador registrado con esa cédula.')
             else:
-                user.backend = 'django.contrib.auth.backends.ModelBackend'
-                login(request, user)
-
-            messages.success(request, "Registro completado. Has iniciado sesión correctamente.")
-            return redirect('inicio')
+                # Recién creada: no hace falta volver a comprobar la contraseña
+                login(request, user, backend='django.contrib.auth.backends.ModelBackend')
+                messages.success(request, "Registro completado. Has iniciado sesión correctamente.")
+                return redirect('inicio')
     else:
         form = CustomUserCreationForm()
 
@@ -2790,20 +2993,13 @@ def iniciar_sesion(request):
         if form.is_valid():
             user = form.get_user()
             login(request, user)
-            # Asegurar que el usuario no-staff tiene un perfil de Jugador y pertenece al grupo
+            # El perfil y el grupo se crean al registrar la cuenta; aquí solo se
+            # comprueba la marca cacheada (cuentas antiguas se completan una vez)
             try:
-                from .models import Jugador
-                from django.contrib.auth.models import Group
-                if not user.is_staff and not user.is_superuser:
-                    # Crear jugador si no existe
-                    if not Jugador.objects.filter(user=user).exists():
-                        Jugador.objects.create(user=user, nombre=user.first_name or '', apellido=user.last_name or '')
-                    # Añadir al grupo 'jugadores'
-                    grupo_jugadores, _ = Group.objects.get_or_create(name='jugadores')
-                    user.groups.add(grupo_jugadores)
+                asegurar_perfil(user)
             except Exception:
                 # No interrumpir el login si algo falla al crear el perfil
-                pass
+                logger.exception('No se pudo aprovisionar el perfil del usuario %s', user.pk)
             messages.success(request, f'Has iniciado sesión como {user.username}')
             return redirect('inicio')
     else:
@@ -2828,7 +3024,7 @@ def resultados_partidos(request):
     from .models import Equipo
     from django.db.models import Q
     now = timezone.now()
-    equipos = Equipo.objects.all()
+    equipos = referencia.equipos()
     equipo_id = request.GET.get('equipo')
     fecha = request.GET.get('fecha')
     partidos_pasados = Partido.objects.filter(fecha__lte=now)
@@ -1,11 +1,12 @@
-from django.shortcuts import render
+from django.shortcuts import render, redirect
 from .models import Equipo, Partido, Torneo
 from django.db.models import Q, Sum, Count, F
+from .archivo import url_archivo
+from . import referencia
 
-def tabla_clasificacion(request):
-    torneos = Torneo.objects.all()
-    torneo_id = request.GET.get('torneo')
-    torneo = Torneo.objects.filter(id=torneo_id).first() if torneo_id else torneos.first()
+
+def calcular_clasificacion(torneo):
+    """Devuelve la tabla de posiciones de `torneo` como lista de dicts ordenada."""
     equipos = Equipo.objects.filter(torneos=torneo)
     clasificacion = []
     for equipo in equipos:
@@ -32,7 +33,24 @@ def tabla_clasificacion(request):
             'goles_favor': goles_favor,
             'goles_contra': goles_contra,
         })
-    clasificacion = sorted(clasificacion, key=lambda x: (-x['puntos'], x['goles_favor']-x['goles_contra']))
+    return sorted(clasificacion, key=lambda x: (-x['puntos'], x['goles_favor']-x['goles_contra']))
+
+
+def tabla_clasificacion(request):
+    torneos = referencia.torneos()
+    torneo_id = request.GET.get('torneo')
+    if torneo_id:
+        torneo = next((t for t in torneos if str(t.id) == torneo_id), None)
+    else:
+        torneo = torneos[0] if torneos else None
+    # Un torneo finalizado pedido expresamente se sirve desde su instantánea estática
+    # (sin torneo se muestra el predeterminado en vivo, para no dejar al visitante
+    # atrapado en una página estática; el staff siempre ve la vista en vivo)
+    if torneo and torneo_id and request.method == 'GET' and not request.user.is_staff:
+        url = url_archivo(torneo.id, 'clasificacion.html')
+        if url:
+            return redirect(url)
+    clasificacion = calcular_clasificacion(torneo)
     return render(request, 'jugadores/tabla_clasificacion.html', {
         'equipos': clasificacion,
         'torneos': torneos,
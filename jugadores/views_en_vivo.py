@@ -0,0 +1,142 @@
+"""Vistas de marcador en vivo: Server-Sent Events y sondeo largo.
+
+Bajo ASGI (`config.asgi`) las conexiones SSE quedan abiertas y esperan en el
+canal sin ocupar hilos. Bajo WSGI no se retiene el worker: la respuesta SSE
+entrega los eventos pendientes y termina, y `EventSource` se reconecta tras
+`retry` enviando `Last-Event-ID`, con lo que degrada a un sondeo barato que no
+consulta la base de datos.
+
+Si el cursor del cliente no es de este proceso (otro worker de gunicorn, o un
+reinicio) no se le reenvía nada del historial: recibe un evento `resync` (en
+el sondeo, `"resync": true`) y sigue desde el último id de este worker; el
+flujo de un partido vuelve a mandar el estado actual.
+"""
+import json
+import time
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import Http404, HttpResponse, JsonResponse, StreamingHttpResponse
+
+from .en_vivo import TEMA_LIGA, canal, tema_partido
+from .models import Partido
+
+
+def _entero(valor):
+    try:
+        return max(int(valor), 0)
+    except (TypeError, ValueError):
+        return None
+
+
+def _desde(request):
+    """
+    (último id visto por el cliente, resync). Si no envía ninguno solo recibe
+    eventos nuevos; si su cursor no es de este proceso, resync es True.
+    """
+    cursor = request.headers.get('Last-Event-ID') or request.GET.get('desde')
+    if not cursor:
+        return canal.ultimo_id, False
+    desde = canal.leer_cursor(cursor)
+    if desde is None:
+        return canal.ultimo_id, True
+    return desde, False
+
+
+def _sse(evento, nombre=None, con_id=True):
+    lineas = []
+    if con_id:
+        lineas.append(f"id: {canal.cursor(evento['id'])}")
+    lineas.append(f"event: {nombre or evento.get('tipo', 'message')}")
+    lineas.append('data: ' + json.dumps(evento, cls=DjangoJSONEncoder, ensure_ascii=False))
+    return '\n'.join(lineas) + '\n\n'
+
+
+def _estado_partido(partido_id):
+    partido = Partido.objects.filter(pk=partido_id).values(
+        'id', 'marcador_local', 'marcador_visitante', 'estado'
+    ).first()
+    if partido is None:
+        raise Http404('Partido no encontrado')
+    partido['partido'] = partido.pop('id')
+    partido['tipo'] = 'estado'
+    return partido
+
+
+def _resync():
+    return 'event: resync\ndata: {}\n\n'
+
+
+async def _flujo(tema, desde, resync, inicial=None):
+    yield f"retry: {settings.EN_VIVO_REINTENTO_MS}\nid: {canal.cursor(desde)}\n\n"
+    if resync:
+        yield _resync()
+    if inicial is not None:
+        yield _sse(inicial, con_id=False)
+    ultimo = desde
+    # Cerrar periódicamente para reciclar conexiones; el cliente reconecta solo
+    fin = time.monotonic() + settings.EN_VIVO_SSE_DURACION
+    while time.monotonic() < fin:
+        eventos = await canal.aesperar(tema, ultimo, timeout=settings.EN_VIVO_LATIDO)
+        if not eventos:
+            yield ': latido\n\n'
+            continue
+        for evento in eventos:
+            ultimo = evento['id']
+            yield _sse(evento)
+
+
+def _respuesta_sse(request, tema, inicial=None):
+    desde, resync = _desde(request)
+    if isinstance(request, ASGIRequest):
+        respuesta = StreamingHttpResponse(_flujo(tema, desde, resync, inicial), content_type='text/event-stream')
+    else:
+        eventos = canal.eventos_desde(tema, desde)
+        ultimo = eventos[-1]['id'] if eventos else desde
+        partes = [f"retry: {settings.EN_VIVO_REINTENTO_WSGI_MS}\nid: {canal.cursor(ultimo)}\n\n"]
+        if resync:
+            partes.append(_resync())
+        if inicial is not None:
+            partes.append(_sse(inicial, con_id=False))
+        partes.extend(_sse(e) for e in eventos)
+        respuesta = HttpResponse(''.join(partes), content_type='text/event-stream')
+    respuesta['Cache-Control'] = 'no-cache'
+    # Evitar que nginx acumule el flujo antes de enviarlo
+    respuesta['X-Accel-Buffering'] = 'no'
+    return respuesta
+
+
+async def partido_eventos(request, partido_id):
+    """Flujo SSE de un partido: estado inicial y luego deltas de marcador, tarjetas y estadísticas."""
+    inicial = await sync_to_async(_estado_partido)(partido_id)
+    return _respuesta_sse(request, tema_partido(partido_id), inicial)
+
+
+async def liga_eventos(request):
+    """Flujo SSE con los eventos de todos los partidos."""
+    return _respuesta_sse(request, TEMA_LIGA)
+
+
+async def en_vivo_sondeo(request):
+    """
+    Sondeo largo en JSON para clientes sin EventSource:
+    ``?partido=<id>&desde=<último cursor>&espera=<segundos>``.
+    Bajo WSGI responde al instante para no retener el worker.
+    """
+    partido_id = _entero(request.GET.get('partido'))
+    tema = tema_partido(partido_id) if partido_id else TEMA_LIGA
+    desde, resync = _desde(request)
+    espera = 0
+    if isinstance(request, ASGIRequest):
+        espera = min(_entero(request.GET.get('espera')) or settings.EN_VIVO_ESPERA_MAX, settings.EN_VIVO_ESPERA_MAX)
+    if espera and not resync:
+        eventos = await canal.aesperar(tema, desde, timeout=espera)
+    else:
+        eventos = canal.eventos_desde(tema, desde)
+    return JsonResponse({
+        'ultimo': canal.cursor(eventos[-1]['id'] if eventos else desde),
+        'resync': resync,
+        'eventos': eventos,
+    })
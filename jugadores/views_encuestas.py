@@ -1,17 +1,35 @@
-from django.shortcuts import render, redirect
-from .models import Jugador
-from django.views.decorators.csrf import csrf_exempt
+from django.shortcuts import render, redirect, get_object_or_404
+from django.contrib import messages
+from django.contrib.auth.views import redirect_to_login
+from django.core.exceptions import ValidationError
+from django.http import Http404
+
+from .models import Encuesta, VotoEncuesta
+from .encuestas import encuestas_abiertas, resultados, votar
+
 
-@csrf_exempt
 def encuestas(request):
-    jugadores = Jugador.objects.all()
-    mensaje = ''
+    """Lista las encuestas abiertas con sus resultados y registra votos (uno por usuario y encuesta)."""
     if request.method == 'POST':
-        if 'jugador' in request.POST:
-            jugador_id = request.POST.get('jugador')
-            jugador = Jugador.objects.filter(id=jugador_id).first()
-            mensaje = f'¡Has votado por {jugador.nombre} {jugador.apellido} como Jugador del Partido!'
-        elif 'camiseta' in request.POST:
-            camiseta = request.POST.get('camiseta')
-            mensaje = f'¡Has votado por la camiseta {camiseta} para el próximo partido!'
-    return render(request, 'jugadores/encuestas.html', {'jugadores': jugadores, 'mensaje': mensaje})
+        if not request.user.is_authenticated:
+            return redirect_to_login(request.get_full_path())
+        encuesta_id = request.POST.get('encuesta') or ''
+        if not encuesta_id.isdigit():
+            raise Http404('Encuesta no encontrada')
+        encuesta = get_object_or_404(Encuesta, pk=int(encuesta_id))
+        try:
+            opcion = votar(encuesta, request.POST.get('opcion'), request.user)
+            messages.success(request, f'¡Has votado por {opcion.texto}!')
+        except ValidationError as e:
+            messages.error(request, e.messages[0])
+        return redirect('encuestas')
+
+    abiertas = list(encuestas_abiertas()[:10])
+    votadas = set()
+    if request.user.is_authenticated and abiertas:
+        votadas = set(VotoEncuesta.objects.filter(usuario=request.user, encuesta__in=abiertas).values_list('encuesta_id', flat=True))
+    tarjetas = [
+        {'encuesta': e, 'resultados': resultados(e.id), 'ya_voto': e.id in votadas}
+        for e in abiertas
+    ]
+    return render(request, 'jugadores/encuestas.html', {'tarjetas': tarjetas})
@@ -1,4 +1,4 @@
-from django.shortcuts import render
+from django.shortcuts import render, redirect
 from .models import Jugador, Estadistica, Partido
 from django.db.models import Sum, Count, Q, F
 from .models import Tarjeta, Torneo
@@ -6,6 +6,7 @@ from django.db.models import Value
 from django.contrib.admin.views.decorators import staff_member_required
 from django.shortcuts import get_object_or_404
 from django.contrib.auth.decorators import login_required
+from .archivo import url_archivo
 
 
 def _get_count_or_sum(jugador, field_name, partido_qs=None, partido_obj=None):
@@ -28,10 +29,8 @@ def _get_count_or_sum(jugador, field_name, partido_qs=None, partido_obj=None):
     return Estadistica.objects.filter(**{field_name: jugador}).count()
 
 
-def estadisticas_por_partido(request, partido_id):
-    partido = Partido.objects.filter(id=partido_id).first()
-    if not partido:
-        return render(request, 'jugadores/estadisticas_por_partido.html', {'error': 'Partido no encontrado.'})
+def datos_estadisticas_partido(partido):
+    """Goles, asistencias y tarjetas por jugador de los dos equipos de `partido`."""
     jugadores = Jugador.objects.filter(equipo__in=[partido.equipo_local, partido.equipo_visitante])
     # Agregaciones: obtener totales por jugador en pocas consultas para evitar N+1
     datos = []
@@ -60,13 +59,23 @@ def estadisticas_por_partido(request, partido_id):
         amarillas = jugador_tarjetas.get('amarilla', 0)
         rojas = jugador_tarjetas.get('roja', 0)
         datos.append({'jugador': jugador, 'goles': goles, 'asistencias': asistencias, 'amarillas': amarillas, 'rojas': rojas})
+    return datos
+
+
+def estadisticas_por_partido(request, partido_id):
+    partido = Partido.objects.filter(id=partido_id).first()
+    if not partido:
+        return render(request, 'jugadores/estadisticas_por_partido.html', {'error': 'Partido no encontrado.'})
+    if partido.torneo_id and request.method == 'GET':
+        url = url_archivo(partido.torneo_id, f'partido_{partido.id}.html')
+        if url:
+            return redirect(url)
+    datos = datos_estadisticas_partido(partido)
     return render(request, 'jugadores/estadisticas_por_partido.html', {'partido': partido, 'datos': datos})
 
 
-def estadisticas_por_torneo(request, torneo_id):
-    torneo = Torneo.objects.filter(id=torneo_id).first()
-    if not torneo:
-        return render(request, 'jugadores/estadisticas_por_torneo.html', {'error': 'Torneo no encontrado.'})
+def datos_estadisticas_torneo(torneo):
+    """Totales por jugador (goles, asistencias, tarjetas) en todos los partidos de `torneo`."""
     # Obtener todos los partidos del torneo
     partidos = torneo.partidos.all()
     equipos_ids = list({p.equipo_local_id for p in partidos} | {p.equipo_visitante_id for p in partidos})
@@ -94,6 +103,18 @@ def estadisticas_por_torneo(request, torneo_id):
         amarillas = jugador_tarjetas.get('amarilla', 0)
         rojas = jugador_tarjetas.get('roja', 0)
         datos.append({'jugador': jugador, 'goles': goles, 'asistencias': asistencias, 'amarillas': amarillas, 'rojas': rojas})
+    return datos
+
+
+def estadisticas_por_torneo(request, torneo_id):
+    torneo = Torneo.objects.filter(id=torneo_id).first()
+    if not torneo:
+        return render(request, 'jugadores/estadisticas_por_torneo.html', {'error': 'Torneo no encontrado.'})
+    if request.method == 'GET':
+        url = url_archivo(torneo.id, 'estadisticas.html')
+        if url:
+            return redirect(url)
+    datos = datos_estadisticas_torneo(torneo)
     return render(request, 'jugadores/estadisticas_por_torneo.html', {'torneo': torneo, 'datos': datos})
 
 
@@ -0,0 +1,38 @@
+"""Proxy de imágenes externas con variantes redimensionadas (ver imagenes.py)."""
+import logging
+
+from django.http import FileResponse, Http404, HttpResponseRedirect
+from django.templatetags.static import static
+from django.utils.cache import get_conditional_response
+from django.utils.http import quote_etag
+
+from . import imagenes
+
+logger = logging.getLogger(__name__)
+
+UN_ANO = 365 * 24 * 3600
+IMAGEN_GENERICA = 'jugadores/images/avatar-placeholder.png'
+
+
+def imagen_proxy(request, firma, variante):
+    url = imagenes.url_de_firma(firma)
+    if url is None or variante not in imagenes.VARIANTES:
+        raise Http404('Imagen no encontrada')
+    formato = 'webp' if 'image/webp' in request.headers.get('Accept', '') else 'jpg'
+    etiqueta = quote_etag(f'{imagenes.clave(url)}-{variante}-{formato}')
+    respuesta = get_conditional_response(request, etag=etiqueta)
+    if respuesta is None:
+        try:
+            camino = imagenes.variante(url, variante, formato)
+        except imagenes.ImagenNoDisponible as e:
+            logger.info('Imagen externa no disponible: %s', e)
+            # Nunca a la URL original: la escribe el jugador y el navegador la cargaría sin proxy
+            respuesta = HttpResponseRedirect(static(IMAGEN_GENERICA))
+            respuesta['Cache-Control'] = f'public, max-age={imagenes.FALLO_SEGUNDOS}'
+            return respuesta
+        respuesta = FileResponse(open(camino, 'rb'), content_type=imagenes.FORMATOS[formato])
+    # La dirección cambia con la URL original: se puede cachear para siempre
+    respuesta['ETag'] = etiqueta
+    respuesta['Cache-Control'] = f'public, max-age={UN_ANO}, immutable'
+    respuesta['Vary'] = 'Accept'
+    return respuesta
@@ -0,0 +1,75 @@
+"""Subida del comprobante por trozos reanudables (ver subidas.py).
+
+- POST `subidas/comprobante/` con `nombre` y `tamano` abre la subida (201).
+- PUT `subidas/comprobante/<token>/` con el trozo como cuerpo y la cabecera
+  `X-Desplazamiento` lo escribe; si el desplazamiento no cuadra responde 409
+  con lo recibido para que el cliente siga desde ahí.
+- GET `subidas/comprobante/<token>/` dice cuánto ha llegado (para reanudar).
+
+Todas responden el estado en JSON; cuando `completa` es true el token se envía
+en el formulario de pago como `comprobante_token`.
+"""
+from django.conf import settings
+from django.contrib.auth.decorators import login_required
+from django.core.exceptions import ValidationError
+from django.http import JsonResponse
+from django.shortcuts import get_object_or_404
+from django.views.decorators.http import require_http_methods, require_POST
+
+from . import subidas
+from .models import SubidaParcial
+
+
+def _entero(valor):
+    try:
+        return int(valor)
+    except (TypeError, ValueError):
+        return None
+
+
+def _estado(subida, status=200):
+    return JsonResponse({
+        'token': subida.token,
+        'nombre': subida.nombre,
+        'tamano': subida.tamano,
+        'recibidos': subida.recibidos,
+        'completa': subida.completa,
+        'tamano_trozo': settings.SUBIDAS_TAMANO_TROZO,
+    }, status=status)
+
+
+def _error(error):
+    return JsonResponse({'error': error.messages[0]}, status=413 if error.code == 'tamano' else 400)
+
+
+@login_required
+@require_POST
+def subida_comprobante_crear(request):
+    tamano = _entero(request.POST.get('tamano'))
+    if tamano is None:
+        return JsonResponse({'error': 'Falta el tamaño del comprobante.'}, status=400)
+    try:
+        subida = subidas.crear(request.user, request.POST.get('nombre', ''), tamano)
+    except ValidationError as e:
+        return _error(e)
+    return _estado(subida, status=201)
+
+
+@login_required
+@require_http_methods(['GET', 'PUT'])
+def subida_comprobante(request, token):
+    subida = get_object_or_404(SubidaParcial, token=token, usuario=request.user)
+    if request.method == 'GET':
+        return _estado(subida)
+    desplazamiento = _entero(request.headers.get('X-Desplazamiento'))
+    longitud = _entero(request.META.get('CONTENT_LENGTH'))
+    if desplazamiento is None or desplazamiento < 0 or longitud is None:
+        return JsonResponse({'error': 'Faltan X-Desplazamiento o Content-Length.'}, status=400)
+    try:
+        subida = subidas.recibir_trozo(subida, desplazamiento, request, longitud)
+    except subidas.DesplazamientoIncorrecto:
+        subida.refresh_from_db()
+        return _estado(subida, status=409)
+    except ValidationError as e:
+        return _error(e)
+    return _estado(subida)
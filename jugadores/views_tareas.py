@@ -0,0 +1,60 @@
+"""Estado de la cola de tareas en segundo plano para el staff (ver tareas.py)."""
+from django.conf import settings
+from django.contrib import messages
+from django.contrib.admin.views.decorators import staff_member_required
+from django.db import IntegrityError, transaction
+from django.db.models import Count, Min, Q
+from django.shortcuts import redirect, render
+from django.utils import timezone
+from django.views.decorators.http import require_POST
+
+from .models import Tarea
+
+
+@staff_member_required
+def estado_tareas(request):
+    ahora = timezone.now()
+    conteos = dict(Tarea.objects.values_list('estado').annotate(n=Count('pk')).order_by())
+    vencidas = Tarea.objects.filter(estado='pendiente', ejecutar_en__lte=ahora).aggregate(
+        n=Count('pk'), mas_antigua=Min('ejecutar_en'),
+    )
+    por_tarea = (
+        Tarea.objects.values('nombre')
+        .annotate(
+            pendientes=Count('pk', filter=Q(estado='pendiente')),
+            en_curso=Count('pk', filter=Q(estado='en_curso')),
+            hechas=Count('pk', filter=Q(estado='hecha')),
+            fallidas=Count('pk', filter=Q(estado='fallida')),
+        )
+        .order_by('nombre')
+    )
+    return render(request, 'jugadores/estado_tareas.html', {
+        'activas': settings.TAREAS_ACTIVAS,
+        'conteos': {estado: conteos.get(estado, 0) for estado, _nombre in Tarea.ESTADO_CHOICES},
+        'vencidas': vencidas['n'],
+        # Retraso de la cola: cuánto lleva esperando la pendiente más antigua
+        'retraso': ahora - vencidas['mas_antigua'] if vencidas['mas_antigua'] else None,
+        'por_tarea': por_tarea,
+        'en_curso': Tarea.objects.filter(estado='en_curso').order_by('bloqueada_hasta')[:50],
+        'proximas': Tarea.objects.filter(estado='pendiente').order_by('ejecutar_en')[:20],
+        'fallidas': Tarea.objects.filter(estado='fallida').order_by('-terminada')[:20],
+        'programadas': sorted(settings.TAREAS_PROGRAMADAS.items(), key=lambda par: par[1]),
+    })
+
+
+@staff_member_required
+@require_POST
+def reintentar_tarea(request, tarea_id):
+    try:
+        with transaction.atomic():
+            cambiadas = Tarea.objects.filter(pk=tarea_id, estado='fallida').update(
+                estado='pendiente', intentos=0, ejecutar_en=timezone.now(), terminada=None,
+            )
+    except IntegrityError:
+        messages.info(request, 'Ya hay una tarea pendiente equivalente; no se duplica.')
+        return redirect('estado_tareas')
+    if cambiadas:
+        messages.success(request, f'Tarea #{tarea_id} encolada de nuevo.')
+    else:
+        messages.error(request, 'La tarea no existe o no está fallida.')
+    return redirect('estado_tareas')
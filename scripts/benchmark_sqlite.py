@@ -0,0 +1,127 @@
+#!/usr/bin/env python
+"""
+Benchmark de SQLite: configuración por defecto frente a la de producción
+(config/database.py) con varios procesos concurrentes, como workers de gunicorn.
+
+Cada proceso abre su propia conexión sobre una base temporal y, durante
+--segundos, mezcla lecturas (recuento de votos por jugador) y escrituras
+(insertar un voto en una transacción). Se informa de operaciones por segundo
+y de los errores "database is locked".
+
+Uso:
+    python scripts/benchmark_sqlite.py --procesos 8 --segundos 5 --escrituras 0.3
+"""
+import argparse
+import multiprocessing
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+
+proj_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if proj_root not in sys.path:
+    sys.path.insert(0, proj_root)
+
+from config.database import opciones_sqlite  # noqa: E402
+
+JUGADORES = 200
+
+
+def conectar(ruta, modo):
+    """Devuelve (conexión, sentencia con la que abrir transacciones de escritura)."""
+    if modo == 'produccion':
+        opciones = opciones_sqlite()
+        conn = sqlite3.connect(ruta, timeout=opciones['timeout'], isolation_level=None)
+        for comando in opciones['init_command'].split(';'):
+            conn.execute(comando)
+        return conn, 'BEGIN IMMEDIATE'
+    # Lo que usaba Django antes: journal DELETE, timeout de 5 s y BEGIN diferido
+    conn = sqlite3.connect(ruta, timeout=5, isolation_level=None)
+    conn.execute('PRAGMA journal_mode=DELETE')
+    return conn, 'BEGIN'
+
+
+def preparar(ruta):
+    conn = sqlite3.connect(ruta)
+    conn.execute('CREATE TABLE voto (id INTEGER PRIMARY KEY, partido INTEGER, jugador INTEGER, usuario INTEGER)')
+    conn.execute('CREATE INDEX voto_partido ON voto (partido, jugador)')
+    conn.executemany(
+        'INSERT INTO voto (partido, jugador, usuario) VALUES (?, ?, ?)',
+        [(i % 20, i % JUGADORES, i) for i in range(20000)],
+    )
+    conn.commit()
+    conn.close()
+
+
+def trabajador(ruta, modo, segundos, proporcion_escrituras, resultados):
+    conn, inicio = conectar(ruta, modo)
+    cuenta = {'lecturas': 0, 'escrituras': 0, 'bloqueos': 0}
+    azar = random.Random(os.getpid())
+    fin = time.monotonic() + segundos
+    while time.monotonic() < fin:
+        partido = azar.randrange(20)
+        try:
+            if azar.random() < proporcion_escrituras:
+                conn.execute(inicio)
+                # Lectura previa dentro de la transacción, como hace la vista al validar
+                conn.execute('SELECT COUNT(*) FROM voto WHERE partido = ? AND usuario = ?', (partido, 0)).fetchone()
+                conn.execute(
+                    'INSERT INTO voto (partido, jugador, usuario) VALUES (?, ?, ?)',
+                    (partido, azar.randrange(JUGADORES), azar.randrange(10 ** 6)),
+                )
+                conn.execute('COMMIT')
+                cuenta['escrituras'] += 1
+            else:
+                conn.execute(
+                    'SELECT jugador, COUNT(*) FROM voto WHERE partido = ? GROUP BY jugador ORDER BY 2 DESC LIMIT 5',
+                    (partido,),
+                ).fetchall()
+                cuenta['lecturas'] += 1
+        except sqlite3.OperationalError as exc:
+            if 'locked' not in str(exc) and 'busy' not in str(exc):
+                raise
+            cuenta['bloqueos'] += 1
+            if conn.in_transaction:
+                conn.execute('ROLLBACK')
+    conn.close()
+    resultados.put(cuenta)
+
+
+def ejecutar(modo, procesos, segundos, proporcion_escrituras):
+    with tempfile.TemporaryDirectory() as tmp:
+        ruta = os.path.join(tmp, 'bench.sqlite3')
+        preparar(ruta)
+        resultados = multiprocessing.Queue()
+        hijos = [
+            multiprocessing.Process(target=trabajador, args=(ruta, modo, segundos, proporcion_escrituras, resultados))
+            for _ in range(procesos)
+        ]
+        for hijo in hijos:
+            hijo.start()
+        totales = {'lecturas': 0, 'escrituras': 0, 'bloqueos': 0}
+        for _ in hijos:
+            for clave, valor in resultados.get(timeout=segundos + 60).items():
+                totales[clave] += valor
+        for hijo in hijos:
+            hijo.join()
+    return totales
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--procesos', type=int, default=8)
+    parser.add_argument('--segundos', type=float, default=5)
+    parser.add_argument('--escrituras', type=float, default=0.3, help='proporción de operaciones que escriben')
+    args = parser.parse_args()
+
+    print(f'{args.procesos} procesos, {args.segundos:g} s, {args.escrituras:.0%} escrituras')
+    print(f"{'modo':<12}{'lecturas/s':>12}{'escrituras/s':>14}{'bloqueos':>10}")
+    for modo in ('defecto', 'produccion'):
+        t = ejecutar(modo, args.procesos, args.segundos, args.escrituras)
+        print(f"{modo:<12}{t['lecturas'] / args.segundos:>12.0f}{t['escrituras'] / args.segundos:>14.0f}{t['bloqueos']:>10}")
+
+
+if __name__ == '__main__':
+    main()